@@ -1,11 +1,16 @@
-from app.core.interfaces import IDatabase, IStorageEngine, IPersistence, IWriteAheadLog, ICollection
+from app.core.interfaces import MISSING, IDatabase, IStorageEngine, IPersistence, IWriteAheadLog, ICollection
 from app.core.storage import InMemoryStorage
 from app.core.persistence import Snapshotter
-from app.core.wal import FileWal
+from app.core.wal import FileWal, SegmentedWal, Durability
+from app.core.batch import WriteBatch
+from app.core.tracing import OpTracer, TraceEvent, RecordingTracer, LoggingTracer
 from app.core.database import KVDB
+from app.core.async_database import AsyncKVDB
+from app.core.sharding import ShardedKVDB, ShardedStorage
 from app.core.collection import Collection
 
 __all__ = [
+    'MISSING',
     'IDatabase',
     'IStorageEngine',
     'IPersistence',
@@ -13,7 +18,17 @@ __all__ = [
     'InMemoryStorage',
     'Snapshotter',
     'FileWal',
+    'SegmentedWal',
+    'Durability',
     'KVDB',
+    'AsyncKVDB',
+    'ShardedKVDB',
+    'ShardedStorage',
+    'WriteBatch',
+    'OpTracer',
+    'TraceEvent',
+    'RecordingTracer',
+    'LoggingTracer',
     'Collection',
 ]
 
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.core.batch import Items, WriteBatch
+from app.core.database import EXPIRE_BATCH
+from app.core.interfaces import MISSING, IDatabase
+
+logger = logging.getLogger(__name__)
+
+# Наибольшее число операций, которое писатель собирает в одну группу
+DEFAULT_MAX_BATCH = 4096
+
+
+class AsyncKVDB:
+    """
+    Асинхронный фасад над KVDB (или ShardedKVDB) для сервисов на asyncio.
+
+    Чтения обслуживаются прямо из памяти в цикле событий и никогда не ждут
+    ввода-вывода. Записи ставятся в очередь единственной задачи-писателя:
+    она забирает все накопившиеся к этому моменту записи, выполняет их
+    одним вызовом db.write() (одна запись WAL и одна фиксация на группу) в
+    выделенном потоке и будит ожидающих после фиксации группы. Пока группа
+    фиксируется, следующие записи копятся в очереди, поэтому чем больше
+    одновременных писателей, тем крупнее группы. Снапшоты, которые запускает
+    запись, тоже выполняются в потоке писателя, а не в цикле событий.
+
+    Группа записывается атомарно: ошибка журнала завершает с ошибкой все
+    записи группы. Записи выполняются в порядке вызовов.
+
+    С expire_interval фасад раз в expire_interval секунд удаляет истекшие
+    ключи (db.purge_expired) в потоке писателя, так что память истекших
+    ключей освобождается и без записей.
+    """
+
+    def __init__(
+        self,
+        db: IDatabase,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        shutdown_db: bool = True,
+        expire_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            db: База данных с методом write(WriteBatch) (KVDB, ShardedKVDB)
+            max_batch: Наибольшее число операций в группе; пакет set_many
+                больше этого числа записывается одной группой целиком
+            shutdown_db: Вызвать db.shutdown() в close()
+            expire_interval: Период в секундах удаления истекших ключей;
+                None - ключи удаляются только попутно с записями
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch должен быть положительным")
+        if expire_interval is not None and not expire_interval > 0:
+            raise ValueError(f"expire_interval должен быть положительным, а не {expire_interval!r}")
+        self.db = db
+        self.max_batch = max_batch
+        self.expire_interval = expire_interval
+        self._shutdown_db = shutdown_db
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._expirer: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        # Число зафиксированных групп и операций в них
+        self.commits = 0
+        self.committed_operations = 0
+
+    async def start(self) -> None:
+        """Запускает задачу-писателя (и задачу истечения); вызывается автоматически при первой записи."""
+        if self._closed:
+            raise IOError("AsyncKVDB закрыта")
+        if self._writer is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kvdb-async-writer")
+        self._writer = asyncio.create_task(self._write_loop())
+        if self.expire_interval is not None:
+            self._expirer = asyncio.create_task(self._expire_loop())
+
+    async def close(self) -> None:
+        """Дожидается записи поставленных в очередь операций и завершает базу."""
+        if self._closed:
+            return
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        if self._expirer is not None:
+            self._expirer.cancel()
+            await asyncio.gather(self._expirer, return_exceptions=True)
+        if self._writer is not None:
+            self._queue.put_nowait(None)
+            await self._writer
+        if self._shutdown_db and hasattr(self.db, 'shutdown'):
+            # Финальный снапшот пишется не в цикле событий
+            await loop.run_in_executor(self._executor, self.db.shutdown)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncKVDB":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def get(self, key: str, namespace: Optional[str] = None, default: Any = None) -> Any:
+        """Возвращает значение по ключу из памяти или default, если ключа нет."""
+        return self.db.get(key, namespace, default)
+
+    async def get_many(
+        self, keys: Iterable[str], namespace: Optional[str] = None, ordered: bool = False
+    ) -> Union[Dict[str, Any], List[Any]]:
+        """
+        Возвращает значения нескольких ключей из памяти, как KVDB.get_many.
+
+        В отличие от KVDB.get_many, чтение не берет блокировку базы (она
+        удерживается и на время синхронного снапшота), поэтому группа,
+        которая применяется в этот момент, может быть видна частично.
+        """
+        keys = list(keys)
+        values = self.db.storage_engine.get_many(keys, namespace=namespace)
+        if ordered:
+            return values
+        return {key: value for key, value in zip(keys, values) if value is not MISSING}
+
+    async def set(self, key: str, value: Any, namespace: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение (с ttl - истекающее через ttl секунд); возвращается после фиксации группы в WAL."""
+        await self._submit(WriteBatch().set(key, value, namespace, ttl).operations)
+
+    async def delete(self, key: str, namespace: Optional[str] = None) -> bool:
+        """Удаляет ключ после фиксации группы в WAL; возвращает True, если ключ существовал."""
+        deleted, = await self._submit(WriteBatch().delete(key, namespace).operations)
+        return deleted
+
+    async def set_many(self, items: Items, namespace: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Атомарно сохраняет несколько пар; пары попадают в одну группу."""
+        operations = WriteBatch().set_many(items, namespace, ttl).operations
+        if operations:
+            await self._submit(operations)
+
+    async def _submit(self, operations: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        """Ставит операции в очередь писателя и ждет фиксации их группы."""
+        if self._writer is None:
+            await self.start()
+        if self._closed:
+            raise IOError("AsyncKVDB закрыта")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operations, future))
+        return await future
+
+    async def _write_loop(self) -> None:
+        """Задача-писатель: собирает группы из очереди и фиксирует их по одной."""
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            if item is None:
+                break
+            group: List[Tuple[List[Dict[str, Any]], asyncio.Future]] = [item]
+            count = len(item[0])
+            while count < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    closing = True
+                    break
+                group.append(item)
+                count += len(item[0])
+            operations = [operation for ops, _ in group for operation in ops]
+            try:
+                results = await loop.run_in_executor(self._executor, self._commit, operations)
+            except Exception as e:
+                logger.error("Ошибка записи группы из %d операций: %s", len(operations), e)
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.commits += 1
+            self.committed_operations += len(operations)
+            offset = 0
+            for ops, future in group:
+                # Ожидающий мог быть отменен, но его запись уже зафиксирована
+                if not future.done():
+                    future.set_result(results[offset:offset + len(ops)])
+                offset += len(ops)
+
+    async def _expire_loop(self) -> None:
+        """
+        Задача истечения: раз в expire_interval секунд, если срок ближайшего
+        истечения наступил, удаляет истекшие ключи пакетами по EXPIRE_BATCH
+        в потоке писателя, между группами записей.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.expire_interval)
+            next_expiry = self.db.storage_engine.next_expiry()
+            if next_expiry is None or next_expiry > time.time():
+                continue
+            try:
+                while await loop.run_in_executor(self._executor, self.db.purge_expired, EXPIRE_BATCH) == EXPIRE_BATCH:
+                    pass
+            except Exception as e:
+                logger.error("Ошибка удаления истекших ключей: %s", e)
+
+    def _commit(self, operations: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        """
+        Выполняется в потоке писателя: записывает группу в базу и возвращает
+        для каждой операции delete, существовал ли ключ (для set - None).
+        """
+        if len(operations) == 1 and 'expires_at' not in operations[0]:
+            # Одиночная операция пишется обычной записью журнала, а не пакетом
+            operation = operations[0]
+            namespace = operation.get('namespace')
+            if operation['type'] == 'set':
+                self.db.set(operation['key'], operation['value'], namespace)
+                return [None]
+            return [self.db.delete(operation['key'], namespace)]
+
+        # Пакет сообщает только общее число удаленных ключей, поэтому исход
+        # каждого delete вычисляется заранее по состоянию хранилища и
+        # предыдущим операциям группы. Писатель - единственный поток записи
+        # фасада; конкурентные синхронные записи в ту же базу могут сделать
+        # этот исход неточным.
+        storage = self.db.storage_engine
+        exists: Dict[Tuple[Optional[str], str], bool] = {}
+        results: List[Optional[bool]] = []
+        for operation in operations:
+            item = (operation.get('namespace'), operation['key'])
+            if operation['type'] == 'set':
+                exists[item] = True
+                results.append(None)
+                continue
+            if item not in exists:
+                # contains, а не get_many: проверка не должна освежать ключ в политике вытеснения
+                exists[item] = storage.contains(item[1], namespace=item[0])
+            results.append(exists[item])
+            exists[item] = False
+        batch = WriteBatch()
+        batch.operations = operations
+        self.db.write(batch)
+        return results
@@ -0,0 +1,84 @@
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+# Пары ключ/значение: словарь или итератор пар
+Items = Union[Mapping[str, Any], Iterable[Tuple[str, Any]]]
+
+# Префикс зарезервированных имен пространств: под ним снапшот хранит
+# служебные пространства (времена истечения ключей, см. app.core.storage)
+RESERVED_NAMESPACE_PREFIX = "\x00"
+
+
+class WriteBatch:
+    """
+    Пакет операций записи, который KVDB.write() логирует одной записью WAL
+    и применяет к хранилищу за один проход.
+
+    Операции хранятся в том же виде, что и записи журнала:
+    {'type': 'set', 'key', 'value'} и {'type': 'delete', 'key'} с
+    необязательным полем 'namespace'; у set с TTL есть поле 'expires_at' -
+    время истечения по time.time(), вычисленное при добавлении в пакет.
+    При восстановлении пакет применяется целиком или не применяется вовсе.
+    """
+
+    def __init__(self):
+        self.operations: List[Dict[str, Any]] = []
+
+    def set(self, key: str, value: Any, namespace: Optional[str] = None, ttl: Optional[float] = None) -> "WriteBatch":
+        """Добавляет в пакет запись значения по ключу; с ttl ключ истекает через ttl секунд."""
+        operation = {'type': 'set', 'key': key, 'value': value}
+        if namespace is not None:
+            operation['namespace'] = validate_namespace(namespace)
+        if ttl is not None:
+            operation['expires_at'] = expires_at_for(ttl)
+        self.operations.append(operation)
+        return self
+
+    def delete(self, key: str, namespace: Optional[str] = None) -> "WriteBatch":
+        """Добавляет в пакет удаление ключа."""
+        operation = {'type': 'delete', 'key': key}
+        if namespace is not None:
+            operation['namespace'] = validate_namespace(namespace)
+        self.operations.append(operation)
+        return self
+
+    def set_many(self, items: Items, namespace: Optional[str] = None, ttl: Optional[float] = None) -> "WriteBatch":
+        """Добавляет в пакет запись нескольких пар ключ/значение с общим ttl."""
+        for key, value in iter_pairs(items):
+            self.set(key, value, namespace, ttl)
+        return self
+
+    def delete_many(self, keys: Iterable[str], namespace: Optional[str] = None) -> "WriteBatch":
+        """Добавляет в пакет удаление нескольких ключей."""
+        for key in keys:
+            self.delete(key, namespace)
+        return self
+
+    def clear(self) -> None:
+        """Удаляет из пакета все операции."""
+        self.operations = []
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.operations)
+
+
+def iter_pairs(items: Items) -> Iterable[Tuple[str, Any]]:
+    """Возвращает пары ключ/значение из словаря или итератора пар."""
+    return items.items() if isinstance(items, Mapping) else items
+
+
+def expires_at_for(ttl: float) -> float:
+    """Возвращает время истечения (по time.time()) ключа, записанного сейчас с ttl секунд."""
+    if not ttl > 0:
+        raise ValueError(f"ttl должен быть положительным, а не {ttl!r}")
+    return time.time() + ttl
+
+
+def validate_namespace(namespace: str) -> str:
+    """Возвращает имя пространства имен; для зарезервированного имени - ValueError."""
+    if namespace.startswith(RESERVED_NAMESPACE_PREFIX):
+        raise ValueError(f"Имя пространства {namespace!r} зарезервировано (начинается с {RESERVED_NAMESPACE_PREFIX!r})")
+    return namespace
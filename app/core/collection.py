@@ -1,4 +1,5 @@
-from typing import Any, Optional, Dict
+from typing import Any, Iterable, List, Optional, Dict, Union
+from app.core.batch import Items, WriteBatch, validate_namespace
 from app.core.interfaces import IDatabase, ICollection
 import logging
 
@@ -7,8 +8,15 @@ logger = logging.getLogger(__name__)
 
 class Collection(ICollection):
     """
-    Коллекция - логическая группа данных с общим префиксом.
-    Позволяет организовать данные в пространства имен.
+    Коллекция - логическая группа данных в собственном пространстве имен хранилища.
+    Ключи разных коллекций и общего пространства не пересекаются, а выборка и
+    подсчет стоят O(размера коллекции), а не всей базы данных.
+
+    Прежние версии хранили коллекцию в общем пространстве ключами с префиксом
+    "<имя>:". Если пространство коллекции пусто, а такие ключи есть, коллекция
+    при создании переносит их в свое пространство одним пакетом WAL (см.
+    _migrate_legacy_keys); после переноса пространство непусто, и повторного
+    переноса не происходит.
     """
 
     def __init__(self, db: IDatabase, name: str):
@@ -17,57 +25,100 @@ class Collection(ICollection):
         
         Args:
             db: Экземпляр базы данных
-            name: Имя коллекции (будет использоваться как префикс ключей)
+            name: Имя коллекции (используется как имя пространства имен;
+                имена, начинающиеся с "\x00", зарезервированы)
         """
         self.db = db
-        self.name = name
-        self.prefix = f"{name}:"
+        self.name = validate_namespace(name)
+        self._migrate_legacy_keys()
 
-    def _make_key(self, key: str) -> str:
-        """Создает полный ключ с префиксом коллекции."""
-        return f"{self.prefix}{key}"
+    def _migrate_legacy_keys(self) -> int:
+        """
+        Переносит ключи "<имя>:<ключ>" общего пространства, записанные прежними
+        версиями, в пространство коллекции, сохраняя их TTL. Перенос - один
+        атомарный пакет WAL: удаление из общего пространства и запись в
+        коллекцию. Выполняется, только если пространство коллекции пусто.
+        Возвращает число перенесенных ключей.
+        """
+        storage = self.db.storage_engine
+        prefix = f"{self.name}:"
+        if storage.count(namespace=self.name):
+            return 0
+        pairs = list(storage.scan_prefix(prefix))
+        if not pairs:
+            return 0
+        batch = WriteBatch()
+        for key, value in pairs:
+            batch.delete(key)
+            batch.set(key[len(prefix):], value, self.name)
+            expires_at = storage.expiry(key)
+            if expires_at is not None:
+                batch.operations[-1]['expires_at'] = expires_at
+        self.db.write(batch)
+        logger.info("Коллекция '%s': перенесено ключей прежнего формата: %d", self.name, len(pairs))
+        return len(pairs)
 
-    def set(self, key: str, value: Any) -> None:
-        """Сохраняет значение в коллекции."""
-        full_key = self._make_key(key)
-        self.db.set(full_key, value)
-        logger.debug(f"Collection '{self.name}' SET: {key} = {value}")
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение в коллекции; с ttl ключ истекает через ttl секунд."""
+        self.db.set(key, value, namespace=self.name, ttl=ttl)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Collection '%s' SET: %s = %r", self.name, key, value)
 
     def get(self, key: str) -> Optional[Any]:
         """Получает значение из коллекции."""
-        full_key = self._make_key(key)
-        value = self.db.get(full_key)
-        logger.debug(f"Collection '{self.name}' GET: {key} = {value}")
+        value = self.db.get(key, namespace=self.name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Collection '%s' GET: %s = %r", self.name, key, value)
         return value
 
+    def get_many(self, keys: Iterable[str], ordered: bool = False) -> Union[Dict[str, Any], List[Any]]:
+        """
+        Получает из коллекции значения нескольких ключей: словарь найденных
+        ключей или, если ordered=True, список в порядке keys с MISSING для
+        отсутствующих.
+        """
+        return self.db.get_many(keys, namespace=self.name, ordered=ordered)
+
     def delete(self, key: str) -> bool:
         """Удаляет значение из коллекции."""
-        full_key = self._make_key(key)
-        result = self.db.delete(full_key)
-        logger.debug(f"Collection '{self.name}' DELETE: {key} - {'успешно' if result else 'не найдено'}")
+        result = self.db.delete(key, namespace=self.name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Collection '%s' DELETE: %s - %s", self.name, key, 'успешно' if result else 'не найдено')
         return result
 
+    def set_many(self, items: Items, ttl: Optional[float] = None) -> None:
+        """Атомарно сохраняет в коллекции несколько пар ключ/значение одной записью WAL."""
+        self.db.set_many(items, namespace=self.name, ttl=ttl)
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Атомарно удаляет из коллекции несколько ключей. Возвращает число удаленных."""
+        return self.db.delete_many(keys, namespace=self.name)
+
     def get_all(self) -> Dict[str, Any]:
-        """
-        Получает все данные из коллекции.
-        """
-        all_data = self.db.storage_engine.get_all_data()
-        # Фильтруем только ключи с нашим префиксом
-        collection_data = {}
-        for full_key, value in all_data.items():
-            if full_key.startswith(self.prefix):
-                # Убираем префикс из ключа
-                key = full_key[len(self.prefix):]
-                collection_data[key] = value
-        return collection_data
+        """Получает все данные из коллекции."""
+        return self.db.storage_engine.get_all_data(namespace=self.name)
 
     def count(self) -> int:
         """Возвращает количество элементов в коллекции."""
-        return len(self.get_all())
+        return self.db.storage_engine.count(namespace=self.name)
+
+    def drop(self) -> int:
+        """
+        Удаляет все элементы коллекции одной записью WAL.
+        Возвращает число удаленных элементов.
+        """
+        removed = self.db.drop_namespace(self.name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Collection '%s' DROP: удалено %d", self.name, removed)
+        return removed
+
+    def clear(self) -> int:
+        """Очищает коллекцию; то же, что drop(), так как пустая коллекция не хранится."""
+        return self.drop()
 
     def exists(self, key: str) -> bool:
-        """Проверяет, существует ли ключ в коллекции."""
-        return self.get(key) is not None
+        """Проверяет, существует ли ключ в коллекции (в том числе со значением None)."""
+        return key in self.get_many([key])
 
     def __str__(self) -> str:
         return f"Collection(name='{self.name}', items={self.count()})"
@@ -0,0 +1,69 @@
+import gzip
+import lzma
+import zlib
+from typing import BinaryIO, Optional
+
+# Кодеки сжатия файлов снапшотов и сегментов WAL (только стандартная библиотека)
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_LZMA = "lzma"
+COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_LZMA)
+
+# Уровни по умолчанию: для lzma старшие пресеты в десятки раз медленнее при небольшом выигрыше в размере
+DEFAULT_LEVELS = {COMPRESSION_ZLIB: 6, COMPRESSION_LZMA: 1}
+
+# Ошибки распаковки поврежденного или обрезанного файла
+DECOMPRESSION_ERRORS = (EOFError, gzip.BadGzipFile, lzma.LZMAError, zlib.error)
+
+# zlib пишется в контейнере gzip: сигнатура позволяет распознать сжатый файл, а CRC32 - его повреждение
+_GZIP_MAGIC = b"\x1f\x8b"
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+
+
+def validate_compression(compression: Optional[str]) -> str:
+    """Проверяет название кодека; None означает отсутствие сжатия."""
+    if compression is None:
+        return COMPRESSION_NONE
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Неизвестный кодек сжатия: {compression!r} (допустимые: {', '.join(COMPRESSIONS)})")
+    return compression
+
+
+def detect_compression(file_path: str) -> str:
+    """Определяет кодек существующего файла по сигнатуре."""
+    with open(file_path, 'rb') as f:
+        head = f.read(len(_XZ_MAGIC))
+    if head.startswith(_GZIP_MAGIC):
+        return COMPRESSION_ZLIB
+    if head == _XZ_MAGIC:
+        return COMPRESSION_LZMA
+    return COMPRESSION_NONE
+
+
+def open_read(file_path: str, buffering: int = 1024 * 1024) -> BinaryIO:
+    """Открывает файл на чтение, прозрачно распаковывая его, если он сжат."""
+    compression = detect_compression(file_path)
+    # Распаковывающие потоки буферизуют чтение сами
+    if compression == COMPRESSION_ZLIB:
+        return gzip.GzipFile(file_path, 'rb')
+    if compression == COMPRESSION_LZMA:
+        return lzma.LZMAFile(file_path, 'rb')
+    return open(file_path, 'rb', buffering=buffering)
+
+
+def wrap_writer(f: BinaryIO, compression: str, level: Optional[int] = None) -> BinaryIO:
+    """
+    Оборачивает открытый на запись файл сжимающим потоком.
+
+    Закрытие обертки дописывает окончание сжатого потока, но не закрывает
+    сам файл, чтобы после него можно было сделать fsync. Без сжатия
+    возвращается сам файл.
+    """
+    if level is None:
+        level = DEFAULT_LEVELS.get(compression)
+    if compression == COMPRESSION_ZLIB:
+        return gzip.GzipFile(fileobj=f, mode='wb', compresslevel=level, mtime=0)
+    if compression == COMPRESSION_LZMA:
+        return lzma.LZMAFile(f, 'wb', preset=level)
+    return f
+
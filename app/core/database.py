@@ -1,13 +1,50 @@
 import logging
-from typing import Any, Optional
-from app.core.interfaces import IDatabase, IStorageEngine, IPersistence, IWriteAheadLog
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from app.core.batch import Items, WriteBatch, expires_at_for, validate_namespace
+from app.core.interfaces import MISSING, IDatabase, IStorageEngine, IPersistence, IWriteAheadLog
+from app.core.locks import NullRWLock, RWLock
+from app.core.recovery import ParallelReplay
+from app.core.tracing import OpTracer, TraceEvent
 
 logger = logging.getLogger(__name__)
 
+# Наибольшее число истекших ключей, которое запись удаляет попутно
+EXPIRE_BATCH = 100
+
 
 class KVDB(IDatabase):
     """
     Key-Value База Данных с поддержкой персистентности и WAL.
+
+    В потокобезопасном режиме (thread_safe=True) каждая запись под
+    монопольной блокировкой ставится в WAL, применяется к хранилищу и
+    учитывается в счетчике операций, поэтому порядок записей в журнале
+    совпадает с порядком их применения, а снапшот снимается между
+    операциями. Ожидание fsync в режиме group commit вынесено за пределы
+    блокировки, так что записи конкурентных писателей по-прежнему
+    фиксируются общим пакетом; вызов возвращается только после фиксации,
+    но другие потоки могут увидеть значение чуть раньше. get читает без
+    блокировки, get_many - под разделяемой блокировкой, так что пакет
+    записей виден целиком.
+
+    Ключ, записанный с ttl, истекает через ttl секунд: чтения сразу перестают
+    его видеть (ленивое истечение), а память освобождается активным
+    истечением - каждая запись попутно удаляет до EXPIRE_BATCH ключей, срок
+    которых наступил, а purge_expired() - все такие ключи. С expire_interval
+    то же делает фоновый поток раз в expire_interval секунд, так что память
+    освобождается и без записей. Ближайшие истечения хранилище находит по
+    куче, без обхода данных. Удаление
+    истекших ключей логируется одной компактной записью 'expire' на
+    пространство имен и учитывается в пороге снапшота как одна операция.
+
+    Если хранилище ограничено по объему (InMemoryStorage с max_keys или
+    max_memory), запись, после которой бюджет превышен, вытесняет ключи,
+    выбранные политикой хранилища. Вытеснение логируется так же компактно -
+    записью 'evict' на пространство имен, - и запись ждет ее фиксации,
+    поэтому восстановление из журнала не возвращает вытесненные ключи.
+    Счетчики вытеснения - storage_engine.eviction_stats().
     """
 
     def __init__(
@@ -15,39 +52,125 @@ class KVDB(IDatabase):
         storage_engine: IStorageEngine,
         persistence: IPersistence,
         wal: IWriteAheadLog,
-        auto_snapshot_threshold: int = 100
+        auto_snapshot_threshold: int = 100,
+        durability: Optional[str] = None,
+        background_snapshots: bool = False,
+        tracer: Optional[OpTracer] = None,
+        thread_safe: bool = False,
+        recovery_processes: int = 1,
+        expire_interval: Optional[float] = None
     ):
+        """
+        Args:
+            storage_engine: Движок хранения данных
+            persistence: Механизм снапшотов
+            wal: Журнал операций
+            auto_snapshot_threshold: Число операций между автоматическими снапшотами
+            durability: Уровень durability журнала ("none", "flush", "fsync", "interval").
+                Если не задан, используется настройка самого журнала
+            background_snapshots: Создавать автоматические снапшоты в фоновом потоке.
+                Требует журнал с LSN (SegmentedWal): пока снапшот пишется, новые
+                операции продолжают попадать в WAL и не удаляются при его сжатии
+            tracer: Трассировщик операций (см. app.core.tracing). Без него
+                операции не измеряются и не создают событий
+            thread_safe: Разрешает вызывать методы из нескольких потоков (см. описание класса)
+            recovery_processes: Число процессов, в которых при запуске читаются закрытые
+                сегменты SegmentedWal (см. app.core.recovery.ParallelReplay); 1 - чтение
+                в текущем процессе
+            expire_interval: Период в секундах, с которым фоновый поток удаляет
+                истекшие ключи. Требует thread_safe=True; None - ключи удаляются
+                только попутно с записями и purge_expired()
+        """
+        if recovery_processes < 1:
+            raise ValueError("recovery_processes должен быть положительным")
+        if expire_interval is not None:
+            if not expire_interval > 0:
+                raise ValueError(f"expire_interval должен быть положительным, а не {expire_interval!r}")
+            if not thread_safe:
+                raise ValueError("Фоновое истечение ключей требует потокобезопасную базу (thread_safe=True)")
+        if background_snapshots and wal.last_lsn is None:
+            raise ValueError(
+                f"Фоновые снапшоты требуют журнал с LSN (например, SegmentedWal), а не {type(wal).__name__}"
+            )
         self.storage_engine = storage_engine
         self.persistence = persistence
         self.wal = wal
         self.auto_snapshot_threshold = auto_snapshot_threshold
+        self.background_snapshots = background_snapshots
+        self.tracer = tracer
+        self.thread_safe = thread_safe
+        self.recovery_processes = recovery_processes
+        self.expire_interval = expire_interval
+        # Писатели берут блокировку монопольно, пакетное чтение - совместно
+        self._lock = RWLock() if thread_safe else NullRWLock()
         self.operation_count = 0
+        # Фоновый поток, пишущий снапшот, и последняя ошибка фонового снапшота
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self.last_snapshot_error: Optional[Exception] = None
+        # Выставляется shutdown: новые фоновые снапшоты не запускаются
+        self._shutting_down = False
+        if durability is not None:
+            self.wal.set_durability(durability)
         
         # Инициализация: загружаем данные из снапшота и применяем WAL
         self._initialize()
 
+        # Фоновый поток истечения ключей и событие его остановки
+        self._expire_stop = threading.Event()
+        self._expire_thread: Optional[threading.Thread] = None
+        if expire_interval is not None:
+            self._expire_thread = threading.Thread(target=self._run_expire_loop, name="kvdb-expire", daemon=True)
+            self._expire_thread.start()
+
     def _initialize(self) -> None:
-        """Инициализация базы данных: загрузка снапшота и применение WAL."""
+        """
+        Инициализация базы данных: загрузка снапшота и применение WAL.
+
+        С recovery_processes > 1 сегменты журнала разбираются в пуле процессов
+        одновременно с загрузкой снапшота. С фоновыми снапшотами снапшот после
+        применения журнала пишется в фоне, и база доступна, как только
+        состояние восстановлено в памяти.
+        """
         logger.info("Инициализация базы данных...")
         
-        # Загружаем снапшот
-        snapshot_data = self.persistence.load()
-        if snapshot_data:
-            logger.info(f"Загружен снапшот с {len(snapshot_data)} записями")
-            self.storage_engine.load_data(snapshot_data)
-        else:
-            logger.info("Снапшот не найден, начинаем с пустой базы данных")
-        
-        # Применяем операции из WAL
-        operations = self.wal.replay()
-        if operations:
-            logger.info(f"Применение {len(operations)} операций из WAL")
+        # Если снапшот помечен LSN, операции, уже вошедшие в него, пропускаются
+        snapshot_lsn = self.persistence.load_lsn()
+        wal_lsn = self.wal.last_lsn
+        stale_snapshot_lsn = snapshot_lsn is not None and wal_lsn is not None and wal_lsn < snapshot_lsn
+        if stale_snapshot_lsn:
+            # Снапшот не может быть новее журнала: значит, журнал был потерян или создан заново.
+            # Применяем его целиком и перевыпускаем снапшот с LSN журнала
+            logger.warning(f"LSN снапшота ({snapshot_lsn}) больше LSN журнала ({wal_lsn})")
+            snapshot_lsn = None
+
+        # Разбор сегментов журнала в пуле процессов начинается до загрузки снапшота
+        with ParallelReplay(self.wal, after_lsn=snapshot_lsn, processes=self.recovery_processes) as operations:
+            # Загружаем снапшот потоково, сразу в движок хранения
+            loaded = self.persistence.load_into(self.storage_engine)
+            if loaded:
+                logger.info(f"Загружен снапшот с {loaded} записями")
+            else:
+                logger.info("Снапшот не найден, начинаем с пустой базы данных")
+
+            # Применяем операции из WAL по одной, не загружая журнал в память целиком
+            applied = 0
             for operation in operations:
                 self._apply_operation(operation)
+                applied += 1
+        # Бюджет хранилища мог уменьшиться с прошлого запуска: лишние ключи
+        # вытесняются до снапшота, и он их уже не содержит
+        evict_waits = self._maybe_evict()
+        for evict_wait in evict_waits:
+            evict_wait()
+        if applied or stale_snapshot_lsn or evict_waits:
+            logger.info(f"Применено {applied} операций из WAL")
             # После применения WAL создаем новый снапшот и очищаем WAL
-            self._create_snapshot()
-            self.wal.compact()
-            logger.info("WAL применен и очищен")
+            if self.background_snapshots:
+                self._start_background_snapshot()
+                logger.info("WAL применен, снапшот пишется в фоне")
+            else:
+                self._create_snapshot()
+                logger.info("WAL применен и очищен")
         else:
             logger.info("WAL пуст")
 
@@ -55,59 +178,383 @@ class KVDB(IDatabase):
         """Применяет операцию из WAL к движку хранения."""
         op_type = operation.get('type')
         key = operation.get('key')
+        namespace = operation.get('namespace')
         
         if op_type == 'set':
             value = operation.get('value')
-            self.storage_engine.set(key, value)
+            self.storage_engine.set(key, value, namespace=namespace, expires_at=operation.get('expires_at'))
         elif op_type == 'delete':
-            self.storage_engine.delete(key)
+            self.storage_engine.delete(key, namespace=namespace)
+        elif op_type in ('expire', 'evict'):
+            self.storage_engine.apply_batch(_key_deletes(operation))
+        elif op_type == 'drop':
+            self.storage_engine.drop_namespace(namespace)
+        elif op_type == 'batch':
+            self.storage_engine.apply_batch(operation['operations'])
 
     def _create_snapshot(self) -> None:
-        """Создает снапшот текущего состояния данных."""
-        data = self.storage_engine.get_all_data()
-        self.persistence.dump(data)
-        logger.info(f"Создан снапшот с {len(data)} записями")
-
-    def _maybe_snapshot(self) -> None:
-        """Проверяет, нужно ли создать снапшот."""
-        self.operation_count += 1
+        """
+        Создает снапшот текущего состояния данных и удаляет из WAL вошедшие в него операции.
+
+        Если журнал нумерует записи, снапшот помечается LSN последней операции,
+        и журнал сжимается только до этого LSN.
+        """
+        lsn = self.wal.last_lsn
+        data = self.storage_engine.begin_snapshot()
+        try:
+            self._write_snapshot(data, self.storage_engine.snapshot_namespaces(), lsn)
+        finally:
+            self.storage_engine.end_snapshot()
+
+    def _write_snapshot(self, data: dict, namespaces: Dict[str, dict], lsn: Optional[int]) -> None:
+        """Сохраняет снятое состояние данных и сжимает WAL до его LSN."""
+        if lsn is None:
+            self.persistence.dump(data, namespaces=namespaces)
+            self.wal.compact()
+        else:
+            self.persistence.dump(data, lsn=lsn, namespaces=namespaces)
+            self.wal.compact(upto_lsn=lsn)
+        records = len(data) + sum(len(ns_data) for ns_data in namespaces.values())
+        logger.info(f"Создан снапшот с {records} записями")
+
+    def _start_background_snapshot(self) -> bool:
+        """
+        Снимает состояние данных и запускает его запись в фоновом потоке.
+        Возвращает False, если предыдущий фоновый снапшот еще не завершен
+        или база завершает работу.
+        """
+        if self.snapshot_in_progress or self._shutting_down:
+            return False
+        lsn = self.wal.last_lsn
+        # Снимок на момент времени без копирования: изменения до конца записи идут в оверлей
+        data = self.storage_engine.begin_snapshot()
+        namespaces = self.storage_engine.snapshot_namespaces()
+        self._snapshot_thread = threading.Thread(
+            target=self._run_background_snapshot, args=(data, namespaces, lsn), name="kvdb-snapshot", daemon=True
+        )
+        self._snapshot_thread.start()
+        return True
+
+    def _run_background_snapshot(self, data: dict, namespaces: Dict[str, dict], lsn: int) -> None:
+        """Тело фонового потока снапшота."""
+        try:
+            self._write_snapshot(data, namespaces, lsn)
+            self.last_snapshot_error = None
+        except Exception as e:
+            # Операции остаются в WAL, поэтому данные не теряются; следующий снапшот повторит попытку
+            self.last_snapshot_error = e
+            logger.exception(f"Ошибка фонового снапшота: {e}")
+        finally:
+            self.storage_engine.end_snapshot()
+
+    @property
+    def snapshot_in_progress(self) -> bool:
+        """Пишется ли сейчас фоновый снапшот."""
+        return self._snapshot_thread is not None and self._snapshot_thread.is_alive()
+
+    def wait_for_snapshot(self, timeout: Optional[float] = None) -> bool:
+        """Ждет завершения фонового снапшота. Возвращает False, если время ожидания истекло."""
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _maybe_snapshot(self, operations: int = 1) -> None:
+        """Учитывает выполненные операции и проверяет, нужно ли создать снапшот."""
+        self.operation_count += operations
         if self.operation_count >= self.auto_snapshot_threshold:
+            if self.background_snapshots:
+                # Если предыдущий снапшот еще пишется, попробуем на следующей операции
+                if self._start_background_snapshot():
+                    logger.info(f"Достигнут порог {self.auto_snapshot_threshold} операций, запущен фоновый снапшот")
+                    self.operation_count = 0
+                return
             logger.info(f"Достигнут порог {self.auto_snapshot_threshold} операций, создаем снапшот")
             self._create_snapshot()
-            self.wal.compact()
             self.operation_count = 0
 
-    def set(self, key: str, value: Any) -> None:
-        """Сохраняет значение по ключу."""
-        # Сначала логируем операцию в WAL
-        self.wal.log({'type': 'set', 'key': key, 'value': value})
-        # Затем выполняем операцию
-        self.storage_engine.set(key, value)
-        logger.debug(f"SET: {key} = {value}")
-        # Проверяем, нужен ли снапшот
-        self._maybe_snapshot()
-
-    def get(self, key: str) -> Optional[Any]:
-        """Возвращает значение по ключу."""
-        value = self.storage_engine.get(key)
-        logger.debug(f"GET: {key} = {value}")
+    def _expire(self, limit: Optional[int]) -> Tuple[int, List[Callable[[], None]]]:
+        """
+        Удаляет ключи, истекшие к текущему моменту (не больше limit), записав
+        истечение в WAL. Вызывается под монопольной блокировкой. Возвращает
+        число удаленных ключей и функции ожидания фиксации записей журнала.
+        """
+        removed = 0
+        waits = []
+        expired = self.storage_engine.pop_expired(time.time(), limit)
+        for namespace, keys in list(expired.items()):
+            operation = {'type': 'expire', 'keys': keys}
+            if namespace is not None:
+                operation['namespace'] = namespace
+            try:
+                waits.append(self.wal.log_deferred(operation))
+            except Exception:
+                # Ключи уже извлечены из кучи: без возврата их не удалило бы ни одно следующее истечение
+                self.storage_engine.requeue_expired(expired)
+                raise
+            self.storage_engine.apply_batch(_key_deletes(operation))
+            del expired[namespace]
+            removed += len(keys)
+        if removed and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("EXPIRE: удалено истекших ключей %d", removed)
+        return removed, waits
+
+    def _maybe_expire(self) -> int:
+        """
+        Попутно удаляет истекшие ключи, если срок ближайшего наступил.
+        Вызывается под монопольной блокировкой; возвращает число записей WAL.
+        Фиксации этих записей запись не ждет: после сбоя истекшие ключи
+        снова истекут по времени из своих записей set.
+        """
+        next_expiry = self.storage_engine.next_expiry()
+        if next_expiry is None or next_expiry > time.time():
+            return 0
+        return len(self._expire(EXPIRE_BATCH)[1])
+
+    def _maybe_evict(self) -> List[Callable[[], None]]:
+        """
+        Вытесняет ключи, если хранилище превысило бюджет, записав вытеснение
+        в WAL. Вызывается под монопольной блокировкой; возвращает функции
+        ожидания фиксации записей журнала (по одной на пространство имен).
+        """
+        if not self.storage_engine.over_budget():
+            return []
+        waits = []
+        evicted = 0
+        for namespace, keys in self.storage_engine.select_evictions().items():
+            operation = {'type': 'evict', 'keys': keys}
+            if namespace is not None:
+                operation['namespace'] = namespace
+            waits.append(self.wal.log_deferred(operation))
+            evicted += self.storage_engine.evict(keys, namespace)
+        if evicted and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("EVICT: вытеснено ключей %d", evicted)
+        return waits
+
+    def _run_expire_loop(self) -> None:
+        """
+        Фоновый поток: раз в expire_interval секунд, если срок ближайшего
+        истечения наступил, удаляет истекшие ключи пакетами по EXPIRE_BATCH,
+        отпуская блокировку между пакетами, чтобы не задерживать записи.
+        """
+        while not self._expire_stop.wait(self.expire_interval):
+            next_expiry = self.storage_engine.next_expiry()
+            if next_expiry is None or next_expiry > time.time():
+                continue
+            try:
+                while self.purge_expired(EXPIRE_BATCH) == EXPIRE_BATCH and not self._expire_stop.is_set():
+                    pass
+            except Exception as e:
+                logger.exception(f"Ошибка фонового истечения ключей: {e}")
+
+    def purge_expired(self, limit: Optional[int] = None) -> int:
+        """
+        Удаляет все ключи (не больше limit), срок которых наступил, и ждет
+        фиксации записей журнала. Возвращает число удаленных ключей.
+        """
+        with self._lock.write:
+            removed, waits = self._expire(limit)
+            if waits:
+                self._maybe_snapshot(len(waits))
+        for wait in waits:
+            wait()
+        return removed
+
+    def ttl(self, key: str, namespace: Optional[str] = None) -> Optional[float]:
+        """Возвращает оставшееся время жизни ключа в секундах или None, если у ключа нет TTL или он истек."""
+        expires_at = self.storage_engine.expiry(key, namespace)
+        if expires_at is None:
+            return None
+        remaining = expires_at - time.time()
+        return remaining if remaining > 0 else None
+
+    def _trace(self, op: str, namespace: Optional[str], key: Optional[str], count: int, start: float) -> None:
+        """Передает трассировщику событие операции, начатой в момент start."""
+        self.tracer.record(TraceEvent(op, namespace, key, count, time.perf_counter() - start))
+
+    def set(self, key: str, value: Any, namespace: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """
+        Сохраняет значение по ключу в пространстве имен (None - общее пространство).
+        С ttl ключ истекает через ttl секунд; запись без ttl снимает прежний TTL ключа.
+        """
+        tracing = self.tracer is not None
+        if tracing:
+            start = time.perf_counter()
+        operation = {'type': 'set', 'key': key, 'value': value}
+        if namespace is not None:
+            operation['namespace'] = validate_namespace(namespace)
+        expires_at = None
+        if ttl is not None:
+            expires_at = operation['expires_at'] = expires_at_for(ttl)
+        with self._lock.write:
+            # Сначала логируем операцию в WAL, затем выполняем ее
+            wait = self.wal.log_deferred(operation)
+            self.storage_engine.set(key, value, namespace=namespace, expires_at=expires_at)
+            # Попутно удаляем истекшие ключи, вытесняем ключи сверх бюджета и проверяем, нужен ли снапшот
+            records = self._maybe_expire()
+            evict_waits = self._maybe_evict()
+            self._maybe_snapshot(1 + records + len(evict_waits))
+        wait()
+        for evict_wait in evict_waits:
+            evict_wait()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SET: %s = %r", key, value)
+        if tracing:
+            self._trace('set', namespace, key, 1, start)
+
+    def get(self, key: str, namespace: Optional[str] = None, default: Any = None) -> Any:
+        """
+        Возвращает значение по ключу из пространства имен или default, если
+        ключа нет. С default=MISSING отсутствующий ключ отличается от сохраненного None.
+        """
+        tracing = self.tracer is not None
+        if tracing:
+            start = time.perf_counter()
+        # Чтение одного ключа не берет блокировку: хранилище возвращает значение
+        # либо до, либо после конкурентной записи
+        if default is None:
+            value = self.storage_engine.get(key, namespace=namespace)
+        else:
+            value, = self.storage_engine.get_many([key], namespace=namespace)
+            if value is MISSING:
+                value = default
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("GET: %s = %r", key, value)
+        if tracing:
+            self._trace('get', namespace, key, 1, start)
         return value
 
-    def delete(self, key: str) -> bool:
-        """Удаляет значение по ключу."""
-        # Сначала логируем операцию в WAL
-        self.wal.log({'type': 'delete', 'key': key})
-        # Затем выполняем операцию
-        result = self.storage_engine.delete(key)
-        logger.debug(f"DELETE: {key} - {'успешно' if result else 'ключ не найден'}")
-        # Проверяем, нужен ли снапшот
-        self._maybe_snapshot()
+    def get_many(
+        self, keys: Iterable[str], namespace: Optional[str] = None, ordered: bool = False
+    ) -> Union[Dict[str, Any], List[Any]]:
+        """
+        Возвращает значения нескольких ключей за один проход по хранилищу.
+
+        По умолчанию - словарь только найденных ключей, так что отсутствующий
+        ключ отличается от сохраненного значения None. С ordered=True - список
+        значений в порядке keys, где отсутствующим ключам соответствует MISSING.
+        """
+        tracing = self.tracer is not None
+        if tracing:
+            start = time.perf_counter()
+        keys = list(keys)
+        # Разделяемая блокировка: пакет записей виден либо целиком, либо не виден вовсе
+        with self._lock.read:
+            values = self.storage_engine.get_many(keys, namespace=namespace)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("GET_MANY: ключей %d", len(keys))
+        if tracing:
+            self._trace('get_many', namespace, None, len(keys), start)
+        if ordered:
+            return values
+        return {key: value for key, value in zip(keys, values) if value is not MISSING}
+
+    def delete(self, key: str, namespace: Optional[str] = None) -> bool:
+        """Удаляет значение по ключу из пространства имен."""
+        tracing = self.tracer is not None
+        if tracing:
+            start = time.perf_counter()
+        operation = {'type': 'delete', 'key': key}
+        if namespace is not None:
+            operation['namespace'] = validate_namespace(namespace)
+        with self._lock.write:
+            # Сначала логируем операцию в WAL, затем выполняем ее
+            wait = self.wal.log_deferred(operation)
+            result = self.storage_engine.delete(key, namespace=namespace)
+            # Попутно удаляем истекшие ключи и проверяем, нужен ли снапшот
+            self._maybe_snapshot(1 + self._maybe_expire())
+        wait()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("DELETE: %s - %s", key, 'успешно' if result else 'ключ не найден')
+        if tracing:
+            self._trace('delete', namespace, key, 1, start)
         return result
 
+    def write(self, batch: WriteBatch) -> int:
+        """
+        Атомарно выполняет пакет операций: логирует его одной записью WAL и
+        применяет к хранилищу за один проход. При восстановлении пакет
+        применяется целиком или не применяется вовсе. Каждая операция пакета
+        учитывается в пороге автоматического снапшота.
+        Возвращает число ключей, удаленных операциями delete.
+        """
+        operations = batch.operations
+        if not operations:
+            return 0
+        tracing = self.tracer is not None
+        if tracing:
+            start = time.perf_counter()
+        with self._lock.write:
+            # Сначала логируем пакет в WAL, затем выполняем операции
+            wait = self.wal.log_deferred({'type': 'batch', 'operations': operations})
+            deleted = self.storage_engine.apply_batch(operations)
+            # Попутно удаляем истекшие ключи, вытесняем ключи сверх бюджета и проверяем, нужен ли снапшот
+            records = self._maybe_expire()
+            evict_waits = self._maybe_evict()
+            self._maybe_snapshot(len(operations) + records + len(evict_waits))
+        wait()
+        for evict_wait in evict_waits:
+            evict_wait()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("BATCH: операций %d, удалено ключей %d", len(operations), deleted)
+        if tracing:
+            # Пакет может затрагивать несколько пространств имен
+            self._trace('batch', None, None, len(operations), start)
+        return deleted
+
+    def set_many(self, items: Items, namespace: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Атомарно сохраняет несколько пар ключ/значение из словаря или итератора пар с общим ttl."""
+        self.write(WriteBatch().set_many(items, namespace, ttl))
+
+    def delete_many(self, keys: Iterable[str], namespace: Optional[str] = None) -> int:
+        """Атомарно удаляет несколько ключей. Возвращает число удаленных ключей."""
+        return self.write(WriteBatch().delete_many(keys, namespace))
+
+    def drop_namespace(self, namespace: Optional[str]) -> int:
+        """
+        Удаляет все ключи пространства имен одной записью WAL и одной операцией
+        хранилища. Возвращает число удаленных ключей.
+        """
+        tracing = self.tracer is not None
+        if tracing:
+            start = time.perf_counter()
+        operation = {'type': 'drop'}
+        if namespace is not None:
+            operation['namespace'] = validate_namespace(namespace)
+        with self._lock.write:
+            # Сначала логируем операцию в WAL, затем выполняем ее
+            wait = self.wal.log_deferred(operation)
+            removed = self.storage_engine.drop_namespace(namespace)
+            # Попутно удаляем истекшие ключи и проверяем, нужен ли снапшот
+            self._maybe_snapshot(1 + self._maybe_expire())
+        wait()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("DROP: %r - удалено ключей: %d", namespace, removed)
+        if tracing:
+            self._trace('drop', namespace, None, removed, start)
+        return removed
+
     def shutdown(self) -> None:
         """Корректное завершение работы: создание финального снапшота."""
         logger.info("Завершение работы базы данных...")
-        self._create_snapshot()
-        self.wal.compact()
+        if self._expire_thread is not None:
+            self._expire_stop.set()
+            self._expire_thread.join()
+        with self._lock.write:
+            # Под блокировкой: писатель не успеет запустить фоновый снапшот после ожидания
+            self._shutting_down = True
+        # Фоновый поток не берет блокировку базы, поэтому ждем его вне ее
+        self.wait_for_snapshot()
+        with self._lock.write:
+            self._create_snapshot()
+        self.wal.close()
         logger.info("База данных завершила работу")
 
+
+def _key_deletes(operation: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Операции delete, равносильные записи журнала об истечении или вытеснении ключей."""
+    namespace = operation.get('namespace')
+    if namespace is None:
+        return [{'type': 'delete', 'key': key} for key in operation['keys']]
+    return [{'type': 'delete', 'key': key, 'namespace': namespace} for key in operation['keys']]
@@ -0,0 +1,276 @@
+import random
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Ключ хранилища вместе с пространством имен
+Item = Tuple[Optional[str], str]
+
+EVICTION_LRU = "lru"
+EVICTION_LFU = "lfu"
+EVICTION_TTL = "ttl"
+EVICTION_POLICIES = (EVICTION_LRU, EVICTION_LFU, EVICTION_TTL)
+
+# Оценка накладных расходов хранилища на один ключ сверх размеров ключа и
+# значения: ячейка словаря, место в индексе ключей и учет политики вытеснения
+ENTRY_OVERHEAD = 200
+
+# Счетчик LFU: 8 бит, новый ключ начинает с LFU_INIT_COUNTER, чтобы не быть
+# вытесненным раньше ключей, к которым ни разу не обращались после загрузки
+LFU_MAX_COUNTER = 255
+LFU_INIT_COUNTER = 1
+# Чем больше множитель, тем медленнее растет счетчик (см. LFUPolicy)
+LFU_LOG_FACTOR = 10
+# Счетчик уменьшается на 1 за каждые LFU_DECAY_TIME секунд без обращений
+# (как lfu-decay-time в Redis); 0 - счетчики не уменьшаются
+LFU_DECAY_TIME = 60.0
+# Сколько давно не уменьшавшихся счетчиков уменьшает один поиск кандидатов
+LFU_DECAY_BATCH = 128
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Приблизительный объем объекта в байтах: sys.getsizeof с обходом вложенных
+    dict, list, tuple, set и frozenset. Общие объекты учитываются при каждой ссылке.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+def entry_size(key: str, value: Any) -> int:
+    """Оценка памяти, которую занимает в хранилище пара ключ/значение."""
+    return sys.getsizeof(key) + estimate_size(value) + ENTRY_OVERHEAD
+
+
+class EvictionPolicy(ABC):
+    """
+    Политика вытеснения: отслеживает ключи хранилища и выдает их в порядке,
+    в котором их следует вытеснять. Методы учета стоят O(1) и вызываются
+    хранилищем под его замком; candidates не меняет набор отслеживаемых
+    ключей - вытесненный ключ перестает отслеживаться, когда хранилище его удалит.
+    """
+
+    @abstractmethod
+    def added(self, item: Item) -> None:
+        """Ключ записан (новый или перезаписанный)."""
+        pass
+
+    @abstractmethod
+    def accessed(self, item: Item) -> None:
+        """Ключ прочитан."""
+        pass
+
+    @abstractmethod
+    def removed(self, item: Item) -> None:
+        """Ключ удален; неотслеживаемый ключ игнорируется."""
+        pass
+
+    @abstractmethod
+    def candidates(self) -> Iterator[Item]:
+        """Ключи в порядке вытеснения; хранилище не меняется, пока итератор используется."""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Перестает отслеживать все ключи."""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+
+class LRUPolicy(EvictionPolicy):
+    """Вытесняет ключи, к которым дольше всего не обращались: упорядоченный словарь, O(1) на операцию."""
+
+    def __init__(self):
+        self._order: "OrderedDict[Item, None]" = OrderedDict()
+
+    def added(self, item: Item) -> None:
+        self._order[item] = None
+        self._order.move_to_end(item)
+
+    def accessed(self, item: Item) -> None:
+        if item in self._order:
+            self._order.move_to_end(item)
+
+    def removed(self, item: Item) -> None:
+        self._order.pop(item, None)
+
+    def candidates(self) -> Iterator[Item]:
+        return iter(self._order)
+
+    def clear(self) -> None:
+        self._order.clear()
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Приближенный LFU: вытесняет ключи с наименьшим счетчиком обращений.
+
+    Счетчик занимает 8 бит и растет логарифмически: обращение увеличивает
+    его с вероятностью 1 / ((счетчик - LFU_INIT_COUNTER) * LFU_LOG_FACTOR + 1),
+    так что 255 соответствует примерно миллиону обращений. Ключи разложены по
+    корзинам счетчиков (упорядоченным словарям), поэтому учет обращения и
+    поиск кандидата стоят O(1): корзин не больше 256. Внутри корзины первым
+    вытесняется ключ, дольше всех находящийся в ней.
+
+    Как в Redis, счетчик уменьшается на 1 за каждые decay_time секунд с его
+    прошлого уменьшения, так что ключ, популярный когда-то давно, со временем
+    становится кандидатом на вытеснение. Уменьшение ленивое: счетчик
+    пересчитывается при обращении к ключу, а поиск кандидатов пересчитывает
+    до LFU_DECAY_BATCH счетчиков, дольше всех не пересчитывавшихся (ключи
+    упорядочены по времени пересчета), поэтому стоимость учета остается O(1).
+    """
+
+    def __init__(
+        self,
+        rng: Optional[random.Random] = None,
+        decay_time: float = LFU_DECAY_TIME,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            rng: Источник случайных чисел для приращения счетчиков (для воспроизводимости)
+            decay_time: Период уменьшения счетчика в секундах; 0 - счетчики не уменьшаются
+            clock: Источник времени в секундах (для тестов)
+        """
+        if decay_time < 0:
+            raise ValueError("decay_time не может быть отрицательным")
+        self._random = (rng or random.Random()).random
+        self._decay_time = decay_time
+        self._clock = clock
+        self._counters: Dict[Item, int] = {}
+        self._buckets: List[Dict[Item, None]] = [{} for _ in range(LFU_MAX_COUNTER + 1)]
+        # Наименьший счетчик, корзина которого может быть непустой
+        self._min_counter = LFU_MAX_COUNTER
+        # Период последнего пересчета счетчика каждого ключа, от давних к недавним
+        self._decayed: "OrderedDict[Item, int]" = OrderedDict()
+
+    def _period(self) -> int:
+        return int(self._clock() // self._decay_time)
+
+    def _move(self, item: Item, counter: int, new_counter: int) -> None:
+        del self._buckets[counter][item]
+        self._buckets[new_counter][item] = None
+        self._counters[item] = new_counter
+
+    def _decay(self, item: Item, counter: int, period: int) -> int:
+        """Уменьшает счетчик на число периодов с прошлого пересчета; возвращает новый счетчик."""
+        decayed = self._decayed
+        new_counter = max(counter - (period - decayed[item]), 0)
+        if new_counter < counter:
+            self._move(item, counter, new_counter)
+            if new_counter < self._min_counter:
+                self._min_counter = new_counter
+        decayed[item] = period
+        decayed.move_to_end(item)
+        return new_counter
+
+    def _decay_idle(self) -> None:
+        """Пересчитывает до LFU_DECAY_BATCH счетчиков, дольше всех не пересчитывавшихся."""
+        period = self._period()
+        decayed = self._decayed
+        for _ in range(LFU_DECAY_BATCH):
+            if not decayed:
+                break
+            item, last = next(iter(decayed.items()))
+            if last >= period:
+                break
+            self._decay(item, self._counters[item], period)
+
+    def _increment(self, item: Item, counter: int) -> None:
+        if counter < LFU_MAX_COUNTER:
+            base = max(counter - LFU_INIT_COUNTER, 0)
+            if self._random() < 1.0 / (base * LFU_LOG_FACTOR + 1):
+                self._move(item, counter, counter + 1)
+
+    def added(self, item: Item) -> None:
+        counter = self._counters.get(item)
+        if counter is None:
+            self._counters[item] = LFU_INIT_COUNTER
+            self._buckets[LFU_INIT_COUNTER][item] = None
+            if LFU_INIT_COUNTER < self._min_counter:
+                self._min_counter = LFU_INIT_COUNTER
+            if self._decay_time:
+                self._decayed[item] = self._period()
+        else:
+            # Перезапись считается обращением
+            self.accessed(item)
+
+    def accessed(self, item: Item) -> None:
+        counter = self._counters.get(item)
+        if counter is not None:
+            if self._decay_time:
+                counter = self._decay(item, counter, self._period())
+            self._increment(item, counter)
+
+    def removed(self, item: Item) -> None:
+        counter = self._counters.pop(item, None)
+        if counter is not None:
+            del self._buckets[counter][item]
+            self._decayed.pop(item, None)
+
+    def candidates(self) -> Iterator[Item]:
+        if self._decay_time:
+            self._decay_idle()
+        buckets = self._buckets
+        while self._min_counter < LFU_MAX_COUNTER and not buckets[self._min_counter]:
+            self._min_counter += 1
+        for counter in range(self._min_counter, LFU_MAX_COUNTER + 1):
+            yield from buckets[counter]
+
+    def counter(self, item: Item) -> Optional[int]:
+        """Текущий счетчик ключа или None, если ключ не отслеживается."""
+        return self._counters.get(item)
+
+    def clear(self) -> None:
+        self._counters.clear()
+        for bucket in self._buckets:
+            bucket.clear()
+        self._min_counter = LFU_MAX_COUNTER
+        self._decayed.clear()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+class TTLFirstPolicy(LRUPolicy):
+    """
+    Сначала вытесняет ключи с TTL в порядке приближения срока истечения, затем
+    остальные в порядке LRU. Ключи с TTL выдает функция expiring хранилища (по
+    его куче истечений, O(log n) на ключ), учет обращений - как у LRUPolicy.
+    """
+
+    def __init__(self, expiring: Callable[[], Iterator[Item]]):
+        """
+        Args:
+            expiring: Возвращает ключи с TTL по возрастанию времени истечения
+        """
+        super().__init__()
+        self._expiring = expiring
+
+    def candidates(self) -> Iterator[Item]:
+        seen = set()
+        for item in self._expiring():
+            seen.add(item)
+            yield item
+        for item in self._order:
+            if item not in seen:
+                yield item
+
+
+def validate_policy(policy: str) -> str:
+    """Проверяет имя политики вытеснения."""
+    if policy not in EVICTION_POLICIES:
+        raise ValueError(f"Неизвестная политика вытеснения: {policy!r}; допустимы {', '.join(EVICTION_POLICIES)}")
+    return policy
@@ -0,0 +1,116 @@
+from bisect import bisect_left
+from typing import Iterable, Iterator, List, Optional
+
+
+class SortedKeyIndex:
+    """
+    Отсортированный набор строковых ключей для префиксных и диапазонных запросов.
+
+    Ключи хранятся в списке отсортированных блоков ограниченного размера и
+    списке максимумов блоков. Поиск - два бинарных поиска (по максимумам и
+    внутри блока), поэтому вставка и удаление сдвигают элементы только одного
+    блока, а не всего индекса, и стоят O(log n + размер блока).
+    """
+
+    def __init__(self, keys: Iterable[str] = (), block_size: int = 1000):
+        """
+        Args:
+            keys: Начальный набор ключей
+            block_size: Целевой размер блока; блок делится пополам, когда вырастает вдвое
+        """
+        if block_size < 1:
+            raise ValueError("block_size должен быть положительным")
+        self._block_size = block_size
+        self._blocks: List[List[str]] = []
+        self._maxes: List[str] = []
+        self._len = 0
+        self.reset(keys)
+
+    def reset(self, keys: Iterable[str]) -> None:
+        """Заменяет содержимое индекса набором уникальных ключей."""
+        ordered = sorted(keys)
+        size = self._block_size
+        self._blocks = [ordered[i:i + size] for i in range(0, len(ordered), size)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(ordered)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, key: str) -> bool:
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        block = self._blocks[i]
+        j = bisect_left(block, key)
+        return block[j] == key
+
+    def add(self, key: str) -> bool:
+        """Добавляет ключ. Возвращает False, если он уже был в индексе."""
+        maxes = self._maxes
+        if not maxes:
+            self._blocks.append([key])
+            maxes.append(key)
+            self._len = 1
+            return True
+        i = bisect_left(maxes, key)
+        if i == len(maxes):
+            # Ключ больше всех: дописываем в конец последнего блока
+            i -= 1
+            block = self._blocks[i]
+            block.append(key)
+            maxes[i] = key
+        else:
+            block = self._blocks[i]
+            j = bisect_left(block, key)
+            if block[j] == key:
+                return False
+            block.insert(j, key)
+        self._len += 1
+        if len(block) > 2 * self._block_size:
+            half = len(block) // 2
+            self._blocks[i:i + 1] = [block[:half], block[half:]]
+            maxes[i:i + 1] = [block[half - 1], block[-1]]
+        return True
+
+    def discard(self, key: str) -> bool:
+        """Удаляет ключ. Возвращает False, если его не было в индексе."""
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        block = self._blocks[i]
+        j = bisect_left(block, key)
+        if block[j] != key:
+            return False
+        del block[j]
+        self._len -= 1
+        if not block:
+            del self._blocks[i]
+            del self._maxes[i]
+        elif j == len(block):
+            self._maxes[i] = block[-1]
+        return True
+
+    def irange(self, start: Optional[str] = None, stop: Optional[str] = None) -> Iterator[str]:
+        """
+        Возвращает по возрастанию ключи из полуинтервала [start, stop).
+        Индекс нельзя изменять, пока итерация не завершена.
+        """
+        if start is None:
+            i, j = 0, 0
+        else:
+            i = bisect_left(self._maxes, start)
+            j = bisect_left(self._blocks[i], start) if i < len(self._blocks) else 0
+        for block in self._blocks[i:]:
+            for key in block[j:] if j else block:
+                if stop is not None and key >= stop:
+                    return
+                yield key
+            j = 0
+
+    def iter_prefix(self, prefix: str) -> Iterator[str]:
+        """Возвращает по возрастанию ключи, начинающиеся с prefix."""
+        for key in self.irange(prefix):
+            if not key.startswith(prefix):
+                return
+            yield key
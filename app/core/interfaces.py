@@ -1,36 +1,200 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional, Dict
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Dict, Tuple, Union
+from app.core.batch import Items, WriteBatch, iter_pairs
+
+
+class _Missing:
+    """Тип отметки отсутствующего ключа."""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+    def __bool__(self) -> bool:
+        return False
+
+
+# Отметка отсутствующего ключа в результатах get_many (в отличие от сохраненного значения None)
+MISSING = _Missing()
+
 
 class IStorageEngine(ABC):
     """
     Интерфейс для движка хранения данных в памяти.
+
+    Данные разделены на пространства имен (коллекции); namespace=None -
+    общее пространство для ключей вне коллекций.
+
+    Ключ может иметь время истечения (expires_at, секунды по time.time()):
+    истекший ключ не виден чтениям, а удаляет его база, записав истечение
+    в журнал. Хранилище без поддержки TTL может игнорировать expires_at.
+    Так же ограниченное по объему хранилище только выбирает ключи для
+    вытеснения (select_evictions), а удаляет их база через evict.
     """
 
     @abstractmethod
-    def set(self, key: str, value: Any) -> None:
-        """Сохраняет значение по ключу."""
+    def set(self, key: str, value: Any, namespace: Optional[str] = None, expires_at: Optional[float] = None) -> None:
+        """Сохраняет значение по ключу; expires_at - время истечения или None (без TTL)."""
         pass
 
     @abstractmethod
-    def get(self, key: str) -> Optional[Any]:
+    def get(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
         """Возвращает значение по ключу."""
         pass
 
     @abstractmethod
-    def delete(self, key: str) -> bool:
+    def delete(self, key: str, namespace: Optional[str] = None) -> bool:
         """Удаляет значение по ключу. Возвращает True, если ключ был найден и удален."""
         pass
 
     @abstractmethod
-    def get_all_data(self) -> Dict[str, Any]:
-        """Возвращает все данные из хранилища."""
+    def get_all_data(self, namespace: Optional[str] = None) -> Dict[str, Any]:
+        """Возвращает все данные пространства имен."""
         pass
 
+    def get_many(self, keys: List[str], namespace: Optional[str] = None) -> List[Any]:
+        """
+        Возвращает значения ключей в порядке keys; для отсутствующих ключей - MISSING.
+        Реализация по умолчанию копирует пространство имен целиком.
+        """
+        data = self.get_all_data(namespace)
+        return [data.get(key, MISSING) for key in keys]
+
+    def contains(self, key: str, namespace: Optional[str] = None) -> bool:
+        """
+        Есть ли ключ в пространстве имен. В отличие от get, проверка не считается
+        обращением к ключу для политики вытеснения.
+        """
+        return self.get_many([key], namespace)[0] is not MISSING
+
     @abstractmethod
-    def load_data(self, data: Dict[str, Any]) -> None:
-        """Загружает все данные в хранилище."""
+    def load_data(self, data: Dict[str, Any], namespaces: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """Загружает все данные в хранилище: общее пространство и остальные пространства имен."""
         pass
 
+    def namespaces(self) -> List[str]:
+        """Возвращает имена непустых пространств имен (кроме общего)."""
+        return []
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        """Возвращает число ключей в пространстве имен."""
+        return len(self.get_all_data(namespace))
+
+    def load_items(self, items: Iterable[Tuple[str, Any]]) -> int:
+        """
+        Заменяет данные хранилища парами ключ/значение из итератора.
+        Возвращает число загруженных пар.
+        """
+        return self.load_namespaces([(None, items)])
+
+    def load_namespaces(self, parts: Iterable[Tuple[Optional[str], Iterable[Tuple[str, Any]]]]) -> int:
+        """
+        Заменяет все данные частями вида (пространство имен, пары ключ/значение).
+        Возвращает общее число загруженных пар.
+        """
+        loaded: Dict[Optional[str], Dict[str, Any]] = {None: {}}
+        for name, items in parts:
+            loaded.setdefault(name, {}).update(items)
+        data = loaded.pop(None)
+        self.load_data(data, namespaces=loaded)
+        return len(data) + sum(len(ns_data) for ns_data in loaded.values())
+
+    def scan_prefix(self, prefix: str, namespace: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """Возвращает по возрастанию ключей пары, ключ которых начинается с prefix."""
+        data = self.get_all_data(namespace)
+        return iter(sorted((key, value) for key, value in data.items() if key.startswith(prefix)))
+
+    def apply_batch(self, operations: Iterable[Dict[str, Any]]) -> int:
+        """
+        Применяет пакет операций set/delete в виде записей WAL.
+        Возвращает число ключей, удаленных операциями delete.
+        """
+        deleted = 0
+        for operation in operations:
+            if operation['type'] == 'set':
+                self.set(operation['key'], operation['value'], operation.get('namespace'), operation.get('expires_at'))
+            elif self.delete(operation['key'], operation.get('namespace')):
+                deleted += 1
+        return deleted
+
+    def drop_namespace(self, namespace: Optional[str]) -> int:
+        """Удаляет все ключи пространства имен. Возвращает число удаленных ключей."""
+        keys = list(self.get_all_data(namespace))
+        for key in keys:
+            self.delete(key, namespace)
+        return len(keys)
+
+    def count_prefix(self, prefix: str, namespace: Optional[str] = None) -> int:
+        """Возвращает число ключей, начинающихся с prefix."""
+        return sum(1 for _ in self.scan_prefix(prefix, namespace))
+
+    def range(
+        self, start: Optional[str] = None, end: Optional[str] = None, namespace: Optional[str] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """Возвращает по возрастанию ключей пары с ключами из полуинтервала [start, end)."""
+        data = self.get_all_data(namespace)
+        return iter(sorted(
+            (key, value) for key, value in data.items()
+            if (start is None or key >= start) and (end is None or key < end)
+        ))
+
+    def begin_snapshot(self) -> Dict[str, Any]:
+        """
+        Фиксирует состояние данных на момент вызова для записи снапшота и
+        возвращает общее пространство имен. Остальные пространства возвращает
+        snapshot_namespaces(). Возвращенные словари не должны меняться до
+        вызова end_snapshot().
+        """
+        return self.get_all_data()
+
+    def snapshot_namespaces(self) -> Dict[str, Dict[str, Any]]:
+        """Возвращает пространства имен (кроме общего), зафиксированные begin_snapshot()."""
+        return {name: self.get_all_data(name) for name in self.namespaces()}
+
+    def end_snapshot(self) -> None:
+        """Сообщает, что снапшот, начатый begin_snapshot(), записан."""
+        pass
+
+    def expiry(self, key: str, namespace: Optional[str] = None) -> Optional[float]:
+        """Возвращает время истечения ключа или None, если у ключа нет TTL."""
+        return None
+
+    def next_expiry(self) -> Optional[float]:
+        """Возвращает ближайшее время истечения или None, если ключей с TTL нет."""
+        return None
+
+    def pop_expired(self, now: float, limit: Optional[int] = None) -> Dict[Optional[str], List[str]]:
+        """
+        Возвращает по пространствам имен ключи, истекшие к моменту now (не
+        больше limit), и перестает их отслеживать. Ключи не удаляются.
+        """
+        return {}
+
+    def requeue_expired(self, expired: Dict[Optional[str], List[str]]) -> None:
+        """Снова отслеживает ключи, выданные pop_expired, но не удаленные."""
+        pass
+
+    def over_budget(self) -> bool:
+        """Превышает ли хранилище свой бюджет памяти или числа ключей."""
+        return False
+
+    def select_evictions(self) -> Dict[Optional[str], List[str]]:
+        """
+        Возвращает по пространствам имен ключи, которые нужно вытеснить, чтобы
+        вернуться в бюджет. Ключи не удаляются.
+        """
+        return {}
+
+    def evict(self, keys: List[str], namespace: Optional[str] = None) -> int:
+        """Удаляет вытесняемые ключи. Возвращает число удаленных."""
+        return self.apply_batch({'type': 'delete', 'key': key, 'namespace': namespace} for key in keys)
+
+    def eviction_stats(self) -> Dict[str, Any]:
+        """Возвращает бюджет и счетчики вытеснения; пустой словарь, если хранилище не ограничено."""
+        return {}
+
 
 class IPersistence(ABC):
     """
@@ -38,15 +202,45 @@ class IPersistence(ABC):
     """
 
     @abstractmethod
-    def dump(self, data: Dict[str, Any]) -> None:
-        """Сохраняет снапшот данных на диск."""
+    def dump(
+        self,
+        data: Dict[str, Any],
+        lsn: Optional[int] = None,
+        namespaces: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> None:
+        """
+        Сохраняет снапшот данных на диск. data - общее пространство имен,
+        namespaces - остальные пространства, lsn - LSN последней операции WAL,
+        вошедшей в снапшот.
+        """
         pass
 
     @abstractmethod
     def load(self) -> Optional[Dict[str, Any]]:
-        """Загружает снапшот данных с диска."""
+        """Загружает с диска общее пространство имен снапшота."""
         pass
 
+    def load_lsn(self) -> Optional[int]:
+        """Возвращает LSN последней операции WAL, вошедшей в снапшот, если он известен."""
+        return None
+
+    def load_into(self, storage: IStorageEngine) -> Optional[int]:
+        """
+        Загружает снапшот в движок хранения.
+        Возвращает число загруженных пар или None, если снапшота нет.
+        """
+        data = self.load()
+        if data is None:
+            return None
+        storage.load_data(data)
+        return len(data)
+
+
+def _no_wait() -> None:
+    """Ожидание фиксации записи, которая уже зафиксирована."""
+    pass
+
+
 class IWriteAheadLog(ABC):
     """
     Интерфейс для механизма WAL.
@@ -57,16 +251,46 @@ class IWriteAheadLog(ABC):
         """Логирует одну операцию в журнал"""
         pass
 
+    def log_deferred(self, operation: Dict[str, Any]) -> Callable[[], None]:
+        """
+        Ставит операцию в журнал, сохраняя порядок вызовов, и возвращает функцию,
+        которая ждет, пока запись станет durable. Позволяет писателю выполнить
+        операцию под блокировкой, а ожидание диска вынести за ее пределы.
+        По умолчанию запись выполняется сразу, и ждать нечего.
+        """
+        self.log(operation)
+        return _no_wait
+
     @abstractmethod
     def replay(self) -> List[Dict[str, Any]]:
         """Читает и возвращает все операции из журнала."""
         pass
 
     @abstractmethod
-    def compact(self) -> None:
-        """Очищает журнал"""
+    def compact(self, upto_lsn: Optional[int] = None) -> None:
+        """Очищает журнал. Если задан upto_lsn, удаляются только операции с LSN не больше upto_lsn."""
+        pass
+
+    def iter_replay(self, after_lsn: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Последовательно возвращает операции из журнала, не загружая их все в память.
+        Если журнал нумерует записи, возвращаются только операции с LSN больше after_lsn.
+        """
+        return iter(self.replay())
+
+    @property
+    def last_lsn(self) -> Optional[int]:
+        """LSN последней записанной операции или None, если журнал не нумерует записи."""
+        return None
+
+    def close(self) -> None:
+        """Освобождает ресурсы журнала (файловые дескрипторы, фоновые потоки)."""
         pass
 
+    def set_durability(self, durability: str) -> None:
+        """Задает уровень durability журнала."""
+        raise NotImplementedError(f"{type(self).__name__} не поддерживает настройку durability")
+
 
 class IDatabase(ABC):
     """
@@ -74,29 +298,74 @@ class IDatabase(ABC):
     """
 
     @abstractmethod
-    def set(self, key: str, value: Any) -> None:
-        """Сохраняет значение по ключу."""
+    def set(self, key: str, value: Any, namespace: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение по ключу; с ttl ключ истекает через ttl секунд."""
         pass
 
     @abstractmethod
-    def get(self, key: str) -> Optional[Any]:
-        """Возвращает значение по ключу."""
+    def get(self, key: str, namespace: Optional[str] = None, default: Any = None) -> Any:
+        """Возвращает значение по ключу или default, если ключа нет."""
         pass
 
     @abstractmethod
-    def delete(self, key: str) -> bool:
+    def delete(self, key: str, namespace: Optional[str] = None) -> bool:
         """Удаляет значение по ключу."""
         pass
 
+    @abstractmethod
+    def get_many(
+        self, keys: Iterable[str], namespace: Optional[str] = None, ordered: bool = False
+    ) -> Union[Dict[str, Any], List[Any]]:
+        """
+        Возвращает значения нескольких ключей: словарь найденных ключей или,
+        если ordered=True, список значений в порядке keys с MISSING для отсутствующих.
+        """
+        pass
+
+    @abstractmethod
+    def drop_namespace(self, namespace: Optional[str]) -> int:
+        """Удаляет все ключи пространства имен. Возвращает число удаленных ключей."""
+        pass
+
+    def set_many(self, items: Items, namespace: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Сохраняет несколько пар ключ/значение из словаря или итератора пар."""
+        for key, value in iter_pairs(items):
+            self.set(key, value, namespace, ttl)
+
+    def delete_many(self, keys: Iterable[str], namespace: Optional[str] = None) -> int:
+        """Удаляет несколько ключей. Возвращает число удаленных ключей."""
+        return sum(1 for key in keys if self.delete(key, namespace))
+
+    def write(self, batch: WriteBatch) -> int:
+        """
+        Выполняет пакет операций. Возвращает число ключей, удаленных операциями delete.
+        Реализация по умолчанию выполняет операции по одной, без атомарности пакета.
+        """
+        deleted = 0
+        for operation in batch:
+            namespace = operation.get('namespace')
+            if operation['type'] == 'delete':
+                deleted += self.delete(operation['key'], namespace)
+                continue
+            expires_at = operation.get('expires_at')
+            if expires_at is None:
+                self.set(operation['key'], operation['value'], namespace)
+            elif expires_at > time.time():
+                self.set(operation['key'], operation['value'], namespace, ttl=expires_at - time.time())
+            else:
+                # Ключ истек раньше, чем записан
+                self.delete(operation['key'], namespace)
+        return deleted
+
 
 class ICollection(ABC):
     """
-    Интерфейс для коллекции - логической группы данных с общим префиксом.
+    Интерфейс для коллекции - логической группы данных в собственном пространстве имен.
     """
 
     @abstractmethod
-    def set(self, key: str, value: Any) -> None:
-        """Сохраняет значение в коллекции."""
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение в коллекции; с ttl ключ истекает через ttl секунд."""
         pass
 
     @abstractmethod
@@ -109,6 +378,11 @@ class ICollection(ABC):
         """Удаляет значение из коллекции."""
         pass
 
+    @abstractmethod
+    def get_many(self, keys: Iterable[str], ordered: bool = False) -> Union[Dict[str, Any], List[Any]]:
+        """Получает из коллекции значения нескольких ключей."""
+        pass
+
     @abstractmethod
     def get_all(self) -> Dict[str, Any]:
         """Получает все данные из коллекции."""
@@ -119,6 +393,11 @@ class ICollection(ABC):
         """Возвращает количество элементов в коллекции."""
         pass
 
+    @abstractmethod
+    def drop(self) -> int:
+        """Удаляет все элементы коллекции. Возвращает число удаленных элементов."""
+        pass
+
     @abstractmethod
     def exists(self, key: str) -> bool:
         """Проверяет, существует ли ключ в коллекции."""
@@ -0,0 +1,118 @@
+import threading
+
+
+class RWLock:
+    """
+    Блокировка читатель-писатель без голодания.
+
+    Читатели не блокируют друг друга; писатель получает монопольный доступ.
+    Пока писатель ждет, новые читатели не входят, поэтому поток чтений не
+    задерживает записи. После выхода писателя сначала входят все ожидающие
+    читатели, а затем следующий писатель, поэтому и непрерывный поток записей
+    не задерживает чтения. Блокировка не реентерабельна.
+
+    Захват через менеджеры контекста read и write:
+
+        with lock.read:
+            ...
+        with lock.write:
+            ...
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._readers_waiting = 0
+        self._writers_waiting = 0
+        # Очередь читателей, дождавшихся выхода писателя
+        self._readers_turn = False
+        self.read = _ReadGuard(self)
+        self.write = _WriteGuard(self)
+
+    def acquire_read(self) -> None:
+        with self._cond:
+            self._readers_waiting += 1
+            try:
+                while self._writer or (self._writers_waiting and not self._readers_turn):
+                    self._cond.wait()
+                self._readers += 1
+            finally:
+                self._readers_waiting -= 1
+                if not self._readers_waiting and self._readers_turn:
+                    # Все ожидавшие читатели вошли: очередь переходит к писателям
+                    self._readers_turn = False
+                    self._cond.notify_all()
+
+    def release_read(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            if not self._readers and self._writers_waiting:
+                self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers or self._readers_turn:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer = False
+            self._readers_turn = self._readers_waiting > 0
+            self._cond.notify_all()
+
+
+class _ReadGuard:
+    """Менеджер контекста разделяемого захвата RWLock."""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self, lock: RWLock):
+        self._lock = lock
+
+    def __enter__(self) -> None:
+        self._lock.acquire_read()
+
+    def __exit__(self, *exc_info) -> None:
+        self._lock.release_read()
+
+
+class _WriteGuard:
+    """Менеджер контекста монопольного захвата RWLock."""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self, lock: RWLock):
+        self._lock = lock
+
+    def __enter__(self) -> None:
+        self._lock.acquire_write()
+
+    def __exit__(self, *exc_info) -> None:
+        self._lock.release_write()
+
+
+class NullRWLock:
+    """Заглушка RWLock для однопоточного режима: захват ничего не делает."""
+
+    def __init__(self):
+        self.read = _NULL_GUARD
+        self.write = _NULL_GUARD
+
+
+class _NullGuard:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_GUARD = _NullGuard()
@@ -1,38 +1,332 @@
+import io
+import itertools
 import json
 import os
-from typing import Any, Optional, Dict
-from app.core.interfaces import IPersistence
+import pickle
+import struct
+import zlib
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, Dict, Tuple
+from app.core.compression import (
+    open_read, validate_compression, wrap_writer, COMPRESSION_NONE, DECOMPRESSION_ERRORS
+)
+from app.core.interfaces import IPersistence, IStorageEngine
+
+# Форматы снапшота
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+SNAPSHOT_FORMATS = (FORMAT_JSON, FORMAT_BINARY)
+
+# Бинарный формат снапшота:
+#   заголовок: [сигнатура][lsn: i64, -1 если не задан]
+#   блоки:     [b'B'][длина: u32][число пар: u32][crc32 данных: u32][pickle словаря пар]
+#   окончание: [b'E'][всего пар: u64][crc32 всех предыдущих байт файла: u32]
+# Блоки общего пространства имен идут первыми; блоки остальных пространств
+# предваряются отметкой [b'N'][длина имени: u32][имя в UTF-8].
+BINARY_MAGIC = b"KVDBSNP1"
+_HEADER = struct.Struct("<q")
+_BLOCK_HEADER = struct.Struct("<III")
+_NAMESPACE_HEADER = struct.Struct("<I")
+_FOOTER = struct.Struct("<QI")
+_BLOCK_TAG = b"B"
+_NAMESPACE_TAG = b"N"
+_END_TAG = b"E"
+# Число пар в одном блоке: pickle целого блока намного быстрее, чем пары по отдельности
+BLOCK_SIZE = 65536
+
+
+def _write_binary(
+    f: BinaryIO,
+    items: Iterable[Tuple[str, Any]],
+    lsn: Optional[int],
+    namespaces: Optional[Dict[str, Dict[str, Any]]] = None
+) -> int:
+    """Пишет снапшот в бинарном формате. Возвращает число записанных пар."""
+    header = BINARY_MAGIC + _HEADER.pack(-1 if lsn is None else lsn)
+    f.write(header)
+    crc = zlib.crc32(header)
+    total = 0
+    parts = [(None, items)] + list((namespaces or {}).items())
+    for name, part in parts:
+        if name is not None:
+            name_bytes = name.encode('utf-8')
+            marker = _NAMESPACE_TAG + _NAMESPACE_HEADER.pack(len(name_bytes)) + name_bytes
+            f.write(marker)
+            crc = zlib.crc32(marker, crc)
+        iterator = iter(part.items() if isinstance(part, dict) else part)
+        while True:
+            block = dict(itertools.islice(iterator, BLOCK_SIZE))
+            if not block:
+                break
+            payload = pickle.dumps(block, protocol=pickle.HIGHEST_PROTOCOL)
+            block_header = _BLOCK_TAG + _BLOCK_HEADER.pack(len(payload), len(block), zlib.crc32(payload))
+            f.write(block_header)
+            f.write(payload)
+            crc = zlib.crc32(payload, zlib.crc32(block_header, crc))
+            total += len(block)
+    f.write(_END_TAG + _FOOTER.pack(total, crc))
+    return total
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    """Читает ровно size байт или сообщает о том, что файл обрезан."""
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("файл снапшота обрезан")
+    return data
+
+
+def _read_binary_header(f: BinaryIO) -> Optional[int]:
+    """Читает заголовок бинарного снапшота и возвращает LSN."""
+    if _read_exact(f, len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError("неверная сигнатура бинарного снапшота")
+    lsn, = _HEADER.unpack(_read_exact(f, _HEADER.size))
+    return None if lsn < 0 else lsn
+
+
+def _iter_binary_blocks(f: BinaryIO) -> Iterator[Tuple[Optional[str], Dict[str, Any]]]:
+    """
+    Читает блоки бинарного снапшота и проверяет контрольные суммы.
+    Возвращает пары (пространство имен, блок). Файл должен быть позиционирован в начало.
+    """
+    lsn = _read_binary_header(f)
+    crc = zlib.crc32(BINARY_MAGIC + _HEADER.pack(-1 if lsn is None else lsn))
+    total = 0
+    namespace = None
+    while True:
+        tag = _read_exact(f, 1)
+        if tag == _END_TAG:
+            expected_total, expected_crc = _FOOTER.unpack(_read_exact(f, _FOOTER.size))
+            if expected_total != total:
+                raise ValueError(f"в снапшоте {total} пар, ожидалось {expected_total}")
+            if expected_crc != crc:
+                raise ValueError("неверная контрольная сумма снапшота")
+            return
+        if tag == _NAMESPACE_TAG:
+            name_header = _read_exact(f, _NAMESPACE_HEADER.size)
+            name_bytes = _read_exact(f, _NAMESPACE_HEADER.unpack(name_header)[0])
+            crc = zlib.crc32(tag + name_header + name_bytes, crc)
+            namespace = name_bytes.decode('utf-8')
+            continue
+        if tag != _BLOCK_TAG:
+            raise ValueError(f"неизвестный тип блока {tag!r}")
+        block_header = _read_exact(f, _BLOCK_HEADER.size)
+        length, count, block_crc = _BLOCK_HEADER.unpack(block_header)
+        payload = _read_exact(f, length)
+        if zlib.crc32(payload) != block_crc:
+            raise ValueError("неверная контрольная сумма блока снапшота")
+        crc = zlib.crc32(payload, zlib.crc32(tag + block_header, crc))
+        block = pickle.loads(payload)
+        if len(block) != count:
+            raise ValueError("число пар в блоке не совпадает с заголовком")
+        total += count
+        yield namespace, block
+
+
+# JSON снапшот с пространствами имен: {"format": JSON_NAMESPACES_FORMAT, "data": {...}, "namespaces": {...}}.
+# Без пространств имен JSON снапшот остается плоским объектом ключ/значение
+JSON_NAMESPACES_FORMAT = "kvdb-namespaces/1"
+_JSON_NAMESPACES_KEYS = {"format", "data", "namespaces"}
+
+
+def _split_json_document(document: Any) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """Разбирает JSON снапшот на общее пространство имен и остальные пространства."""
+    if not isinstance(document, dict):
+        raise ValueError(f"ожидался JSON объект, получен {type(document).__name__}")
+    if document.keys() == _JSON_NAMESPACES_KEYS and document["format"] == JSON_NAMESPACES_FORMAT:
+        data, namespaces = document["data"], document["namespaces"]
+        if not isinstance(data, dict) or not isinstance(namespaces, dict) or \
+                not all(isinstance(ns_data, dict) for ns_data in namespaces.values()):
+            raise ValueError("неверная структура пространств имен JSON снапшота")
+        return data, namespaces
+    return document, {}
+
+
+def detect_snapshot_format(file_path: str) -> str:
+    """Определяет формат существующего (возможно, сжатого) снапшота по сигнатуре."""
+    with open_read(file_path) as f:
+        head = f.read(len(BINARY_MAGIC))
+    return FORMAT_BINARY if head == BINARY_MAGIC else FORMAT_JSON
+
+
+def _fsync_dir(path: str) -> None:
+    """Сбрасывает на диск запись каталога, чтобы переименование файла пережило сбой питания."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return  # Не все платформы позволяют открыть каталог
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 
 class Snapshotter(IPersistence):
     """
     Механизм сохранения и загрузки снапшотов данных в файл.
+
+    Поддерживаются два формата: компактный бинарный (блоки пар ключ/значение
+    с длинами и CRC32, заголовком с LSN и окончанием с общей контрольной
+    суммой) и JSON с отступами, удобный для просмотра и экспорта. Снапшот
+    сначала пишется во временный файл и затем атомарно заменяет прежний через
+    os.replace, поэтому сбой посреди записи не портит последний снапшот.
+    Файл снапшота можно сжимать кодеками стандартной библиотеки (zlib, lzma).
+    Формат и кодек при загрузке определяются по содержимому файла.
+
+    load_into() передает пары прямо в движок хранения без промежуточного
+    словаря; бинарный снапшот при этом читается по одному блоку.
     """
 
-    def __init__(self, file_path: str = "data/snapshot.json"):
+    def __init__(
+        self,
+        file_path: str = "data/snapshot.json",
+        format: Optional[str] = None,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None
+    ):
+        """
+        Args:
+            file_path: Путь к файлу снапшота
+            format: Формат записи: "binary" или "json". По умолчанию определяется
+                по расширению: ".json" - JSON, иначе бинарный формат
+            compression: Кодек сжатия: "none" (по умолчанию), "zlib" или "lzma"
+            compression_level: Уровень сжатия; по умолчанию 6 для zlib и 1 для lzma
+        """
+        if format is None:
+            format = FORMAT_JSON if file_path.endswith(".json") else FORMAT_BINARY
+        if format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"Неизвестный формат снапшота: {format!r} (допустимые: {', '.join(SNAPSHOT_FORMATS)})")
         self.file_path = file_path
+        self.format = format
+        self.compression = validate_compression(compression)
+        self.compression_level = compression_level
+        # Метаданные JSON снапшота (LSN последней вошедшей в него операции WAL);
+        # бинарный снапшот хранит LSN в заголовке
+        self.meta_path = f"{file_path}.meta"
         # Создаем директорию, если она не существует
         os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
 
-    def dump(self, data: Dict[str, Any]) -> None:
-        """Сохраняет снапшот данных на диск."""
+    def dump(
+        self,
+        data: Dict[str, Any],
+        lsn: Optional[int] = None,
+        namespaces: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> None:
+        """
+        Сохраняет снапшот данных на диск: общее пространство имен data и
+        остальные пространства namespaces.
+
+        Для JSON LSN записывается в файл метаданных после самого снапшота: если
+        процесс упадет между этими шагами, при восстановлении будет взят старый
+        LSN и часть операций WAL применится повторно, что для set/delete безопасно.
+        """
+        tmp_path = f"{self.file_path}.tmp"
         try:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with open(tmp_path, 'wb', buffering=1024 * 1024) as f:
+                out = wrap_writer(f, self.compression, self.compression_level)
+                if self.format == FORMAT_BINARY:
+                    _write_binary(out, data.items(), lsn, namespaces)
+                else:
+                    if namespaces:
+                        document = {"format": JSON_NAMESPACES_FORMAT, "data": data, "namespaces": namespaces}
+                    else:
+                        document = data
+                    text = io.TextIOWrapper(out, encoding='utf-8')
+                    json.dump(document, text, ensure_ascii=False, indent=2)
+                    # detach вместо close: файл еще нужен для fsync
+                    text.detach()
+                if self.compression != COMPRESSION_NONE:
+                    out.close()
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+            _fsync_dir(self.file_path)
+            self._dump_meta(lsn if self.format == FORMAT_JSON else None)
         except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise IOError(f"Ошибка сохранения снапшота: {e}")
 
+    def _dump_meta(self, lsn: Optional[int]) -> None:
+        """Атомарно сохраняет LSN снапшота; без LSN удаляет устаревшие метаданные."""
+        if lsn is None:
+            if os.path.exists(self.meta_path):
+                os.remove(self.meta_path)
+            return
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"lsn": lsn}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def load_lsn(self) -> Optional[int]:
+        """Возвращает LSN последней операции WAL, вошедшей в снапшот."""
+        if not os.path.exists(self.file_path):
+            return None
+        try:
+            if detect_snapshot_format(self.file_path) == FORMAT_BINARY:
+                with open_read(self.file_path) as f:
+                    return _read_binary_header(f)
+            if not os.path.exists(self.meta_path):
+                return None
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return int(json.load(f)["lsn"])
+        except (ValueError, KeyError, TypeError, *DECOMPRESSION_ERRORS) as e:
+            raise ValueError(f"Ошибка декодирования метаданных снапшота: {e}")
+        except Exception as e:
+            raise IOError(f"Ошибка загрузки метаданных снапшота: {e}")
+
     def load(self) -> Optional[Dict[str, Any]]:
-        """Загружает снапшот данных с диска."""
+        """Загружает с диска общее пространство имен снапшота."""
         if not os.path.exists(self.file_path):
             return None
-        
+        data = {}
+        for namespace, items in self.iter_namespaces():
+            if namespace is None:
+                data.update(items)
+        return data
+
+    def iter_items(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Последовательно возвращает пары ключ/значение общего пространства имен
+        снапшота. Если снапшота нет, не возвращает ничего.
+        """
+        for namespace, items in self.iter_namespaces():
+            if namespace is None:
+                yield from items
+
+    def iter_namespaces(self) -> Iterator[Tuple[Optional[str], Iterator[Tuple[str, Any]]]]:
+        """
+        Последовательно возвращает части снапшота вида (пространство имен, пары
+        ключ/значение); None - общее пространство. Одно пространство может
+        прийти несколькими частями. Бинарный снапшот читается по одному блоку;
+        JSON разбирается целиком, так как потоковый разбор на Python заметно
+        медленнее json.load. Если снапшота нет, не возвращает ничего.
+        """
+        if not os.path.exists(self.file_path):
+            return
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data
-        except json.JSONDecodeError as e:
+            if detect_snapshot_format(self.file_path) == FORMAT_BINARY:
+                with open_read(self.file_path) as f:
+                    for namespace, block in _iter_binary_blocks(f):
+                        yield namespace, iter(block.items())
+            else:
+                with io.TextIOWrapper(open_read(self.file_path), encoding='utf-8') as f:
+                    document = json.load(f)
+                data, namespaces = _split_json_document(document)
+                yield None, iter(data.items())
+                for namespace, ns_data in namespaces.items():
+                    yield namespace, iter(ns_data.items())
+        except (json.JSONDecodeError, ValueError, pickle.UnpicklingError, *DECOMPRESSION_ERRORS) as e:
             raise ValueError(f"Ошибка декодирования снапшота: {e}")
         except Exception as e:
             raise IOError(f"Ошибка загрузки снапшота: {e}")
 
+    def load_into(self, storage: IStorageEngine) -> Optional[int]:
+        """
+        Потоково загружает снапшот со всеми пространствами имен в движок хранения.
+        Возвращает число пар или None без снапшота.
+        """
+        if not os.path.exists(self.file_path):
+            return None
+        return storage.load_namespaces(self.iter_namespaces())
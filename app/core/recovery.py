@@ -0,0 +1,159 @@
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.core.interfaces import IWriteAheadLog
+from app.core.wal import SegmentedWal, iter_log_file
+
+logger = logging.getLogger(__name__)
+
+
+def compact_operations(operations: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Сворачивает последовательность операций журнала в эквивалентную, но более короткую.
+
+    Все операции KVDB идемпотентны и "последняя запись побеждает": для
+    каждого ключа важна только последняя операция, а drop пространства
+    имен отменяет все предшествующие операции в нем. Истечение ключей
+    (expire) и вытеснение (evict) равносильны их удалению; set с TTL
+    сохраняет время истечения.
+    Результат - для каждого пространства имен необязательный drop и один
+    пакет с последней операцией set/delete каждого ключа.
+    """
+    # Пространство имен -> (было ли удалено целиком, ключ -> последняя операция)
+    namespaces: Dict[Optional[str], Tuple[bool, Dict[str, Dict[str, Any]]]] = {}
+
+    def record(operation: Dict[str, Any]) -> None:
+        namespace = operation.get('namespace')
+        state = namespaces.get(namespace)
+        if state is None:
+            state = namespaces[namespace] = (False, {})
+        state[1][operation['key']] = operation
+
+    for operation in operations:
+        op_type = operation.get('type')
+        if op_type in ('set', 'delete'):
+            record(operation)
+        elif op_type == 'batch':
+            for batch_operation in operation['operations']:
+                record(batch_operation)
+        elif op_type in ('expire', 'evict'):
+            namespace = operation.get('namespace')
+            for key in operation['keys']:
+                delete = {'type': 'delete', 'key': key}
+                if namespace is not None:
+                    delete['namespace'] = namespace
+                record(delete)
+        elif op_type == 'drop':
+            namespaces[operation.get('namespace')] = (True, {})
+
+    compacted: List[Dict[str, Any]] = []
+    for namespace, (dropped, keys) in namespaces.items():
+        if dropped:
+            drop = {'type': 'drop'}
+            if namespace is not None:
+                drop['namespace'] = namespace
+            compacted.append(drop)
+        if keys:
+            compacted.append({'type': 'batch', 'operations': list(keys.values())})
+    return compacted
+
+
+def _read_segment(path: str, base_lsn: int, after_lsn: int) -> Tuple[int, bool, List[Dict[str, Any]]]:
+    """
+    Читает закрытый сегмент в процессе пула и сворачивает его операции с LSN больше after_lsn.
+    Возвращает LSN последней прочитанной записи, признак того, что сегмент
+    прочитан до конца, и свернутые операции.
+    """
+    lsn = base_lsn - 1
+    operations = []
+    records = iter_log_file(path)
+    while True:
+        try:
+            operation = next(records)
+        except StopIteration as stop:
+            complete = stop.value is None
+            break
+        lsn += 1
+        if lsn > after_lsn:
+            operations.append(operation)
+    return lsn, complete, compact_operations(operations)
+
+
+class ParallelReplay:
+    """
+    Чтение журнала при запуске в пуле процессов.
+
+    Закрытые сегменты SegmentedWal неизменяемы, поэтому их разбор и сжатие
+    операций (compact_operations) идут в отдельных процессах сразу при
+    создании объекта, пока основной процесс загружает снапшот. Итерация
+    возвращает результаты строго в порядке LSN сегментов, затем операции
+    активного сегмента, который читается в текущем процессе (только он
+    может требовать обрезки недописанного хвоста). Как и при
+    последовательном чтении, поврежденный сегмент прекращает чтение.
+
+    Для журналов без сегментов и при processes=1 операции читаются
+    обычным iter_replay.
+    """
+
+    def __init__(self, wal: IWriteAheadLog, after_lsn: Optional[int] = None, processes: int = 1):
+        """
+        Args:
+            wal: Журнал для чтения
+            after_lsn: Читать только операции с LSN больше after_lsn
+            processes: Число процессов для чтения закрытых сегментов
+        """
+        self.wal = wal
+        self.after_lsn = after_lsn or 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # (LSN первой записи, путь, LSN первой записи следующего сегмента, результат разбора)
+        self._jobs: List[Tuple[int, str, int, Future]] = []
+        closed: List[Tuple[int, str, int]] = []
+        if isinstance(wal, SegmentedWal) and processes > 1:
+            segments = wal.segments()
+            # Последний сегмент активный; закрытые сегменты, целиком вошедшие в снапшот, не читаются
+            closed = [
+                (base, path, next_base) for (base, path), (next_base, _) in zip(segments, segments[1:])
+                if next_base - 1 > self.after_lsn
+            ]
+        if not closed:
+            return
+        # Сжатие сегмента подменяет его файл: дожидаемся сжатия, оставшегося с прошлого запуска
+        wal.wait_for_compression()
+        workers = min(processes, len(closed))
+        # spawn, а не fork: у процесса могут быть запущены потоки (group commit, снапшоты)
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Чтение {len(closed)} сегментов WAL в {workers} процессах")
+        for base, path, next_base in closed:
+            self._jobs.append((base, path, next_base, self._pool.submit(_read_segment, path, base, self.after_lsn)))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if not self._jobs:
+            yield from self.wal.iter_replay(after_lsn=self.after_lsn)
+            return
+        try:
+            for base, path, next_base, job in self._jobs:
+                lsn, complete, operations = job.result()
+                yield from operations
+                if not complete:
+                    logger.error(f"WAL: сегмент {path} поврежден, последующие сегменты пропущены")
+                    return
+                if lsn + 1 != next_base:
+                    logger.warning(f"WAL: в сегменте {path} {lsn - base + 1} записей, "
+                                   f"ожидалось {next_base - base}")
+        finally:
+            self.close()
+        # Активный сегмент: все записи до него уже прочитаны
+        yield from self.wal.iter_replay(after_lsn=max(self.after_lsn, self._jobs[-1][2] - 1))
+
+    def close(self) -> None:
+        """Останавливает пул процессов, отменяя еще не начатый разбор."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "ParallelReplay":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,509 @@
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from app.core.batch import Items, WriteBatch
+from app.core.database import KVDB
+from app.core.interfaces import MISSING, IDatabase, IStorageEngine
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.tracing import OpTracer
+from app.core.wal import BINARY_MAGIC, FileWal
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(key: str, shards: int) -> int:
+    """
+    Возвращает номер шарда ключа. Хэш (CRC32 от UTF-8) не зависит от
+    PYTHONHASHSEED, поэтому ключ попадает в тот же шард после перезапуска
+    и в других процессах.
+    """
+    return zlib.crc32(key.encode('utf-8')) % shards
+
+
+def _group_by_shard(keys: List[str], shards: int) -> List[List[int]]:
+    """Возвращает для каждого шарда позиции его ключей в keys."""
+    groups: List[List[int]] = [[] for _ in range(shards)]
+    for position, key in enumerate(keys):
+        groups[shard_of(key, shards)].append(position)
+    return groups
+
+
+class ShardedStorage(IStorageEngine):
+    """
+    Движок хранения, разбивающий ключи по хэшу на N шардов InMemoryStorage.
+
+    У каждого шарда свой замок, поэтому записи в разные шарды не ждут
+    друг друга. Пространство имен распределено по всем шардам: операции
+    над ключом идут в один шард, а выборка, подсчет и удаление
+    пространства имен - во все. scan_prefix и range сливают
+    отсортированные выборки шардов.
+
+    Снапшот через begin_snapshot замораживает все шарды и собирает их
+    пространства имен в общие словари (копия O(n)); ShardedKVDB пишет
+    снапшот каждого шарда отдельно и эту копию не делает.
+    """
+
+    def __init__(self, shards: Union[int, List[InMemoryStorage]] = 4):
+        """
+        Args:
+            shards: Число шардов или готовые хранилища шардов
+        """
+        if isinstance(shards, int):
+            if shards < 1:
+                raise ValueError("Число шардов должно быть положительным")
+            shards = [InMemoryStorage() for _ in range(shards)]
+        elif not shards:
+            raise ValueError("Нужен хотя бы один шард")
+        self.shards: List[InMemoryStorage] = list(shards)
+
+    def shard_for(self, key: str) -> InMemoryStorage:
+        """Возвращает хранилище шарда, которому принадлежит ключ."""
+        return self.shards[shard_of(key, len(self.shards))]
+
+    def _partition(self, items: Iterable[Tuple[str, Any]]) -> List[Dict[str, Any]]:
+        """Раскладывает пары ключ/значение по шардам."""
+        parts: List[Dict[str, Any]] = [{} for _ in self.shards]
+        count = len(self.shards)
+        for key, value in items:
+            parts[shard_of(key, count)][key] = value
+        return parts
+
+    def set(self, key: str, value: Any, namespace: Optional[str] = None, expires_at: Optional[float] = None) -> None:
+        """Сохраняет значение по ключу."""
+        self.shard_for(key).set(key, value, namespace, expires_at)
+
+    def get(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
+        """Возвращает значение по ключу."""
+        return self.shard_for(key).get(key, namespace)
+
+    def delete(self, key: str, namespace: Optional[str] = None) -> bool:
+        """Удаляет значение по ключу. Возвращает True, если ключ был найден и удален."""
+        return self.shard_for(key).delete(key, namespace)
+
+    def contains(self, key: str, namespace: Optional[str] = None) -> bool:
+        """Есть ли ключ в шарде ключа (без учета обращения политикой вытеснения)."""
+        return self.shard_for(key).contains(key, namespace)
+
+    def get_many(self, keys: List[str], namespace: Optional[str] = None) -> List[Any]:
+        """
+        Возвращает значения ключей в порядке keys; для отсутствующих ключей - MISSING.
+        Каждый шард читается одним вызовом get_many.
+        """
+        values: List[Any] = [MISSING] * len(keys)
+        for shard, positions in zip(self.shards, _group_by_shard(keys, len(self.shards))):
+            if positions:
+                found = shard.get_many([keys[position] for position in positions], namespace)
+                for position, value in zip(positions, found):
+                    values[position] = value
+        return values
+
+    def get_all_data(self, namespace: Optional[str] = None) -> Dict[str, Any]:
+        """Возвращает все данные пространства имен со всех шардов."""
+        data: Dict[str, Any] = {}
+        for shard in self.shards:
+            data.update(shard.get_all_data(namespace))
+        return data
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        """Возвращает число ключей в пространстве имен."""
+        return sum(shard.count(namespace) for shard in self.shards)
+
+    def namespaces(self) -> List[str]:
+        """Возвращает отсортированные имена непустых пространств имен (кроме общего)."""
+        names = set()
+        for shard in self.shards:
+            names.update(shard.namespaces())
+        return sorted(names)
+
+    def apply_batch(self, operations: Iterable[Dict[str, Any]]) -> int:
+        """
+        Применяет пакет операций set/delete, передавая каждому шарду его часть.
+        Возвращает число ключей, удаленных операциями delete.
+        """
+        parts: List[List[Dict[str, Any]]] = [[] for _ in self.shards]
+        count = len(self.shards)
+        for operation in operations:
+            parts[shard_of(operation['key'], count)].append(operation)
+        return sum(shard.apply_batch(part) for shard, part in zip(self.shards, parts) if part)
+
+    def drop_namespace(self, namespace: Optional[str]) -> int:
+        """Удаляет пространство имен во всех шардах. Возвращает число удаленных ключей."""
+        return sum(shard.drop_namespace(namespace) for shard in self.shards)
+
+    def count_prefix(self, prefix: str, namespace: Optional[str] = None) -> int:
+        """Возвращает число ключей, начинающихся с prefix (счетчики ведет каждый шард)."""
+        return sum(shard.count_prefix(prefix, namespace) for shard in self.shards)
+
+    def load_data(self, data: Dict[str, Any], namespaces: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """Загружает все данные, раскладывая ключи по шардам."""
+        parts = self._partition(data.items())
+        ns_parts = {name: self._partition(ns_data.items()) for name, ns_data in (namespaces or {}).items()}
+        for index, shard in enumerate(self.shards):
+            shard.load_data(parts[index], {name: ns_part[index] for name, ns_part in ns_parts.items()})
+
+    def load_namespaces(self, parts: Iterable[Tuple[Optional[str], Iterable[Tuple[str, Any]]]]) -> int:
+        """
+        Заменяет все данные частями вида (пространство имен, пары ключ/значение),
+        раскладывая ключи по шардам. Возвращает общее число загруженных пар.
+        """
+        loaded: Dict[Optional[str], List[Dict[str, Any]]] = {None: [{} for _ in self.shards]}
+        count = len(self.shards)
+        for name, items in parts:
+            targets = loaded.get(name)
+            if targets is None:
+                targets = loaded[name] = [{} for _ in self.shards]
+            for key, value in items:
+                targets[shard_of(key, count)][key] = value
+        total = 0
+        for index, shard in enumerate(self.shards):
+            total += shard.load_namespaces((name, targets[index].items()) for name, targets in loaded.items())
+        return total
+
+    def scan_prefix(self, prefix: str, namespace: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """Возвращает по возрастанию ключей пары, ключ которых начинается с prefix."""
+        return heapq.merge(*(shard.scan_prefix(prefix, namespace) for shard in self.shards), key=_pair_key)
+
+    def range(
+        self, start: Optional[str] = None, end: Optional[str] = None, namespace: Optional[str] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """Возвращает по возрастанию ключей пары с ключами из полуинтервала [start, end)."""
+        return heapq.merge(*(shard.range(start, end, namespace) for shard in self.shards), key=_pair_key)
+
+    def begin_snapshot(self) -> Dict[str, Any]:
+        """Замораживает все шарды и возвращает общее пространство имен, собранное из шардов."""
+        data: Dict[str, Any] = {}
+        for shard in self.shards:
+            data.update(shard.begin_snapshot())
+        return data
+
+    def snapshot_namespaces(self) -> Dict[str, Dict[str, Any]]:
+        """Возвращает пространства имен (кроме общего), собранные из замороженных шардов."""
+        namespaces: Dict[str, Dict[str, Any]] = {}
+        for shard in self.shards:
+            for name, data in shard.snapshot_namespaces().items():
+                namespaces.setdefault(name, {}).update(data)
+        return namespaces
+
+    def end_snapshot(self) -> None:
+        """Закрывает снапшот во всех шардах."""
+        for shard in self.shards:
+            shard.end_snapshot()
+
+    def expiry(self, key: str, namespace: Optional[str] = None) -> Optional[float]:
+        """Возвращает время истечения ключа или None, если у ключа нет TTL."""
+        return self.shard_for(key).expiry(key, namespace)
+
+    def next_expiry(self) -> Optional[float]:
+        """Возвращает ближайшее время истечения среди шардов или None."""
+        return min(
+            (expires_at for expires_at in (shard.next_expiry() for shard in self.shards) if expires_at is not None),
+            default=None
+        )
+
+    def pop_expired(self, now: float, limit: Optional[int] = None) -> Dict[Optional[str], List[str]]:
+        """Извлекает истекшие к моменту now ключи из куч шардов (всего не больше limit)."""
+        due: Dict[Optional[str], List[str]] = {}
+        for shard in self.shards:
+            remaining = None if limit is None else limit - sum(len(keys) for keys in due.values())
+            if remaining is not None and remaining <= 0:
+                break
+            for name, keys in shard.pop_expired(now, remaining).items():
+                due.setdefault(name, []).extend(keys)
+        return due
+
+    def requeue_expired(self, expired: Dict[Optional[str], List[str]]) -> None:
+        """Возвращает невыполненные истечения в кучи шардов ключей."""
+        for name, keys in expired.items():
+            for shard, positions in zip(self.shards, _group_by_shard(keys, len(self.shards))):
+                if positions:
+                    shard.requeue_expired({name: [keys[position] for position in positions]})
+
+    def over_budget(self) -> bool:
+        """Превышает ли бюджет хотя бы один шард."""
+        return any(shard.over_budget() for shard in self.shards)
+
+    def select_evictions(self) -> Dict[Optional[str], List[str]]:
+        """Возвращает ключи, которые нужно вытеснить, чтобы каждый шард вернулся в свой бюджет."""
+        victims: Dict[Optional[str], List[str]] = {}
+        for shard in self.shards:
+            if shard.over_budget():
+                for name, keys in shard.select_evictions().items():
+                    victims.setdefault(name, []).extend(keys)
+        return victims
+
+    def evict(self, keys: List[str], namespace: Optional[str] = None) -> int:
+        """Удаляет вытесняемые ключи в их шардах. Возвращает число удаленных."""
+        removed = 0
+        for shard, positions in zip(self.shards, _group_by_shard(keys, len(self.shards))):
+            if positions:
+                removed += shard.evict([keys[position] for position in positions], namespace)
+        return removed
+
+    def eviction_stats(self) -> Dict[str, Any]:
+        """Бюджет и счетчики вытеснения, просуммированные по шардам (лимиты заданы на шард)."""
+        stats = [shard.eviction_stats() for shard in self.shards]
+        merged = dict(stats[0])
+        for name in ('max_keys', 'max_memory', 'keys', 'memory', 'evicted_keys', 'evicted_bytes'):
+            values = [shard_stats[name] for shard_stats in stats]
+            merged[name] = None if None in values else sum(values)
+        return merged
+
+
+def _pair_key(pair: Tuple[str, Any]) -> str:
+    return pair[0]
+
+
+# Файл с числом шардов: при другом числе шардов ключи разошлись бы не по тем шардам
+SHARDS_META_FILE = "shards.json"
+
+
+def _shard_paths(dir_path: str, index: int) -> Tuple[str, str]:
+    """Пути к снапшоту и журналу шарда."""
+    base = os.path.join(dir_path, f"shard-{index:03d}")
+    return f"{base}.snapshot", f"{base}.wal"
+
+
+def _wal_size(wal_path: str) -> int:
+    """
+    Объем записей в журнале шарда. Пустой журнал - это пустой файл (JSON)
+    или одна сигнатура (бинарный формат); любая запись длиннее сигнатуры.
+    """
+    if not os.path.exists(wal_path):
+        return 0
+    return max(os.path.getsize(wal_path) - len(BINARY_MAGIC), 0)
+
+
+def _recover_shard(
+    snapshot_path: str,
+    wal_path: str,
+    snapshot_options: Dict[str, Any],
+    wal_options: Dict[str, Any],
+    storage_options: Dict[str, Any]
+) -> int:
+    """
+    Восстанавливает шард в отдельном процессе: загружает снапшот, применяет
+    журнал, пишет новый снапшот и очищает журнал. Возвращает число записей
+    в снапшоте; сами данные процесс-родитель затем читает из снапшота.
+    """
+    storage = InMemoryStorage(**storage_options)
+    wal_options = dict(wal_options, group_commit=False)
+    db = KVDB(storage, Snapshotter(snapshot_path, **snapshot_options), FileWal(wal_path, **wal_options))
+    db.wal.close()
+    return sum(storage.count(name) for name in [None, *storage.namespaces()])
+
+
+class ShardedKVDB(IDatabase):
+    """
+    KVDB, разбитая по хэшу ключа на N независимых шардов.
+
+    Каждый шард - отдельная KVDB со своим хранилищем InMemoryStorage,
+    блокировкой, журналом FileWal и файлом снапшота, поэтому записи в разные
+    шарды не ждут общего замка и общего fsync, а снапшоты шардов пишутся
+    независимо. Порог auto_snapshot_threshold действует в каждом шарде.
+
+    При запуске шарды с длинным журналом восстанавливаются параллельно в
+    пуле процессов: применение WAL и запись нового снапшота идут на разных
+    ядрах, после чего основной процесс читает готовые снапшоты. Короткий
+    журнал дешевле применить в основном процессе, чем писать и перечитывать
+    снапшот. Шарды открываются в пуле потоков, так что чтение и распаковка
+    их снапшотов перекрываются.
+
+    Пакет (write, set_many, delete_many) делится по шардам; каждая часть
+    атомарна в своем шарде, но атомарность пакета между шардами при сбое
+    не гарантируется.
+    """
+
+    def __init__(
+        self,
+        dir_path: str = "data/shards",
+        shards: int = 4,
+        snapshot_options: Optional[Dict[str, Any]] = None,
+        wal_options: Optional[Dict[str, Any]] = None,
+        auto_snapshot_threshold: int = 100,
+        tracer: Optional[OpTracer] = None,
+        thread_safe: bool = True,
+        recovery_processes: Optional[int] = None,
+        storage_options: Optional[Dict[str, Any]] = None,
+        recovery_min_wal_bytes: int = 1 << 20,
+        expire_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            dir_path: Каталог со снапшотами и журналами шардов
+            shards: Число шардов. Должно совпадать с числом, с которым каталог был создан
+            snapshot_options: Параметры Snapshotter шардов (format, compression и т.д.)
+            wal_options: Параметры FileWal шардов (group_commit, durability, record_format и т.д.)
+            auto_snapshot_threshold: Число операций в шарде между его автоматическими снапшотами
+            tracer: Трассировщик операций шардов
+            thread_safe: Потокобезопасный режим шардов (см. KVDB)
+            recovery_processes: Число процессов для восстановления шардов.
+                По умолчанию - по числу ядер; 1 - восстановление в текущем процессе
+            storage_options: Параметры InMemoryStorage шардов (max_keys, max_memory,
+                eviction_policy); бюджет действует в каждом шарде отдельно
+            recovery_min_wal_bytes: Журнал шарда короче этого объема применяется
+                основным процессом, а не в пуле процессов
+            expire_interval: Период фонового удаления истекших ключей в каждом
+                шарде (см. KVDB); None - без фонового потока
+        """
+        if shards < 1:
+            raise ValueError("Число шардов должно быть положительным")
+        if recovery_processes is not None and recovery_processes < 1:
+            raise ValueError("recovery_processes должен быть положительным")
+        self.dir_path = dir_path
+        self.thread_safe = thread_safe
+        self.snapshot_options = dict(snapshot_options or {})
+        self.wal_options = dict(wal_options or {})
+        self.storage_options = dict(storage_options or {})
+        os.makedirs(dir_path, exist_ok=True)
+        self._check_shard_count(shards)
+
+        paths = [_shard_paths(dir_path, index) for index in range(shards)]
+        self._recover(paths, recovery_processes, recovery_min_wal_bytes)
+
+        def open_shard(snapshot_path: str, wal_path: str) -> KVDB:
+            return KVDB(
+                storage_engine=InMemoryStorage(**self.storage_options),
+                persistence=Snapshotter(snapshot_path, **self.snapshot_options),
+                wal=FileWal(wal_path, **self.wal_options),
+                auto_snapshot_threshold=auto_snapshot_threshold,
+                tracer=tracer,
+                thread_safe=thread_safe,
+                expire_interval=expire_interval
+            )
+
+        with ThreadPoolExecutor(max_workers=shards, thread_name_prefix="kvdb-shard-open") as pool:
+            futures = [pool.submit(open_shard, snapshot_path, wal_path) for snapshot_path, wal_path in paths]
+            self.shards: List[KVDB] = [future.result() for future in futures]
+        self.storage_engine = ShardedStorage([shard.storage_engine for shard in self.shards])
+
+    def _check_shard_count(self, shards: int) -> None:
+        """Запоминает число шардов каталога или проверяет, что оно не изменилось."""
+        meta_path = os.path.join(self.dir_path, SHARDS_META_FILE)
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    stored = int(json.load(f)["shards"])
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"Ошибка чтения числа шардов из {meta_path}: {e}")
+            if stored != shards:
+                raise ValueError(
+                    f"Каталог {self.dir_path} создан с {stored} шардами, а не {shards}; перешардирование не поддерживается"
+                )
+            return
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"shards": shards}, f)
+        os.replace(tmp_path, meta_path)
+
+    def _recover(self, paths: List[Tuple[str, str]], processes: Optional[int], min_wal_bytes: int) -> None:
+        """
+        Параллельно применяет журналы шардов к их снапшотам. Шарды с пустым
+        или коротким журналом (меньше min_wal_bytes) загружаются основным
+        процессом, и KVDB шарда применяет журнал сама: процесс восстановления
+        записал бы снапшот, который основной процесс затем прочитал бы снова.
+        """
+        pending = [
+            (snapshot_path, wal_path) for snapshot_path, wal_path in paths
+            if _wal_size(wal_path) >= max(min_wal_bytes, 1)
+        ]
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(pending))
+        if processes < 2:
+            # Восстанавливать нечего или параллелить не на что: KVDB шарда применит журнал сама
+            return
+        logger.info(f"Восстановление {len(pending)} шардов в {processes} процессах")
+        # spawn, а не fork: у родителя могут быть запущены потоки (group commit, снапшоты)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            futures = [
+                pool.submit(
+                    _recover_shard, snapshot_path, wal_path, self.snapshot_options, self.wal_options,
+                    self.storage_options
+                )
+                for snapshot_path, wal_path in pending
+            ]
+            for future in futures:
+                future.result()
+
+    def shard_for(self, key: str) -> KVDB:
+        """Возвращает шард, которому принадлежит ключ."""
+        return self.shards[shard_of(key, len(self.shards))]
+
+    def set(self, key: str, value: Any, namespace: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение по ключу в шарде ключа; с ttl ключ истекает через ttl секунд."""
+        self.shard_for(key).set(key, value, namespace, ttl)
+
+    def get(self, key: str, namespace: Optional[str] = None, default: Any = None) -> Any:
+        """Возвращает значение по ключу из шарда ключа или default, если ключа нет."""
+        return self.shard_for(key).get(key, namespace, default)
+
+    def delete(self, key: str, namespace: Optional[str] = None) -> bool:
+        """Удаляет значение по ключу из шарда ключа."""
+        return self.shard_for(key).delete(key, namespace)
+
+    def get_many(
+        self, keys: Iterable[str], namespace: Optional[str] = None, ordered: bool = False
+    ) -> Union[Dict[str, Any], List[Any]]:
+        """
+        Возвращает значения нескольких ключей: словарь найденных ключей или,
+        если ordered=True, список значений в порядке keys с MISSING для
+        отсутствующих. Каждый шард читается одним вызовом.
+        """
+        keys = list(keys)
+        values: List[Any] = [MISSING] * len(keys)
+        for shard, positions in zip(self.shards, _group_by_shard(keys, len(self.shards))):
+            if positions:
+                found = shard.get_many([keys[position] for position in positions], namespace, ordered=True)
+                for position, value in zip(positions, found):
+                    values[position] = value
+        if ordered:
+            return values
+        return {key: value for key, value in zip(keys, values) if value is not MISSING}
+
+    def write(self, batch: WriteBatch) -> int:
+        """
+        Выполняет пакет операций: каждая часть пакета атомарно пишется в свой шард.
+        Возвращает число ключей, удаленных операциями delete.
+        """
+        count = len(self.shards)
+        parts = [WriteBatch() for _ in self.shards]
+        for operation in batch.operations:
+            parts[shard_of(operation['key'], count)].operations.append(operation)
+        return sum(shard.write(part) for shard, part in zip(self.shards, parts) if part.operations)
+
+    def set_many(self, items: Items, namespace: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Сохраняет несколько пар ключ/значение; атомарно в пределах каждого шарда."""
+        self.write(WriteBatch().set_many(items, namespace, ttl))
+
+    def delete_many(self, keys: Iterable[str], namespace: Optional[str] = None) -> int:
+        """Удаляет несколько ключей; атомарно в пределах каждого шарда. Возвращает число удаленных."""
+        return self.write(WriteBatch().delete_many(keys, namespace))
+
+    def drop_namespace(self, namespace: Optional[str]) -> int:
+        """Удаляет пространство имен во всех шардах. Возвращает число удаленных ключей."""
+        return sum(shard.drop_namespace(namespace) for shard in self.shards)
+
+    def purge_expired(self, limit: Optional[int] = None) -> int:
+        """Удаляет истекшие ключи во всех шардах (всего не больше limit). Возвращает их число."""
+        removed = 0
+        for shard in self.shards:
+            if limit is not None and removed >= limit:
+                break
+            removed += shard.purge_expired(None if limit is None else limit - removed)
+        return removed
+
+    def ttl(self, key: str, namespace: Optional[str] = None) -> Optional[float]:
+        """Возвращает оставшееся время жизни ключа в секундах (см. KVDB.ttl)."""
+        return self.shard_for(key).ttl(key, namespace)
+
+    def shutdown(self) -> None:
+        """Корректное завершение работы: финальные снапшоты всех шардов."""
+        for shard in self.shards:
+            shard.shutdown()
@@ -1,35 +1,815 @@
-from typing import Any, Optional, Dict
-from app.core.interfaces import IStorageEngine
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Iterable, Iterator, List, Optional, Dict, Set, Tuple
+from app.core.batch import RESERVED_NAMESPACE_PREFIX
+from app.core.eviction import (
+    EVICTION_LFU, EVICTION_LRU, EVICTION_TTL, EvictionPolicy, Item, LFUPolicy, LRUPolicy, TTLFirstPolicy,
+    entry_size, validate_policy
+)
+from app.core.index import SortedKeyIndex
+from app.core.interfaces import MISSING, IStorageEngine
 
+# Отметка об удалении ключа в copy-on-write оверлее
+_TOMBSTONE = object()
 
-class InMemoryStorage(IStorageEngine):
+# Времена истечения ключей с TTL попадают в снапшот служебными пространствами
+# имен: "\x00expires" для общего пространства и "\x00expires:<имя>" для
+# остальных. Имена пространств, начинающиеся с "\x00", зарезервированы
+# (см. app.core.batch.validate_namespace).
+EXPIRES_NAMESPACE = RESERVED_NAMESPACE_PREFIX + "expires"
+# Куча истечений перестраивается, когда устаревших записей в ней становится
+# больше, чем живых (но не раньше этого размера)
+_MIN_EXPIRY_HEAP_REBUILD = 1024
+
+
+def expires_namespace(namespace: Optional[str]) -> str:
+    """Имя служебного пространства снапшота с временами истечения ключей пространства namespace."""
+    return EXPIRES_NAMESPACE if namespace is None else f"{EXPIRES_NAMESPACE}:{namespace}"
+
+
+def _split_expires(
+    loaded: Dict[Optional[str], Dict[str, Any]]
+) -> Dict[Optional[str], Dict[str, float]]:
+    """Извлекает из загруженных пространств служебные пространства с временами истечения."""
+    expires: Dict[Optional[str], Dict[str, float]] = {}
+    for name in [name for name in loaded if name is not None and name.startswith(EXPIRES_NAMESPACE)]:
+        data = loaded.pop(name)
+        if name == EXPIRES_NAMESPACE:
+            expires[None] = data
+        elif name.startswith(EXPIRES_NAMESPACE + ":"):
+            expires[name[len(EXPIRES_NAMESPACE) + 1:]] = data
+    return expires
+
+
+class _Namespace:
     """
-    In-memory хранилище данных на основе хэш-таблицы (dict).
+    Данные одного пространства имен: словарь, copy-on-write оверлей на время
+    снапшота, времена истечения ключей с TTL, отсортированный индекс ключей и
+    счетчики префиксов. Изменяющие методы вызываются под замком хранилища.
     """
 
-    def __init__(self):
-        self._data: Dict[str, Any] = {}
+    __slots__ = ("data", "overlay", "expires", "expires_overlay", "index", "prefix_counts", "prefix_lengths")
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, expires: Optional[Dict[str, float]] = None):
+        self.data: Dict[str, Any] = {} if data is None else data
+        # Оверлей изменений на время снапшота (None, если словарь не заморожен)
+        self.overlay: Optional[Dict[str, Any]] = None
+        # Время истечения (по time.time()) ключей с TTL и его оверлей на время снапшота
+        self.expires: Dict[str, float] = {} if expires is None else expires
+        self.expires_overlay: Optional[Dict[str, Any]] = None
+        # Отсортированные ключи текущего состояния (с учетом оверлея)
+        self.index = SortedKeyIndex(self.data)
+        # Счетчики ключей по отслеживаемым префиксам и множество длин этих префиксов
+        self.prefix_counts: Dict[str, int] = {}
+        self.prefix_lengths: Set[int] = set()
+
+    def get(self, key: str) -> Any:
+        """Возвращает значение с учетом оверлея или MISSING, если ключа нет."""
+        overlay = self.overlay
+        if overlay is not None:
+            value = overlay.get(key, MISSING)
+            if value is not MISSING:
+                return MISSING if value is _TOMBSTONE else value
+        return self.data.get(key, MISSING)
 
-    def set(self, key: str, value: Any) -> None:
-        """Сохраняет значение по ключу."""
-        self._data[key] = value
+    def expiry(self, key: str) -> Optional[float]:
+        """Возвращает время истечения ключа с учетом оверлея или None, если у ключа нет TTL."""
+        overlay = self.expires_overlay
+        if overlay:
+            expires_at = overlay.get(key, MISSING)
+            if expires_at is not MISSING:
+                return None if expires_at is _TOMBSTONE else expires_at
+        return self.expires.get(key)
 
-    def get(self, key: str) -> Optional[Any]:
-        """Возвращает значение по ключу."""
-        return self._data.get(key)
+    def is_expired(self, key: str, now: float) -> bool:
+        expires_at = self.expiry(key)
+        return expires_at is not None and expires_at <= now
+
+    def set_expiry(self, key: str, expires_at: Optional[float]) -> None:
+        """Задает или снимает (None) время истечения ключа."""
+        overlay = self.expires_overlay
+        if overlay is None:
+            if expires_at is None:
+                self.expires.pop(key, None)
+            else:
+                self.expires[key] = expires_at
+        elif expires_at is not None:
+            overlay[key] = expires_at
+        elif key in self.expires:
+            overlay[key] = _TOMBSTONE
+        else:
+            overlay.pop(key, None)
+
+    def materialize_expires(self) -> Dict[str, float]:
+        """Возвращает копию времен истечения с примененным оверлеем."""
+        expires = self.expires.copy()
+        if self.expires_overlay:
+            _apply_overlay(expires, self.expires_overlay)
+        return expires
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None) -> None:
+        overlay = self.overlay
+        if overlay is None:
+            if key not in self.data:
+                self._key_added(key)
+            self.data[key] = value
+        else:
+            previous = overlay.get(key, MISSING)
+            if previous is _TOMBSTONE or (previous is MISSING and key not in self.data):
+                self._key_added(key)
+            overlay[key] = value
+        # Запись без TTL снимает прежнее время истечения ключа
+        if expires_at is not None or self.expires or self.expires_overlay:
+            self.set_expiry(key, expires_at)
 
     def delete(self, key: str) -> bool:
-        """Удаляет значение по ключу. Возвращает True, если ключ был найден и удален."""
-        if key in self._data:
-            del self._data[key]
+        if self._delete_value(key):
+            if self.expires or self.expires_overlay:
+                self.set_expiry(key, None)
+            return True
+        return False
+
+    def _delete_value(self, key: str) -> bool:
+        overlay = self.overlay
+        if overlay is None:
+            if key in self.data:
+                del self.data[key]
+                self._key_removed(key)
+                return True
+            return False
+
+        value = overlay.get(key, MISSING)
+        if value is _TOMBSTONE:
+            return False
+        if key in self.data:
+            overlay[key] = _TOMBSTONE
+            self._key_removed(key)
+            return True
+        if value is not MISSING:
+            del overlay[key]
+            self._key_removed(key)
             return True
         return False
 
-    def get_all_data(self) -> Dict[str, Any]:
-        """Возвращает все данные из хранилища."""
-        return self._data.copy()
+    def _key_added(self, key: str) -> None:
+        self.index.add(key)
+        if self.prefix_lengths:
+            self._update_counts(key, 1)
+
+    def _key_removed(self, key: str) -> None:
+        self.index.discard(key)
+        if self.prefix_lengths:
+            self._update_counts(key, -1)
+
+    def _update_counts(self, key: str, delta: int) -> None:
+        counts = self.prefix_counts
+        for length in self.prefix_lengths:
+            prefix = key[:length]
+            if prefix in counts:
+                counts[prefix] += delta
+
+    def track_prefix(self, prefix: str) -> int:
+        """Начинает отслеживать префикс и возвращает текущее число его ключей."""
+        if prefix not in self.prefix_counts:
+            self.prefix_counts[prefix] = sum(1 for _ in self.index.iter_prefix(prefix))
+            self.prefix_lengths.add(len(prefix))
+        return self.prefix_counts[prefix]
+
+    def materialize(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Возвращает копию текущего состояния с примененным оверлеем; если задан
+        момент now, ключи, истекшие к нему, в копию не входят.
+        """
+        data = self.data.copy()
+        if self.overlay is not None:
+            _apply_overlay(data, self.overlay)
+        if now is not None and (self.expires or self.expires_overlay):
+            for key, expires_at in self.materialize_expires().items():
+                if expires_at <= now:
+                    data.pop(key, None)
+        return data
+
+    def merge_overlay(self) -> None:
+        """Переносит изменения оверлеев в словари и снимает заморозку."""
+        overlay = self.overlay
+        if overlay is not None:
+            _apply_overlay(self.data, overlay)
+            # Читатели, успевшие взять ссылку на оверлей, видят в нем те же значения
+            self.overlay = None
+        expires_overlay = self.expires_overlay
+        if expires_overlay is not None:
+            _apply_overlay(self.expires, expires_overlay)
+            self.expires_overlay = None
+
+
+def _apply_overlay(data: Dict[str, Any], overlay: Dict[str, Any]) -> None:
+    """Применяет изменения оверлея к словарю."""
+    for key, value in overlay.items():
+        if value is _TOMBSTONE:
+            data.pop(key, None)
+        else:
+            data[key] = value
+
+
+class InMemoryStorage(IStorageEngine):
+    """
+    In-memory хранилище данных на основе хэш-таблицы (dict).
+
+    Данные разделены на пространства имен: у каждого свой словарь, поэтому
+    ключи разных коллекций не пересекаются, а перечисление пространства
+    стоит O(его размера). Пространство имен None - общее пространство
+    для ключей вне коллекций.
+
+    Поддерживает снапшоты на момент времени без копирования данных: пока
+    снапшот открыт, словари заморожены, а изменения попадают в
+    copy-on-write оверлеи. Дополнительная память на снапшот пропорциональна
+    числу ключей, измененных за время его записи.
+
+    Рядом со словарями поддерживаются отсортированные индексы ключей, поэтому
+    scan_prefix и range стоят O(log n + k), где k - число найденных ключей.
+    Для префиксов, по которым вызывался count_prefix, хранятся счетчики ключей,
+    обновляемые при каждом изменении, так что повторный подсчет стоит O(1).
+
+    Ключ может иметь время истечения (expires_at по time.time()). Истекший
+    ключ не виден чтениям (get, get_many, выборки) и не учитывается в count,
+    но занимает память, пока его не удалит владелец хранилища: ближайшие
+    истечения выдает pop_expired по куче (время, ключ) за O(log n) на ключ,
+    без обхода данных. Записи кучи, устаревшие после перезаписи или удаления
+    ключа, пропускаются при извлечении.
+
+    С max_keys или max_memory хранилище ограничено по объему: политика
+    вытеснения (lru, lfu или ttl, см. app.core.eviction) учитывает записи и
+    чтения get/get_many за O(1), а select_evictions выдает ключи, которые
+    нужно вытеснить, чтобы вернуться в бюджет. Как и истекшие ключи, их
+    удаляет владелец хранилища (evict), после того как запишет вытеснение в
+    журнал; до этого хранилище может превышать бюджет. Объем памяти -
+    оценка по sys.getsizeof ключей и значений (см. entry_size), а не RSS
+    процесса. Выборки scan_prefix и range не считаются обращениями.
+    """
+
+    def __init__(
+        self,
+        max_keys: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        eviction_policy: str = EVICTION_LRU
+    ):
+        """
+        Args:
+            max_keys: Наибольшее число ключей во всех пространствах имен (None - без ограничения)
+            max_memory: Наибольший оценочный объем ключей и значений в байтах (None - без ограничения)
+            eviction_policy: Политика вытеснения при превышении бюджета: "lru" - давно не
+                использованные ключи, "lfu" - редко используемые (приближенно), "ttl" - сначала
+                ключи с ближайшим истечением, затем давно не использованные
+        """
+        if max_keys is not None and max_keys < 1:
+            raise ValueError("max_keys должен быть положительным")
+        if max_memory is not None and max_memory < 1:
+            raise ValueError("max_memory должен быть положительным")
+        self.max_keys = max_keys
+        self.max_memory = max_memory
+        self.eviction_policy = validate_policy(eviction_policy)
+        self._namespaces: Dict[Optional[str], _Namespace] = {None: _Namespace()}
+        # Словари, замороженные открытым снапшотом (None, если снапшот не открыт)
+        self._frozen: Optional[Dict[Optional[str], Dict[str, Any]]] = None
+        self._frozen_expires: Optional[Dict[Optional[str], Dict[str, float]]] = None
+        # Куча (время истечения, порядковый номер, пространство имен, ключ);
+        # номер нужен, чтобы не сравнивать имена пространств None и str
+        self._expiry_heap: List[Tuple[float, int, Optional[str], str]] = []
+        self._expiry_seq = itertools.count()
+        self._expiry_heap_limit = _MIN_EXPIRY_HEAP_REBUILD
+        # Учет ключей для вытеснения ведется, только если задан бюджет
+        self._policy: Optional[EvictionPolicy] = None
+        # Оценка объема каждого ключа и их сумма (только с max_memory)
+        self._sizes: Optional[Dict[Item, int]] = None
+        self._memory = 0
+        if max_keys is not None or max_memory is not None:
+            self._policy = self._make_policy()
+            if max_memory is not None:
+                self._sizes = {}
+        # Счетчики вытесненных ключей и их оценочного объема
+        self.evicted_keys = 0
+        self.evicted_bytes = 0
+        # Сериализует изменения с открытием и закрытием снапшота
+        self._lock = threading.Lock()
+
+    def _make_policy(self) -> EvictionPolicy:
+        if self.eviction_policy == EVICTION_LFU:
+            return LFUPolicy()
+        if self.eviction_policy == EVICTION_TTL:
+            return TTLFirstPolicy(self._iter_expiring)
+        return LRUPolicy()
+
+    def _namespace_for_write(self, namespace: Optional[str]) -> _Namespace:
+        """Возвращает пространство имен, создавая его при необходимости. Вызывается под _lock."""
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            # Пространство, созданное во время снапшота, в него не входит и не замораживается
+            ns = self._namespaces[namespace] = _Namespace()
+        return ns
+
+    def _schedule_expiry(self, namespace: Optional[str], key: str, expires_at: float) -> None:
+        """Добавляет истечение ключа в кучу. Вызывается под _lock."""
+        heapq.heappush(self._expiry_heap, (expires_at, next(self._expiry_seq), namespace, key))
+        if len(self._expiry_heap) > self._expiry_heap_limit:
+            self._rebuild_expiry_heap()
+
+    def _rebuild_expiry_heap(self) -> None:
+        """Перестраивает кучу по текущим временам истечения, отбрасывая устаревшие записи. Вызывается под _lock."""
+        heap = [
+            (expires_at, next(self._expiry_seq), name, key)
+            for name, ns in self._namespaces.items()
+            for key, expires_at in ns.materialize_expires().items()
+        ]
+        heapq.heapify(heap)
+        self._expiry_heap = heap
+        self._expiry_heap_limit = max(_MIN_EXPIRY_HEAP_REBUILD, 2 * len(heap))
+
+    def _iter_expiring(self, until: Optional[float] = None) -> Iterator[Item]:
+        """
+        Ключи с TTL по возрастанию времени истечения (с until - только
+        истекающие не позже until): обход кучи от корня со вспомогательной
+        кучей, O(log k) на ключ. Из кучи извлекаются только устаревшие записи
+        в ее вершине (их оставляют вытесненные ключи). Вызывается под _lock.
+        """
+        heap = self._expiry_heap
+        while heap:
+            expires_at, _, name, key = heap[0]
+            ns = self._namespaces.get(name)
+            if ns is not None and ns.expiry(key) == expires_at:
+                break
+            heapq.heappop(heap)
+        pending = [(heap[0], 0)] if heap and (until is None or heap[0][0] <= until) else []
+        while pending:
+            (expires_at, _, name, key), index = heapq.heappop(pending)
+            ns = self._namespaces.get(name)
+            if ns is not None and ns.expiry(key) == expires_at:
+                yield name, key
+            for child in (2 * index + 1, 2 * index + 2):
+                # Потомки истекают не раньше родителя, поэтому поддерево позже until пропускается
+                if child < len(heap) and (until is None or heap[child][0] <= until):
+                    heapq.heappush(pending, (heap[child], child))
+
+    def _count_expired(self, namespace: Optional[str], prefix: Optional[str] = None) -> int:
+        """
+        Число истекших, но еще не удаленных ключей пространства (с prefix - только
+        ключей с этим префиксом). Без истекших ключей - O(1) по вершине кучи,
+        иначе O(m log m) по m истекшим ключам всех пространств.
+        """
+        heap = self._expiry_heap
+        now = time.time()
+        if not heap or heap[0][0] > now:
+            return 0
+        with self._lock:
+            return self._count_expired_locked(namespace, now, prefix)
+
+    def _count_expired_locked(self, namespace: Optional[str], now: float, prefix: Optional[str] = None) -> int:
+        """То же, что _count_expired, на момент now. Вызывается под _lock."""
+        return len({
+            key for name, key in self._iter_expiring(now)
+            if name == namespace and (prefix is None or key.startswith(prefix))
+        })
+
+    def _track_set(self, namespace: Optional[str], key: str, value: Any) -> None:
+        """Учитывает запись ключа в политике вытеснения и оценке объема. Вызывается под _lock."""
+        item = (namespace, key)
+        self._policy.added(item)
+        sizes = self._sizes
+        if sizes is not None:
+            size = entry_size(key, value)
+            self._memory += size - sizes.get(item, 0)
+            sizes[item] = size
+
+    def _track_delete(self, namespace: Optional[str], key: str) -> int:
+        """Перестает учитывать удаленный ключ; возвращает его оценочный объем. Вызывается под _lock."""
+        item = (namespace, key)
+        self._policy.removed(item)
+        sizes = self._sizes
+        if sizes is None:
+            return 0
+        size = sizes.pop(item, 0)
+        self._memory -= size
+        return size
+
+    def _rebuild_tracking(self) -> None:
+        """Заново учитывает все ключи после загрузки данных. Вызывается под _lock."""
+        self._policy.clear()
+        if self._sizes is not None:
+            self._sizes = {}
+            self._memory = 0
+        # Только что загруженные пространства не заморожены снапшотом: оверлеев нет
+        for name, ns in self._namespaces.items():
+            for key, value in ns.data.items():
+                self._track_set(name, key, value)
+
+    def _track_access(self, namespace: Optional[str], keys: List[str], values: List[Any]) -> None:
+        """Учитывает чтение найденных ключей в политике вытеснения."""
+        with self._lock:
+            accessed = self._policy.accessed
+            for key, value in zip(keys, values):
+                if value is not MISSING:
+                    accessed((namespace, key))
+
+    def set(self, key: str, value: Any, namespace: Optional[str] = None, expires_at: Optional[float] = None) -> None:
+        """Сохраняет значение по ключу; expires_at - время истечения по time.time() или None."""
+        with self._lock:
+            self._namespace_for_write(namespace).set(key, value, expires_at)
+            if expires_at is not None:
+                self._schedule_expiry(namespace, key, expires_at)
+            if self._policy is not None:
+                self._track_set(namespace, key, value)
+
+    def get(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
+        """Возвращает значение по ключу; истекший ключ считается отсутствующим."""
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            return None
+        value = ns.get(key)
+        if value is MISSING or ((ns.expires or ns.expires_overlay) and ns.is_expired(key, time.time())):
+            return None
+        if self._policy is not None:
+            with self._lock:
+                self._policy.accessed((namespace, key))
+        return value
+
+    def expiry(self, key: str, namespace: Optional[str] = None) -> Optional[float]:
+        """Возвращает время истечения ключа или None, если у ключа нет TTL."""
+        ns = self._namespaces.get(namespace)
+        return ns.expiry(key) if ns is not None else None
+
+    def next_expiry(self) -> Optional[float]:
+        """Ближайшее время истечения в куче (возможно, уже устаревшей записи) или None."""
+        heap = self._expiry_heap
+        return heap[0][0] if heap else None
+
+    def pop_expired(self, now: float, limit: Optional[int] = None) -> Dict[Optional[str], List[str]]:
+        """
+        Извлекает из кучи ключи, истекшие к моменту now (не больше limit), и
+        возвращает их по пространствам имен. Сами ключи не удаляются: их
+        удаляет вызывающий, после того как запишет истечение в журнал.
+        """
+        due: Dict[Optional[str], Dict[str, None]] = {}
+        found = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now and (limit is None or found < limit):
+                expires_at, _, name, key = heapq.heappop(heap)
+                ns = self._namespaces.get(name)
+                if ns is None or ns.expiry(key) != expires_at:
+                    # Ключ перезаписан, удален или удалено его пространство имен
+                    continue
+                keys = due.setdefault(name, {})
+                if key not in keys:
+                    keys[key] = None
+                    found += 1
+        return {name: list(keys) for name, keys in due.items()}
+
+    def requeue_expired(self, expired: Dict[Optional[str], List[str]]) -> None:
+        """
+        Возвращает в кучу ключи, выданные pop_expired, но не удаленные (например,
+        запись истечения в журнал не удалась), чтобы их выдало следующее истечение.
+        """
+        with self._lock:
+            for name, keys in expired.items():
+                ns = self._namespaces.get(name)
+                if ns is None:
+                    continue
+                for key in keys:
+                    expires_at = ns.expiry(key)
+                    if expires_at is not None:
+                        self._schedule_expiry(name, key, expires_at)
+
+    def delete(self, key: str, namespace: Optional[str] = None) -> bool:
+        """
+        Удаляет значение по ключу. Возвращает True, если ключ был найден и удален;
+        истекший ключ удаляется, но считается уже отсутствовавшим.
+        """
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                return False
+            expired = bool(ns.expires or ns.expires_overlay) and ns.is_expired(key, time.time())
+            if not ns.delete(key):
+                return False
+            if self._policy is not None:
+                self._track_delete(namespace, key)
+            return not expired
+
+    def get_many(self, keys: List[str], namespace: Optional[str] = None) -> List[Any]:
+        """
+        Возвращает значения ключей в порядке keys за один проход без захвата замка;
+        для отсутствующих ключей - MISSING.
+        """
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            return [MISSING] * len(keys)
+        if ns.overlay is None:
+            get = ns.data.get
+            values = [get(key, MISSING) for key in keys]
+        else:
+            get = ns.get
+            values = [get(key) for key in keys]
+        if ns.expires or ns.expires_overlay:
+            now = time.time()
+            is_expired = ns.is_expired
+            values = [
+                MISSING if value is not MISSING and is_expired(key, now) else value
+                for key, value in zip(keys, values)
+            ]
+        if self._policy is not None:
+            self._track_access(namespace, keys, values)
+        return values
+
+    def contains(self, key: str, namespace: Optional[str] = None) -> bool:
+        """Есть ли ключ (истекший считается отсутствующим); политика вытеснения не учитывает проверку."""
+        ns = self._namespaces.get(namespace)
+        if ns is None or ns.get(key) is MISSING:
+            return False
+        return not ((ns.expires or ns.expires_overlay) and ns.is_expired(key, time.time()))
+
+    def get_all_data(self, namespace: Optional[str] = None) -> Dict[str, Any]:
+        """Возвращает все данные пространства имен без истекших ключей."""
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            return ns.materialize(time.time()) if ns is not None else {}
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        """
+        Возвращает число ключей в пространстве имен без истекших: за O(1),
+        если истекших, но еще не удаленных ключей нет (см. _count_expired).
+        """
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            return 0
+        return len(ns.index) - self._count_expired(namespace)
+
+    def namespaces(self) -> List[str]:
+        """Возвращает отсортированные имена непустых пространств имен (кроме общего)."""
+        with self._lock:
+            return sorted(name for name, ns in self._namespaces.items() if name is not None and len(ns.index))
+
+    def apply_batch(self, operations: Iterable[Dict[str, Any]]) -> int:
+        """
+        Применяет пакет операций set/delete за один захват замка.
+        Возвращает число ключей, удаленных операциями delete.
+        """
+        deleted = 0
+        tracking = self._policy is not None
+        with self._lock:
+            namespaces = self._namespaces
+            # Пакет обычно пишет в одно пространство имен: не ищем его заново для каждой операции
+            name, ns = None, namespaces[None]
+            for operation in operations:
+                namespace = operation.get('namespace')
+                if namespace != name:
+                    name, ns = namespace, namespaces.get(namespace)
+                if operation['type'] == 'set':
+                    if ns is None:
+                        ns = self._namespace_for_write(namespace)
+                    expires_at = operation.get('expires_at')
+                    ns.set(operation['key'], operation['value'], expires_at)
+                    if expires_at is not None:
+                        self._schedule_expiry(namespace, operation['key'], expires_at)
+                    if tracking:
+                        self._track_set(namespace, operation['key'], operation['value'])
+                elif ns is not None:
+                    key = operation['key']
+                    expired = bool(ns.expires or ns.expires_overlay) and ns.is_expired(key, time.time())
+                    if ns.delete(key):
+                        if tracking:
+                            self._track_delete(namespace, key)
+                        if not expired:
+                            deleted += 1
+        return deleted
+
+    def drop_namespace(self, namespace: Optional[str]) -> int:
+        """
+        Удаляет пространство имен целиком за одну операцию под замком.
+        Возвращает число удаленных ключей; истекшие, но еще не удаленные
+        ключи освобождаются, но, как и в delete, считаются уже отсутствовавшими.
+
+        Открытый снапшот продолжает ссылаться на замороженный словарь
+        удаленного пространства, поэтому в него попадает состояние до удаления.
+        """
+        with self._lock:
+            heap = self._expiry_heap
+            now = time.time()
+            # Истекшие ключи считаются, пока пространство еще доступно по имени
+            expired = self._count_expired_locked(namespace, now) if heap and heap[0][0] <= now else 0
+            if namespace is None:
+                ns = self._namespaces[None]
+                self._namespaces[None] = _Namespace()
+            else:
+                ns = self._namespaces.pop(namespace, None)
+            if ns is None:
+                return 0
+            if self._policy is not None:
+                for key in ns.index.irange():
+                    self._track_delete(namespace, key)
+            return len(ns.index) - expired
+
+    def count_prefix(self, prefix: str, namespace: Optional[str] = None) -> int:
+        """
+        Возвращает число ключей, начинающихся с prefix, без истекших.
+
+        Первый вызов для префикса считает ключи по индексу за O(log n + k)
+        и начинает отслеживать префикс; дальше счетчик обновляется при
+        каждом изменении, и подсчет стоит O(1) (плюс вычитание истекших, но
+        еще не удаленных ключей, см. _count_expired).
+        """
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            return 0
+        count = ns.prefix_counts.get(prefix)
+        if count is None:
+            with self._lock:
+                count = ns.track_prefix(prefix)
+        return count - self._count_expired(namespace, prefix)
+
+    def load_data(self, data: Dict[str, Any], namespaces: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """
+        Загружает все данные в хранилище: общее пространство и остальные пространства имен
+        (включая служебные пространства с временами истечения, см. expires_namespace).
+        """
+        loaded = {None: data.copy()}
+        for name, ns_data in (namespaces or {}).items():
+            loaded[name] = ns_data.copy()
+        self._replace_namespaces(loaded)
+
+    def _replace_namespaces(self, loaded: Dict[Optional[str], Dict[str, Any]]) -> None:
+        """Заменяет все данные загруженными словарями и перестраивает кучу истечений."""
+        expires = _split_expires(loaded)
+        namespaces = {name: _Namespace(data) for name, data in loaded.items()}
+        for name, ns_expires in expires.items():
+            ns = namespaces.get(name)
+            if ns is not None:
+                # Истечения ключей, которых нет в данных, не нужны
+                ns.expires = {key: at for key, at in ns_expires.items() if key in ns.data}
+        with self._lock:
+            # Открытый снапшот продолжает ссылаться на прежние словари
+            self._namespaces = namespaces
+            self._rebuild_expiry_heap()
+            if self._policy is not None:
+                self._rebuild_tracking()
+
+    def load_items(self, items: Iterable[Tuple[str, Any]]) -> int:
+        """
+        Заменяет данные парами из итератора без промежуточного словаря и копии.
+        Если итератор завершится ошибкой, прежние данные не меняются.
+        """
+        return self.load_namespaces([(None, items)])
+
+    def load_namespaces(self, parts: Iterable[Tuple[Optional[str], Iterable[Tuple[str, Any]]]]) -> int:
+        """
+        Заменяет все данные частями вида (пространство имен, пары ключ/значение).
+        Пары одного пространства могут идти несколькими частями. Возвращает
+        общее число загруженных пар; при ошибке прежние данные не меняются.
+        """
+        loaded: Dict[Optional[str], Dict[str, Any]] = {None: {}}
+        for name, items in parts:
+            target = loaded.get(name)
+            if target is None:
+                target = loaded[name] = {}
+            target.update(items)
+        self._replace_namespaces(loaded)
+        return sum(len(data) for data in loaded.values())
+
+    def scan_prefix(self, prefix: str, namespace: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """Возвращает по возрастанию ключей пары, ключ которых начинается с prefix."""
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            keys = list(ns.index.iter_prefix(prefix)) if ns is not None else []
+        return self._iter_values(ns, keys)
+
+    def range(
+        self, start: Optional[str] = None, end: Optional[str] = None, namespace: Optional[str] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """Возвращает по возрастанию ключей пары с ключами из полуинтервала [start, end)."""
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            keys = list(ns.index.irange(start, end)) if ns is not None else []
+        return self._iter_values(ns, keys)
+
+    @staticmethod
+    def _iter_values(ns: Optional[_Namespace], keys: List[str]) -> Iterator[Tuple[str, Any]]:
+        """
+        Возвращает значения ключей, собранных из индекса; удаленные с тех пор
+        и истекшие ключи пропускаются.
+        """
+        now = time.time()
+        for key in keys:
+            value = ns.get(key)
+            if value is not MISSING and not ((ns.expires or ns.expires_overlay) and ns.is_expired(key, now)):
+                yield key, value
+
+    def over_budget(self) -> bool:
+        """Превышает ли хранилище бюджет max_keys или max_memory; O(1)."""
+        policy = self._policy
+        if policy is None:
+            return False
+        return (
+            (self.max_keys is not None and len(policy) > self.max_keys)
+            or (self.max_memory is not None and self._memory > self.max_memory)
+        )
+
+    def select_evictions(self) -> Dict[Optional[str], List[str]]:
+        """
+        Возвращает по пространствам имен ключи, которые политика вытеснения
+        предлагает удалить, чтобы хранилище вернулось в бюджет. Ключи не
+        удаляются и продолжают учитываться до вызова evict.
+        """
+        victims: Dict[Optional[str], List[str]] = {}
+        if self._policy is None:
+            return victims
+        with self._lock:
+            excess_keys = len(self._policy) - self.max_keys if self.max_keys is not None else 0
+            excess_memory = self._memory - self.max_memory if self.max_memory is not None else 0
+            sizes = self._sizes
+            for item in self._policy.candidates():
+                if excess_keys <= 0 and excess_memory <= 0:
+                    break
+                victims.setdefault(item[0], []).append(item[1])
+                excess_keys -= 1
+                if sizes is not None:
+                    excess_memory -= sizes.get(item, 0)
+        return victims
+
+    def evict(self, keys: List[str], namespace: Optional[str] = None) -> int:
+        """Удаляет вытесняемые ключи и учитывает их в счетчиках вытеснения. Возвращает число удаленных."""
+        removed = 0
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                return 0
+            tracking = self._policy is not None
+            for key in keys:
+                if ns.delete(key):
+                    removed += 1
+                    if tracking:
+                        self.evicted_bytes += self._track_delete(namespace, key)
+            self.evicted_keys += removed
+        return removed
+
+    def eviction_stats(self) -> Dict[str, Any]:
+        """
+        Бюджет и счетчики вытеснения: политика, лимиты, текущее число ключей,
+        оценочный объем (None без max_memory), число и объем вытесненных ключей.
+        """
+        with self._lock:
+            keys = sum(len(ns.index) for ns in self._namespaces.values())
+            return {
+                'policy': self.eviction_policy if self._policy is not None else None,
+                'max_keys': self.max_keys,
+                'max_memory': self.max_memory,
+                'keys': keys,
+                'memory': self._memory if self._sizes is not None else None,
+                'evicted_keys': self.evicted_keys,
+                'evicted_bytes': self.evicted_bytes,
+            }
+
+    def begin_snapshot(self) -> Dict[str, Any]:
+        """
+        Замораживает текущее состояние и возвращает общее пространство имен без копирования.
+
+        Остальные замороженные пространства возвращает snapshot_namespaces().
+        Возвращенные словари не меняются до вызова end_snapshot(): все
+        изменения до этого момента накапливаются в оверлеях.
+        """
+        with self._lock:
+            if self._frozen is not None:
+                raise RuntimeError("Снапшот уже открыт")
+            frozen = {}
+            frozen_expires = {}
+            for name, ns in self._namespaces.items():
+                ns.overlay = {}
+                ns.expires_overlay = {}
+                frozen[name] = ns.data
+                frozen_expires[name] = ns.expires
+            self._frozen = frozen
+            self._frozen_expires = frozen_expires
+            return frozen[None]
 
-    def load_data(self, data: Dict[str, Any]) -> None:
-        """Загружает все данные в хранилище."""
-        self._data = data.copy()
+    def snapshot_namespaces(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Возвращает непустые пространства имен (кроме общего), замороженные открытым
+        снапшотом, и служебные пространства с временами истечения ключей.
+        """
+        frozen = self._frozen
+        if frozen is None:
+            raise RuntimeError("Снапшот не открыт")
+        namespaces = {name: data for name, data in frozen.items() if name is not None and data}
+        for name, expires in self._frozen_expires.items():
+            if expires:
+                namespaces[expires_namespace(name)] = expires
+        return namespaces
 
+    def end_snapshot(self) -> None:
+        """Закрывает снапшот и переносит накопленные изменения в основные словари."""
+        with self._lock:
+            if self._frozen is None:
+                return
+            for ns in self._namespaces.values():
+                ns.merge_overlay()
+            self._frozen = None
+            self._frozen_expires = None
@@ -0,0 +1,84 @@
+import logging
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+
+class TraceEvent(NamedTuple):
+    """Структурированная запись об одной операции KVDB."""
+    # Операция: "set", "get", "delete", "get_many", "batch" или "drop"
+    op: str
+    # Пространство имен (None - общее пространство)
+    namespace: Optional[str]
+    # Ключ операции над одним ключом; None для пакетных операций
+    key: Optional[str]
+    # Число ключей, затронутых операцией
+    count: int
+    # Длительность операции в секундах, включая запись в WAL
+    duration: float
+
+
+class OpTracer:
+    """
+    Трассировщик операций KVDB: получает TraceEvent после каждой операции.
+
+    Трассировка необязательна: если трассировщик не задан, KVDB не измеряет
+    время и не создает события. Значения не передаются в события, чтобы
+    трассировка не форматировала и не удерживала большие объекты.
+    """
+
+    def record(self, event: TraceEvent) -> None:
+        """Обрабатывает событие операции."""
+        pass
+
+
+class RecordingTracer(OpTracer):
+    """Хранит последние события в памяти и считает суммарную статистику по операциям."""
+
+    def __init__(self, maxlen: Optional[int] = 10000):
+        """
+        Args:
+            maxlen: Сколько последних событий хранить (None - без ограничения)
+        """
+        self.events: Deque[TraceEvent] = deque(maxlen=maxlen)
+        # Операция -> (число вызовов, суммарная длительность в секундах)
+        self._stats: Dict[str, Tuple[int, float]] = {}
+
+    def record(self, event: TraceEvent) -> None:
+        self.events.append(event)
+        calls, total = self._stats.get(event.op, (0, 0.0))
+        self._stats[event.op] = (calls + 1, total + event.duration)
+
+    def stats(self) -> Dict[str, Tuple[int, float]]:
+        """Возвращает для каждой операции число вызовов и суммарную длительность."""
+        return dict(self._stats)
+
+    def clear(self) -> None:
+        """Сбрасывает события и статистику."""
+        self.events.clear()
+        self._stats = {}
+
+
+class LoggingTracer(OpTracer):
+    """Пишет события операций в лог одной строкой с ленивым %-форматированием."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.DEBUG):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.level = level
+
+    def record(self, event: TraceEvent) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(
+                self.level, "%s namespace=%r key=%r count=%d %.1f мкс",
+                event.op, event.namespace, event.key, event.count, event.duration * 1e6
+            )
+
+
+class MultiTracer(OpTracer):
+    """Передает события нескольким трассировщикам."""
+
+    def __init__(self, tracers: List[OpTracer]):
+        self.tracers = list(tracers)
+
+    def record(self, event: TraceEvent) -> None:
+        for tracer in self.tracers:
+            tracer.record(event)
@@ -1,55 +1,892 @@
+import functools
+import io
 import json
+import logging
 import os
-from typing import Any, List, Dict
-from app.core.interfaces import IWriteAheadLog
+import pickle
+import queue
+import shutil
+import struct
+import threading
+import time
+import zlib
+from enum import Enum
+from typing import Any, BinaryIO, Callable, Iterator, List, Dict, Optional, Tuple, Union
+from app.core.compression import (
+    open_read, detect_compression, validate_compression, wrap_writer, COMPRESSION_NONE
+)
+from app.core.interfaces import IWriteAheadLog, _no_wait
+
+logger = logging.getLogger(__name__)
+
+# Форматы записей журнала
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+RECORD_FORMATS = (FORMAT_JSON, FORMAT_BINARY)
+
+# Бинарный формат: файл начинается с сигнатуры, за ней идут записи вида
+# [crc32: u32][op: u8][key_len: u32][value_len: u32][key][value].
+# CRC32 считается по всем байтам записи после самого поля crc32.
+BINARY_MAGIC = b"KVDBWAL1"
+_RECORD_HEADER = struct.Struct("<IBII")
+_CRC_FIELD_SIZE = 4
+
+# Коды операций бинарного формата
+OP_OTHER = 0      # произвольная операция: value - pickle всего словаря операции
+OP_SET = 1        # key - ключ в UTF-8, value - pickle значения
+OP_DELETE = 2     # key - ключ в UTF-8, value пустое
+OP_NS_SET = 3     # key - [длина имени: u32][пространство имен][ключ] в UTF-8, value - pickle значения
+OP_NS_DELETE = 4  # key - как у OP_NS_SET, value пустое
+OP_SET_TTL = 5    # key - как у OP_SET, value - [время истечения: f64][pickle значения]
+OP_NS_SET_TTL = 6  # key - как у OP_NS_SET, value - как у OP_SET_TTL
+OP_EXPIRE = 7     # key пустой, value - истекшие ключи [длина: u32][ключ в UTF-8]...
+OP_NS_EXPIRE = 8  # key - пространство имен в UTF-8, value - как у OP_EXPIRE
+OP_EVICT = 9      # key и value - как у OP_EXPIRE, для вытесненных ключей
+OP_NS_EVICT = 10  # key и value - как у OP_NS_EXPIRE, для вытесненных ключей
+
+_NAMESPACE_LEN = struct.Struct("<I")
+_EXPIRES_AT = struct.Struct("<d")
+
+
+def _encode_namespaced_key(namespace: str, key: str) -> bytes:
+    name_bytes = namespace.encode('utf-8')
+    return _NAMESPACE_LEN.pack(len(name_bytes)) + name_bytes + key.encode('utf-8')
+
+
+def _decode_namespaced_key(key_bytes: bytes) -> Tuple[str, str]:
+    name_len = _NAMESPACE_LEN.unpack_from(key_bytes)[0]
+    name_end = _NAMESPACE_LEN.size + name_len
+    if name_end > len(key_bytes):
+        raise ValueError("длина пространства имен выходит за пределы ключа")
+    return key_bytes[_NAMESPACE_LEN.size:name_end].decode('utf-8'), key_bytes[name_end:].decode('utf-8')
+
+
+def _encode_keys(keys: List[str]) -> bytes:
+    parts = []
+    for key in keys:
+        key_bytes = key.encode('utf-8')
+        parts.append(_NAMESPACE_LEN.pack(len(key_bytes)))
+        parts.append(key_bytes)
+    return b''.join(parts)
+
+
+def _decode_keys(value_bytes: bytes) -> List[str]:
+    keys = []
+    offset = 0
+    while offset < len(value_bytes):
+        key_len = _NAMESPACE_LEN.unpack_from(value_bytes, offset)[0]
+        offset += _NAMESPACE_LEN.size
+        if offset + key_len > len(value_bytes):
+            raise ValueError("длина ключа выходит за пределы записи")
+        keys.append(value_bytes[offset:offset + key_len].decode('utf-8'))
+        offset += key_len
+    return keys
+
+
+def encode_binary_record(operation: Dict[str, Any]) -> bytes:
+    """Кодирует операцию в бинарную запись с контрольной суммой."""
+    op_type = operation.get('type')
+    key = operation.get('key')
+    namespace = operation.get('namespace')
+    # Необязательное поле namespace не учитывается при проверке числа полей
+    fields = len(operation) - ('namespace' in operation)
+    if namespace is not None and not isinstance(namespace, str):
+        op_type = None
+    elif op_type in ('expire', 'evict'):
+        keys = operation.get('keys')
+        if fields != 2 or not isinstance(keys, list) or not all(isinstance(k, str) for k in keys):
+            op_type = None
+    elif not isinstance(key, str):
+        op_type = None
+    expires_at = operation.get('expires_at')
+    if op_type == 'set' and fields == 3 and 'value' in operation:
+        if namespace is None:
+            op, key_bytes = OP_SET, key.encode('utf-8')
+        else:
+            op, key_bytes = OP_NS_SET, _encode_namespaced_key(namespace, key)
+        value_bytes = pickle.dumps(operation['value'], protocol=pickle.HIGHEST_PROTOCOL)
+    elif op_type == 'set' and fields == 4 and 'value' in operation and isinstance(expires_at, (int, float)):
+        if namespace is None:
+            op, key_bytes = OP_SET_TTL, key.encode('utf-8')
+        else:
+            op, key_bytes = OP_NS_SET_TTL, _encode_namespaced_key(namespace, key)
+        value_bytes = _EXPIRES_AT.pack(expires_at) + pickle.dumps(operation['value'], protocol=pickle.HIGHEST_PROTOCOL)
+    elif op_type in ('expire', 'evict'):
+        if namespace is None:
+            op, key_bytes = (OP_EXPIRE if op_type == 'expire' else OP_EVICT), b''
+        else:
+            op, key_bytes = (OP_NS_EXPIRE if op_type == 'expire' else OP_NS_EVICT), namespace.encode('utf-8')
+        value_bytes = _encode_keys(operation['keys'])
+    elif op_type == 'delete' and fields == 2:
+        if namespace is None:
+            op, key_bytes = OP_DELETE, key.encode('utf-8')
+        else:
+            op, key_bytes = OP_NS_DELETE, _encode_namespaced_key(namespace, key)
+        value_bytes = b''
+    else:
+        op, key_bytes = OP_OTHER, b''
+        value_bytes = pickle.dumps(operation, protocol=pickle.HIGHEST_PROTOCOL)
+
+    header_tail = _RECORD_HEADER.pack(0, op, len(key_bytes), len(value_bytes))[_CRC_FIELD_SIZE:]
+    crc = zlib.crc32(value_bytes, zlib.crc32(key_bytes, zlib.crc32(header_tail)))
+    return b''.join((struct.pack("<I", crc), header_tail, key_bytes, value_bytes))
+
+
+def _decode_binary_payload(op: int, key_bytes: bytes, value_bytes: bytes) -> Dict[str, Any]:
+    """Восстанавливает словарь операции из полей бинарной записи."""
+    if op == OP_SET:
+        return {'type': 'set', 'key': key_bytes.decode('utf-8'), 'value': pickle.loads(value_bytes)}
+    if op == OP_DELETE:
+        return {'type': 'delete', 'key': key_bytes.decode('utf-8')}
+    if op == OP_NS_SET:
+        namespace, key = _decode_namespaced_key(key_bytes)
+        return {'type': 'set', 'key': key, 'value': pickle.loads(value_bytes), 'namespace': namespace}
+    if op == OP_NS_DELETE:
+        namespace, key = _decode_namespaced_key(key_bytes)
+        return {'type': 'delete', 'key': key, 'namespace': namespace}
+    if op in (OP_SET_TTL, OP_NS_SET_TTL):
+        expires_at = _EXPIRES_AT.unpack_from(value_bytes)[0]
+        value = pickle.loads(value_bytes[_EXPIRES_AT.size:])
+        if op == OP_SET_TTL:
+            return {'type': 'set', 'key': key_bytes.decode('utf-8'), 'value': value, 'expires_at': expires_at}
+        namespace, key = _decode_namespaced_key(key_bytes)
+        return {'type': 'set', 'key': key, 'value': value, 'expires_at': expires_at, 'namespace': namespace}
+    if op == OP_EXPIRE:
+        return {'type': 'expire', 'keys': _decode_keys(value_bytes)}
+    if op == OP_NS_EXPIRE:
+        return {'type': 'expire', 'keys': _decode_keys(value_bytes), 'namespace': key_bytes.decode('utf-8')}
+    if op == OP_EVICT:
+        return {'type': 'evict', 'keys': _decode_keys(value_bytes)}
+    if op == OP_NS_EVICT:
+        return {'type': 'evict', 'keys': _decode_keys(value_bytes), 'namespace': key_bytes.decode('utf-8')}
+    if op == OP_OTHER:
+        return pickle.loads(value_bytes)
+    raise ValueError(f"неизвестный код операции {op}")
+
+
+def iter_binary_records(f: BinaryIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Читает бинарные записи из файла, позиционированного после сигнатуры.
+
+    Возвращает пары (смещение конца записи, операция). Чтение прекращается на
+    первой неполной или поврежденной записи: все, что после нее, считается
+    недописанным хвостом.
+    """
+    header_size = _RECORD_HEADER.size
+    offset = f.tell()
+    while True:
+        header = f.read(header_size)
+        if not header:
+            return
+        if len(header) < header_size:
+            logger.warning(f"WAL: неполный заголовок записи на смещении {offset}, остаток журнала пропущен")
+            return
+        crc, op, key_len, value_len = _RECORD_HEADER.unpack(header)
+        body = f.read(key_len + value_len)
+        if len(body) < key_len + value_len:
+            logger.warning(f"WAL: неполная запись на смещении {offset}, остаток журнала пропущен")
+            return
+        if zlib.crc32(body, zlib.crc32(header[_CRC_FIELD_SIZE:])) != crc:
+            logger.warning(f"WAL: неверная контрольная сумма на смещении {offset}, остаток журнала пропущен")
+            return
+        try:
+            operation = _decode_binary_payload(op, body[:key_len], body[key_len:])
+        except Exception as e:
+            logger.warning(f"WAL: не удалось декодировать запись на смещении {offset} ({e}), остаток журнала пропущен")
+            return
+        offset += header_size + key_len + value_len
+        yield offset, operation
+
+
+def detect_record_format(file_path: str) -> Optional[str]:
+    """
+    Определяет формат существующего (возможно, сжатого) журнала по сигнатуре.
+    Для пустого файла возвращает None.
+    """
+    try:
+        with open_read(file_path) as f:
+            head = f.read(len(BINARY_MAGIC))
+    except FileNotFoundError:
+        return None
+    if not head:
+        return None
+    return FORMAT_BINARY if head == BINARY_MAGIC else FORMAT_JSON
+
+
+def iter_log_file(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Читает операции из одного (возможно, сжатого) файла журнала, не открывая журнал на запись.
+
+    Возвращает (через StopIteration.value) None, если файл прочитан до конца,
+    или смещение конца последней корректной записи, если чтение бинарного
+    файла остановилось на поврежденной записи.
+    """
+    try:
+        record_format = detect_record_format(path)
+    except Exception as e:
+        raise IOError(f"Ошибка чтения WAL: {e}")
+
+    if record_format == FORMAT_BINARY:
+        valid_end = len(BINARY_MAGIC)
+        try:
+            with open_read(path) as f:
+                f.read(valid_end)
+                for valid_end, operation in iter_binary_records(f):
+                    yield operation
+                # Размер считаем по распакованным данным: закрытые сегменты могут быть сжаты
+                while f.read(1024 * 1024):
+                    pass
+                file_size = f.tell()
+        except Exception as e:
+            raise IOError(f"Ошибка чтения WAL: {e}")
+        return None if valid_end >= file_size else valid_end
+
+    try:
+        with io.TextIOWrapper(open_read(path), encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:  # Пропускаем пустые строки
+                    yield json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Ошибка декодирования WAL: {e}")
+    except Exception as e:
+        raise IOError(f"Ошибка чтения WAL: {e}")
+    return None
+
+
+class Durability(str, Enum):
+    """
+    Уровни durability журнала: компромисс между задержкой записи и сохранностью данных.
+    """
+
+    # Запись остается в буфере процесса и сбрасывается в ОС при его заполнении
+    NONE = "none"
+    # Сброс в ОС после каждой операции: переживает падение процесса, но не ОС
+    FLUSH = "flush"
+    # fsync после каждой операции: переживает падение ОС и отключение питания
+    FSYNC = "fsync"
+    # Сброс в ОС после каждой операции и фоновый fsync раз в fsync_interval секунд
+    INTERVAL = "interval"
 
 
 class FileWal(IWriteAheadLog):
     """
     Write-Ahead Log (WAL) для журналирования операций перед их выполнением.
+
+    Файл журнала открывается один раз и остается открытым на дозапись.
+    В режиме group commit записи конкурентных писателей собираются в пакет,
+    который сбрасывается на диск одним write и одним fsync; каждый вызов
+    log() возвращается только после того, как его пакет стал durable.
+
+    Уровень durability определяет, что происходит после каждой записи
+    (или каждого пакета в режиме group commit), см. Durability.
+
+    Записи хранятся либо строками JSON (по умолчанию), либо в компактном
+    бинарном формате с длинами и CRC32. При чтении бинарного журнала replay
+    останавливается на первой поврежденной записи и отрезает недописанный хвост.
     """
 
-    def __init__(self, file_path: str = "data/wal.log"):
+    def __init__(
+        self,
+        file_path: str = "data/wal.log",
+        group_commit: bool = False,
+        flush_interval: float = 0.0,
+        max_batch_size: int = 1000,
+        durability: Optional[Union[Durability, str]] = None,
+        fsync_interval: float = 1.0,
+        record_format: str = FORMAT_JSON
+    ):
+        """
+        Args:
+            file_path: Путь к файлу журнала
+            group_commit: Включает групповую фиксацию записей
+            flush_interval: Сколько секунд пакет ждет новых записей перед сбросом.
+                При 0 в пакет попадает все, что накопилось за время предыдущего fsync
+            max_batch_size: Максимальное число записей в одном пакете
+            durability: Уровень durability. По умолчанию FSYNC в режиме group commit
+                и FLUSH в остальных случаях
+            fsync_interval: Период фонового fsync для Durability.INTERVAL, в секундах
+            record_format: Формат записей: "json" или "binary"
+        """
+        if flush_interval < 0:
+            raise ValueError("flush_interval не может быть отрицательным")
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size должен быть положительным")
+        if fsync_interval <= 0:
+            raise ValueError("fsync_interval должен быть положительным")
+        if record_format not in RECORD_FORMATS:
+            raise ValueError(f"Неизвестный формат WAL: {record_format!r} (допустимые: {', '.join(RECORD_FORMATS)})")
+
         self.file_path = file_path
+        self.group_commit = group_commit
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.fsync_interval = fsync_interval
+        self.record_format = record_format
+        self._encode = encode_binary_record if record_format == FORMAT_BINARY else self._encode_json
+        # Защищает файловый дескриптор от одновременных write/truncate/close
+        self._io_lock = threading.Lock()
+        # Открываем (и при необходимости создаем) файл один раз на все время работы
+        self._file: Optional[BinaryIO] = None
+        self._file = self._open_log()
+        # Есть ли данные, записанные после последнего fsync
+        self._dirty = False
+
+        # Состояние фонового fsync (Durability.INTERVAL)
+        self._syncer: Optional[threading.Thread] = None
+        self._syncer_stop = threading.Event()
+        self._durability = Durability.FLUSH
+        self.set_durability(durability if durability is not None else
+                            (Durability.FSYNC if group_commit else Durability.FLUSH))
+
+        # Состояние group commit
+        self._cond = threading.Condition()
+        self._pending: List[bytes] = []
+        self._next_seq = 1
+        self._committed_seq = 0
+        self._error: Optional[Exception] = None
+        self._closed = False
+        self._committer: Optional[threading.Thread] = None
+        if self.group_commit:
+            self._committer = threading.Thread(
+                target=self._commit_loop, name="wal-group-commit", daemon=True
+            )
+            self._committer.start()
+
+    @property
+    def durability(self) -> Durability:
+        """Текущий уровень durability."""
+        return self._durability
+
+    def set_durability(self, durability: Union[Durability, str]) -> None:
+        """Меняет уровень durability; при необходимости запускает или останавливает фоновый fsync."""
+        try:
+            durability = Durability(durability)
+        except ValueError:
+            levels = ", ".join(level.value for level in Durability)
+            raise ValueError(f"Неизвестный уровень durability: {durability!r} (допустимые: {levels})")
+
+        with self._io_lock:
+            self._durability = durability
+            if durability is not Durability.NONE:
+                # Не оставляем в буфере записи, сделанные на предыдущем уровне
+                self._file.flush()
+        if durability is Durability.INTERVAL:
+            if self._syncer is None:
+                self._syncer_stop.clear()
+                self._syncer = threading.Thread(target=self._sync_loop, name="wal-fsync", daemon=True)
+                self._syncer.start()
+        else:
+            self._stop_syncer()
+
+    def _stop_syncer(self) -> None:
+        """Останавливает поток фонового fsync, если он запущен."""
+        if self._syncer is not None:
+            self._syncer_stop.set()
+            self._syncer.join()
+            self._syncer = None
+
+    def _sync_loop(self) -> None:
+        """Фоновый поток: раз в fsync_interval сбрасывает журнал на диск."""
+        while not self._syncer_stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except IOError:
+                # Ошибка проявится на следующей записи или при закрытии журнала
+                pass
+
+    def _persist(self) -> None:
+        """Доводит записанные данные до уровня durability. Вызывается под _io_lock."""
+        durability = self._durability
+        if durability is Durability.NONE:
+            self._dirty = True
+            return
+        self._file.flush()
+        if durability is Durability.FSYNC:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        else:
+            self._dirty = True
+
+    def sync(self) -> None:
+        """Принудительно сбрасывает журнал на диск (flush + fsync)."""
+        try:
+            with self._io_lock:
+                if self._dirty and not self._file.closed:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._dirty = False
+        except Exception as e:
+            raise IOError(f"Ошибка синхронизации WAL: {e}")
+
+    def _open_file(self, path: str) -> BinaryIO:
+        """Открывает файл журнала на дозапись, проверяя формат уже записанных в него данных."""
         # Создаем директорию, если она не существует
-        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-        # Создаем файл, если он не существует
-        if not os.path.exists(self.file_path):
-            open(self.file_path, 'w').close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        existing_format = detect_record_format(path)
+        if existing_format is not None and existing_format != self.record_format:
+            raise ValueError(
+                f"Журнал {path} записан в формате {existing_format}, а не {self.record_format}"
+            )
+        f = open(path, 'ab')
+        if self.record_format == FORMAT_BINARY and existing_format is None:
+            f.write(BINARY_MAGIC)
+            f.flush()
+        return f
+
+    def _open_log(self) -> BinaryIO:
+        """Открывает файл, в который будут дописываться новые записи."""
+        return self._open_file(self.file_path)
+
+    def _on_written(self, records: int, size: int) -> None:
+        """Вызывается под _io_lock после записи records записей общим размером size байт."""
+        pass
+
+    def _write_header(self) -> None:
+        """Записывает сигнатуру бинарного формата в начало пустого журнала."""
+        self._file.write(BINARY_MAGIC)
+        self._file.flush()
+
+    @staticmethod
+    def _encode_json(operation: Dict[str, Any]) -> bytes:
+        """Сериализует операцию в строку журнала."""
+        return (json.dumps(operation, ensure_ascii=False) + '\n').encode('utf-8')
 
     def log(self, operation: Dict[str, Any]) -> None:
         """Логирует одну операцию в журнал."""
         try:
-            with open(self.file_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(operation, ensure_ascii=False) + '\n')
+            record = self._encode(operation)
+        except Exception as e:
+            raise IOError(f"Ошибка записи в WAL: {e}")
+
+        if self.group_commit:
+            self._log_grouped(record)
+            return
+
+        try:
+            with self._io_lock:
+                self._file.write(record)
+                self._persist()
+                self._on_written(1, len(record))
         except Exception as e:
             raise IOError(f"Ошибка записи в WAL: {e}")
 
+    def log_deferred(self, operation: Dict[str, Any]) -> Callable[[], None]:
+        """
+        Ставит операцию в журнал и возвращает функцию ожидания ее фиксации.
+
+        В режиме group commit запись только встает в очередь пакета (порядок
+        записей совпадает с порядком вызовов), а ждет фиксации возвращенная
+        функция. Без group commit запись выполняется сразу, как в log().
+        """
+        if not self.group_commit:
+            self.log(operation)
+            return _no_wait
+        try:
+            record = self._encode(operation)
+        except Exception as e:
+            raise IOError(f"Ошибка записи в WAL: {e}")
+        return functools.partial(self._wait_committed, self._enqueue(record))
+
+    def _log_grouped(self, record: bytes) -> None:
+        """Ставит запись в текущий пакет и ждет, пока пакет будет записан на диск."""
+        self._wait_committed(self._enqueue(record))
+
+    def _enqueue(self, record: bytes) -> int:
+        """Ставит запись в текущий пакет и возвращает ее порядковый номер."""
+        with self._cond:
+            if self._closed:
+                raise IOError("Ошибка записи в WAL: журнал закрыт")
+            if self._error is not None:
+                raise IOError(f"Ошибка записи в WAL: {self._error}")
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending.append(record)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._cond.notify_all()
+            return seq
+
+    def _wait_committed(self, seq: int) -> None:
+        """Ждет, пока запись с порядковым номером seq будет записана на диск."""
+        with self._cond:
+            while self._committed_seq < seq and self._error is None:
+                self._cond.wait()
+            if self._committed_seq < seq:
+                raise IOError(f"Ошибка записи в WAL: {self._error}")
+
+    def _commit_loop(self) -> None:
+        """Фоновый поток: собирает пакеты записей и фиксирует их одним write (+ fsync)."""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Даем пакету наполниться, но не дольше flush_interval
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+                last_seq = self._committed_seq + len(batch)
+
+            error = None
+            try:
+                data = b''.join(batch)
+                with self._io_lock:
+                    self._file.write(data)
+                    self._persist()
+                    self._on_written(len(batch), len(data))
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                if error is not None:
+                    # После сбоя записи журнал считается неработоспособным
+                    self._error = error
+                    self._pending.clear()
+                else:
+                    self._committed_seq = last_seq
+                self._cond.notify_all()
+                if error is not None:
+                    return
+
     def replay(self) -> List[Dict[str, Any]]:
         """Читает и возвращает все операции из журнала."""
-        operations = []
-        
+        return list(self.iter_replay())
+
+    def iter_replay(self, after_lsn: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Последовательно читает операции из журнала.
+
+        Журнал читается потоково: в памяти одновременно находится только
+        текущая запись, поэтому объем журнала не влияет на пиковое потребление памяти.
+        FileWal не нумерует записи, поэтому after_lsn игнорируется.
+        """
         if not os.path.exists(self.file_path):
-            return operations
-        
+            return
+        self._flush_buffer()
+        yield from self._iter_file(self.file_path)
+
+    def _flush_buffer(self) -> None:
+        """Сбрасывает в ОС записи, оставшиеся в буфере процесса, чтобы их увидел replay."""
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:  # Пропускаем пустые строки
-                        operations.append(json.loads(line))
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Ошибка декодирования WAL: {e}")
+            with self._io_lock:
+                if not self._file.closed:
+                    self._file.flush()
         except Exception as e:
             raise IOError(f"Ошибка чтения WAL: {e}")
-        
-        return operations
 
-    def compact(self) -> None:
-        """Очищает журнал."""
+    def _iter_file(self, path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Читает операции из одного файла журнала; поврежденный хвост активного файла отрезается.
+
+        Возвращает (через StopIteration.value) True, если файл прочитан до конца,
+        и False, если чтение остановилось на поврежденной записи.
+        """
+        valid_end = yield from iter_log_file(path)
+        if valid_end is None:
+            return True
+        # Смещения сжатого сегмента относятся к распакованным данным, его не обрезаем
+        if path == self.file_path and detect_compression(path) == COMPRESSION_NONE:
+            self._truncate_tail(path, valid_end)
+        return False
+
+    def _truncate_tail(self, path: str, valid_end: int) -> None:
+        """Обрезает журнал по концу последней корректной записи, чтобы новые записи не попали за мусор."""
         try:
-            with open(self.file_path, 'w') as f:
-                pass  # Просто перезаписываем файл пустым содержимым
+            with self._io_lock:
+                if self._file is not None and not self._file.closed:
+                    self._file.flush()
+                # Файл открыт с O_APPEND, поэтому следующие записи пойдут в новый конец файла
+                os.truncate(path, valid_end)
+        except Exception as e:
+            raise IOError(f"Ошибка чтения WAL: {e}")
+        logger.warning(f"WAL {path}: поврежденный хвост обрезан до {valid_end} байт")
+
+    def compact(self, upto_lsn: Optional[int] = None) -> None:
+        """Очищает журнал. FileWal не нумерует записи, поэтому журнал очищается целиком."""
+        try:
+            with self._io_lock:
+                self._file.flush()
+                self._file.truncate(0)
+                if self.record_format == FORMAT_BINARY:
+                    self._write_header()
+                self._dirty = False
         except Exception as e:
             raise IOError(f"Ошибка очистки WAL: {e}")
 
+    def close(self) -> None:
+        """Дожидается записи ожидающих пакетов и закрывает файл журнала."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._committer is not None:
+            self._committer.join()
+        self._stop_syncer()
+        try:
+            with self._io_lock:
+                self._file.flush()
+                if self._dirty and self._durability is not Durability.NONE:
+                    os.fsync(self._file.fileno())
+                    self._dirty = False
+                self._file.close()
+        except Exception as e:
+            raise IOError(f"Ошибка закрытия WAL: {e}")
+
+
+SEGMENT_SUFFIX = ".wal"
+# Суффикс временного файла, в который сжимается закрытый сегмент
+COMPRESS_TMP_SUFFIX = ".tmp"
+
+
+class SegmentedWal(FileWal):
+    """
+    Сегментированный WAL: журнал хранится в каталоге в виде пронумерованных файлов-сегментов.
+
+    Каждой записи присваивается LSN (log sequence number) - ее порядковый
+    номер в журнале, начиная с 1. Имя сегмента - LSN его первой записи.
+    Активный сегмент закрывается и заменяется новым, когда его размер
+    достигает max_segment_bytes или число записей - max_segment_records.
+    Закрытые сегменты не изменяются, поэтому их можно архивировать.
+
+    Сжатие журнала после снапшота сводится к удалению целых сегментов,
+    все записи которых вошли в снапшот, без перезаписи файлов.
+
+    Закрытые сегменты можно сжимать кодеком стандартной библиотеки (zlib,
+    lzma): это делает фоновый поток, а активный сегмент, в который идет
+    дозапись, остается несжатым. Сжатые сегменты распознаются при чтении
+    по сигнатуре.
+    """
+
+    def __init__(
+        self,
+        dir_path: str = "data/wal",
+        max_segment_bytes: Optional[int] = 64 * 1024 * 1024,
+        max_segment_records: Optional[int] = None,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None,
+        **kwargs: Any
+    ):
+        """
+        Args:
+            dir_path: Каталог с сегментами журнала
+            max_segment_bytes: Размер сегмента, после которого начинается новый (None - без ограничения)
+            max_segment_records: Число записей в сегменте, после которого начинается новый
+                (None - без ограничения)
+            compression: Кодек сжатия закрытых сегментов: "none" (по умолчанию), "zlib" или "lzma"
+            compression_level: Уровень сжатия; по умолчанию 6 для zlib и 1 для lzma
+            **kwargs: Параметры FileWal (group_commit, durability, record_format и т.д.)
+        """
+        if max_segment_bytes is not None and max_segment_bytes < 1:
+            raise ValueError("max_segment_bytes должен быть положительным")
+        if max_segment_records is not None and max_segment_records < 1:
+            raise ValueError("max_segment_records должен быть положительным")
+        self.dir_path = dir_path
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_records = max_segment_records
+        self.compression = validate_compression(compression)
+        self.compression_level = compression_level
+        self._last_lsn = 0
+        self._segment_records = 0
+        self._segment_bytes = 0
+        # Очередь закрытых сегментов на сжатие и обрабатывающий ее поток
+        self._compress_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._compressor: Optional[threading.Thread] = None
+        super().__init__(self._segment_path(1), **kwargs)
+        if self.compression != COMPRESSION_NONE:
+            self._compressor = threading.Thread(target=self._compress_loop, name="wal-compress", daemon=True)
+            self._compressor.start()
+            # Сегменты, закрытые до перезапуска, но не успевшие сжаться
+            for _, path in self.segments()[:-1]:
+                self._compress_queue.put(path)
+
+    def _segment_path(self, base_lsn: int) -> str:
+        """Путь к сегменту, первая запись которого имеет LSN base_lsn."""
+        return os.path.join(self.dir_path, f"{base_lsn:020d}{SEGMENT_SUFFIX}")
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """Возвращает пары (LSN первой записи, путь) для всех сегментов по возрастанию LSN."""
+        segments = []
+        for name in os.listdir(self.dir_path):
+            base = name[:-len(SEGMENT_SUFFIX)]
+            if name.endswith(SEGMENT_SUFFIX) and base.isdigit():
+                segments.append((int(base), os.path.join(self.dir_path, name)))
+        segments.sort()
+        return segments
+
+    @property
+    def last_lsn(self) -> int:
+        """LSN последней записанной операции (0, если записей еще не было)."""
+        return self._last_lsn
+
+    def _open_log(self) -> BinaryIO:
+        """Открывает последний сегмент и восстанавливает счетчик LSN по его записям."""
+        os.makedirs(self.dir_path, exist_ok=True)
+        # Удаляем недописанные сжатые копии, оставшиеся после сбоя
+        for name in os.listdir(self.dir_path):
+            if name.endswith(SEGMENT_SUFFIX + COMPRESS_TMP_SUFFIX):
+                os.remove(os.path.join(self.dir_path, name))
+        segments = self.segments()
+        base, path = segments[-1] if segments else (1, self._segment_path(1))
+        self.file_path = path
+        records = 0
+        if os.path.exists(path):
+            for _ in self._iter_file(path):
+                records += 1
+        if records and detect_compression(path) != COMPRESSION_NONE:
+            # В сжатый сегмент дописывать нельзя: начинаем новый
+            base, path, records = base + records, self._segment_path(base + records), 0
+            self.file_path = path
+        self._last_lsn = base - 1 + records
+        self._segment_records = records
+        f = self._open_file(path)
+        self._segment_bytes = os.path.getsize(path)
+        return f
+
+    def _on_written(self, records: int, size: int) -> None:
+        """Продвигает LSN и начинает новый сегмент, если активный заполнен."""
+        self._last_lsn += records
+        self._segment_records += records
+        self._segment_bytes += size
+        if ((self.max_segment_bytes is not None and self._segment_bytes >= self.max_segment_bytes) or
+                (self.max_segment_records is not None and self._segment_records >= self.max_segment_records)):
+            self._rotate()
+
+    def _rotate(self) -> None:
+        """Закрывает активный сегмент и открывает новый. Вызывается под _io_lock."""
+        if self._segment_records == 0:
+            return
+        self._file.flush()
+        if self._durability is not Durability.NONE:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        if self.compression != COMPRESSION_NONE:
+            self._compress_queue.put(self.file_path)
+        self.file_path = self._segment_path(self._last_lsn + 1)
+        self._file = self._open_file(self.file_path)
+        self._segment_records = 0
+        self._segment_bytes = os.path.getsize(self.file_path)
+        self._dirty = False
+
+    def _compress_loop(self) -> None:
+        """Фоновый поток: сжимает закрытые сегменты из очереди."""
+        while True:
+            path = self._compress_queue.get()
+            try:
+                if path is None:
+                    return
+                self._compress_segment(path)
+            except Exception as e:
+                # Сегмент остается несжатым и читается как обычно
+                logger.error(f"WAL: не удалось сжать сегмент {path}: {e}")
+            finally:
+                self._compress_queue.task_done()
+
+    def _compress_segment(self, path: str) -> None:
+        """
+        Сжимает закрытый сегмент во временный файл и атомарно подменяет им исходный.
+        Если сегмент успели удалить при сжатии журнала, сжатая копия удаляется.
+        """
+        if not os.path.exists(path) or detect_compression(path) != COMPRESSION_NONE:
+            return
+        tmp_path = path + COMPRESS_TMP_SUFFIX
+        try:
+            with open(path, 'rb') as src, open(tmp_path, 'wb') as f:
+                out = wrap_writer(f, self.compression, self.compression_level)
+                shutil.copyfileobj(src, out, 1024 * 1024)
+                out.close()
+                f.flush()
+                if self._durability is not Durability.NONE:
+                    os.fsync(f.fileno())
+            # compact удаляет сегменты под тем же замком
+            with self._io_lock:
+                if os.path.exists(path):
+                    os.replace(tmp_path, path)
+                    return
+            os.remove(tmp_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def wait_for_compression(self) -> None:
+        """Ждет, пока будут сжаты все закрытые на данный момент сегменты."""
+        self._compress_queue.join()
+
+    def close(self) -> None:
+        """Закрывает журнал и останавливает поток сжатия сегментов."""
+        try:
+            super().close()
+        finally:
+            if self._compressor is not None:
+                self._compress_queue.put(None)
+                self._compressor.join()
+                self._compressor = None
+
+    def rotate(self) -> None:
+        """Принудительно начинает новый сегмент."""
+        try:
+            with self._io_lock:
+                self._rotate()
+        except Exception as e:
+            raise IOError(f"Ошибка ротации WAL: {e}")
+
+    def iter_replay(self, after_lsn: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Последовательно читает операции всех сегментов, начиная с LSN after_lsn + 1.
+
+        Сегменты, все записи которых не новее after_lsn, не читаются. Чтение
+        останавливается на первой поврежденной записи.
+        """
+        self._flush_buffer()
+        after_lsn = after_lsn or 0
+        segments = self.segments()
+        for i, (base, path) in enumerate(segments):
+            next_base = segments[i + 1][0] if i + 1 < len(segments) else None
+            if next_base is not None and next_base - 1 <= after_lsn:
+                continue
+            lsn = base - 1
+            records = self._iter_file(path)
+            while True:
+                try:
+                    operation = next(records)
+                except StopIteration as stop:
+                    complete = stop.value
+                    break
+                lsn += 1
+                if lsn > after_lsn:
+                    yield operation
+            if not complete:
+                if next_base is not None:
+                    logger.error(f"WAL: сегмент {path} поврежден, последующие сегменты пропущены")
+                return
+            if next_base is not None and lsn + 1 != next_base:
+                logger.warning(f"WAL: в сегменте {path} {lsn - base + 1} записей, "
+                               f"ожидалось {next_base - base}")
+
+    def compact(self, upto_lsn: Optional[int] = None) -> None:
+        """
+        Удаляет сегменты, все записи которых имеют LSN не больше upto_lsn.
+
+        Без upto_lsn (или если он покрывает весь журнал) удаляются все записи:
+        активный сегмент предварительно закрывается, и запись продолжается в новый.
+        """
+        try:
+            with self._io_lock:
+                if upto_lsn is None or upto_lsn >= self._last_lsn:
+                    upto_lsn = self._last_lsn
+                    self._rotate()
+                segments = self.segments()
+                # Последний сегмент активный, его не удаляем
+                for (base, path), (next_base, _) in zip(segments, segments[1:]):
+                    if next_base - 1 > upto_lsn:
+                        break
+                    os.remove(path)
+        except Exception as e:
+            raise IOError(f"Ошибка очистки WAL: {e}")
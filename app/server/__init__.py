@@ -0,0 +1,10 @@
+from app.server.client import KVDBClient, KVDBClientPool
+from app.server.http import create_app
+from app.server.tcp import KVDBServer
+
+__all__ = [
+    'create_app',
+    'KVDBServer',
+    'KVDBClient',
+    'KVDBClientPool',
+]
@@ -0,0 +1,75 @@
+"""
+Запуск HTTP сервиса или TCP сервера KVDB.
+
+    uv run python -m app.server [--data-dir data] [--protocol http] [--host 127.0.0.1] [--port 8000] [--shards 0]
+
+Без --shards база хранит снапшот и сегментированный WAL с group commit в
+--data-dir; с --shards N - N шардов ShardedKVDB в --data-dir/shards.
+--max-keys и --max-memory (в байтах) ограничивают хранилище: ключи сверх
+бюджета вытесняются по политике --eviction; у шардов бюджет делится поровну.
+Истекшие ключи удаляются фоновым потоком раз в --expire-interval секунд.
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+import uvicorn
+
+from app.core.database import KVDB
+from app.core.eviction import EVICTION_POLICIES
+from app.core.persistence import Snapshotter
+from app.core.sharding import ShardedKVDB
+from app.core.storage import InMemoryStorage
+from app.core.wal import SegmentedWal
+from app.server.http import create_app
+from app.server.tcp import serve
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--protocol", default="http", choices=["http", "tcp"])
+    parser.add_argument("--port", type=int, default=None, help="по умолчанию 8000 для http и 7379 для tcp")
+    parser.add_argument("--shards", type=int, default=0)
+    parser.add_argument("--snapshot-threshold", type=int, default=100_000)
+    parser.add_argument("--max-keys", type=int, default=None)
+    parser.add_argument("--max-memory", type=int, default=None, help="оценочный объем данных в байтах")
+    parser.add_argument("--eviction", default="lru", choices=list(EVICTION_POLICIES))
+    parser.add_argument("--expire-interval", type=float, default=1.0, help="период удаления истекших ключей в секундах")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    parts = max(args.shards, 1)
+    storage_options = {
+        "max_keys": -(-args.max_keys // parts) if args.max_keys is not None else None,
+        "max_memory": -(-args.max_memory // parts) if args.max_memory is not None else None,
+        "eviction_policy": args.eviction,
+    }
+    if args.shards:
+        db = ShardedKVDB(
+            os.path.join(args.data_dir, "shards"), shards=args.shards,
+            wal_options={"group_commit": True, "record_format": "binary"},
+            auto_snapshot_threshold=args.snapshot_threshold,
+            storage_options=storage_options,
+            expire_interval=args.expire_interval,
+        )
+    else:
+        db = KVDB(
+            storage_engine=InMemoryStorage(**storage_options),
+            persistence=Snapshotter(os.path.join(args.data_dir, "snapshot.bin")),
+            wal=SegmentedWal(os.path.join(args.data_dir, "wal"), group_commit=True, record_format="binary"),
+            auto_snapshot_threshold=args.snapshot_threshold,
+            background_snapshots=True,
+            thread_safe=True,
+            expire_interval=args.expire_interval,
+        )
+    if args.protocol == "tcp":
+        asyncio.run(serve(db, host=args.host, port=args.port or 7379))
+    else:
+        uvicorn.run(create_app(db), host=args.host, port=args.port or 8000)
+
+
+if __name__ == "__main__":
+    main()
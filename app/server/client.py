@@ -0,0 +1,210 @@
+import asyncio
+import itertools
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.sharding import shard_of
+from app.server.protocol import (
+    HEADER,
+    OP_DELETE,
+    OP_GET,
+    OP_PING,
+    OP_SET,
+    STATUS_ERROR,
+    STATUS_NOT_FOUND,
+    decode_fields,
+    decode_value,
+    encode_fields,
+    encode_frame,
+    encode_value,
+)
+
+
+class KVDBClient:
+    """
+    Асинхронный клиент TCP сервера KVDB (app.server.tcp) по одному соединению.
+
+    Запросы отправляются сразу, не дожидаясь ответов на предыдущие: несколько
+    корутин, одновременно вызывающих методы клиента, образуют конвейер, и их
+    записи на сервере делят group commit. Ответы сопоставляются с запросами
+    по номеру. Операции над одним ключом сервер выполняет в порядке отправки.
+
+    Если сервер разорвал соединение, незавершенные запросы и все следующие
+    завершаются ConnectionError, пока клиент не переподключится (reconnect).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 7379):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        # Ошибка разрыва соединения; None, пока соединение живо
+        self._error: Optional[ConnectionError] = None
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        """Соединение установлено и не разорвано."""
+        return self._writer is not None and self._error is None
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._error = None
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def reconnect(self) -> None:
+        """
+        Подключается, если соединение не установлено или разорвано. Конкурентные
+        вызовы устанавливают одно соединение; ошибка подключения передается вызывающему.
+        """
+        async with self._connect_lock:
+            if self.connected:
+                return
+            await self.close()
+            await self.connect()
+
+    async def close(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._reader_task.cancel()
+        await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._writer = None
+        self._error = None
+        self._fail_pending(ConnectionError("Соединение закрыто"))
+
+    async def __aenter__(self) -> "KVDBClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def ping(self) -> None:
+        await self._request(OP_PING, b"")
+
+    async def get(self, key: str, namespace: Optional[str] = None) -> Any:
+        """Значение ключа или None, если ключа нет (как KVDB.get)."""
+        status, body = await self._request(OP_GET, encode_fields(namespace, key))
+        if status == STATUS_NOT_FOUND:
+            return None
+        value, = decode_fields(body, 1)
+        return decode_value(value)
+
+    async def set(self, key: str, value: Any, namespace: Optional[str] = None) -> None:
+        """Записывает значение; возвращается после фиксации записи в WAL сервера."""
+        await self._request(OP_SET, encode_fields(namespace, key, encode_value(value)))
+
+    async def delete(self, key: str, namespace: Optional[str] = None) -> bool:
+        """Удаляет ключ; возвращает True, если ключ существовал."""
+        _, body = await self._request(OP_DELETE, encode_fields(namespace, key))
+        return body == b"\x01"
+
+    async def set_many(self, items: Iterable[Tuple[str, Any]], namespace: Optional[str] = None) -> int:
+        """Записывает пары конвейером, не дожидаясь ответов по одной; возвращает их число."""
+        results = await asyncio.gather(*(self.set(key, value, namespace) for key, value in items))
+        return len(results)
+
+    async def _request(self, opcode: int, body: bytes) -> Tuple[int, bytes]:
+        if self._error is not None:
+            raise self._error
+        if self._writer is None:
+            raise ConnectionError("Клиент не подключен")
+        request_id = next(self._ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(encode_frame(request_id, opcode, body))
+        try:
+            await self._writer.drain()
+        except ConnectionError:
+            self._pending.pop(request_id, None)
+            raise
+        status, response = await future
+        if status == STATUS_ERROR:
+            raise IOError(f"Ошибка сервера: {response.decode('utf-8', errors='replace')}")
+        return status, response
+
+    async def _read_responses(self) -> None:
+        try:
+            while True:
+                header = await self._reader.readexactly(HEADER.size)
+                length, request_id, status = HEADER.unpack(header)
+                body = await self._reader.readexactly(length)
+                future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, body))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            # Новые запросы сразу получат эту ошибку, а не будут ждать ответа вечно
+            self._error = ConnectionError(f"Соединение с сервером разорвано: {e}")
+            self._writer.close()
+            self._fail_pending(self._error)
+
+    def _fail_pending(self, error: Exception) -> None:
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+
+class KVDBClientPool:
+    """
+    Пул соединений с TCP сервером KVDB.
+
+    Соединение выбирается по хэшу ключа (как шард в ShardedKVDB), поэтому
+    операции над одним ключом идут по одному соединению и сохраняют порядок,
+    а операции над разными ключами распределяются по всем соединениям.
+    Разорванное соединение (или не установленное после ошибки подключения)
+    переподключается при следующем запросе к нему.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 7379, size: int = 4):
+        if size < 1:
+            raise ValueError("Размер пула должен быть положительным")
+        self.clients: List[KVDBClient] = [KVDBClient(host, port) for _ in range(size)]
+
+    async def connect(self) -> None:
+        await asyncio.gather(*(client.connect() for client in self.clients))
+
+    async def close(self) -> None:
+        await asyncio.gather(*(client.close() for client in self.clients))
+
+    async def __aenter__(self) -> "KVDBClientPool":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    def client_for(self, key: str) -> KVDBClient:
+        return self.clients[shard_of(key, len(self.clients))]
+
+    @staticmethod
+    async def _ready(client: KVDBClient) -> KVDBClient:
+        """Переподключает клиент с разорванным соединением."""
+        if not client.connected:
+            await client.reconnect()
+        return client
+
+    async def ping(self) -> None:
+        await asyncio.gather(*(self._ready(client) for client in self.clients))
+        await asyncio.gather(*(client.ping() for client in self.clients))
+
+    async def get(self, key: str, namespace: Optional[str] = None) -> Any:
+        return await (await self._ready(self.client_for(key))).get(key, namespace)
+
+    async def set(self, key: str, value: Any, namespace: Optional[str] = None) -> None:
+        await (await self._ready(self.client_for(key))).set(key, value, namespace)
+
+    async def delete(self, key: str, namespace: Optional[str] = None) -> bool:
+        return await (await self._ready(self.client_for(key))).delete(key, namespace)
+
+    async def set_many(self, items: Iterable[Tuple[str, Any]], namespace: Optional[str] = None) -> int:
+        """Записывает пары конвейером по всем соединениям пула; возвращает их число."""
+        results = await asyncio.gather(*(self.set(key, value, namespace) for key, value in items))
+        return len(results)
@@ -0,0 +1,196 @@
+import asyncio
+import functools
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Literal, Optional, TypeVar
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.batch import WriteBatch
+from app.core.interfaces import MISSING, IDatabase
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Число потоков для записей, если база потокобезопасна
+DEFAULT_WRITE_WORKERS = 8
+# Максимальное число пар, которое возвращает один запрос выборки
+MAX_SCAN_LIMIT = 10000
+
+
+class SetRequest(BaseModel):
+    value: Any = None
+
+
+class GetManyRequest(BaseModel):
+    keys: List[str]
+    namespace: Optional[str] = None
+
+
+class BatchOperation(BaseModel):
+    type: Literal['set', 'delete']
+    key: str
+    value: Any = None
+    namespace: Optional[str] = None
+
+
+class WriteRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+def create_app(
+    db: IDatabase,
+    write_workers: Optional[int] = None,
+    shutdown_db: bool = True
+) -> FastAPI:
+    """
+    Создает асинхронный HTTP сервис над базой данных.
+
+    Чтение одного ключа (KVDB.get с трассировкой и логированием) выполняется
+    прямо в цикле событий: оно обращается только к памяти и не берет
+    блокировку базы. Записи (WAL, снапшоты), пакетные чтения (под
+    разделяемой блокировкой они ждут писателя) и выборки коллекций
+    выполняются в пуле потоков, чтобы блокирующий ввод-вывод не
+    останавливал цикл событий. Если хранилище ограничено по объему, чтение
+    учитывается политикой вытеснения под замком хранилища, поэтому чтение
+    одного ключа тоже выполняется в пуле потоков. Для конкурентных записей база
+    должна быть потокобезопасной (KVDB(..., thread_safe=True) или
+    ShardedKVDB); иначе записи выполняются в одном потоке по очереди.
+
+    Args:
+        db: База данных (KVDB, ShardedKVDB)
+        write_workers: Размер пула потоков для записей и выборок. По умолчанию
+            DEFAULT_WRITE_WORKERS для потокобезопасной базы и 1 для остальных
+        shutdown_db: Вызвать db.shutdown() при остановке сервиса
+    """
+    thread_safe = getattr(db, 'thread_safe', False)
+    if write_workers is None:
+        write_workers = DEFAULT_WRITE_WORKERS if thread_safe else 1
+    if write_workers < 1:
+        raise ValueError("write_workers должен быть положительным")
+    if write_workers > 1 and not thread_safe:
+        raise ValueError("Несколько потоков записи требуют потокобезопасную базу (thread_safe=True)")
+    executor = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix="kvdb-http")
+    # У ограниченного хранилища чтение берет замок учета вытеснения
+    bounded = db.storage_engine.eviction_stats().get('policy') is not None
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        try:
+            yield
+        finally:
+            executor.shutdown(wait=True)
+            if shutdown_db and hasattr(db, 'shutdown'):
+                db.shutdown()
+
+    app = FastAPI(title="KVDB", lifespan=lifespan)
+    app.state.db = db
+
+    async def offload(func: Callable[..., T], *args: Any) -> T:
+        """Выполняет блокирующий вызов базы в пуле потоков."""
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args))
+
+    @app.exception_handler(IOError)
+    async def io_error_handler(request: Request, exc: IOError) -> JSONResponse:
+        # Ошибка WAL или снапшота: запись не подтверждена
+        logger.error("Ошибка ввода-вывода при обработке %s %s: %s", request.method, request.url.path, exc)
+        return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+    @app.exception_handler(ValueError)
+    async def value_error_handler(request: Request, exc: ValueError) -> JSONResponse:
+        return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+    async def get_value(key: str, namespace: Optional[str]) -> Dict[str, Any]:
+        # default=MISSING отличает отсутствующий ключ от сохраненного None
+        if bounded:
+            value = await offload(db.get, key, namespace, MISSING)
+        else:
+            value = db.get(key, namespace, MISSING)
+        if value is MISSING:
+            raise HTTPException(status_code=404, detail=f"Ключ {key!r} не найден")
+        return {"key": key, "value": value}
+
+    async def set_value(key: str, value: Any, namespace: Optional[str]) -> Dict[str, Any]:
+        await offload(db.set, key, value, namespace)
+        return {"key": key}
+
+    async def delete_value(key: str, namespace: Optional[str]) -> Dict[str, Any]:
+        return {"key": key, "deleted": await offload(db.delete, key, namespace)}
+
+    @app.get("/keys/{key:path}")
+    async def get_key(key: str, namespace: Optional[str] = None) -> Dict[str, Any]:
+        return await get_value(key, namespace)
+
+    @app.put("/keys/{key:path}")
+    async def put_key(key: str, request: SetRequest, namespace: Optional[str] = None) -> Dict[str, Any]:
+        return await set_value(key, request.value, namespace)
+
+    @app.delete("/keys/{key:path}")
+    async def delete_key(key: str, namespace: Optional[str] = None) -> Dict[str, Any]:
+        return await delete_value(key, namespace)
+
+    @app.post("/batch/get")
+    async def batch_get(request: GetManyRequest) -> Dict[str, Any]:
+        """Значения найденных ключей и список отсутствующих."""
+        values = await offload(db.get_many, request.keys, request.namespace, True)
+        return {
+            "values": {key: value for key, value in zip(request.keys, values) if value is not MISSING},
+            "missing": [key for key, value in zip(request.keys, values) if value is MISSING],
+        }
+
+    @app.post("/batch/write")
+    async def batch_write(request: WriteRequest) -> Dict[str, Any]:
+        """Пакет операций set/delete одной записью WAL."""
+        batch = WriteBatch()
+        for operation in request.operations:
+            if operation.type == 'set':
+                batch.set(operation.key, operation.value, operation.namespace)
+            else:
+                batch.delete(operation.key, operation.namespace)
+        return {"operations": len(batch), "deleted": await offload(db.write, batch)}
+
+    @app.get("/collections/{name}")
+    async def scan_collection(
+        name: str,
+        prefix: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: int = Query(1000, ge=1, le=MAX_SCAN_LIMIT)
+    ) -> Dict[str, Any]:
+        """Пары коллекции по возрастанию ключей: по префиксу или из полуинтервала [start, end)."""
+        if prefix is not None and (start is not None or end is not None):
+            raise HTTPException(status_code=400, detail="prefix нельзя сочетать со start и end")
+
+        def scan() -> List[List[Any]]:
+            storage = db.storage_engine
+            if prefix is not None:
+                pairs = storage.scan_prefix(prefix, namespace=name)
+            else:
+                pairs = storage.range(start, end, namespace=name)
+            return [[key, value] for key, value in itertools.islice(pairs, limit)]
+
+        items = await offload(scan)
+        return {"collection": name, "items": items, "count": db.storage_engine.count(namespace=name)}
+
+    @app.delete("/collections/{name}")
+    async def drop_collection(name: str) -> Dict[str, Any]:
+        return {"collection": name, "deleted": await offload(db.drop_namespace, name)}
+
+    @app.get("/collections/{name}/keys/{key:path}")
+    async def get_collection_key(name: str, key: str) -> Dict[str, Any]:
+        return await get_value(key, name)
+
+    @app.put("/collections/{name}/keys/{key:path}")
+    async def put_collection_key(name: str, key: str, request: SetRequest) -> Dict[str, Any]:
+        return await set_value(key, request.value, name)
+
+    @app.delete("/collections/{name}/keys/{key:path}")
+    async def delete_collection_key(name: str, key: str) -> Dict[str, Any]:
+        return await delete_value(key, name)
+
+    return app
@@ -0,0 +1,92 @@
+import json
+import struct
+from typing import Any, List, Optional, Tuple
+
+# Бинарный протокол KVDB поверх TCP. Каждый кадр:
+#   [длина тела: u32][номер запроса: u32][код операции или статус: u8][тело]
+# Клиент может отправлять запросы, не дожидаясь ответов (конвейер); ответ
+# несет номер запроса и может прийти не в порядке отправки.
+# Поля тела: строка - [длина: i32, -1 для None][UTF-8], значение - строка с JSON.
+# Значения передаются в JSON, а не pickle: разбор pickle из сети позволяет
+# выполнить произвольный код.
+HEADER = struct.Struct("<IIB")
+_FIELD_LEN = struct.Struct("<i")
+# Максимальный размер тела кадра; больший кадр считается ошибкой протокола
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Коды операций запросов
+OP_PING = 0    # тело пустое
+OP_GET = 1     # [пространство имен][ключ]
+OP_SET = 2     # [пространство имен][ключ][значение]
+OP_DELETE = 3  # [пространство имен][ключ]
+OPERATIONS = (OP_PING, OP_GET, OP_SET, OP_DELETE)
+
+# Статусы ответов
+STATUS_OK = 0         # GET - [значение], DELETE - [1 байт: был ли ключ], иначе тело пустое
+STATUS_NOT_FOUND = 1  # GET отсутствующего ключа
+STATUS_ERROR = 2      # тело - сообщение об ошибке в UTF-8
+
+
+def encode_frame(request_id: int, code: int, body: bytes = b"") -> bytes:
+    """Собирает кадр из номера запроса, кода операции (статуса) и тела."""
+    return HEADER.pack(len(body), request_id, code) + body
+
+
+def encode_fields(*fields: Optional[str]) -> bytes:
+    """Кодирует строковые поля тела; None передается длиной -1."""
+    parts = []
+    for field in fields:
+        if field is None:
+            parts.append(_FIELD_LEN.pack(-1))
+        else:
+            data = field.encode('utf-8')
+            parts.append(_FIELD_LEN.pack(len(data)))
+            parts.append(data)
+    return b"".join(parts)
+
+
+def decode_fields(body: bytes, count: int) -> List[Optional[str]]:
+    """Декодирует count строковых полей тела."""
+    fields: List[Optional[str]] = []
+    offset = 0
+    for _ in range(count):
+        if offset + _FIELD_LEN.size > len(body):
+            raise ValueError("кадр обрезан")
+        length, = _FIELD_LEN.unpack_from(body, offset)
+        offset += _FIELD_LEN.size
+        if length < 0:
+            fields.append(None)
+            continue
+        if offset + length > len(body):
+            raise ValueError("кадр обрезан")
+        fields.append(body[offset:offset + length].decode('utf-8'))
+        offset += length
+    if offset != len(body):
+        raise ValueError("лишние байты в кадре")
+    return fields
+
+
+def encode_value(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_value(text: str) -> Any:
+    return json.loads(text)
+
+
+def decode_request(opcode: int, body: bytes) -> Tuple[Optional[str], Optional[str], Any]:
+    """Возвращает (пространство имен, ключ, значение) запроса; для PING все None."""
+    if opcode == OP_PING:
+        decode_fields(body, 0)
+        return None, None, None
+    if opcode == OP_SET:
+        namespace, key, value = decode_fields(body, 3)
+        if key is None or value is None:
+            raise ValueError("SET требует ключ и значение")
+        return namespace, key, decode_value(value)
+    if opcode in (OP_GET, OP_DELETE):
+        namespace, key = decode_fields(body, 2)
+        if key is None:
+            raise ValueError("операция требует ключ")
+        return namespace, key, None
+    raise ValueError(f"неизвестный код операции {opcode}")
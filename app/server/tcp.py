@@ -0,0 +1,254 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from app.core.interfaces import MISSING, IDatabase
+from app.server.protocol import (
+    HEADER,
+    MAX_FRAME_SIZE,
+    OP_GET,
+    OP_PING,
+    OP_SET,
+    STATUS_ERROR,
+    STATUS_NOT_FOUND,
+    STATUS_OK,
+    decode_request,
+    encode_fields,
+    encode_frame,
+    encode_value,
+)
+
+logger = logging.getLogger(__name__)
+
+# Число потоков для записей, если база потокобезопасна. Больше, чем у HTTP
+# сервиса: каждый поток ждет fsync своей записи, и чем больше записей из
+# конвейера одновременно в полете, тем больше их покрывает один group commit.
+DEFAULT_WRITE_WORKERS = 32
+# Максимальное число незавершенных записей одного соединения; дальше сервер
+# перестает читать запросы этого соединения
+DEFAULT_MAX_INFLIGHT = 1024
+
+
+class KVDBServer:
+    """
+    Асинхронный TCP сервер KVDB с бинарным протоколом (app.server.protocol).
+
+    Клиент может отправлять запросы конвейером, не дожидаясь ответов.
+    Чтения выполняются прямо в цикле событий (в пуле потоков, если хранилище
+    ограничено по объему и чтение берет замок учета вытеснения), записи - в
+    пуле потоков, поэтому
+    много записей одного соединения одновременно ждут фиксации WAL и делят
+    один group commit. Ответ на запись отправляется после ее фиксации.
+    Ответы могут приходить не в порядке запросов; операции одного соединения
+    над одним ключом выполняются в порядке получения (чтение после записи
+    видит эту запись).
+    """
+
+    def __init__(
+        self,
+        db: IDatabase,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        write_workers: Optional[int] = None,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT,
+        shutdown_db: bool = True
+    ):
+        """
+        Args:
+            db: База данных (KVDB, ShardedKVDB)
+            host: Адрес для прослушивания
+            port: Порт; 0 - выбрать свободный (см. KVDBServer.port)
+            write_workers: Размер пула потоков для записей. По умолчанию
+                DEFAULT_WRITE_WORKERS для потокобезопасной базы и 1 для остальных
+            max_inflight: Максимальное число незавершенных записей на соединение
+            shutdown_db: Вызвать db.shutdown() в close()
+        """
+        thread_safe = getattr(db, 'thread_safe', False)
+        if write_workers is None:
+            write_workers = DEFAULT_WRITE_WORKERS if thread_safe else 1
+        if write_workers < 1:
+            raise ValueError("write_workers должен быть положительным")
+        if write_workers > 1 and not thread_safe:
+            raise ValueError("Несколько потоков записи требуют потокобезопасную базу (thread_safe=True)")
+        if max_inflight < 1:
+            raise ValueError("max_inflight должен быть положительным")
+        self.db = db
+        self.host = host
+        self._port = port
+        self._write_workers = write_workers
+        self._max_inflight = max_inflight
+        self._shutdown_db = shutdown_db
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        # У ограниченного хранилища чтение берет замок учета вытеснения
+        self._bounded = db.storage_engine.eviction_stats().get('policy') is not None
+
+    @property
+    def port(self) -> int:
+        """Фактический порт после start()."""
+        if self._server is not None and self._server.sockets:
+            return self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    async def start(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self._write_workers, thread_name_prefix="kvdb-tcp")
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self._port)
+        logger.info("TCP сервер KVDB слушает %s:%d", self.host, self.port)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Закрывает соединения, дожидается начатых записей и завершает базу."""
+        if self._server is None:
+            return
+        self._server.close()
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+        self._executor.shutdown(wait=True)
+        if self._shutdown_db and hasattr(self.db, 'shutdown'):
+            self.db.shutdown()
+
+    async def __aenter__(self) -> "KVDBServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(asyncio.current_task())
+        # Последняя незавершенная операция над ключом (пространство имен, ключ):
+        # следующая операция над тем же ключом ждет ее завершения
+        pending: Dict[Tuple[Optional[str], str], asyncio.Future] = {}
+        inflight = asyncio.Semaphore(self._max_inflight)
+        tasks: Set[asyncio.Task] = set()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                length, request_id, opcode = HEADER.unpack(header)
+                if length > MAX_FRAME_SIZE:
+                    writer.write(encode_frame(request_id, STATUS_ERROR, "кадр слишком большой".encode('utf-8')))
+                    break
+                body = await reader.readexactly(length)
+                try:
+                    namespace, key, value = decode_request(opcode, body)
+                except (ValueError, UnicodeDecodeError) as e:
+                    writer.write(encode_frame(request_id, STATUS_ERROR, str(e).encode('utf-8')))
+                    # Как и после чтения: клиент, не читающий ответы, не раздувает буфер записи
+                    await writer.drain()
+                    continue
+
+                if opcode == OP_PING:
+                    writer.write(encode_frame(request_id, STATUS_OK))
+                    await writer.drain()
+                    continue
+                previous = pending.get((namespace, key))
+                if opcode == OP_GET and previous is None and not self._bounded:
+                    writer.write(self._get(request_id, key, namespace))
+                    await writer.drain()
+                    continue
+
+                await inflight.acquire()
+                task = asyncio.create_task(
+                    self._execute(writer, previous, request_id, opcode, key, value, namespace)
+                )
+                tasks.add(task)
+                pending[(namespace, key)] = task
+                task.add_done_callback(functools.partial(
+                    self._on_done, tasks, pending, inflight, (namespace, key)
+                ))
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Клиент отключился посреди кадра или сервер останавливается
+            pass
+        finally:
+            # Начатые записи доводятся до конца: клиент мог не получить ответ,
+            # но запись уже в WAL
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            self._connections.discard(asyncio.current_task())
+
+    @staticmethod
+    def _on_done(
+        tasks: Set[asyncio.Task],
+        pending: Dict[Tuple[Optional[str], str], asyncio.Future],
+        inflight: asyncio.Semaphore,
+        item: Tuple[Optional[str], str],
+        task: asyncio.Task
+    ) -> None:
+        tasks.discard(task)
+        if pending.get(item) is task:
+            del pending[item]
+        inflight.release()
+
+    def _get(self, request_id: int, key: str, namespace: Optional[str]) -> bytes:
+        # default=MISSING отличает отсутствующий ключ от сохраненного None
+        value = self.db.get(key, namespace, MISSING)
+        if value is MISSING:
+            return encode_frame(request_id, STATUS_NOT_FOUND)
+        try:
+            body = encode_fields(encode_value(value))
+        except (TypeError, ValueError) as e:
+            # Значение записано в базу не через протокол и не представимо в JSON
+            return encode_frame(request_id, STATUS_ERROR, str(e).encode('utf-8'))
+        return encode_frame(request_id, STATUS_OK, body)
+
+    async def _execute(
+        self,
+        writer: asyncio.StreamWriter,
+        previous: Optional[asyncio.Future],
+        request_id: int,
+        opcode: int,
+        key: str,
+        value: Any,
+        namespace: Optional[str]
+    ) -> None:
+        if previous is not None:
+            # Исход предыдущей операции над ключом уже отправлен ее клиенту
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            if opcode == OP_GET:
+                if self._bounded:
+                    frame = await self._offload(self._get, request_id, key, namespace)
+                else:
+                    frame = self._get(request_id, key, namespace)
+            elif opcode == OP_SET:
+                await self._offload(self.db.set, key, value, namespace)
+                frame = encode_frame(request_id, STATUS_OK)
+            else:
+                deleted = await self._offload(self.db.delete, key, namespace)
+                frame = encode_frame(request_id, STATUS_OK, bytes([deleted]))
+        except (IOError, ValueError, TypeError) as e:
+            # Ошибка WAL или снапшота: запись не подтверждена
+            logger.error("Ошибка при выполнении операции %d над %r: %s", opcode, key, e)
+            frame = encode_frame(request_id, STATUS_ERROR, str(e).encode('utf-8'))
+        except Exception as e:
+            # Непредвиденная ошибка не должна оставить запрос клиента без ответа
+            logger.exception("Непредвиденная ошибка при выполнении операции %d над %r: %s", opcode, key, e)
+            frame = encode_frame(request_id, STATUS_ERROR, str(e).encode('utf-8'))
+        if not writer.is_closing():
+            writer.write(frame)
+
+    async def _offload(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет блокирующий вызов базы в пуле потоков."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+
+async def serve(db: IDatabase, host: str = "127.0.0.1", port: int = 7379, **options: Any) -> None:
+    """Запускает TCP сервер над базой и обслуживает соединения до отмены."""
+    await KVDBServer(db, host=host, port=port, **options).serve_forever()
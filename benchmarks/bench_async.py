@@ -0,0 +1,106 @@
+"""
+Записи из asyncio: run_in_executor на каждую операцию против AsyncKVDB.
+
+Несколько корутин-клиентов пишут ключи одновременно. Режимы:
+    executor - каждая запись KVDB.set выполняется в пуле из --workers потоков
+               (потокобезопасная база, group commit WAL);
+    async    - AsyncKVDB: записи собираются единственной задачей-писателем в
+               группы, каждая группа - один вызов db.write в выделенном потоке.
+Параллельно работает задача-тикер, которая просыпается каждую миллисекунду:
+ее наибольшее опоздание показывает, насколько записи задерживают цикл событий.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_async [--writes 20000] [--concurrency 256] [--durability fsync]
+"""
+import argparse
+import asyncio
+import functools
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List
+
+from app.core.async_database import AsyncKVDB
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import SegmentedWal
+
+
+def _open_db(args: argparse.Namespace, data_dir: str) -> KVDB:
+    return KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(data_dir, "snapshot.bin")),
+        wal=SegmentedWal(os.path.join(data_dir, "wal"), group_commit=True, record_format="binary",
+                         durability=args.durability),
+        auto_snapshot_threshold=args.snapshot_threshold,
+        background_snapshots=True,
+        thread_safe=True,
+    )
+
+
+async def _load(args: argparse.Namespace, write: Callable[[str, dict], Awaitable[None]]) -> tuple:
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    async def client(offset: int) -> None:
+        for i in range(offset, args.writes, args.concurrency):
+            await write(f"key{i}", {"i": i, "payload": "x" * 64})
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(client(offset) for offset in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker_task
+    return args.writes / elapsed, max(lags, default=0.0)
+
+
+async def _run_executor(args: argparse.Namespace, data_dir: str) -> tuple:
+    db = _open_db(args, data_dir)
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        async def write(key: str, value: dict) -> None:
+            await loop.run_in_executor(executor, functools.partial(db.set, key, value))
+
+        result = await _load(args, write)
+    db.shutdown()
+    return result + ("-",)
+
+
+async def _run_async(args: argparse.Namespace, data_dir: str) -> tuple:
+    async with AsyncKVDB(_open_db(args, data_dir)) as db:
+        result = await _load(args, db.set)
+        groups = f"{db.commits:,} (в среднем {db.committed_operations / max(db.commits, 1):.0f} операций)"
+    return result + (groups,)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    print(f"записей: {args.writes:,}, клиентов: {args.concurrency}, durability: {args.durability}")
+    print(f"{'режим':<10} {'записей/с':>12} {'макс. задержка цикла, мс':>26}  групп записи")
+    for mode, run in (("executor", _run_executor), ("async", _run_async)):
+        with tempfile.TemporaryDirectory() as data_dir:
+            rate, lag, groups = await run(args, data_dir)
+        print(f"{mode:<10} {rate:>12,.0f} {lag * 1e3:>26.2f}  {groups}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=32, help="потоков в режиме executor")
+    parser.add_argument("--snapshot-threshold", type=int, default=100_000)
+    parser.add_argument("--durability", default="fsync", choices=["none", "flush", "fsync"])
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
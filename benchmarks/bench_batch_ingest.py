@@ -0,0 +1,67 @@
+"""
+Бенчмарк массовой загрузки данных: KVDB.set по одному ключу против
+пакетной записи set_many пакетами разного размера.
+
+Пакет логируется одной записью WAL и применяется к хранилищу за один
+захват замка, поэтому накладные расходы на запись журнала, отладочное
+логирование и проверку порога снапшота платятся один раз на пакет.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_batch_ingest [--keys 1000000] [--record-format binary]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import FileWal, RECORD_FORMATS
+
+
+def _create_db(temp_dir: str, name: str, record_format: str) -> KVDB:
+    return KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(temp_dir, f"{name}.bin")),
+        wal=FileWal(os.path.join(temp_dir, f"{name}.wal"), record_format=record_format, durability="none"),
+        auto_snapshot_threshold=10 ** 12,
+    )
+
+
+def _value(i: int) -> dict:
+    return {"id": i, "name": f"user{i}", "active": i % 2 == 0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--record-format", choices=RECORD_FORMATS, default="binary")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    print(f"ключей: {args.keys:,}, формат WAL: {args.record_format}")
+    print(f"{'способ':<22} {'время, с':>10} {'ключей/с':>12} {'ускорение':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = _create_db(temp_dir, "single", args.record_format)
+        start = time.perf_counter()
+        for i in range(args.keys):
+            db.set(f"user:{i}", _value(i))
+        db.wal.close()
+        single_time = time.perf_counter() - start
+        print(f"{'set по одному':<22} {single_time:>10.2f} {args.keys / single_time:>12,.0f} {1:>9.1f}x")
+
+        for batch_size in args.batch_sizes:
+            db = _create_db(temp_dir, f"batch-{batch_size}", args.record_format)
+            start = time.perf_counter()
+            for offset in range(0, args.keys, batch_size):
+                db.set_many((f"user:{i}", _value(i)) for i in range(offset, min(offset + batch_size, args.keys)))
+            db.wal.close()
+            elapsed = time.perf_counter() - start
+            assert db.storage_engine.count() == args.keys
+            name = f"set_many по {batch_size:,}"
+            print(f"{name:<22} {elapsed:>10.2f} {args.keys / elapsed:>12,.0f} {single_time / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Бенчмарк удаления коллекции целиком.
+
+Сравнивает цикл Collection.delete по всем ключам (запись WAL и проверка
+порога снапшота на каждый ключ) с Collection.drop (одна запись WAL и одна
+операция хранилища), а также применение при восстановлении записей
+delete по каждому ключу с одной записью drop.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_collection_drop [--keys 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.core.collection import Collection
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import FileWal
+
+
+def _create_db(temp_dir: str, name: str, keys: int) -> KVDB:
+    db = KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(temp_dir, f"{name}.bin")),
+        wal=FileWal(os.path.join(temp_dir, f"{name}.wal"), record_format="binary", durability="none"),
+        auto_snapshot_threshold=10 ** 12,
+    )
+    # Заполняем хранилище напрямую: измеряем только удаление
+    db.storage_engine.load_namespaces([("users", ((f"user{i}", i) for i in range(keys)))])
+    return db
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = _create_db(temp_dir, "loop", args.keys)
+        users = Collection(db, "users")
+        start = time.perf_counter()
+        for i in range(args.keys):
+            users.delete(f"user{i}")
+        loop_time = time.perf_counter() - start
+        assert users.count() == 0
+        db.wal.close()
+        loop_wal_size = os.path.getsize(db.wal.file_path)
+
+        db = _create_db(temp_dir, "drop", args.keys)
+        users = Collection(db, "users")
+        start = time.perf_counter()
+        users.drop()
+        drop_time = time.perf_counter() - start
+        assert users.count() == 0
+        db.wal.close()
+        drop_wal_size = os.path.getsize(db.wal.file_path)
+
+        # Восстановление: применяем записи журнала к заполненному хранилищу
+        replay_times = []
+        for name in ("loop", "drop"):
+            db = _create_db(temp_dir, f"replay-{name}", args.keys)
+            wal = FileWal(os.path.join(temp_dir, f"{name}.wal"), record_format="binary")
+            operations = wal.replay()
+            wal.close()
+            start = time.perf_counter()
+            for operation in operations:
+                db._apply_operation(operation)
+            replay_times.append(time.perf_counter() - start)
+            assert db.storage_engine.count(namespace="users") == 0
+            db.wal.close()
+
+    print(f"ключей в коллекции: {args.keys:,}")
+    print(f"{'способ':<20} {'удаление, с':>12} {'WAL, байт':>14} {'применение WAL, с':>18}")
+    print(f"{'цикл delete':<20} {loop_time:>12.3f} {loop_wal_size:>14,} {replay_times[0]:>18.3f}")
+    print(f"{'drop':<20} {drop_time:>12.4f} {drop_wal_size:>14,} {replay_times[1]:>18.4f}")
+
+
+if __name__ == "__main__":
+    main()
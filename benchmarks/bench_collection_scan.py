@@ -0,0 +1,73 @@
+"""
+Бенчмарк выборки небольшой коллекции из большой базы данных.
+
+Сравнивает прежний способ (копия всех данных через get_all_data() и
+фильтрация по startswith), префиксный запрос по отсортированному индексу
+InMemoryStorage.scan_prefix и копию собственного пространства имен
+коллекции. Дополнительно измеряет, во сколько обходится поддержка индекса
+при записи новых ключей.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_collection_scan [--keys 1000000] [--collection 10]
+"""
+import argparse
+import time
+
+from app.core.storage import InMemoryStorage
+
+
+def _full_scan(storage: InMemoryStorage, prefix: str) -> dict:
+    return {key[len(prefix):]: value for key, value in storage.get_all_data().items() if key.startswith(prefix)}
+
+
+def _index_scan(storage: InMemoryStorage, prefix: str) -> dict:
+    return {key[len(prefix):]: value for key, value in storage.scan_prefix(prefix)}
+
+
+def _namespace_scan(storage: InMemoryStorage, prefix: str) -> dict:
+    return storage.get_all_data(namespace=prefix[:-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--collection", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    storage = InMemoryStorage()
+    start = time.perf_counter()
+    for i in range(args.keys):
+        storage.set(f"bulk:{i}", i)
+    insert_time = time.perf_counter() - start
+    for i in range(args.collection):
+        storage.set(f"users:{i}", {"name": f"user{i}"})
+        storage.set(str(i), {"name": f"user{i}"}, namespace="users")
+
+    plain = {}
+    start = time.perf_counter()
+    for i in range(args.keys):
+        plain[f"bulk:{i}"] = i
+    dict_time = time.perf_counter() - start
+
+    print(f"ключей в базе: {args.keys:,}, в коллекции: {args.collection:,}")
+    print(f"{'способ':<28} {'время, мс':>10}")
+    scans = (
+        ("get_all_data + startswith", _full_scan),
+        ("scan_prefix по индексу", _index_scan),
+        ("пространство имен", _namespace_scan),
+    )
+    for name, scan in scans:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            result = scan(storage, "users:")
+        elapsed = (time.perf_counter() - start) / args.repeat
+        assert len(result) == args.collection
+        print(f"{name:<28} {elapsed * 1e3:>10.3f}")
+
+    print(f"\nзапись {args.keys:,} новых ключей: InMemoryStorage {insert_time:.2f} с, "
+          f"голый dict {dict_time:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Бенчмарк сжатия снапшотов и сегментов WAL кодеками стандартной библиотеки.
+
+Для каждого формата снапшота и кодека выводит размер файла, время записи и
+время загрузки. Для WAL - размер закрытого сегмента, время его сжатия и
+время чтения всех записей.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_compression [--keys 500000] [--records 500000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.core.compression import COMPRESSIONS
+from app.core.persistence import Snapshotter
+from app.core.wal import SegmentedWal
+
+
+def _bench_snapshots(temp_dir: str, keys: int) -> None:
+    data = {
+        f"user:{i}": {"id": i, "name": f"name{i}", "email": f"user{i}@example.com", "active": i % 2 == 0}
+        for i in range(keys)
+    }
+    print(f"снапшот, ключей: {keys:,}")
+    print(f"{'формат':<8} {'кодек':<6} {'размер, МБ':>11} {'запись, с':>10} {'загрузка, с':>12}")
+    for format in ("json", "binary"):
+        for compression in COMPRESSIONS:
+            snapshotter = Snapshotter(os.path.join(temp_dir, f"snapshot-{format}-{compression}"),
+                                      format=format, compression=compression)
+            start = time.perf_counter()
+            snapshotter.dump(data)
+            dump_time = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = snapshotter.load()
+            load_time = time.perf_counter() - start
+            assert len(loaded) == keys
+            size = os.path.getsize(snapshotter.file_path)
+            print(f"{format:<8} {compression:<6} {size / 2**20:>11.1f} {dump_time:>10.2f} {load_time:>12.2f}")
+
+
+def _bench_wal(temp_dir: str, records: int) -> None:
+    print(f"\nсегмент WAL, записей: {records:,}")
+    print(f"{'формат':<8} {'кодек':<6} {'размер, МБ':>11} {'сжатие, с':>10} {'чтение, с':>10}")
+    for record_format in ("json", "binary"):
+        for compression in COMPRESSIONS:
+            wal = SegmentedWal(os.path.join(temp_dir, f"wal-{record_format}-{compression}"),
+                               max_segment_bytes=None, compression=compression,
+                               record_format=record_format, durability="none")
+            for i in range(records):
+                wal.log({"type": "set", "key": f"user:{i % 10_000}",
+                         "value": {"id": i, "name": f"name{i}", "active": i % 2 == 0}})
+            start = time.perf_counter()
+            wal.rotate()
+            wal.wait_for_compression()
+            compress_time = time.perf_counter() - start
+            start = time.perf_counter()
+            count = sum(1 for _ in wal.iter_replay())
+            read_time = time.perf_counter() - start
+            assert count == records
+            size = os.path.getsize(wal.segments()[0][1])
+            wal.close()
+            print(f"{record_format:<8} {compression:<6} {size / 2**20:>11.1f} "
+                  f"{compress_time:>10.2f} {read_time:>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=500_000)
+    parser.add_argument("--records", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _bench_snapshots(temp_dir, args.keys)
+        _bench_wal(temp_dir, args.records)
+
+
+if __name__ == "__main__":
+    main()
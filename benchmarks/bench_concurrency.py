@@ -0,0 +1,101 @@
+"""
+Бенчмарк пропускной способности потокобезопасной KVDB (thread_safe=True).
+
+Два сценария при разном числе потоков:
+- смешанная нагрузка: 90% get_many по 10 ключей, 10% set, WAL без fsync;
+- запись с group commit и fsync: ожидание диска вынесено за пределы
+  блокировки, поэтому записи конкурентных потоков фиксируются общим
+  пакетом, и пропускная способность растет с числом писателей.
+
+Под GIL чтения не выполняются параллельно на нескольких ядрах; бенчмарк
+показывает, что блокировка не сериализует их сверх этого и не
+превращает group commit в последовательные fsync.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_concurrency [--ops 20000] [--threads 1 2 4 8]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import FileWal
+
+
+def _run_threads(threads: int, target) -> float:
+    """Запускает target(thread_id) в threads потоках и возвращает общее время."""
+    workers = [threading.Thread(target=target, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def _bench_mixed(temp_dir: str, threads: int, ops: int, keys: int) -> float:
+    db = KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(temp_dir, f"mixed-{threads}.bin")),
+        wal=FileWal(os.path.join(temp_dir, f"mixed-{threads}.wal"), record_format="binary", durability="none"),
+        auto_snapshot_threshold=10 ** 12,
+        thread_safe=True,
+    )
+    db.set_many((f"key{i}", i) for i in range(keys))
+    per_thread = ops // threads
+
+    def worker(thread_id: int) -> None:
+        rng = random.Random(thread_id)
+        for i in range(per_thread):
+            if i % 10 == 0:
+                db.set(f"key{rng.randrange(keys)}", i)
+            else:
+                db.get_many([f"key{rng.randrange(keys)}" for _ in range(10)])
+
+    elapsed = _run_threads(threads, worker)
+    db.wal.close()
+    return per_thread * threads / elapsed
+
+
+def _bench_group_commit(temp_dir: str, threads: int, ops: int) -> float:
+    db = KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(temp_dir, f"commit-{threads}.bin")),
+        wal=FileWal(os.path.join(temp_dir, f"commit-{threads}.wal"), group_commit=True, record_format="binary"),
+        auto_snapshot_threshold=10 ** 12,
+        thread_safe=True,
+    )
+    per_thread = ops // threads
+
+    def worker(thread_id: int) -> None:
+        for i in range(per_thread):
+            db.set(f"t{thread_id}:{i}", i)
+
+    elapsed = _run_threads(threads, worker)
+    db.wal.close()
+    return per_thread * threads / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--commit-ops", type=int, default=2_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{'потоков':>8} {'смешанная, оп/с':>16} {'group commit + fsync, записей/с':>32}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for threads in args.threads:
+            mixed = _bench_mixed(temp_dir, threads, args.ops, args.keys)
+            commit = _bench_group_commit(temp_dir, threads, args.commit_ops)
+            print(f"{threads:>8} {mixed:>16,.0f} {commit:>32,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк хранилища с ограниченным объемом в роли кэша.
+
+Клиент читает ключи с распределением Ципфа (немногие ключи популярны) и при
+промахе записывает значение в базу. Хранилище без ограничения сравнивается
+с бюджетом --max-keys при политиках вытеснения lru, lfu и ttl (у части
+ключей есть TTL). Выводятся доля попаданий, скорость операций, число
+вытесненных ключей и оценочный объем данных.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_eviction [--requests 200000] [--universe 100000] [--max-keys 10000]
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import tempfile
+import time
+from typing import List, Optional
+
+from app.core.database import KVDB
+from app.core.eviction import EVICTION_POLICIES
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import FileWal
+
+
+def _zipf_keys(args: argparse.Namespace) -> List[str]:
+    """Последовательность запрашиваемых ключей с распределением Ципфа."""
+    rng = random.Random(0)
+    weights = [1.0 / (rank ** args.skew) for rank in range(1, args.universe + 1)]
+    cumulative = list(itertools.accumulate(weights))
+    total = cumulative[-1]
+    # Популярные ключи разбросаны по пространству, а не идут подряд
+    names = [f"key{i}" for i in range(args.universe)]
+    rng.shuffle(names)
+    return [names[bisect.bisect_left(cumulative, rng.random() * total)] for _ in range(args.requests)]
+
+
+def _run(args: argparse.Namespace, keys: List[str], policy: Optional[str], data_dir: str) -> tuple:
+    storage = InMemoryStorage() if policy is None else InMemoryStorage(
+        max_keys=args.max_keys, max_memory=None, eviction_policy=policy
+    )
+    db = KVDB(
+        storage_engine=storage,
+        persistence=Snapshotter(os.path.join(data_dir, "snapshot.bin")),
+        wal=FileWal(os.path.join(data_dir, "wal.log"), durability="none", record_format="binary"),
+        auto_snapshot_threshold=10 ** 9,
+    )
+    value = {"payload": "x" * 100}
+    hits = 0
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        if db.get(key) is not None:
+            hits += 1
+        else:
+            # Каждый четвертый ключ кэшируется с TTL
+            db.set(key, value, ttl=3600 if i % 4 == 0 else None)
+    elapsed = time.perf_counter() - start
+    stats = storage.eviction_stats()
+    count = storage.count()
+    db.wal.close()
+    return hits / len(keys), len(keys) / elapsed, stats.get("evicted_keys", 0), count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--universe", type=int, default=100_000, help="число различных ключей")
+    parser.add_argument("--max-keys", type=int, default=10_000)
+    parser.add_argument("--skew", type=float, default=1.0, help="показатель распределения Ципфа")
+    args = parser.parse_args()
+
+    keys = _zipf_keys(args)
+    print(f"запросов: {args.requests:,}, различных ключей: {args.universe:,}, бюджет: {args.max_keys:,} ключей")
+    print(f"{'политика':<12} {'попадания':>10} {'операций/с':>12} {'вытеснено':>10} {'ключей':>8}")
+    for policy in (None, *EVICTION_POLICIES):
+        with tempfile.TemporaryDirectory() as data_dir:
+            hit_rate, rate, evicted, count = _run(args, keys, policy, data_dir)
+        print(f"{policy or 'без лимита':<12} {hit_rate:>10.1%} {rate:>12,.0f} {evicted:>10,} {count:>8,}")
+
+
+if __name__ == "__main__":
+    main()
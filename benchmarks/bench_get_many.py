@@ -0,0 +1,65 @@
+"""
+Бенчмарк пакетного чтения: цикл Collection.get против Collection.get_many.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_get_many [--keys 1000000] [--batch 100] [--requests 10000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.core.collection import Collection
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import FileWal
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = KVDB(
+            storage_engine=InMemoryStorage(),
+            persistence=Snapshotter(os.path.join(temp_dir, "snapshot.bin")),
+            wal=FileWal(os.path.join(temp_dir, "wal.log"), durability="none"),
+        )
+        db.storage_engine.load_namespaces([("users", ((f"user{i}", i) for i in range(args.keys)))])
+        users = Collection(db, "users")
+        rng = random.Random(0)
+        # Десятая часть запрашиваемых ключей отсутствует
+        requests = [
+            [f"user{rng.randrange(args.keys + args.keys // 10)}" for _ in range(args.batch)]
+            for _ in range(args.requests)
+        ]
+
+        start = time.perf_counter()
+        for keys in requests:
+            loop_result = {key: users.get(key) for key in keys}
+        loop_time = time.perf_counter() - start
+
+        timings = []
+        for ordered in (False, True):
+            start = time.perf_counter()
+            for keys in requests:
+                users.get_many(keys, ordered=ordered)
+            timings.append(time.perf_counter() - start)
+        assert users.get_many(requests[-1]) == {key: value for key, value in loop_result.items() if value is not None}
+        db.wal.close()
+
+    lookups = args.batch * args.requests
+    print(f"ключей в коллекции: {args.keys:,}, запросов: {args.requests:,} по {args.batch} ключей")
+    print(f"{'способ':<24} {'время, с':>10} {'мкс на ключ':>12}")
+    for name, elapsed in (("цикл get", loop_time), ("get_many -> dict", timings[0]),
+                          ("get_many -> list", timings[1])):
+        print(f"{name:<24} {elapsed:>10.3f} {elapsed / lookups * 1e6:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
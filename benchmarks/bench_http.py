@@ -0,0 +1,101 @@
+"""
+Нагрузочный тест HTTP сервиса KVDB (app.server) с клиентом в том же процессе.
+
+Запросы идут через httpx.ASGITransport прямо в приложение, без сети, поэтому
+измеряются накладные расходы сервиса, сериализации и самой базы. Несколько
+корутин-клиентов одновременно выполняют смесь GET/PUT (доля записей
+--write-ratio) и, если задан --batch, пакетных чтений. Печатаются
+пропускная способность и перцентили задержки по видам запросов.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_http [--requests 20000] [--concurrency 64] [--write-ratio 0.1] [--batch 0]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import SegmentedWal
+from app.server.http import create_app
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def _run(args: argparse.Namespace, temp_dir: str) -> None:
+    db = KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(temp_dir, "snapshot.bin")),
+        wal=SegmentedWal(os.path.join(temp_dir, "wal"), group_commit=True, record_format="binary",
+                         durability=args.durability),
+        auto_snapshot_threshold=100_000,
+        background_snapshots=True,
+        thread_safe=True,
+    )
+    db.set_many((f"key{i}", {"i": i, "payload": "x" * 64}) for i in range(args.keys))
+    app = create_app(db, shutdown_db=False)
+    latencies: Dict[str, List[float]] = {"get": [], "put": [], "batch_get": []}
+    per_client = args.requests // args.concurrency
+
+    async def client_loop(client: httpx.AsyncClient, seed: int) -> None:
+        rng = random.Random(seed)
+        for i in range(per_client):
+            key = f"key{rng.randrange(args.keys)}"
+            start = time.perf_counter()
+            if rng.random() < args.write_ratio:
+                kind = "put"
+                response = await client.put(f"/keys/{key}", json={"value": {"i": i, "payload": "y" * 64}})
+            elif args.batch and rng.random() < 0.1:
+                kind = "batch_get"
+                keys = [f"key{rng.randrange(args.keys)}" for _ in range(args.batch)]
+                response = await client.post("/batch/get", json={"keys": keys})
+            else:
+                kind = "get"
+                response = await client.get(f"/keys/{key}")
+            response.raise_for_status()
+            latencies[kind].append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://kvdb") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, seed) for seed in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    db.shutdown()
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"запросов: {total:,}, клиентов: {args.concurrency}, durability: {args.durability}")
+    print(f"пропускная способность: {total / elapsed:,.0f} запр/с")
+    print(f"{'запрос':<10} {'число':>8} {'среднее, мс':>12} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    for kind, samples in latencies.items():
+        if samples:
+            print(f"{kind:<10} {len(samples):>8,} {statistics.fmean(samples) * 1e3:>12.2f} "
+                  f"{_percentile(samples, 0.5) * 1e3:>9.2f} {_percentile(samples, 0.95) * 1e3:>9.2f} "
+                  f"{_percentile(samples, 0.99) * 1e3:>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--batch", type=int, default=0, help="размер пакетного чтения (0 - без пакетных чтений)")
+    parser.add_argument("--durability", default="fsync", choices=["none", "flush", "fsync"])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        asyncio.run(_run(args, temp_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Микробенчмарк накладных расходов отладочного логирования на операцию.
+
+Сравнивает при выключенном уровне DEBUG:
+- прежний вариант: logger.debug(f"...") форматирует значение на каждый вызов;
+- текущий вариант: %-форматирование под проверкой isEnabledFor;
+- текущий вариант с включенным трассировщиком RecordingTracer.
+
+Измеряется KVDB.get, у которой нет записи в WAL, поэтому разница
+определяется только логированием и трассировкой. Значение - словарь
+заданного размера, так что стоимость его repr растет вместе с ним.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_logging_overhead [--ops 200000] [--value-items 1 100 10000]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Optional
+
+from app.core import database as database_module
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.tracing import RecordingTracer
+from app.core.wal import FileWal
+
+
+class EagerLoggingKVDB(KVDB):
+    """KVDB.get в прежнем виде: строка лога форматируется до проверки уровня."""
+
+    def get(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
+        value = self.storage_engine.get(key, namespace=namespace)
+        database_module.logger.debug(f"GET: {key} = {value}")
+        return value
+
+
+def _measure(db: KVDB, ops: int) -> float:
+    """Возвращает среднее время одной операции в микросекундах."""
+    get = db.get
+    start = time.perf_counter()
+    for _ in range(ops):
+        get("key")
+    return (time.perf_counter() - start) / ops * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--value-items", type=int, nargs="+", default=[1, 100, 10_000])
+    args = parser.parse_args()
+
+    database_module.logger.setLevel(logging.INFO)
+    print(f"{'элементов в значении':>20} {'f-строка, мкс':>14} {'isEnabledFor, мкс':>18} {'+ трассировка, мкс':>19}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for items in args.value_items:
+            value = {f"field{i}": i for i in range(items)}
+            # Для больших значений уменьшаем число операций, чтобы прежний вариант не шел минутами
+            ops = max(1000, args.ops // max(1, items // 100))
+            timings = []
+            for name, db_class, tracer in (("eager", EagerLoggingKVDB, None), ("lazy", KVDB, None),
+                                           ("traced", KVDB, RecordingTracer())):
+                db = db_class(
+                    storage_engine=InMemoryStorage(),
+                    persistence=Snapshotter(os.path.join(temp_dir, f"{name}-{items}.bin")),
+                    wal=FileWal(os.path.join(temp_dir, f"{name}-{items}.wal"), durability="none"),
+                    tracer=tracer,
+                )
+                db.set("key", value)
+                _measure(db, ops // 10)  # прогрев
+                timings.append(_measure(db, ops))
+                db.wal.close()
+            print(f"{items:>20,} {timings[0]:>14.3f} {timings[1]:>18.3f} {timings[2]:>19.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Бенчмарк запуска KVDB после сбоя: снапшот плюс длинный сегментированный WAL.
+
+Режимы:
+    serial     - сегменты читаются в текущем процессе, снапшот после применения
+                 журнала пишется до того, как база становится доступна (как раньше);
+    parallel   - закрытые сегменты разбираются и сворачиваются в пуле процессов,
+                 пока основной процесс загружает снапшот;
+    parallel+bg - то же, а снапшот после применения журнала пишется в фоне.
+
+Время - от создания KVDB до готовности принимать запросы. Журнал состоит
+из перезаписей --keys ключей, поэтому свертка сегментов в процессах пула
+сокращает число операций, передаваемых и применяемых основным процессом.
+Выигрыш пула зависит от числа ядер: на одном ядре процессы только
+добавляют расходы на запуск и передачу результатов.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_parallel_recovery [--snapshot-keys 200000] [--records 500000] [--keys 10000] [--processes 4]
+"""
+import argparse
+import gc
+import os
+import shutil
+import tempfile
+import time
+
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import FORMAT_BINARY, FORMAT_JSON, SegmentedWal
+
+SEGMENT_RECORDS = 50_000
+
+
+def _open(directory: str, record_format: str, **kwargs) -> KVDB:
+    return KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(directory, "snapshot.bin")),
+        wal=SegmentedWal(os.path.join(directory, "wal"), max_segment_records=SEGMENT_RECORDS,
+                         record_format=record_format, durability="none"),
+        auto_snapshot_threshold=10 ** 12,
+        **kwargs
+    )
+
+
+def _prepare(directory: str, record_format: str, snapshot_keys: int, records: int, keys: int) -> None:
+    """Снапшот с snapshot_keys ключами и records несвернутых операций в журнале."""
+    db = _open(directory, record_format)
+    db.set_many((f"base{i}", {"payload": "x" * 64, "i": i}) for i in range(snapshot_keys))
+    db._create_snapshot()
+    for i in range(records):
+        db.set(f"key{i % keys}", {"version": i, "payload": "x" * 64})
+    db.wal.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot-keys", type=int, default=200_000)
+    parser.add_argument("--records", type=int, default=500_000)
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    processes = max(2, args.processes)
+    print(f"ключей в снапшоте: {args.snapshot_keys:,}, записей в WAL: {args.records:,}, "
+          f"процессов: {processes}, ядер: {os.cpu_count()}")
+    print(f"{'формат':<8} {'режим':<12} {'до готовности, с':>17}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for record_format in (FORMAT_JSON, FORMAT_BINARY):
+            source = os.path.join(temp_dir, f"source-{record_format}")
+            _prepare(source, record_format, args.snapshot_keys, args.records, args.keys)
+            expected = None
+            for mode, options in (("serial", {}),
+                                  ("parallel", {"recovery_processes": processes}),
+                                  ("parallel+bg", {"recovery_processes": processes, "background_snapshots": True})):
+                target = os.path.join(temp_dir, f"{record_format}-{mode}")
+                shutil.copytree(source, target)
+                start = time.perf_counter()
+                db = _open(target, record_format, **options)
+                elapsed = time.perf_counter() - start
+                count = db.storage_engine.count()
+                assert expected is None or count == expected
+                expected = count
+                db.wait_for_snapshot()
+                db.wal.close()
+                # Данные предыдущего прогона увеличивали бы стоимость сборки мусора в следующем
+                del db
+                gc.collect()
+                print(f"{record_format:<8} {mode:<12} {elapsed:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
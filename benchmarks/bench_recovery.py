@@ -0,0 +1,97 @@
+"""
+Бенчмарк восстановления KVDB из WAL: время и пиковый RSS процесса.
+
+Журнал содержит много перезаписей небольшого набора ключей, поэтому объем
+журнала значительно больше объема данных. Каждый режим восстановления
+запускается в отдельном процессе, чтобы пиковый RSS не смешивался.
+
+Режимы:
+    list   - как раньше: replay() материализует список всех операций
+    stream - KVDB._initialize потребляет iter_replay() по одной записи
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_recovery [--records 1000000] [--keys 10000]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import FileWal, FORMAT_BINARY, FORMAT_JSON
+
+
+def _peak_rss_mb() -> float:
+    # На Linux ru_maxrss измеряется в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _fill(wal_path: str, record_format: str, records: int, keys: int) -> None:
+    wal = FileWal(wal_path, record_format=record_format, durability="none")
+    for i in range(records):
+        wal.log({"type": "set", "key": f"key{i % keys}", "value": {"version": i, "payload": "x" * 64}})
+    wal.close()
+
+
+def _child(mode: str, snapshot_path: str, wal_path: str, record_format: str) -> None:
+    """Восстанавливает базу в текущем процессе и печатает результат в JSON."""
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "list":
+        storage = InMemoryStorage()
+        for operation in FileWal(wal_path, record_format=record_format).replay():
+            if operation["type"] == "set":
+                storage.set(operation["key"], operation["value"])
+            else:
+                storage.delete(operation["key"])
+        size = len(storage.get_all_data())
+    else:
+        wal = FileWal(wal_path, record_format=record_format)
+        # Журнал не очищаем, чтобы переиспользовать его в следующих прогонах
+        wal.compact = lambda: None
+        db = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), wal, auto_snapshot_threshold=10**9)
+        size = len(db.storage_engine.get_all_data())
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"keys": size, "seconds": elapsed, "rss_before": rss_before, "rss_peak": _peak_rss_mb()}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "SNAPSHOT", "WAL", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    print(f"записей в WAL: {args.records:,}, уникальных ключей: {args.keys:,}")
+    print(f"{'формат':<8} {'режим':<8} {'время, с':>9} {'RSS до, МБ':>11} {'пик RSS, МБ':>12} {'прирост, МБ':>12}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_path = os.path.join(temp_dir, "snapshot.json")
+        for record_format in (FORMAT_JSON, FORMAT_BINARY):
+            wal_path = os.path.join(temp_dir, f"wal-{record_format}.log")
+            _fill(wal_path, record_format, args.records, args.keys)
+            for mode in ("list", "stream"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_recovery", "--child",
+                     mode, snapshot_path, wal_path, record_format],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                if os.path.exists(snapshot_path):
+                    os.remove(snapshot_path)
+                assert result["keys"] == args.keys
+                print(f"{record_format:<8} {mode:<8} {result['seconds']:>9.2f} {result['rss_before']:>11.1f} "
+                      f"{result['rss_peak']:>12.1f} {result['rss_peak'] - result['rss_before']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Бенчмарк шардирования: одна KVDB против ShardedKVDB.
+
+Два сценария:
+- запись с fsync на каждую операцию из нескольких потоков: у одной KVDB
+  все потоки ждут один журнал, у ShardedKVDB fsync разных шардов идут
+  параллельно (fsync отпускает GIL);
+- восстановление после сбоя, когда в журналах шардов остались все
+  операции: в одном процессе и в пуле процессов. Выигрыш пула зависит
+  от числа ядер; на одном ядре он уходит в минус на запуск процессов.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_sharding [--shards 4] [--threads 8] [--ops 2000] [--recovery-ops 200000]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.sharding import ShardedKVDB
+from app.core.storage import InMemoryStorage
+from app.core.wal import FileWal
+
+WAL_OPTIONS = {"record_format": "binary"}
+
+
+def _write_throughput(db, threads: int, ops: int) -> float:
+    """Пишет ops операций из threads потоков и возвращает операций в секунду."""
+    per_thread = ops // threads
+
+    def worker(thread_id: int) -> None:
+        for i in range(per_thread):
+            db.set(f"t{thread_id}:{i}", i)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def _recovery_time(dir_path: str, shards: int, ops: int, processes: int) -> float:
+    """Заполняет журналы шардов без снапшотов и измеряет время открытия."""
+    db = ShardedKVDB(dir_path, shards=shards, wal_options=WAL_OPTIONS, auto_snapshot_threshold=10 ** 12)
+    for start in range(0, ops, 1000):
+        for i in range(start, min(start + 1000, ops)):
+            db.set(f"key{i}", {"value": i})
+    # Сбой: журналы не сжаты, снапшотов нет
+    for shard in db.shards:
+        shard.wal.close()
+    start = time.perf_counter()
+    db = ShardedKVDB(dir_path, shards=shards, wal_options=WAL_OPTIONS, recovery_processes=processes)
+    elapsed = time.perf_counter() - start
+    for shard in db.shards:
+        shard.wal.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=2_000)
+    parser.add_argument("--recovery-ops", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        single = KVDB(
+            storage_engine=InMemoryStorage(),
+            persistence=Snapshotter(os.path.join(temp_dir, "single.bin")),
+            wal=FileWal(os.path.join(temp_dir, "single.wal"), durability="fsync", **WAL_OPTIONS),
+            auto_snapshot_threshold=10 ** 12,
+            thread_safe=True,
+        )
+        sharded = ShardedKVDB(
+            os.path.join(temp_dir, "sharded"), shards=args.shards,
+            wal_options=dict(WAL_OPTIONS, durability="fsync"), auto_snapshot_threshold=10 ** 12,
+        )
+        print(f"запись с fsync, {args.threads} потоков, {args.ops:,} операций")
+        print(f"{'KVDB':<28} {_write_throughput(single, args.threads, args.ops):>12,.0f} оп/с")
+        print(f"{f'ShardedKVDB, {args.shards} шарда':<28} {_write_throughput(sharded, args.threads, args.ops):>12,.0f} оп/с")
+        single.wal.close()
+        for shard in sharded.shards:
+            shard.wal.close()
+
+        print(f"\nвосстановление {args.recovery_ops:,} операций из журналов {args.shards} шардов (ядер: {os.cpu_count()})")
+        for processes in (1, args.shards):
+            elapsed = _recovery_time(os.path.join(temp_dir, f"recovery-{processes}"), args.shards,
+                                     args.recovery_ops, processes)
+            print(f"{f'процессов: {processes}':<28} {elapsed:>12.3f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Бенчмарк форматов снапшота: JSON с отступами против бинарного формата.
+
+Сохраняет и загружает снапшот из keys ключей в каждом формате и выводит
+время записи, время загрузки, размер файла, а для загрузки еще системное
+время процесса и число page faults (getrusage): на больших снапшотах
+загрузку замедляет выделение памяти ядром, а не разбор формата.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_snapshot [--keys 5000000]
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from app.core.persistence import Snapshotter
+
+
+def _measure(snapshotter: Snapshotter, data: dict) -> tuple:
+    start = time.perf_counter()
+    snapshotter.dump(data, lsn=len(data))
+    dump_time = time.perf_counter() - start
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    loaded = snapshotter.load()
+    load_time = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    assert len(loaded) == len(data)
+    return (
+        dump_time, load_time, after.ru_stime - usage.ru_stime, after.ru_minflt - usage.ru_minflt,
+        os.path.getsize(snapshotter.file_path)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    data = {f"user:{i}": {"index": i, "name": f"name{i}", "active": i % 2 == 0} for i in range(args.keys)}
+
+    print(f"ключей: {args.keys:,}")
+    print(f"{'формат':<8} {'запись, с':>10} {'загрузка, с':>12} {'из них сист., с':>16} {'page faults':>12} {'размер, МБ':>11}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for format, file_name in (("json", "snapshot.json"), ("binary", "snapshot.bin")):
+            snapshotter = Snapshotter(os.path.join(temp_dir, file_name), format=format)
+            dump_time, load_time, sys_time, faults, size = _measure(snapshotter, data)
+            print(
+                f"{format:<8} {dump_time:>10.2f} {load_time:>12.2f} {sys_time:>16.2f} {faults:>12,} {size / 2**20:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
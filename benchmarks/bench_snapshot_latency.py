@@ -0,0 +1,69 @@
+"""
+Бенчмарк задержки записи при автоматических снапшотах: синхронный и фоновый режимы.
+
+Заполняет базу keys ключами и затем выполняет ops перезаписей, измеряя
+задержку каждого KVDB.set. Синхронный снапшот останавливает запись,
+пересекшую порог, на все время сериализации; фоновый - только на снятие
+состояния данных.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_snapshot_latency [--keys 100000] [--ops 20000]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import SegmentedWal
+
+
+def _run(temp_dir: str, background: bool, keys: int, ops: int, threshold: int) -> list:
+    name = "background" if background else "sync"
+    db = KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(temp_dir, f"{name}.json")),
+        wal=SegmentedWal(os.path.join(temp_dir, f"wal-{name}"), record_format="binary"),
+        auto_snapshot_threshold=10**9,
+    )
+    for i in range(keys):
+        db.storage_engine.set(f"key{i}", {"index": i, "payload": "x" * 32})
+    db.auto_snapshot_threshold = threshold
+    db.background_snapshots = background
+
+    latencies = []
+    for i in range(ops):
+        start = time.perf_counter()
+        db.set(f"key{i % keys}", {"index": i, "payload": "y" * 32})
+        latencies.append(time.perf_counter() - start)
+    db.wait_for_snapshot()
+    db.wal.close()
+    return latencies
+
+
+def _percentile(values: list, q: float) -> float:
+    return statistics.quantiles(values, n=1000)[int(q * 10) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--threshold", type=int, default=5_000)
+    args = parser.parse_args()
+
+    print(f"ключей: {args.keys:,}, операций: {args.ops:,}, порог снапшота: {args.threshold:,}")
+    print(f"{'режим':<12} {'p50, мкс':>10} {'p99, мкс':>10} {'p99.9, мкс':>11} {'max, мс':>9}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for background in (False, True):
+            latencies = _run(temp_dir, background, args.keys, args.ops, args.threshold)
+            print(f"{'фоновый' if background else 'синхронный':<12} "
+                  f"{_percentile(latencies, 50) * 1e6:>10.1f} {_percentile(latencies, 99) * 1e6:>10.1f} "
+                  f"{_percentile(latencies, 99.9) * 1e6:>11.1f} {max(latencies) * 1e3:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Бенчмарк загрузки снапшота при старте: время и пиковый RSS процесса.
+
+Каждый режим запускается в отдельном процессе. Отношение пика к итоговому
+приросту RSS показывает, во сколько раз загрузка требует больше памяти,
+чем занимают сами данные.
+
+Режимы:
+    load   - как раньше: Snapshotter.load() собирает словарь, load_data() копирует его
+    stream - Snapshotter.load_into() передает пары прямо в движок хранения
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_snapshot_load [--keys 1000000]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+
+
+def _peak_rss_mb() -> float:
+    # На Linux ru_maxrss измеряется в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _fill(snapshot_path: str, keys: int) -> None:
+    data = {f"user:{i}": {"index": i, "name": f"name{i}", "payload": "x" * 64} for i in range(keys)}
+    Snapshotter(snapshot_path).dump(data)
+
+
+def _child(mode: str, snapshot_path: str) -> None:
+    """Загружает снапшот в текущем процессе и печатает результат в JSON."""
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    storage = InMemoryStorage()
+    snapshotter = Snapshotter(snapshot_path)
+    if mode == "load":
+        storage.load_data(snapshotter.load())
+    else:
+        snapshotter.load_into(storage)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "seconds": elapsed, "rss_before": rss_before, "rss_peak": _peak_rss_mb(), "rss_after": _current_rss_mb()
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "SNAPSHOT"), help=argparse.SUPPRESS)
+    parser.add_argument("--fill", metavar="SNAPSHOT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+    if args.fill:
+        _fill(args.fill, args.keys)
+        return
+
+    print(f"ключей: {args.keys:,}")
+    print(f"{'формат':<8} {'режим':<8} {'время, с':>9} {'данные, МБ':>11} {'пик, МБ':>9} {'пик/данные':>11}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for file_name in ("snapshot.json", "snapshot.bin"):
+            snapshot_path = os.path.join(temp_dir, file_name)
+            # Данные готовятся в отдельном процессе: на Linux пиковый RSS родителя
+            # наследуется дочерним процессом и исказил бы измерения
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_snapshot_load", "--fill", snapshot_path,
+                            "--keys", str(args.keys)], check=True)
+            for mode in ("load", "stream"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_snapshot_load", "--child", mode, snapshot_path],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                resident = result["rss_after"] - result["rss_before"]
+                peak = result["rss_peak"] - result["rss_before"]
+                print(f"{Snapshotter(snapshot_path).format:<8} {mode:<8} {result['seconds']:>9.2f} "
+                      f"{resident:>11.1f} {peak:>9.1f} {peak / resident:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Бенчмарк памяти снапшота: полная копия словаря против copy-on-write оверлея.
+
+Измеряет (через tracemalloc) пиковый прирост памяти и время, затраченное
+на снятие состояния, пока во время снапшота изменяется modified ключей.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_snapshot_memory [--keys 1000000] [--modified 10000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from app.core.storage import InMemoryStorage
+
+
+def _measure(storage: InMemoryStorage, copy: bool, modified: int) -> tuple:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    data = storage.get_all_data() if copy else storage.begin_snapshot()
+    capture_time = time.perf_counter() - start
+    for i in range(modified):
+        storage.set(f"key{i}", -i)
+    assert data["key0"] == 0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if not copy:
+        storage.end_snapshot()
+    for i in range(modified):
+        storage.set(f"key{i}", i)
+    return capture_time, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--modified", type=int, default=10_000)
+    args = parser.parse_args()
+
+    storage = InMemoryStorage()
+    for i in range(args.keys):
+        storage.set(f"key{i}", i)
+
+    print(f"ключей: {args.keys:,}, изменено во время снапшота: {args.modified:,}")
+    print(f"{'способ':<22} {'снятие, мс':>11} {'пик памяти, МБ':>15}")
+    for name, copy in (("копия get_all_data()", True), ("COW begin_snapshot()", False)):
+        capture_time, peak = _measure(storage, copy, args.modified)
+        print(f"{name:<22} {capture_time * 1e3:>11.2f} {peak / 2**20:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Массовая загрузка через TCP сервер KVDB (app.server.tcp): без конвейера и с ним.
+
+Сервер и клиент работают в одном процессе и одном цикле событий, соединения
+идут через loopback. Режимы:
+    sequential - одно соединение, следующая запись отправляется после ответа на предыдущую;
+    pipelined  - одно соединение, до --depth записей одновременно в полете;
+    pool       - пул из --connections соединений, до --depth записей в полете.
+Без конвейера каждая запись ждет собственный fsync; с конвейером записи,
+ожидающие фиксации одновременно, покрываются одним group commit.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_tcp [--keys 20000] [--depth 256] [--connections 4] [--durability fsync]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+from typing import Any, Iterable, Iterator, List, Tuple
+
+from app.core.database import KVDB
+from app.core.persistence import Snapshotter
+from app.core.storage import InMemoryStorage
+from app.core.wal import SegmentedWal
+from app.server.client import KVDBClient, KVDBClientPool
+from app.server.tcp import KVDBServer
+
+
+def _chunks(items: Iterable[Tuple[str, Any]], size: int) -> Iterator[List[Tuple[str, Any]]]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+async def _run_mode(mode: str, args: argparse.Namespace, data_dir: str) -> float:
+    db = KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(os.path.join(data_dir, "snapshot.bin")),
+        wal=SegmentedWal(os.path.join(data_dir, "wal"), group_commit=True, record_format="binary",
+                         durability=args.durability),
+        auto_snapshot_threshold=10 * args.keys,
+        thread_safe=True,
+    )
+    keys = args.keys // 10 if mode == "sequential" else args.keys
+    items = ((f"{mode}:key{i}", {"i": i, "payload": "x" * 64}) for i in range(keys))
+    async with KVDBServer(db) as server:
+        if mode == "pool":
+            client = KVDBClientPool(port=server.port, size=args.connections)
+        else:
+            client = KVDBClient(port=server.port)
+        async with client:
+            start = time.perf_counter()
+            if mode == "sequential":
+                for key, value in items:
+                    await client.set(key, value)
+            else:
+                for chunk in _chunks(items, args.depth):
+                    await client.set_many(chunk)
+            elapsed = time.perf_counter() - start
+    return keys / elapsed
+
+
+async def _run(args: argparse.Namespace) -> None:
+    print(f"записей: {args.keys:,} (sequential - {args.keys // 10:,}), глубина конвейера: {args.depth}, "
+          f"соединений в пуле: {args.connections}, durability: {args.durability}")
+    print(f"{'режим':<12} {'записей/с':>12}")
+    for mode in ("sequential", "pipelined", "pool"):
+        with tempfile.TemporaryDirectory() as data_dir:
+            rate = await _run_mode(mode, args, data_dir)
+        print(f"{mode:<12} {rate:>12,.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=20_000)
+    parser.add_argument("--depth", type=int, default=256, help="число записей одновременно в полете")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--durability", default="fsync", choices=["none", "flush", "fsync"])
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
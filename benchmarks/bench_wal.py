@@ -0,0 +1,104 @@
+"""
+Бенчмарк записи в WAL: ops/s для разных режимов FileWal.
+
+Сравнивает исходную схему (open/write/close на каждую операцию) с постоянным
+файловым дескриптором на каждом уровне durability и group commit с несколькими писателями.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_wal [--ops 20000] [--threads 8]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from app.core.wal import FileWal, Durability
+
+
+def _operation(i: int) -> dict:
+    return {"type": "set", "key": f"key{i}", "value": {"index": i, "payload": "x" * 32}}
+
+
+def bench_open_close(path: str, ops: int) -> float:
+    """Исходная реализация FileWal.log: файл открывается и закрывается на каждую запись."""
+    start = time.perf_counter()
+    for i in range(ops):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(_operation(i), ensure_ascii=False) + '\n')
+    return ops / (time.perf_counter() - start)
+
+
+def bench_open_close_fsync(path: str, ops: int) -> float:
+    """Исходная схема с fsync на каждую запись — базовая линия для durable-записи."""
+    start = time.perf_counter()
+    for i in range(ops):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(_operation(i), ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    return ops / (time.perf_counter() - start)
+
+
+def bench_persistent(path: str, ops: int, durability: Durability) -> float:
+    """Постоянный дескриптор с заданным уровнем durability."""
+    wal = FileWal(path, durability=durability)
+    start = time.perf_counter()
+    for i in range(ops):
+        wal.log(_operation(i))
+    elapsed = time.perf_counter() - start
+    wal.close()
+    return ops / elapsed
+
+
+def bench_group_commit(path: str, ops: int, threads: int, flush_interval: float, batch: int) -> float:
+    """Group commit: несколько писателей, один write + fsync на пакет."""
+    wal = FileWal(path, group_commit=True, flush_interval=flush_interval, max_batch_size=batch)
+    per_thread = ops // threads
+
+    def writer(offset: int) -> None:
+        for i in range(per_thread):
+            wal.log(_operation(offset + i))
+
+    workers = [threading.Thread(target=writer, args=(t * per_thread,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    wal.close()
+    return per_thread * threads / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--flush-interval", type=float, default=0.0)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        def path(name: str) -> str:
+            return os.path.join(temp_dir, name)
+
+        results = [
+            ("open/close на операцию (исходный)", bench_open_close(path("legacy.log"), args.ops)),
+            *[(f"постоянный дескриптор, durability={level.value}",
+               bench_persistent(path(f"persistent-{level.value}.log"), args.ops, level))
+              for level in Durability],
+            ("open/close + fsync на операцию", bench_open_close_fsync(path("legacy_fsync.log"), args.ops)),
+            (f"group commit + fsync, {args.threads} потоков",
+             bench_group_commit(path("group.log"), args.ops, args.threads, args.flush_interval, args.batch)),
+        ]
+
+    baseline = results[0][1]
+    print(f"{'режим':<45} {'ops/s':>12} {'x':>7}")
+    for name, rate in results:
+        print(f"{name:<45} {rate:>12,.0f} {rate / baseline:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Бенчмарк replay WAL: JSON-строки против бинарного формата с CRC32.
+
+Запуск из корня репозитория:
+    uv run python -m benchmarks.bench_wal_replay [--records 10000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.core.wal import FileWal, FORMAT_BINARY, FORMAT_JSON
+
+
+def _fill(path: str, record_format: str, records: int) -> float:
+    """Записывает журнал из records операций и возвращает время записи."""
+    wal = FileWal(path, record_format=record_format, durability="none")
+    start = time.perf_counter()
+    for i in range(records):
+        if i % 10 == 9:
+            wal.log({"type": "delete", "key": f"user:{i - 1}"})
+        else:
+            wal.log({"type": "set", "key": f"user:{i}", "value": {"id": i, "name": f"user{i}", "active": True}})
+    elapsed = time.perf_counter() - start
+    wal.close()
+    return elapsed
+
+
+def _replay(path: str, record_format: str) -> float:
+    wal = FileWal(path, record_format=record_format)
+    start = time.perf_counter()
+    operations = wal.replay()
+    elapsed = time.perf_counter() - start
+    wal.close()
+    assert operations
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for record_format in (FORMAT_JSON, FORMAT_BINARY):
+            path = os.path.join(temp_dir, f"wal-{record_format}.log")
+            write_time = _fill(path, record_format, args.records)
+            replay_time = _replay(path, record_format)
+            rows.append((record_format, os.path.getsize(path), write_time, replay_time))
+
+    json_replay = rows[0][3]
+    print(f"записей: {args.records:,}")
+    print(f"{'формат':<8} {'размер, МБ':>11} {'запись, с':>10} {'replay, с':>10} {'replay x':>9}")
+    for record_format, size, write_time, replay_time in rows:
+        print(f"{record_format:<8} {size / 2**20:>11.1f} {write_time:>10.2f} {replay_time:>10.2f} "
+              f"{json_replay / replay_time:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
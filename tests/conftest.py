@@ -1,12 +1,13 @@
 import os
 import tempfile
+from typing import Any, Dict, Optional
 
 import pytest
 
 from app.core.database import KVDB
 from app.core.persistence import Snapshotter
 from app.core.storage import InMemoryStorage
-from app.core.wal import FileWal
+from app.core.wal import FileWal, SegmentedWal
 
 
 @pytest.fixture
@@ -17,6 +18,51 @@ def temp_files():
         yield snapshot_path, wal_path
 
 
+@pytest.fixture
+def data_dir(request):
+    """
+    Временный каталог данных. Косвенный параметр (indirect=True) задает
+    имя подкаталога, который заранее не создается.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        subdir = getattr(request, "param", None)
+        yield temp_dir if subdir is None else os.path.join(temp_dir, subdir)
+
+
+def _open_db(
+    directory: str,
+    snapshot: str = "snapshot.bin",
+    record_format: str = "binary",
+    group_commit: bool = False,
+    segment_records: Optional[int] = None,
+    storage_options: Optional[Dict[str, Any]] = None,
+    **options: Any
+) -> KVDB:
+    """
+    KVDB в каталоге directory: журнал FileWal wal.log или, если задан
+    segment_records, SegmentedWal в подкаталоге wal. options передаются KVDB.
+    """
+    if segment_records is None:
+        wal = FileWal(os.path.join(directory, "wal.log"), group_commit=group_commit, record_format=record_format)
+    else:
+        wal = SegmentedWal(
+            os.path.join(directory, "wal"), max_segment_records=segment_records,
+            group_commit=group_commit, record_format=record_format
+        )
+    return KVDB(
+        storage_engine=InMemoryStorage(**(storage_options or {})),
+        persistence=Snapshotter(os.path.join(directory, snapshot)),
+        wal=wal,
+        **options
+    )
+
+
+@pytest.fixture
+def open_db():
+    """Фабрика KVDB в заданном каталоге (см. _open_db)."""
+    return _open_db
+
+
 @pytest.fixture
 def temp_snapshot_file():
     with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as f:
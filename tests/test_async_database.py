@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.async_database import AsyncKVDB
+from app.core.interfaces import MISSING
+
+
+class TestAsyncKVDB:
+
+    def test_basic_operations(self, data_dir, open_db):
+        """get/set/delete/get_many/set_many; записи переживают перезапуск"""
+        async def scenario():
+            async with AsyncKVDB(open_db(data_dir, group_commit=True, thread_safe=True)) as db:
+                await db.set("a", 1)
+                await db.set("b", None, namespace="ns")
+                await db.set_many({"c": 3, "d": 4})
+                await db.set_many([])
+                assert await db.get("a") == 1
+                assert await db.get_many(["a", "b", "c", "x"]) == {"a": 1, "c": 3}
+                assert await db.get_many(["b", "x"], namespace="ns", ordered=True) == [None, MISSING]
+                assert await db.delete("a") is True
+                assert await db.delete("a") is False
+            with pytest.raises(IOError):
+                await db.set("e", 5)
+
+        asyncio.run(scenario())
+        db = open_db(data_dir, group_commit=True, thread_safe=True)
+        assert db.get("a") is None and db.get("d") == 4
+        assert db.get_many(["b"], namespace="ns") == {"b": None}
+        db.shutdown()
+
+    def test_concurrent_writes_share_a_group(self, data_dir, open_db):
+        """Одновременные записи фиксируются группами: записей WAL меньше, чем операций"""
+        db = open_db(data_dir, group_commit=True, thread_safe=True, auto_snapshot_threshold=10_000)
+
+        async def scenario():
+            async with AsyncKVDB(db, shutdown_db=False) as adb:
+                await asyncio.gather(*(adb.set(f"key{i}", i) for i in range(200)))
+                assert adb.committed_operations == 200
+                assert adb.commits < 20
+                # Исход delete внутри группы учитывает предыдущие операции группы
+                results = await asyncio.gather(
+                    adb.set("k", 1), adb.delete("k"), adb.delete("k"), adb.delete("missing"),
+                    adb.set("k", 2),
+                )
+                assert results == [None, True, False, False, None]
+
+        asyncio.run(scenario())
+        assert len(db.wal.replay()) < 30
+        assert db.get("k") == 2 and db.get("key199") == 199
+        db.shutdown()
+
+    def test_writes_do_not_block_event_loop(self, data_dir, open_db):
+        """Запись и снапшот выполняются вне цикла событий: чтения не ждут фиксации"""
+        db = open_db(data_dir, group_commit=True, thread_safe=True, auto_snapshot_threshold=10_000)
+        released = threading.Event()
+        original_write = db.write
+
+        def slow_write(batch):
+            released.wait(5)
+            return original_write(batch)
+
+        db.write = slow_write
+
+        async def scenario():
+            async with AsyncKVDB(db, shutdown_db=False) as adb:
+                await adb.set("a", 1)
+                pending = asyncio.gather(adb.set("b", 2), adb.set("c", 3))
+                await asyncio.sleep(0.05)
+                # Группа еще не записана, но цикл событий свободен и чтения обслуживаются
+                assert not pending.done()
+                assert await adb.get("a") == 1 and await adb.get("b") is None
+                released.set()
+                await pending
+                assert await adb.get_many(["b", "c"]) == {"b": 2, "c": 3}
+
+        asyncio.run(scenario())
+        db.shutdown()
+
+    def test_delete_probe_does_not_touch_eviction(self, data_dir, open_db):
+        """Проверка существования ключа перед delete в группе не считается обращением для политики вытеснения"""
+        db = open_db(data_dir, group_commit=True, thread_safe=True, storage_options={"max_keys": 10})
+        storage = db.storage_engine
+        for key in "abc":
+            db.set(key, key)
+        accessed = []
+        storage._policy.accessed = accessed.append
+
+        async def scenario():
+            async with AsyncKVDB(db, shutdown_db=False) as adb:
+                results = await asyncio.gather(adb.delete("a"), adb.delete("missing"), adb.set("d", 4))
+                assert results == [True, False, None]
+
+        asyncio.run(scenario())
+        assert accessed == []
+        assert storage.contains("b") and not storage.contains("a") and not storage.contains("missing")
+        assert list(storage._policy.candidates()) == [(None, "b"), (None, "c"), (None, "d")]
+        db.shutdown()
+
+    def test_wal_error_fails_whole_group(self, data_dir, open_db):
+        """Ошибка журнала завершает с ошибкой все записи группы"""
+        db = open_db(data_dir, group_commit=True, thread_safe=True)
+
+        async def scenario():
+            async with AsyncKVDB(db, shutdown_db=False) as adb:
+                await adb.set("a", 1)
+                db.wal.close()
+                results = await asyncio.gather(adb.set("b", 2), adb.delete("a"), return_exceptions=True)
+                assert all(isinstance(result, IOError) for result in results)
+                assert adb.commits == 1
+
+        asyncio.run(scenario())
+        with pytest.raises(ValueError):
+            AsyncKVDB(db, max_batch=0)
@@ -0,0 +1,29 @@
+from app.core.batch import WriteBatch
+
+
+class TestWriteBatch:
+
+    def test_operations_format(self):
+        """Операции пакета хранятся в формате записей WAL"""
+        batch = WriteBatch()
+        batch.set("key1", "value1").delete("key2").set("alice", 1, namespace="users")
+
+        assert len(batch) == 3
+        assert list(batch) == [
+            {"type": "set", "key": "key1", "value": "value1"},
+            {"type": "delete", "key": "key2"},
+            {"type": "set", "key": "alice", "value": 1, "namespace": "users"},
+        ]
+
+    def test_set_many_and_delete_many(self):
+        """set_many принимает словарь или итератор пар, delete_many - итератор ключей"""
+        batch = WriteBatch()
+        batch.set_many({"a": 1, "b": 2})
+        batch.set_many((f"key{i}", i) for i in range(2))
+        batch.delete_many(["a", "key0"], namespace="users")
+
+        assert [op["key"] for op in batch] == ["a", "b", "key0", "key1", "a", "key0"]
+        assert batch.operations[-1] == {"type": "delete", "key": "key0", "namespace": "users"}
+
+        batch.clear()
+        assert len(batch) == 0
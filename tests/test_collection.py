@@ -1,5 +1,9 @@
+import json
+import os
+
 from app.core.collection import Collection
 from app.core.database import KVDB
+from app.core.interfaces import MISSING
 from app.core.persistence import Snapshotter
 from app.core.storage import InMemoryStorage
 from app.core.wal import FileWal
@@ -106,13 +110,28 @@ class TestCollection:
         assert col1.get("key") == "value1"
         assert col2.get("key") == "value2"
 
-    def test_prefix_in_database(self, db):
-        """Ключи хранятся с префиксом в базе данных"""
+    def test_namespace_in_database(self, db):
+        """Ключи хранятся в пространстве имен коллекции, а не в общем пространстве"""
         collection = Collection(db, "users")
         collection.set("user1", {"name": "name1"})
 
-        # Прямой доступ к базе с префиксом
-        assert db.get("users:user1") == {"name": "name1"}
+        assert db.get("user1", namespace="users") == {"name": "name1"}
+        assert db.get("users:user1") is None
+        assert db.get("user1") is None
+
+    def test_colon_keys_do_not_collide(self, db):
+        """Коллекция 'a' с ключом 'b:c' и коллекция 'a:b' с ключом 'c' не пересекаются"""
+        col1 = Collection(db, "a")
+        col2 = Collection(db, "a:b")
+        col1.set("b:c", "first")
+        col2.set("c", "second")
+        db.set("a:b:c", "plain")
+
+        assert col1.get("b:c") == "first"
+        assert col2.get("c") == "second"
+        assert db.get("a:b:c") == "plain"
+        assert col1.get_all() == {"b:c": "first"}
+        assert col2.count() == 1
 
     def test_overwrite_value(self, db):
         """Тест перезаписи значения в коллекции"""
@@ -139,7 +158,8 @@ class TestCollection:
         collection.set("key", "value")
 
         assert collection.get("key") == "value"
-        assert db.get(":key") == "value"
+        assert db.get("key", namespace="") == "value"
+        assert db.get("key") is None
 
     def test_complex_nested_data(self, db):
         """Тест хранения сложных вложенных данных"""
@@ -198,3 +218,136 @@ class TestCollection:
 
         assert users2.get("user1") == {"name": "name1"}
         assert products2.get("laptop") == {"price": 99999}
+
+    def test_get_all_does_not_copy_database(self, db, monkeypatch):
+        """get_all и count не должны копировать и просматривать всю базу данных"""
+        users = Collection(db, "users")
+        users.set("alice", 1)
+        users.set("bob", 2)
+        db.set("usersx", "не из коллекции")
+        Collection(db, "orders").set("1", "order")
+
+        get_all_data = db.storage_engine.get_all_data
+
+        def only_collection(namespace=None):
+            assert namespace == "users", "копировать можно только пространство имен коллекции"
+            return get_all_data(namespace=namespace)
+        monkeypatch.setattr(db.storage_engine, "get_all_data", only_collection)
+
+        assert users.get_all() == {"alice": 1, "bob": 2}
+        assert users.count() == 2
+
+    def test_count_after_restart(self, temp_files):
+        """Счетчик коллекции должен быть верным после загрузки снапшота и применения WAL"""
+        snapshot_path, wal_path = temp_files
+        db1 = create_db(snapshot_path, wal_path, threshold=3)
+        users1 = Collection(db1, "users")
+        for i in range(5):
+            users1.set(f"user{i}", i)
+        users1.delete("user0")
+        del db1  # Имитируем сбой без shutdown
+
+        db2 = create_db(snapshot_path, wal_path, threshold=3)
+        users2 = Collection(db2, "users")
+        assert users2.count() == 4
+        users2.set("user9", 9)
+        assert users2.count() == 5
+        assert str(users2) == "Collection(name='users', items=5)"
+
+    def test_drop(self, db):
+        """drop удаляет все элементы коллекции и не трогает остальные данные"""
+        users = Collection(db, "users")
+        orders = Collection(db, "orders")
+        for i in range(5):
+            users.set(f"user{i}", i)
+        orders.set("1", "order")
+        db.set("user0", "general")
+
+        assert users.drop() == 5
+        assert users.count() == 0
+        assert users.get_all() == {}
+        assert users.get("user0") is None
+        assert orders.get("1") == "order"
+        assert db.get("user0") == "general"
+        assert users.clear() == 0
+
+    def test_drop_single_wal_record(self, temp_files):
+        """drop пишет в WAL одну запись и считается одной операцией"""
+        snapshot_path, wal_path = temp_files
+        db = create_db(snapshot_path, wal_path, threshold=100)
+        users = Collection(db, "users")
+        for i in range(10):
+            users.set(f"user{i}", i)
+        operations = db.operation_count
+
+        users.drop()
+
+        assert db.operation_count == operations + 1
+        assert db.wal.replay()[-1] == {"type": "drop", "namespace": "users"}
+
+    def test_drop_after_restart(self, temp_files):
+        """Удаление коллекции восстанавливается из WAL и снапшота"""
+        snapshot_path, wal_path = temp_files
+        db1 = create_db(snapshot_path, wal_path, threshold=4)
+        users1 = Collection(db1, "users")
+        for i in range(5):
+            users1.set(f"user{i}", i)
+        users1.drop()
+        users1.set("new", "value")
+        Collection(db1, "orders").set("1", "order")
+        del db1  # Имитируем сбой без shutdown
+
+        db2 = create_db(snapshot_path, wal_path)
+        assert Collection(db2, "users").get_all() == {"new": "value"}
+        assert Collection(db2, "orders").get("1") == "order"
+
+    def test_legacy_prefixed_keys_migrated(self, data_dir, open_db):
+        """Коллекция, записанная прежней версией ключами "<имя>:" в снапшоте и WAL, видна и переносится один раз"""
+        # Плоский JSON снапшот и строки JSON журнала в формате прежней версии
+        with open(os.path.join(data_dir, "snapshot.json"), "w", encoding="utf-8") as f:
+            json.dump({"users:alice": {"age": 30}, "users:bob": {"age": 25}, "plain": 1}, f)
+        with open(os.path.join(data_dir, "wal.log"), "w", encoding="utf-8") as f:
+            for operation in (
+                {"type": "set", "key": "users:carol", "value": {"age": 41}},
+                {"type": "delete", "key": "users:bob"},
+                {"type": "set", "key": "orders:1", "value": "order"},
+            ):
+                f.write(json.dumps(operation) + "\n")
+
+        db = open_db(data_dir, "snapshot.json", "json")
+        users = Collection(db, "users")
+        assert users.get_all() == {"alice": {"age": 30}, "carol": {"age": 41}}
+        assert db.get("users:alice") is None and db.get("plain") == 1
+        assert db.wal.replay()[-1]['type'] == 'batch'
+        # Повторное создание коллекции ничего не переносит: ее пространство уже непусто
+        db.set("users:dave", "general")
+        assert Collection(db, "users").count() == 2 and db.get("users:dave") == "general"
+        del db  # Имитируем сбой без shutdown: перенос восстанавливается из WAL
+
+        db = open_db(data_dir, "snapshot.json", "json")
+        assert db.get("carol", namespace="users") == {"age": 41} and db.get("users:carol") is None
+        assert Collection(db, "orders").get("1") == "order" and db.get("orders:1") is None
+        db.shutdown()
+
+    def test_set_many_and_delete_many(self, db):
+        """set_many и delete_many работают в пространстве имен коллекции"""
+        users = Collection(db, "users")
+        users.set_many({f"user{i}": i for i in range(5)})
+        db.set("user0", "general")
+
+        assert users.count() == 5
+        assert users.delete_many(["user0", "user1", "missing"]) == 2
+        assert users.get_all() == {f"user{i}": i for i in range(2, 5)}
+        assert db.get("user0") == "general"
+
+    def test_get_many(self, db):
+        """get_many отличает отсутствующий ключ от сохраненного None"""
+        users = Collection(db, "users")
+        users.set_many({"alice": 1, "bob": None})
+        db.set("carol", "general")
+
+        assert users.get_many(["alice", "bob", "carol"]) == {"alice": 1, "bob": None}
+        assert users.get_many(["carol", "bob", "alice"], ordered=True) == [MISSING, None, 1]
+        assert users.exists("bob") is True
+        assert users.exists("carol") is False
+
@@ -0,0 +1,30 @@
+import pytest
+from app.core.compression import (
+    detect_compression, open_read, validate_compression, wrap_writer, COMPRESSIONS
+)
+
+
+class TestCompression:
+
+    @pytest.mark.parametrize("compression", COMPRESSIONS)
+    def test_write_and_read(self, tmp_path, compression):
+        """Тест записи и прозрачного чтения файла каждым кодеком"""
+        path = str(tmp_path / "data")
+        payload = b"repetitive payload " * 1000
+        with open(path, 'wb') as f:
+            out = wrap_writer(f, compression)
+            out.write(payload)
+            if out is not f:
+                out.close()
+            assert not f.closed
+
+        assert detect_compression(path) == compression
+        with open_read(path) as f:
+            assert f.read() == payload
+
+    def test_validate_compression(self):
+        """Тест проверки названия кодека"""
+        assert validate_compression(None) == "none"
+        assert validate_compression("lzma") == "lzma"
+        with pytest.raises(ValueError, match="Неизвестный кодек сжатия"):
+            validate_compression("zstd")
@@ -1,9 +1,16 @@
 import pytest
+import logging
 import os
+import shutil
+import threading
+from app.core.batch import WriteBatch
+from app.core.collection import Collection
 from app.core.database import KVDB
+from app.core.interfaces import MISSING
 from app.core.storage import InMemoryStorage
 from app.core.persistence import Snapshotter
-from app.core.wal import FileWal
+from app.core.tracing import RecordingTracer
+from app.core.wal import FileWal, SegmentedWal, Durability
 
 
 def create_db(snapshot_path, wal_path, threshold=100):
@@ -213,3 +220,535 @@ class TestKVDB:
         assert db2.get("key1") == "value1"
         assert db2.get("key2") == "value2"
 
+
+    def test_durability_passed_to_wal(self, temp_files):
+        """KVDB должна передавать уровень durability в журнал"""
+        snapshot_path, wal_path = temp_files
+        db = KVDB(
+            storage_engine=InMemoryStorage(),
+            persistence=Snapshotter(snapshot_path),
+            wal=FileWal(wal_path),
+            durability="fsync"
+        )
+
+        assert db.wal.durability is Durability.FSYNC
+        db.set("key1", "value1")
+        db.shutdown()
+
+    def test_initialization_streams_wal(self, temp_files, monkeypatch):
+        """Инициализация должна читать WAL потоково, а не через replay()"""
+        snapshot_path, wal_path = temp_files
+        wal = FileWal(wal_path)
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+        wal.log({"type": "set", "key": "key2", "value": "value2"})
+
+        def fail_replay():
+            raise AssertionError("replay() не должен вызываться при инициализации")
+        monkeypatch.setattr(wal, "replay", fail_replay)
+
+        db = KVDB(
+            storage_engine=InMemoryStorage(),
+            persistence=Snapshotter(snapshot_path),
+            wal=wal
+        )
+
+        assert db.get("key1") == "value1"
+        assert db.get("key2") == "value2"
+
+    def test_initialization_streams_snapshot(self, temp_files, monkeypatch):
+        """Инициализация должна загружать снапшот прямо в хранилище, без load() и копии"""
+        snapshot_path, wal_path = temp_files
+        Snapshotter(snapshot_path).dump({"key1": "value1", "key2": "value2"})
+
+        def fail(*args):
+            raise AssertionError("load() и load_data() не должны вызываться при инициализации")
+        monkeypatch.setattr(Snapshotter, "load", fail)
+        monkeypatch.setattr(InMemoryStorage, "load_data", fail)
+
+        db = create_db(snapshot_path, wal_path)
+
+        assert db.get("key1") == "value1"
+        assert db.get("key2") == "value2"
+
+
+def create_segmented_db(snapshot_path, wal_dir, threshold=100, **wal_kwargs):
+    return KVDB(
+        storage_engine=InMemoryStorage(),
+        persistence=Snapshotter(snapshot_path),
+        wal=SegmentedWal(wal_dir, **wal_kwargs),
+        auto_snapshot_threshold=threshold
+    )
+
+
+class TestKVDBNamespaces:
+
+    def test_namespace_operations(self, temp_files):
+        """Операции с пространством имен не затрагивают общее пространство"""
+        snapshot_path, wal_path = temp_files
+        db = create_db(snapshot_path, wal_path)
+        db.set("key", "general")
+        db.set("key", "users", namespace="users")
+
+        assert db.get("key") == "general"
+        assert db.get("key", namespace="users") == "users"
+        assert db.delete("key", namespace="users")
+        assert db.get("key") == "general"
+
+    @pytest.mark.parametrize("snapshot_name", ["snapshot.json", "snapshot.bin"])
+    def test_namespaces_across_restarts(self, tmp_path, snapshot_name):
+        """Пространства имен восстанавливаются из снапшота и WAL"""
+        snapshot_path, wal_path = str(tmp_path / snapshot_name), str(tmp_path / "wal.log")
+        db1 = create_db(snapshot_path, wal_path, threshold=3)
+        for i in range(4):
+            db1.set(f"user{i}", i, namespace="users")
+        db1.set("user0", "general")
+        db1.delete("user1", namespace="users")
+        del db1  # Имитируем сбой без shutdown
+
+        db2 = create_db(snapshot_path, wal_path)
+        assert db2.get("user0") == "general"
+        assert db2.storage_engine.get_all_data(namespace="users") == {"user0": 0, "user2": 2, "user3": 3}
+
+
+class TestKVDBBatch:
+
+    def test_set_many_single_wal_record(self, temp_files):
+        """set_many пишет в WAL одну запись, а каждая операция учитывается в пороге снапшота"""
+        snapshot_path, wal_path = temp_files
+        db = create_db(snapshot_path, wal_path, threshold=100)
+
+        db.set_many({f"key{i}": i for i in range(10)})
+
+        assert all(db.get(f"key{i}") == i for i in range(10))
+        assert db.operation_count == 10
+        operations = db.wal.replay()
+        assert len(operations) == 1
+        assert operations[0]["type"] == "batch"
+
+    def test_write_batch(self, temp_files):
+        """Пакет со смешанными операциями применяется по порядку"""
+        snapshot_path, wal_path = temp_files
+        db = create_db(snapshot_path, wal_path)
+        db.set("old", 1)
+
+        batch = WriteBatch().set("key", 1).delete("old").set("key", 2).set("alice", 1, namespace="users")
+        assert db.write(batch) == 1
+        assert db.write(WriteBatch()) == 0
+
+        assert db.get("key") == 2
+        assert db.get("old") is None
+        assert db.get("alice", namespace="users") == 1
+        assert db.delete_many(["key", "missing"]) == 1
+
+    def test_batch_snapshot_threshold(self, temp_files):
+        """Большой пакет запускает снапшот один раз по его завершении"""
+        snapshot_path, wal_path = temp_files
+        db = create_db(snapshot_path, wal_path, threshold=5)
+
+        db.set_many((f"key{i}", i) for i in range(12))
+
+        assert db.operation_count == 0
+        assert len(db.persistence.load()) == 12
+        assert db.wal.replay() == []
+
+    def test_get_many(self, temp_files):
+        """get_many возвращает словарь найденных ключей или упорядоченный список"""
+        snapshot_path, wal_path = temp_files
+        db = create_db(snapshot_path, wal_path)
+        db.set_many({"a": 1, "b": None})
+        db.set("a", "users", namespace="users")
+
+        assert db.get_many(["a", "b", "missing"]) == {"a": 1, "b": None}
+        assert db.get_many(iter(["missing", "b", "a"]), ordered=True) == [MISSING, None, 1]
+        assert db.get_many(["a", "b"], namespace="users") == {"a": "users"}
+        assert db.get_many([]) == {}
+
+    @pytest.mark.parametrize("record_format", ["json", "binary"])
+    def test_batch_replay(self, tmp_path, record_format):
+        """Пакет восстанавливается из WAL"""
+        snapshot_path, wal_path = str(tmp_path / "snapshot.json"), str(tmp_path / "wal.log")
+        db1 = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), FileWal(wal_path, record_format=record_format))
+        db1.set("old", 1)
+        db1.write(WriteBatch().set_many({"a": 1, "b": 2}, namespace="users").delete("old"))
+        del db1  # Имитируем сбой без shutdown
+
+        db2 = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), FileWal(wal_path, record_format=record_format))
+        assert db2.get("old") is None
+        assert db2.storage_engine.get_all_data(namespace="users") == {"a": 1, "b": 2}
+
+    def test_torn_batch_not_applied(self, tmp_path):
+        """Недописанный пакет в бинарном WAL не применяется частично"""
+        snapshot_path, wal_path = str(tmp_path / "snapshot.json"), str(tmp_path / "wal.log")
+        db1 = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), FileWal(wal_path, record_format="binary"))
+        db1.set("before", 1)
+        db1.set_many({f"key{i}": i for i in range(50)})
+        db1.wal.close()
+        with open(wal_path, 'r+b') as f:
+            f.truncate(os.path.getsize(wal_path) - 10)
+
+        db2 = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), FileWal(wal_path, record_format="binary"))
+        assert db2.storage_engine.get_all_data() == {"before": 1}
+
+
+class ExplodingRepr:
+    """Значение, форматирование которого считается ошибкой теста."""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __repr__(self):
+        self.formatted += 1
+        return "ExplodingRepr()"
+
+    __str__ = __repr__
+
+
+class TestKVDBTracing:
+
+    def test_values_not_formatted_without_debug(self, temp_files, caplog):
+        """Без уровня DEBUG значения не форматируются для лога"""
+        snapshot_path, wal_path = temp_files
+        # Бинарный журнал сохраняет значение через pickle, не вызывая repr
+        db = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), FileWal(wal_path, record_format="binary"))
+        value = ExplodingRepr()
+
+        with caplog.at_level(logging.INFO, logger="app.core"):
+            db.set("key", value)
+            db.get("key")
+            Collection(db, "users").set("key", value)
+        assert value.formatted == 0
+
+        with caplog.at_level(logging.DEBUG, logger="app.core"):
+            db.get("key")
+        assert value.formatted > 0
+        assert "GET: key = ExplodingRepr()" in caplog.text
+
+    def test_tracer_records_operations(self, temp_files):
+        """Трассировщик получает событие на каждую операцию, включая пакетные"""
+        snapshot_path, wal_path = temp_files
+        tracer = RecordingTracer()
+        db = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), FileWal(wal_path), tracer=tracer)
+
+        db.set("key", 1)
+        db.get("key", namespace="users")
+        db.delete("key")
+        db.set_many({"a": 1, "b": 2}, namespace="users")
+        db.get_many(["a", "b", "c"], namespace="users")
+        db.drop_namespace("users")
+
+        assert [(e.op, e.namespace, e.key, e.count) for e in tracer.events] == [
+            ("set", None, "key", 1),
+            ("get", "users", "key", 1),
+            ("delete", None, "key", 1),
+            ("batch", None, None, 2),
+            ("get_many", "users", None, 3),
+            ("drop", "users", None, 2),
+        ]
+        assert all(event.duration >= 0 for event in tracer.events)
+
+    def test_tracer_disabled_at_runtime(self, temp_files):
+        """Трассировку можно включить и выключить на работающей базе"""
+        snapshot_path, wal_path = temp_files
+        db = create_db(snapshot_path, wal_path)
+        tracer = RecordingTracer()
+
+        db.set("key1", 1)
+        db.tracer = tracer
+        db.set("key2", 2)
+        db.tracer = None
+        db.set("key3", 3)
+
+        assert [event.key for event in tracer.events] == ["key2"]
+
+
+class TestKVDBThreadSafe:
+
+    @pytest.mark.parametrize("background_snapshots", [False, True])
+    def test_concurrent_writers_stress(self, tmp_path, background_snapshots):
+        """Конкурентные записи, пакеты и снапшоты: состояние после восстановления совпадает с живым"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.bin"), str(tmp_path / "wal")
+
+        def open_db():
+            return KVDB(
+                InMemoryStorage(), Snapshotter(snapshot_path),
+                SegmentedWal(wal_dir, max_segment_records=50, group_commit=True, record_format="binary"),
+                auto_snapshot_threshold=37, background_snapshots=background_snapshots, thread_safe=True
+            )
+
+        db = open_db()
+        num_threads, per_thread = 8, 150
+        errors = []
+
+        def worker(thread_id):
+            try:
+                for i in range(per_thread):
+                    # Общие ключи: последний писатель определяется порядком в WAL
+                    db.set(f"shared{i % 10}", (thread_id, i))
+                    db.set(f"t{thread_id}:{i}", i, namespace="users")
+                    if i % 3 == 0:
+                        db.delete(f"t{thread_id}:{i - 1}", namespace="users")
+                    if i % 25 == 0:
+                        db.set_many({f"batch{thread_id}:{i}": i, f"shared{i % 10}": (thread_id, -i)})
+                        assert db.get_many([f"batch{thread_id}:{i}"]) == {f"batch{thread_id}:{i}": i}
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+        assert db.wait_for_snapshot(timeout=5)
+
+        live = db.storage_engine.get_all_data()
+        live_users = db.storage_engine.get_all_data(namespace="users")
+        deleted = {f"t{t}:{i - 1}" for t in range(num_threads) for i in range(3, per_thread, 3)}
+        assert set(live_users) == {f"t{t}:{i}" for t in range(num_threads) for i in range(per_thread)} - deleted
+        db.wal.close()  # Имитируем сбой без shutdown
+
+        recovered = open_db()
+        assert recovered.storage_engine.get_all_data() == live
+        assert recovered.storage_engine.get_all_data(namespace="users") == live_users
+        recovered.shutdown()
+
+    def test_readers_during_writes(self, temp_files):
+        """Читатели видят пакет записей либо целиком, либо не видят вовсе"""
+        snapshot_path, wal_path = temp_files
+        db = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), FileWal(wal_path, durability="none"),
+                  auto_snapshot_threshold=10 ** 9, thread_safe=True)
+        keys = [f"key{i}" for i in range(50)]
+        db.set_many({key: 0 for key in keys})
+        stop = threading.Event()
+        torn = []
+
+        def writer():
+            version = 0
+            while not stop.is_set():
+                version += 1
+                db.set_many({key: version for key in keys})
+
+        def reader():
+            for _ in range(100):
+                values = set(db.get_many(keys).values())
+                if len(values) != 1:
+                    torn.append(values)
+
+        writer_thread = threading.Thread(target=writer)
+        writer_thread.start()
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        stop.set()
+        writer_thread.join()
+        assert torn == []
+
+
+class TestKVDBSegmentedWal:
+
+    def test_persistence_across_restarts(self, tmp_path):
+        """Тест восстановления из снапшота и сегментированного WAL"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db1 = create_segmented_db(snapshot_path, wal_dir, threshold=5, max_segment_records=2)
+        for i in range(12):
+            db1.set(f"key{i}", i)
+        db1.delete("key0")
+        del db1  # Имитируем сбой без shutdown
+
+        db2 = create_segmented_db(snapshot_path, wal_dir, threshold=5, max_segment_records=2)
+        assert db2.get("key0") is None
+        assert all(db2.get(f"key{i}") == i for i in range(1, 12))
+
+    def test_snapshot_tagged_with_lsn(self, tmp_path):
+        """Снапшот должен помечаться LSN последней вошедшей в него операции"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db = create_segmented_db(snapshot_path, wal_dir, threshold=3)
+        for i in range(4):
+            db.set(f"key{i}", i)
+
+        assert db.persistence.load_lsn() == 3
+        assert [op["key"] for op in db.wal.iter_replay(after_lsn=3)] == ["key3"]
+
+    def test_snapshot_deletes_covered_segments(self, tmp_path):
+        """После снапшота должны удаляться сегменты, полностью вошедшие в него"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db = create_segmented_db(snapshot_path, wal_dir, threshold=10, max_segment_records=3)
+        for i in range(10):
+            db.set(f"key{i}", i)
+
+        assert db.wal.replay() == []
+        assert len(db.wal.segments()) == 1
+
+    def test_crash_between_snapshot_and_compact(self, tmp_path, monkeypatch):
+        """Сбой между снапшотом и сжатием не должен приводить к повторному применению операций"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db1 = create_segmented_db(snapshot_path, wal_dir, threshold=3)
+        monkeypatch.setattr(db1.wal, "compact", lambda upto_lsn=None: None)
+        db1.set("counter", 1)
+        db1.set("counter", 2)
+        db1.set("counter", 3)  # Снапшот создан, но WAL не сжат
+        db1.delete("counter")
+        db1.set("other", "value")
+
+        replayed = []
+        original = SegmentedWal.iter_replay
+
+        def spy(self, after_lsn=None):
+            for operation in original(self, after_lsn):
+                replayed.append(operation)
+                yield operation
+        monkeypatch.setattr(SegmentedWal, "iter_replay", spy)
+
+        db2 = create_segmented_db(snapshot_path, wal_dir, threshold=3)
+        assert [op["type"] for op in replayed] == ["delete", "set"]
+        assert db2.get("counter") is None
+        assert db2.get("other") == "value"
+
+    def test_binary_snapshot_across_restarts(self, tmp_path):
+        """Тест восстановления из бинарного снапшота с LSN в заголовке"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.bin"), str(tmp_path / "wal")
+        db1 = create_segmented_db(snapshot_path, wal_dir, threshold=5, record_format="binary")
+        for i in range(12):
+            db1.set(f"key{i}", {"index": i})
+        db1.delete("key0")
+        del db1  # Имитируем сбой без shutdown
+
+        assert Snapshotter(snapshot_path).load_lsn() == 10
+        db2 = create_segmented_db(snapshot_path, wal_dir, threshold=5, record_format="binary")
+        assert db2.get("key0") is None
+        assert all(db2.get(f"key{i}") == {"index": i} for i in range(1, 12))
+
+    def test_lost_wal_does_not_skip_new_records(self, tmp_path):
+        """Если журнал потерян, новые записи не должны пропускаться из-за LSN старого снапшота"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db1 = create_segmented_db(snapshot_path, wal_dir)
+        for i in range(5):
+            db1.set(f"key{i}", i)
+        db1.shutdown()
+        shutil.rmtree(wal_dir)
+
+        db2 = create_segmented_db(snapshot_path, wal_dir)
+        db2.set("new", "value")
+        del db2
+
+        db3 = create_segmented_db(snapshot_path, wal_dir)
+        assert db3.get("new") == "value"
+        assert db3.get("key4") == 4
+
+
+class BlockingSnapshotter(Snapshotter):
+    """Снапшоттер, запись которого ждет разрешения из теста."""
+
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def dump(self, data, lsn=None, namespaces=None):
+        self.started.set()
+        assert self.release.wait(timeout=5)
+        super().dump(data, lsn=lsn, namespaces=namespaces)
+
+
+class TestKVDBBackgroundSnapshots:
+
+    def test_requires_lsn_wal(self, temp_files):
+        """Фоновые снапшоты требуют журнал с LSN"""
+        snapshot_path, wal_path = temp_files
+        with pytest.raises(ValueError, match="SegmentedWal"):
+            KVDB(InMemoryStorage(), Snapshotter(snapshot_path), FileWal(wal_path), background_snapshots=True)
+
+    def test_writes_continue_during_snapshot(self, tmp_path):
+        """Запись не должна блокироваться, пока фоновый снапшот пишется на диск"""
+        snapshotter = BlockingSnapshotter(str(tmp_path / "snapshot.json"))
+        snapshotter.release.set()  # Снапшот при инициализации не блокируем
+        db = KVDB(InMemoryStorage(), snapshotter, SegmentedWal(str(tmp_path / "wal")),
+                  auto_snapshot_threshold=3, background_snapshots=True)
+        snapshotter.release.clear()
+
+        for i in range(3):
+            db.set(f"key{i}", i)  # Третья операция запускает снапшот
+        assert snapshotter.started.wait(timeout=5)
+        assert db.snapshot_in_progress
+
+        # Пока снапшот заблокирован, запись продолжается
+        for i in range(3, 6):
+            db.set(f"key{i}", i)
+        assert db.get("key5") == 5
+
+        snapshotter.release.set()
+        assert db.wait_for_snapshot(timeout=5)
+        assert db.persistence.load() == {f"key{i}": i for i in range(3)}
+        assert db.persistence.load_lsn() == 3
+        # Операции, сделанные во время снапшота, остались в WAL
+        assert [op["key"] for op in db.wal.iter_replay(after_lsn=3)] == ["key3", "key4", "key5"]
+
+    def test_recovery_after_background_snapshot(self, tmp_path):
+        """Восстановление после фоновых снапшотов без shutdown"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db1 = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), SegmentedWal(wal_dir, max_segment_records=4),
+                   auto_snapshot_threshold=5, background_snapshots=True)
+        for i in range(23):
+            db1.set(f"key{i}", i)
+        db1.wait_for_snapshot()
+        del db1
+
+        db2 = create_segmented_db(snapshot_path, wal_dir)
+        assert all(db2.get(f"key{i}") == i for i in range(23))
+
+    def test_background_snapshot_error(self, tmp_path, monkeypatch):
+        """Ошибка фонового снапшота не должна прерывать запись и терять данные"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), SegmentedWal(wal_dir),
+                  auto_snapshot_threshold=2, background_snapshots=True)
+
+        def fail(data, lsn=None, namespaces=None):
+            raise IOError("диск заполнен")
+        monkeypatch.setattr(db.persistence, "dump", fail)
+
+        db.set("key1", "value1")
+        db.set("key2", "value2")
+        db.wait_for_snapshot()
+
+        assert isinstance(db.last_snapshot_error, IOError)
+        assert len(db.wal.replay()) == 2
+        db.set("key3", "value3")
+        assert db.get("key3") == "value3"
+
+    def test_snapshot_without_full_copy(self, tmp_path, monkeypatch):
+        """Снапшот не должен копировать все данные хранилища"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), SegmentedWal(wal_dir),
+                  auto_snapshot_threshold=3, background_snapshots=True)
+
+        def fail():
+            raise AssertionError("get_all_data() не должен вызываться при снапшоте")
+        monkeypatch.setattr(db.storage_engine, "get_all_data", fail)
+
+        for i in range(3):
+            db.set(f"key{i}", i)
+        db.wait_for_snapshot()
+
+        assert db.last_snapshot_error is None
+        assert db.persistence.load() == {"key0": 0, "key1": 1, "key2": 2}
+
+    def test_shutdown_blocks_new_background_snapshots(self, tmp_path, monkeypatch):
+        """Запись между ожиданием фонового снапшота и финальным снапшотом не должна запускать новый"""
+        snapshot_path, wal_dir = str(tmp_path / "snapshot.json"), str(tmp_path / "wal")
+        db = KVDB(InMemoryStorage(), Snapshotter(snapshot_path), SegmentedWal(wal_dir),
+                  auto_snapshot_threshold=2, background_snapshots=True)
+        db.set("key1", 1)
+        wait_for_snapshot = db.wait_for_snapshot
+
+        def write_after_wait(timeout=None):
+            # Писатель успевает между ожиданием в shutdown и захватом блокировки
+            result = wait_for_snapshot(timeout)
+            db.set("key2", 2)
+            assert not db.snapshot_in_progress
+            return result
+        monkeypatch.setattr(db, "wait_for_snapshot", write_after_wait)
+
+        db.shutdown()
+        assert db.persistence.load() == {"key1": 1, "key2": 2}
@@ -0,0 +1,282 @@
+import os
+import random
+import time
+
+import pytest
+
+from app.core.eviction import (
+    ENTRY_OVERHEAD, LFU_DECAY_BATCH, LFU_INIT_COUNTER, LFU_MAX_COUNTER, EvictionPolicy, LFUPolicy, LRUPolicy,
+    TTLFirstPolicy, entry_size, estimate_size
+)
+from app.core.interfaces import MISSING
+from app.core.recovery import compact_operations
+from app.core.sharding import ShardedKVDB
+from app.core.storage import InMemoryStorage
+from app.core.wal import encode_binary_record, iter_binary_records
+
+
+class TestEvictionPolicies:
+
+    def test_lru_order(self):
+        """LRU выдает ключи от давно не использованных к недавним; перезапись и чтение обновляют порядок"""
+        policy = LRUPolicy()
+        for key in "abcd":
+            policy.added((None, key))
+        policy.accessed((None, "a"))
+        policy.added((None, "b"))
+        policy.removed((None, "c"))
+        policy.accessed((None, "missing"))
+        assert list(policy.candidates()) == [(None, "d"), (None, "a"), (None, "b")]
+        assert len(policy) == 3
+
+    def test_lfu_keeps_frequent_keys(self):
+        """Приближенный LFU вытесняет редко используемые ключи; счетчик растет логарифмически и ограничен"""
+        policy = LFUPolicy(random.Random(42))
+        for i in range(10):
+            policy.added(("ns", f"key{i}"))
+        for _ in range(1000):
+            policy.accessed(("ns", "key3"))
+        for _ in range(20):
+            policy.accessed(("ns", "key7"))
+        order = list(policy.candidates())
+        assert order[-2:] == [("ns", "key7"), ("ns", "key3")]
+        assert order[0] == ("ns", "key0")
+        assert LFU_INIT_COUNTER < policy.counter(("ns", "key7")) < policy.counter(("ns", "key3")) < 50
+
+        policy.removed(("ns", "key0"))
+        assert next(policy.candidates()) == ("ns", "key1")
+        for _ in range(100):
+            policy.added(("ns", "hot"))
+        assert policy.counter(("ns", "hot")) <= LFU_MAX_COUNTER
+        assert len(policy) == 10
+
+    def test_lfu_counters_decay(self):
+        """Счетчик LFU уменьшается на 1 за каждый период decay_time при обращении и при поиске кандидатов"""
+        now = [0.0]
+        policy = LFUPolicy(random.Random(1), decay_time=60, clock=lambda: now[0])
+        policy.added((None, "old"))
+        for _ in range(500):
+            policy.accessed((None, "old"))
+        hot = policy.counter((None, "old"))
+        assert hot > LFU_INIT_COUNTER + 3
+        now[0] = 100.0
+        policy.added((None, "new"))
+        assert list(policy.candidates()) == [(None, "new"), (None, "old")]
+
+        # Через три периода без обращений счетчик давно популярного ключа уменьшился на 3
+        now[0] = 3 * 60.0
+        assert list(policy.candidates()) == [(None, "new"), (None, "old")]
+        assert policy.counter((None, "old")) == hot - 3
+        # Обращение пересчитывает счетчик перед приращением; ключ без обращений
+        # дольше его счетчика опускается до 0 и вытесняется раньше недавно прочитанного
+        now[0] = 60.0 * (hot + 10)
+        policy.accessed((None, "new"))
+        assert policy.counter((None, "new")) == 1
+        assert list(policy.candidates()) == [(None, "old"), (None, "new")]
+        assert policy.counter((None, "old")) == 0
+
+        # Поиск кандидатов пересчитывает ограниченное число счетчиков
+        policy = LFUPolicy(random.Random(1), decay_time=60, clock=lambda: now[0])
+        for i in range(2 * LFU_DECAY_BATCH):
+            policy.added((None, f"key{i}"))
+        now[0] += 60
+        next(policy.candidates())
+        assert sum(policy.counter((None, f"key{i}")) == 0 for i in range(2 * LFU_DECAY_BATCH)) == LFU_DECAY_BATCH
+
+        # decay_time=0 отключает уменьшение
+        policy = LFUPolicy(decay_time=0)
+        policy.added((None, "a"))
+        assert policy.counter((None, "a")) == LFU_INIT_COUNTER and not policy._decayed
+        with pytest.raises(ValueError):
+            LFUPolicy(decay_time=-1)
+
+    def test_policy_is_abstract(self):
+        """EvictionPolicy - абстрактный класс: политика без всех методов учета не создается"""
+        class Partial(EvictionPolicy):
+            def added(self, item):
+                pass
+
+        with pytest.raises(TypeError):
+            EvictionPolicy()
+        with pytest.raises(TypeError):
+            Partial()
+
+    def test_ttl_first_order(self):
+        """TTL-first: сначала ключи с ближайшим истечением, затем по LRU; из кучи уходят только устаревшие записи"""
+        storage = InMemoryStorage(max_keys=10, eviction_policy="ttl")
+        now = time.time()
+        storage.set("plain1", 1)
+        storage.set("late", 2, expires_at=now + 200)
+        storage.set("plain2", 3)
+        storage.set("soon", 4, namespace="ns", expires_at=now + 100)
+        storage.set("reset", 5, expires_at=now + 50)
+        storage.set("reset", 5)
+        storage.get("plain1")
+        assert len(storage._expiry_heap) == 3
+        assert isinstance(storage._policy, TTLFirstPolicy)
+        for _ in range(2):
+            assert list(storage._policy.candidates()) == [
+                ("ns", "soon"), (None, "late"), (None, "plain2"), (None, "reset"), (None, "plain1")
+            ]
+        # Устаревшая запись ключа reset в вершине кучи извлечена, живые остались
+        assert sorted(key for _, _, _, key in storage._expiry_heap) == ["late", "soon"]
+
+    def test_entry_size(self):
+        """Оценка объема учитывает вложенные контейнеры и накладные расходы записи"""
+        flat = estimate_size([])
+        nested = estimate_size([{"a": "x" * 100}, (1, 2)])
+        assert nested > flat + 100
+        assert entry_size("key", "value") == estimate_size("key") + estimate_size("value") + ENTRY_OVERHEAD
+
+
+class TestBoundedStorage:
+
+    def test_max_keys(self):
+        """Бюджет числа ключей: хранилище выбирает ключи для вытеснения по LRU, evict удаляет и считает их"""
+        storage = InMemoryStorage(max_keys=3)
+        for key in "abc":
+            storage.set(key, key)
+        storage.set("x", 1, namespace="ns")
+        assert storage.over_budget()
+        assert storage.get("a") == "a"
+        assert storage.get_many(["b", "missing"]) == ["b", MISSING]
+        assert list(storage.scan_prefix("")) == [("a", "a"), ("b", "b"), ("c", "c")]
+
+        # Чтения get/get_many освежают ключи, выборка - нет
+        assert storage.select_evictions() == {None: ["c"]}
+        assert storage.evict(["c"]) == 1
+        assert not storage.over_budget()
+        assert storage.select_evictions() == {}
+        stats = storage.eviction_stats()
+        assert stats["policy"] == "lru" and stats["keys"] == 3 and stats["evicted_keys"] == 1
+
+        with pytest.raises(ValueError):
+            InMemoryStorage(max_keys=0)
+        with pytest.raises(ValueError):
+            InMemoryStorage(max_memory=100, eviction_policy="random")
+        assert InMemoryStorage().eviction_stats()["policy"] is None
+
+    def test_memory_accounting(self):
+        """Оценка объема следует за записями, перезаписями, удалениями, пакетами, drop и загрузкой"""
+        storage = InMemoryStorage(max_memory=10_000)
+        storage.set("a", "x" * 100)
+        storage.set("a", "x" * 1000)
+        storage.apply_batch([
+            {'type': 'set', 'key': 'b', 'value': [1, 2, 3], 'namespace': 'ns'},
+            {'type': 'set', 'key': 'c', 'value': {"k": "v"}},
+            {'type': 'delete', 'key': 'c'},
+        ])
+        expected = entry_size("a", "x" * 1000) + entry_size("b", [1, 2, 3])
+        assert storage.eviction_stats()["memory"] == expected
+        assert storage.drop_namespace("ns") == 1
+        assert storage.eviction_stats()["memory"] == entry_size("a", "x" * 1000)
+
+        storage.set("big", "x" * 20_000)
+        assert storage.over_budget()
+        assert storage.select_evictions() == {None: ["a", "big"]}
+        storage.evict(["a"])
+        assert storage.eviction_stats()["evicted_bytes"] == entry_size("a", "x" * 1000)
+
+        storage.load_data({"a": "x" * 10}, {"ns": {"b": 1}})
+        stats = storage.eviction_stats()
+        assert stats["memory"] == entry_size("a", "x" * 10) + entry_size("b", 1) and stats["keys"] == 2
+
+    def test_evict_during_snapshot(self):
+        """Вытеснение во время снапшота не меняет замороженное состояние"""
+        storage = InMemoryStorage(max_keys=2)
+        storage.set("a", 1)
+        storage.set("b", 2)
+        data = storage.begin_snapshot()
+        storage.set("c", 3)
+        assert storage.select_evictions() == {None: ["a"]}
+        storage.evict(["a"])
+        assert data == {"a": 1, "b": 2}
+        storage.end_snapshot()
+        assert storage.get_all_data() == {"b": 2, "c": 3}
+        assert storage.select_evictions() == {}
+
+
+class TestKVDBEviction:
+
+    @pytest.mark.parametrize("record_format", ["binary", "json"])
+    def test_evictions_are_logged(self, data_dir, open_db, record_format):
+        """Вытеснение пишется в WAL записью evict, и восстановление не возвращает вытесненные ключи"""
+        db = open_db(
+            data_dir, record_format=record_format, storage_options={"max_keys": 5}, auto_snapshot_threshold=1000
+        )
+        for i in range(5):
+            db.set(f"key{i}", i)
+        db.get("key0")
+        db.set_many({f"new{i}": i for i in range(3)})
+        db.set("user", {"name": "x"}, namespace="users")
+        assert db.get_many([f"key{i}" for i in range(5)]) == {"key0": 0}
+        evictions = [op for op in db.wal.replay() if op['type'] == 'evict']
+        assert evictions == [{'type': 'evict', 'keys': ['key1', 'key2', 'key3']}, {'type': 'evict', 'keys': ['key4']}]
+        assert db.storage_engine.eviction_stats()["evicted_keys"] == 4
+        expected = {name: db.storage_engine.get_all_data(name) for name in (None, "users")}
+        db.wal.close()
+
+        db = open_db(
+            data_dir, record_format=record_format, storage_options={"max_keys": 5}, auto_snapshot_threshold=1000
+        )
+        assert {name: db.storage_engine.get_all_data(name) for name in (None, "users")} == expected
+        db.shutdown()
+
+    def test_budget_reduced_on_restart(self, data_dir, open_db):
+        """Если при запуске данных больше бюджета, лишние ключи вытесняются до снапшота"""
+        db = open_db(data_dir, auto_snapshot_threshold=1000)
+        for i in range(10):
+            db.set(f"key{i}", i)
+        db.shutdown()
+
+        db = open_db(
+            data_dir, storage_options={"eviction_policy": "lfu", "max_keys": 4}, auto_snapshot_threshold=1000
+        )
+        assert db.storage_engine.count() == 4
+        assert db.storage_engine.eviction_stats()["evicted_keys"] == 6
+        db.wal.close()
+        db = open_db(data_dir, auto_snapshot_threshold=1000)
+        assert db.storage_engine.count() == 4
+        db.shutdown()
+
+    def test_memory_budget(self, data_dir, open_db):
+        """Бюджет памяти: база держит оценочный объем в пределах max_memory"""
+        db = open_db(data_dir, storage_options={"max_memory": 50_000}, auto_snapshot_threshold=1000)
+        for i in range(200):
+            db.set(f"key{i}", "x" * 1000)
+            assert db.storage_engine.eviction_stats()["memory"] <= 50_000
+        stats = db.storage_engine.eviction_stats()
+        assert 0 < stats["keys"] < 50 and stats["evicted_keys"] == 200 - stats["keys"]
+        assert db.get("key199") == "x" * 1000 and db.get("key0") is None
+        db.shutdown()
+
+    def test_sharded_budget(self, data_dir):
+        """ShardedKVDB применяет бюджет в каждом шарде и суммирует счетчики"""
+        db = ShardedKVDB(data_dir, shards=2, recovery_processes=1, storage_options={"max_keys": 10})
+        db.set_many((f"key{i}", i) for i in range(100))
+        stats = db.storage_engine.eviction_stats()
+        assert stats["max_keys"] == 20 and stats["keys"] == 20 and stats["evicted_keys"] == 80
+        db.shutdown()
+
+        db = ShardedKVDB(data_dir, shards=2, recovery_processes=1, storage_options={"max_keys": 10})
+        assert db.storage_engine.count() == 20
+        db.shutdown()
+
+    def test_evict_records(self, data_dir):
+        """Записи evict кодируются компактно и при сжатии журнала равносильны удалению"""
+        operations = [
+            {'type': 'evict', 'keys': ['a', 'b']},
+            {'type': 'evict', 'keys': ['c'], 'namespace': 'ns'},
+        ]
+        path = os.path.join(data_dir, "records.bin")
+        with open(path, "wb") as f:
+            for operation in operations:
+                f.write(encode_binary_record(operation))
+        with open(path, "rb") as f:
+            assert [operation for _, operation in iter_binary_records(f)] == operations
+
+        compacted = compact_operations([{'type': 'set', 'key': 'a', 'value': 1}, *operations])
+        assert compacted == [
+            {'type': 'batch', 'operations': [{'type': 'delete', 'key': 'a'}, {'type': 'delete', 'key': 'b'}]},
+            {'type': 'batch', 'operations': [{'type': 'delete', 'key': 'c', 'namespace': 'ns'}]},
+        ]
@@ -136,8 +136,9 @@ class TestUnusualScenarios:
         collection.set("key", "value")
         
         assert collection.get("key") == "value"
-        # Проверяем что ключ в базе имеет правильный префикс
-        assert db.get("namespace:subsystem:collection:key") == "value"
+        # Ключ хранится в пространстве имен коллекции
+        assert db.get("key", namespace="namespace:subsystem:collection") == "value"
+        assert db.get("namespace:subsystem:collection:key") is None
 
     def test_alternating_set_delete_same_key(self, temp_files):
         """Тест чередующихся операций set и delete на одном ключе"""
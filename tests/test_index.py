@@ -0,0 +1,58 @@
+import random
+import pytest
+from app.core.index import SortedKeyIndex
+
+
+class TestSortedKeyIndex:
+
+    def test_add_and_discard(self):
+        """Тест добавления и удаления ключей"""
+        index = SortedKeyIndex(block_size=2)
+        assert index.add("b") is True
+        assert index.add("a") is True
+        assert index.add("b") is False
+        assert "a" in index and "b" in index and "c" not in index
+        assert len(index) == 2
+
+        assert index.discard("a") is True
+        assert index.discard("a") is False
+        assert list(index.irange()) == ["b"]
+
+    def test_matches_sorted_set(self):
+        """Индекс должен совпадать с отсортированным множеством при случайных изменениях"""
+        rng = random.Random(42)
+        index = SortedKeyIndex(block_size=4)
+        expected = set()
+        for _ in range(5000):
+            key = f"k{rng.randrange(500):03d}"
+            if rng.random() < 0.6:
+                assert index.add(key) == (key not in expected)
+                expected.add(key)
+            else:
+                assert index.discard(key) == (key in expected)
+                expected.discard(key)
+
+        assert list(index.irange()) == sorted(expected)
+        assert len(index) == len(expected)
+
+    def test_irange(self):
+        """Тест выборки ключей из полуинтервала"""
+        index = SortedKeyIndex((f"k{i:02d}" for i in range(20)), block_size=3)
+
+        assert list(index.irange("k05", "k09")) == ["k05", "k06", "k07", "k08"]
+        assert list(index.irange("k045", "k06")) == ["k05"]
+        assert list(index.irange("k18")) == ["k18", "k19"]
+        assert list(index.irange(stop="k02")) == ["k00", "k01"]
+        assert list(index.irange("z")) == []
+
+    def test_iter_prefix(self):
+        """Тест выборки ключей по префиксу"""
+        index = SortedKeyIndex(["users:b", "users:a", "user", "usersx", "orders:1", "users:"], block_size=2)
+
+        assert list(index.iter_prefix("users:")) == ["users:", "users:a", "users:b"]
+        assert list(index.iter_prefix("products:")) == []
+
+    def test_invalid_block_size(self):
+        """Тест валидации размера блока"""
+        with pytest.raises(ValueError):
+            SortedKeyIndex(block_size=0)
@@ -0,0 +1,105 @@
+import threading
+import time
+from app.core.locks import NullRWLock, RWLock
+
+
+class TestRWLock:
+
+    def test_readers_do_not_block_each_other(self):
+        """Несколько читателей держат блокировку одновременно"""
+        lock = RWLock()
+        inside = threading.Barrier(3, timeout=5)
+
+        def reader():
+            with lock.read:
+                inside.wait()
+
+        threads = [threading.Thread(target=reader) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        inside.wait()
+        for thread in threads:
+            thread.join(timeout=5)
+        assert not any(thread.is_alive() for thread in threads)
+
+    def test_writer_is_exclusive(self):
+        """Писатель ждет выхода читателя, а новые читатели ждут писателя"""
+        lock = RWLock()
+        events = []
+        lock.acquire_read()
+
+        def writer():
+            with lock.write:
+                events.append("write")
+                time.sleep(0.05)
+
+        def reader():
+            with lock.read:
+                events.append("read")
+
+        writer_thread = threading.Thread(target=writer)
+        writer_thread.start()
+        time.sleep(0.05)
+        # Писатель ждет; новый читатель должен встать за ним
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+        time.sleep(0.05)
+        assert events == []
+
+        lock.release_read()
+        writer_thread.join(timeout=5)
+        reader_thread.join(timeout=5)
+        assert events == ["write", "read"]
+
+    def test_writers_serialized(self):
+        """Писатели не пересекаются"""
+        lock = RWLock()
+        counter = {"value": 0}
+
+        def writer():
+            for _ in range(200):
+                with lock.write:
+                    value = counter["value"]
+                    time.sleep(0)
+                    counter["value"] = value + 1
+
+        threads = [threading.Thread(target=writer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert counter["value"] == 800
+
+    def test_readers_not_starved_by_writers(self):
+        """Непрерывный поток записей не задерживает читателей бесконечно"""
+        lock = RWLock()
+        stop = threading.Event()
+        reads = []
+
+        def writer():
+            while not stop.is_set():
+                with lock.write:
+                    pass
+
+        def reader():
+            for i in range(100):
+                with lock.read:
+                    reads.append(i)
+
+        writers = [threading.Thread(target=writer) for _ in range(2)]
+        for thread in writers:
+            thread.start()
+        reader = threading.Thread(target=reader)
+        reader.start()
+        reader.join(timeout=5)
+        stop.set()
+        for thread in writers:
+            thread.join()
+        assert len(reads) == 100
+
+    def test_null_lock(self):
+        """Заглушка поддерживает тот же протокол захвата"""
+        lock = NullRWLock()
+        with lock.read:
+            with lock.write:
+                pass
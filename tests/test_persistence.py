@@ -2,7 +2,9 @@ import pytest
 import os
 import json
 import tempfile
-from app.core.persistence import Snapshotter
+from app.core import persistence as persistence_module
+from app.core.persistence import Snapshotter, BINARY_MAGIC
+from app.core.storage import InMemoryStorage
 
 
 class TestSnapshotter:
@@ -164,3 +166,299 @@ class TestSnapshotter:
         assert loaded["null_value"] is None
         assert loaded["normal_value"] == "test"
 
+
+    def test_dump_with_lsn(self, temp_snapshot_file):
+        """Тест сохранения LSN вместе со снапшотом"""
+        snapshotter = Snapshotter(temp_snapshot_file)
+        snapshotter.dump({"key1": "value1"}, lsn=42)
+
+        assert snapshotter.load() == {"key1": "value1"}
+        assert snapshotter.load_lsn() == 42
+        assert Snapshotter(temp_snapshot_file).load_lsn() == 42
+        os.remove(snapshotter.meta_path)
+
+    def test_dump_without_lsn_clears_meta(self, temp_snapshot_file):
+        """Снапшот без LSN не должен наследовать LSN предыдущего снапшота"""
+        snapshotter = Snapshotter(temp_snapshot_file)
+        snapshotter.dump({"key1": "value1"}, lsn=42)
+        snapshotter.dump({"key1": "value2"})
+
+        assert snapshotter.load_lsn() is None
+        assert not os.path.exists(snapshotter.meta_path)
+
+    def test_load_lsn_without_snapshot(self, temp_snapshot_file):
+        """Тест чтения LSN при отсутствии снапшота"""
+        os.remove(temp_snapshot_file)
+        assert Snapshotter(temp_snapshot_file).load_lsn() is None
+
+
+class TestBinarySnapshotter:
+
+    def test_format_by_extension(self, tmp_path):
+        """Формат по умолчанию определяется по расширению файла"""
+        assert Snapshotter(str(tmp_path / "snapshot.json")).format == "json"
+        assert Snapshotter(str(tmp_path / "snapshot.bin")).format == "binary"
+        assert Snapshotter(str(tmp_path / "snapshot.json"), format="binary").format == "binary"
+
+    def test_unknown_format(self, tmp_path):
+        """Тест неизвестного формата снапшота"""
+        with pytest.raises(ValueError, match="Неизвестный формат снапшота"):
+            Snapshotter(str(tmp_path / "snapshot.bin"), format="xml")
+
+    def test_dump_and_load(self, tmp_path):
+        """Тест сохранения и загрузки бинарного снапшота"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        data = {
+            "string": "Привет мир 你好",
+            "number": 42,
+            "nested": {"list": [1, 2, None], "flag": True},
+            "null_value": None,
+            "": "empty key",
+        }
+
+        snapshotter.dump(data)
+
+        with open(snapshotter.file_path, 'rb') as f:
+            assert f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+        assert snapshotter.load() == data
+        assert snapshotter.load_lsn() is None
+
+    def test_dump_multiple_blocks(self, tmp_path, monkeypatch):
+        """Тест снапшота из нескольких блоков"""
+        monkeypatch.setattr(persistence_module, "BLOCK_SIZE", 7)
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        data = {f"key{i}": i for i in range(100)}
+
+        snapshotter.dump(data)
+
+        assert snapshotter.load() == data
+
+    def test_lsn_in_header(self, tmp_path):
+        """LSN бинарного снапшота хранится в заголовке, без файла метаданных"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        snapshotter.dump({"key1": "value1"}, lsn=17)
+
+        assert snapshotter.load_lsn() == 17
+        assert not os.path.exists(snapshotter.meta_path)
+
+    def test_load_any_format(self, tmp_path):
+        """Формат существующего снапшота определяется при загрузке по содержимому"""
+        path = str(tmp_path / "snapshot.dat")
+        Snapshotter(path, format="json").dump({"key1": "json"})
+        assert Snapshotter(path, format="binary").load() == {"key1": "json"}
+
+        Snapshotter(path, format="binary").dump({"key1": "binary"})
+        assert Snapshotter(path, format="json").load() == {"key1": "binary"}
+
+    def test_failed_dump_keeps_previous_snapshot(self, tmp_path):
+        """Сбой во время записи не должен портить предыдущий снапшот"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        snapshotter.dump({"key1": "value1"}, lsn=1)
+
+        with pytest.raises(IOError, match="Ошибка сохранения снапшота"):
+            snapshotter.dump({"key1": "value2", "bad": lambda: None}, lsn=2)
+
+        assert snapshotter.load() == {"key1": "value1"}
+        assert snapshotter.load_lsn() == 1
+        assert not os.path.exists(f"{snapshotter.file_path}.tmp")
+
+    def test_failed_json_dump_keeps_previous_snapshot(self, temp_snapshot_file):
+        """Сбой записи JSON снапшота тоже не должен портить предыдущий снапшот"""
+        snapshotter = Snapshotter(temp_snapshot_file)
+        snapshotter.dump({"key1": "value1"})
+
+        circular = []
+        circular.append(circular)
+        with pytest.raises(IOError):
+            snapshotter.dump({"key1": circular})
+
+        assert snapshotter.load() == {"key1": "value1"}
+
+    def test_load_truncated_snapshot(self, tmp_path):
+        """Обрезанный бинарный снапшот должен распознаваться как поврежденный"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        snapshotter.dump({f"key{i}": i for i in range(100)})
+        size = os.path.getsize(snapshotter.file_path)
+        with open(snapshotter.file_path, 'r+b') as f:
+            f.truncate(size - 5)
+
+        with pytest.raises(ValueError, match="Ошибка декодирования снапшота"):
+            snapshotter.load()
+
+    def test_load_corrupted_snapshot(self, tmp_path):
+        """Поврежденный бинарный снапшот должен распознаваться по контрольной сумме"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        snapshotter.dump({f"key{i}": i for i in range(100)})
+        with open(snapshotter.file_path, 'r+b') as f:
+            f.seek(40)
+            byte = f.read(1)
+            f.seek(40)
+            f.write(bytes([byte[0] ^ 0xFF]))
+
+        with pytest.raises(ValueError, match="контрольная сумма"):
+            snapshotter.load()
+
+
+class TestSnapshotterStreaming:
+
+    def test_iter_items(self, tmp_path, monkeypatch):
+        """iter_items должна возвращать пары бинарного снапшота по блокам"""
+        monkeypatch.setattr(persistence_module, "BLOCK_SIZE", 3)
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        data = {f"key{i}": i for i in range(10)}
+        snapshotter.dump(data)
+
+        items = snapshotter.iter_items()
+        assert next(items) == ("key0", 0)
+        assert dict(items) == {f"key{i}": i for i in range(1, 10)}
+
+    def test_iter_items_nonexistent(self, tmp_path):
+        """Тест потокового чтения несуществующего снапшота"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        assert list(snapshotter.iter_items()) == []
+
+    @pytest.mark.parametrize("file_name", ["snapshot.json", "snapshot.bin"])
+    def test_load_into(self, tmp_path, file_name):
+        """load_into должна загружать снапшот прямо в движок хранения"""
+        snapshotter = Snapshotter(str(tmp_path / file_name))
+        data = {"key1": "value1", "key2": {"nested": [1, 2]}, "key3": None}
+        snapshotter.dump(data)
+        storage = InMemoryStorage()
+
+        assert snapshotter.load_into(storage) == 3
+        assert storage.get_all_data() == data
+
+    def test_load_into_nonexistent(self, tmp_path):
+        """load_into без снапшота должна возвращать None и не трогать хранилище"""
+        storage = InMemoryStorage()
+        storage.set("key1", "value1")
+
+        assert Snapshotter(str(tmp_path / "snapshot.bin")).load_into(storage) is None
+        assert storage.get("key1") == "value1"
+
+    def test_load_into_corrupted(self, tmp_path):
+        """Поврежденный снапшот не должен частично загружаться в хранилище"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        snapshotter.dump({f"key{i}": i for i in range(100)})
+        size = os.path.getsize(snapshotter.file_path)
+        with open(snapshotter.file_path, 'r+b') as f:
+            f.truncate(size - 5)
+        storage = InMemoryStorage()
+        storage.set("old", "value")
+
+        with pytest.raises(ValueError, match="Ошибка декодирования снапшота"):
+            snapshotter.load_into(storage)
+        assert storage.get_all_data() == {"old": "value"}
+
+    def test_json_snapshot_not_object(self, temp_snapshot_file):
+        """JSON снапшот должен быть объектом"""
+        with open(temp_snapshot_file, 'w', encoding='utf-8') as f:
+            f.write("[1, 2, 3]")
+
+        with pytest.raises(ValueError, match="Ошибка декодирования снапшота"):
+            list(Snapshotter(temp_snapshot_file).iter_items())
+
+
+class TestSnapshotterCompression:
+
+    @pytest.mark.parametrize("compression", ["zlib", "lzma"])
+    @pytest.mark.parametrize("file_name", ["snapshot.json", "snapshot.bin"])
+    def test_dump_and_load(self, tmp_path, file_name, compression):
+        """Тест сохранения и загрузки сжатого снапшота"""
+        snapshotter = Snapshotter(str(tmp_path / file_name), compression=compression)
+        data = {f"user:{i}": {"name": f"Пользователь {i}", "active": True, "tags": None} for i in range(1000)}
+
+        snapshotter.dump(data, lsn=42)
+
+        assert snapshotter.load() == data
+        assert dict(snapshotter.iter_items()) == data
+        assert snapshotter.load_lsn() == 42
+        uncompressed = Snapshotter(str(tmp_path / f"plain-{file_name}"))
+        uncompressed.dump(data)
+        assert os.path.getsize(snapshotter.file_path) < os.path.getsize(uncompressed.file_path) / 3
+
+    def test_compression_detected_on_load(self, tmp_path):
+        """Кодек существующего снапшота определяется при загрузке по содержимому"""
+        path = str(tmp_path / "snapshot.bin")
+        Snapshotter(path, compression="lzma").dump({"key1": "value1"}, lsn=3)
+
+        snapshotter = Snapshotter(path)
+        assert snapshotter.load() == {"key1": "value1"}
+        assert snapshotter.load_lsn() == 3
+
+    def test_unknown_compression(self, tmp_path):
+        """Тест неизвестного кодека сжатия"""
+        with pytest.raises(ValueError, match="Неизвестный кодек сжатия"):
+            Snapshotter(str(tmp_path / "snapshot.bin"), compression="zstd")
+
+    @pytest.mark.parametrize("compression", ["zlib", "lzma"])
+    def test_load_truncated_compressed_snapshot(self, tmp_path, compression):
+        """Обрезанный сжатый снапшот должен распознаваться как поврежденный"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"), compression=compression)
+        snapshotter.dump({f"key{i}": i for i in range(1000)})
+        size = os.path.getsize(snapshotter.file_path)
+        with open(snapshotter.file_path, 'r+b') as f:
+            f.truncate(size // 2)
+
+        with pytest.raises(ValueError, match="Ошибка декодирования снапшота"):
+            snapshotter.load()
+
+
+class TestSnapshotterNamespaces:
+
+    @pytest.mark.parametrize("file_name", ["snapshot.json", "snapshot.bin"])
+    def test_namespaces_roundtrip(self, tmp_path, file_name):
+        """Снапшот сохраняет пространства имен, а load возвращает только общее пространство"""
+        snapshotter = Snapshotter(str(tmp_path / file_name))
+        data = {"key": "general", "users:alice": "legacy"}
+        namespaces = {"users": {"alice": 1, "bob": None}, "a:b": {"c": [1, 2]}}
+        snapshotter.dump(data, lsn=5, namespaces=namespaces)
+        storage = InMemoryStorage()
+
+        assert snapshotter.load() == data
+        assert dict(snapshotter.iter_items()) == data
+        assert snapshotter.load_lsn() == 5
+        assert snapshotter.load_into(storage) == 5
+        assert storage.get_all_data() == data
+        assert storage.get_all_data(namespace="users") == {"alice": 1, "bob": None}
+        assert storage.get_all_data(namespace="a:b") == {"c": [1, 2]}
+
+    def test_json_without_namespaces_stays_flat(self, tmp_path):
+        """Без пространств имен JSON снапшот остается плоским объектом"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.json"))
+        snapshotter.dump({"key": "value"}, namespaces={})
+
+        with open(snapshotter.file_path, encoding='utf-8') as f:
+            assert json.load(f) == {"key": "value"}
+
+    def test_json_flat_snapshot_with_format_key(self, tmp_path):
+        """Плоский JSON снапшот с ключом format не принимается за снапшот с пространствами имен"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.json"))
+        data = {"format": "custom", "data": {}, "namespaces": {}}
+        snapshotter.dump(data)
+
+        assert snapshotter.load() == data
+
+    def test_binary_namespaces_multiple_blocks(self, tmp_path, monkeypatch):
+        """Пространства имен бинарного снапшота могут занимать несколько блоков"""
+        monkeypatch.setattr(persistence_module, "BLOCK_SIZE", 3)
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        namespaces = {"users": {f"user{i}": i for i in range(10)}, "empty": {}}
+        snapshotter.dump({f"key{i}": i for i in range(4)}, namespaces=namespaces)
+        storage = InMemoryStorage()
+
+        assert snapshotter.load_into(storage) == 14
+        assert storage.get_all_data(namespace="users") == namespaces["users"]
+        assert storage.count() == 4
+
+    def test_binary_namespace_tag_corruption(self, tmp_path):
+        """Повреждение имени пространства обнаруживается по контрольной сумме"""
+        snapshotter = Snapshotter(str(tmp_path / "snapshot.bin"))
+        snapshotter.dump({"key": "value"}, namespaces={"users": {"alice": 1}})
+        with open(snapshotter.file_path, 'r+b') as f:
+            content = f.read()
+            f.seek(content.index(b"users"))
+            f.write(b"USERS")
+
+        with pytest.raises(ValueError, match="Ошибка декодирования снапшота"):
+            snapshotter.load()
@@ -0,0 +1,143 @@
+import os
+import shutil
+
+import pytest
+
+from app.core.recovery import ParallelReplay, compact_operations
+from app.core.storage import InMemoryStorage
+from app.core.wal import SegmentedWal
+
+
+def apply_operations(storage, operations):
+    for operation in operations:
+        if operation['type'] == 'set':
+            storage.set(operation['key'], operation['value'], operation.get('namespace'))
+        elif operation['type'] == 'delete':
+            storage.delete(operation['key'], operation.get('namespace'))
+        elif operation['type'] == 'drop':
+            storage.drop_namespace(operation.get('namespace'))
+        elif operation['type'] == 'batch':
+            storage.apply_batch(operation['operations'])
+
+
+def state(storage):
+    return {name: storage.get_all_data(name) for name in [None, *storage.namespaces()]}
+
+
+# Маленькие сегменты, чтобы журнал состоял из многих сегментов
+SEGMENT_RECORDS = 7
+
+
+def fill(db):
+    """Пишет операции всех типов; снапшот по порогу приходится на середину сегмента."""
+    for i in range(120):
+        namespace = "users" if i % 3 == 0 else None
+        db.set(f"key{i % 40}", i, namespace=namespace)
+        if i % 11 == 0:
+            db.delete(f"key{(i + 5) % 40}")
+        if i == 60:
+            db.drop_namespace("users")
+        if i % 17 == 0:
+            db.set_many({f"batch{i}": i, f"key{i % 40}": -i})
+
+
+class TestCompactOperations:
+
+    def test_equivalent_and_shorter(self):
+        """Свернутые операции дают то же состояние, что и исходные, и их меньше"""
+        operations = [
+            {'type': 'set', 'key': 'a', 'value': 1},
+            {'type': 'set', 'key': 'a', 'value': 2},
+            {'type': 'set', 'key': 'b', 'value': 1, 'namespace': 'ns'},
+            {'type': 'delete', 'key': 'c'},
+            {'type': 'drop', 'namespace': 'ns'},
+            {'type': 'set', 'key': 'd', 'value': 4, 'namespace': 'ns'},
+            {'type': 'batch', 'operations': [
+                {'type': 'set', 'key': 'c', 'value': 3},
+                {'type': 'delete', 'key': 'a'},
+            ]},
+        ]
+        compacted = compact_operations(operations)
+        assert sum(len(op.get('operations', [op])) for op in compacted) < len(operations)
+
+        base = {'a': 0, 'c': 0, 'e': 5}
+        for ops in (operations, compacted):
+            storage = InMemoryStorage()
+            storage.load_data(dict(base), namespaces={'ns': {'x': 1}})
+            apply_operations(storage, ops)
+            assert state(storage) == {None: {'c': 3, 'e': 5}, 'ns': {'d': 4}}
+
+
+class TestParallelReplay:
+
+    @pytest.mark.parametrize("record_format", ["json", "binary"])
+    def test_same_state_as_serial(self, data_dir, open_db, record_format):
+        """Восстановление в пуле процессов дает то же состояние, что и последовательное"""
+        source = os.path.join(data_dir, "source")
+        db = open_db(source, record_format=record_format, segment_records=SEGMENT_RECORDS, auto_snapshot_threshold=100)
+        fill(db)
+        expected = state(db.storage_engine)
+        # Сбой: журнал после последнего снапшота не применен
+        db.wal.close()
+        assert db.persistence.load_lsn() % SEGMENT_RECORDS != 0
+
+        results = []
+        for processes in (1, 3):
+            target = os.path.join(data_dir, f"copy{processes}")
+            shutil.copytree(source, target)
+            restored = open_db(
+                target, record_format=record_format, segment_records=SEGMENT_RECORDS, recovery_processes=processes
+            )
+            results.append(state(restored.storage_engine))
+            restored.wal.close()
+        assert results == [expected, expected]
+
+    def test_corrupted_segment_stops_replay(self, data_dir, open_db):
+        """Поврежденный закрытый сегмент прекращает чтение так же, как при последовательном чтении"""
+        source = os.path.join(data_dir, "source")
+        db = open_db(source, segment_records=SEGMENT_RECORDS, auto_snapshot_threshold=10 ** 6)
+        fill(db)
+        db.wal.close()
+        segments = db.wal.segments()
+        _, path = segments[len(segments) // 2]
+        with open(path, 'r+b') as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"\xff\xff\xff")
+
+        results = []
+        for processes in (1, 3):
+            target = os.path.join(data_dir, f"copy{processes}")
+            shutil.copytree(source, target)
+            replay = ParallelReplay(
+                SegmentedWal(os.path.join(target, "wal"), max_segment_records=SEGMENT_RECORDS, record_format="binary"),
+                processes=processes
+            )
+            storage = InMemoryStorage()
+            with replay:
+                apply_operations(storage, replay)
+            replay.wal.close()
+            results.append(state(storage))
+        assert results[0] == results[1]
+        assert len(results[0][None]) < len(state(db.storage_engine)[None])
+
+    def test_post_replay_snapshot_in_background(self, data_dir, open_db):
+        """С фоновыми снапшотами база доступна до записи снапшота после восстановления"""
+        db = open_db(data_dir, segment_records=SEGMENT_RECORDS, auto_snapshot_threshold=10 ** 6)
+        fill(db)
+        expected = state(db.storage_engine)
+        db.wal.close()
+
+        db = open_db(
+            data_dir, segment_records=SEGMENT_RECORDS, background_snapshots=True, recovery_processes=2,
+            auto_snapshot_threshold=10 ** 6
+        )
+        assert state(db.storage_engine) == expected
+        db.set("after", 1)
+        assert db.wait_for_snapshot(timeout=10)
+        assert db.last_snapshot_error is None
+        # Снапшот помечен LSN последней восстановленной операции, а запись после него осталась в журнале
+        assert db.persistence.load_lsn() == db.wal.last_lsn - 1
+        assert list(db.wal.iter_replay(after_lsn=db.persistence.load_lsn())) == [
+            {'type': 'set', 'key': 'after', 'value': 1}
+        ]
+        db.shutdown()
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+from app.core.interfaces import MISSING
+from app.core.tracing import RecordingTracer
+from app.server.http import create_app
+
+
+
+class TestHttpServer:
+
+    def test_key_operations(self, data_dir, open_db):
+        """GET/PUT/DELETE ключей; отсутствующий ключ отличается от сохраненного null"""
+        with TestClient(create_app(open_db(data_dir, group_commit=True, thread_safe=True))) as client:
+            assert client.put("/keys/a/b", json={"value": {"x": 1}}).json() == {"key": "a/b"}
+            assert client.get("/keys/a/b").json() == {"key": "a/b", "value": {"x": 1}}
+            client.put("/keys/empty", json={"value": None})
+            assert client.get("/keys/empty").json() == {"key": "empty", "value": None}
+            assert client.get("/keys/missing").status_code == 404
+            client.put("/keys/a/b", params={"namespace": "ns"}, json={"value": 2})
+            assert client.get("/keys/a/b", params={"namespace": "ns"}).json()["value"] == 2
+            assert client.delete("/keys/a/b").json() == {"key": "a/b", "deleted": True}
+            assert client.delete("/keys/a/b").json()["deleted"] is False
+
+        # Остановка сервиса завершает базу: данные переживают перезапуск
+        db = open_db(data_dir, group_commit=True, thread_safe=True)
+        assert db.get("empty") is None and db.get("a/b", namespace="ns") == 2
+        db.shutdown()
+
+    def test_batch_endpoints(self, data_dir, open_db):
+        """Пакетная запись одной записью WAL и пакетное чтение с отсутствующими ключами"""
+        db = open_db(data_dir, group_commit=True, thread_safe=True)
+        with TestClient(create_app(db)) as client:
+            response = client.post("/batch/write", json={"operations": [
+                {"type": "set", "key": "a", "value": 1},
+                {"type": "set", "key": "b", "value": 2, "namespace": "ns"},
+                {"type": "delete", "key": "c"},
+            ]})
+            assert response.json() == {"operations": 3, "deleted": 0}
+            assert len(db.wal.replay()) == 1
+            assert client.post("/batch/get", json={"keys": ["a", "c"]}).json() == {
+                "values": {"a": 1}, "missing": ["c"]
+            }
+            assert client.post("/batch/write", json={"operations": [{"type": "drop", "key": "a"}]}).status_code == 422
+
+    def test_collection_endpoints(self, data_dir, open_db):
+        """Ключи коллекции, выборка по префиксу и диапазону, удаление коллекции"""
+        with TestClient(create_app(open_db(data_dir, group_commit=True, thread_safe=True))) as client:
+            for i in range(5):
+                client.put(f"/collections/users/keys/user{i}", json={"value": i})
+            assert client.get("/collections/users/keys/user3").json()["value"] == 3
+            assert client.get("/keys/user3").status_code == 404
+
+            scan = client.get("/collections/users", params={"prefix": "user", "limit": 2}).json()
+            assert scan == {"collection": "users", "items": [["user0", 0], ["user1", 1]], "count": 5}
+            scan = client.get("/collections/users", params={"start": "user3"}).json()
+            assert scan["items"] == [["user3", 3], ["user4", 4]]
+            assert client.get("/collections/users", params={"prefix": "u", "start": "a"}).status_code == 400
+
+            assert client.delete("/collections/users/keys/user0").json()["deleted"] is True
+            assert client.delete("/collections/users").json() == {"collection": "users", "deleted": 4}
+            assert client.get("/collections/users").json()["count"] == 0
+
+    def test_write_workers_require_thread_safe_db(self, data_dir, open_db):
+        """Несколько потоков записи допустимы только для потокобезопасной базы; ошибка WAL - 503"""
+        db = open_db(data_dir, group_commit=True)
+        with pytest.raises(ValueError):
+            create_app(db, write_workers=4)
+        with TestClient(create_app(db, shutdown_db=False)) as client:
+            db.wal.close()
+            assert client.put("/keys/a", json={"value": 1}).status_code == 503
+
+    def test_reads_go_through_database(self, data_dir, open_db):
+        """Чтение ключа идет через KVDB.get с трассировкой; при ограниченном хранилище - в пуле потоков"""
+        tracer = RecordingTracer()
+        db = open_db(data_dir, group_commit=True, thread_safe=True, tracer=tracer)
+        with TestClient(create_app(db, shutdown_db=False)) as client:
+            client.put("/keys/a", json={"value": None})
+            assert client.get("/keys/a").json() == {"key": "a", "value": None}
+            assert client.get("/keys/missing").status_code == 404
+        assert [event.key for event in tracer.events if event.op == 'get'] == ["a", "missing"]
+        assert db.get("missing", default=MISSING) is MISSING and db.get("a", default=MISSING) is None
+        db.shutdown()
+
+        db = open_db(data_dir, group_commit=True, thread_safe=True, storage_options={"max_keys": 10})
+        threads = []
+        get = db.get
+
+        def recording_get(*args):
+            threads.append(threading.current_thread().name)
+            return get(*args)
+        db.get = recording_get
+        with TestClient(create_app(db)) as client:
+            client.put("/collections/users/keys/u1", json={"value": 1})
+            assert client.get("/collections/users/keys/u1").json()["value"] == 1
+        assert len(threads) == 1 and threads[0].startswith("kvdb-http")
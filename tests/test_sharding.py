@@ -0,0 +1,145 @@
+import threading
+
+import pytest
+
+from app.core.batch import WriteBatch
+from app.core.collection import Collection
+from app.core.interfaces import MISSING
+from app.core import sharding
+from app.core.sharding import ShardedKVDB, ShardedStorage, shard_of
+
+
+class TestShardedStorage:
+
+    def test_keys_spread_across_shards(self):
+        """Ключи раскладываются по шардам стабильным хэшем и доступны через общий интерфейс"""
+        storage = ShardedStorage(4)
+        for i in range(100):
+            storage.set(f"key{i}", i)
+        assert all(shard.count() > 0 for shard in storage.shards)
+        assert sum(shard.count() for shard in storage.shards) == storage.count() == 100
+        assert storage.shards[shard_of("key7", 4)].get("key7") == 7
+        assert shard_of("key7", 4) == shard_of("key7", 4) and 0 <= shard_of("key7", 4) < 4
+
+        assert storage.get("key7") == 7
+        assert storage.delete("key7") is True
+        assert storage.delete("key7") is False
+        assert storage.get_many(["key1", "key7", "key2"]) == [1, MISSING, 2]
+        assert len(storage.get_all_data()) == 99
+
+    def test_ordered_scans_merge_shards(self):
+        """scan_prefix и range сливают отсортированные выборки шардов"""
+        storage = ShardedStorage(3)
+        storage.load_namespaces([
+            (None, ((f"user{i:03d}", i) for i in range(50))),
+            ("orders", ((f"order{i:03d}", i) for i in range(20))),
+        ])
+        assert [key for key, _ in storage.scan_prefix("user01")] == [f"user01{i}" for i in range(10)]
+        assert [key for key, _ in storage.range("user045", None)] == [f"user{i:03d}" for i in range(45, 50)]
+        assert storage.count_prefix("user0") == 50
+        assert storage.namespaces() == ["orders"]
+        assert storage.count("orders") == 20
+
+        assert storage.apply_batch([
+            {'type': 'delete', 'key': 'order000', 'namespace': 'orders'},
+            {'type': 'set', 'key': 'order100', 'value': 100, 'namespace': 'orders'},
+        ]) == 1
+        assert storage.drop_namespace("orders") == 20
+        assert storage.namespaces() == []
+
+    def test_snapshot_collects_all_shards(self):
+        """Снапшот замораживает все шарды и собирает их данные"""
+        storage = ShardedStorage(2)
+        storage.load_data({"a": 1, "b": 2}, namespaces={"ns": {"c": 3}})
+        data = storage.begin_snapshot()
+        storage.set("a", 10)
+        assert data == {"a": 1, "b": 2}
+        assert storage.snapshot_namespaces() == {"ns": {"c": 3}}
+        storage.end_snapshot()
+        assert storage.get("a") == 10
+
+
+@pytest.mark.parametrize("data_dir", ["shards"], indirect=True)
+class TestShardedKVDB:
+
+    def test_operations_and_restart(self, data_dir):
+        """Операции, пакеты и коллекции переживают перезапуск"""
+        db = ShardedKVDB(data_dir, shards=3, recovery_processes=1)
+        users = Collection(db, "users")
+        db.set_many({f"key{i}": i for i in range(30)})
+        users.set("alice", {"age": 30})
+        assert db.delete("key0") is True
+        assert db.write(WriteBatch().delete("key1").set("key2", "two")) == 1
+        assert db.get_many(["key2", "key1", "key3"], ordered=True) == ["two", MISSING, 3]
+        assert users.count() == 1
+        db.shutdown()
+
+        db = ShardedKVDB(data_dir, shards=3, recovery_processes=1)
+        assert db.get("key0") is None and db.get("key2") == "two" and db.get("key29") == 29
+        assert db.storage_engine.count() == 28
+        assert Collection(db, "users").get_all() == {"alice": {"age": 30}}
+        assert db.drop_namespace("users") == 1
+        db.shutdown()
+
+    def test_parallel_recovery(self, data_dir):
+        """Журналы шардов применяются в пуле процессов так же, как в одном процессе"""
+        db = ShardedKVDB(data_dir, shards=3, auto_snapshot_threshold=10 ** 6)
+        for i in range(200):
+            db.set(f"key{i}", i, namespace="ns" if i % 2 else None)
+        db.delete("key10")
+        expected = {None: db.storage_engine.get_all_data(), "ns": db.storage_engine.get_all_data("ns")}
+        # Сбой: журналы не сжаты, снапшотов нет
+        for shard in db.shards:
+            shard.wal.close()
+
+        db = ShardedKVDB(data_dir, shards=3, recovery_processes=3, recovery_min_wal_bytes=0)
+        # Восстановление уже записало снапшоты шардов и очистило их журналы
+        assert all(shard.wal.replay() == [] for shard in db.shards)
+        assert db.storage_engine.get_all_data() == expected[None]
+        assert db.storage_engine.get_all_data("ns") == expected["ns"]
+        db.shutdown()
+
+    def test_short_wal_recovered_in_parent(self, data_dir, monkeypatch):
+        """Короткие журналы шардов применяются основным процессом без пула процессов"""
+        db = ShardedKVDB(data_dir, shards=3, auto_snapshot_threshold=10 ** 6)
+        db.set_many({f"key{i}": i for i in range(30)})
+        for shard in db.shards:
+            shard.wal.close()
+
+        def no_pool(*args, **kwargs):
+            raise AssertionError("короткий журнал не должен восстанавливаться в пуле процессов")
+        monkeypatch.setattr(sharding, "ProcessPoolExecutor", no_pool)
+        db = ShardedKVDB(data_dir, shards=3, recovery_processes=3)
+        assert all(shard.wal.replay() == [] for shard in db.shards)
+        assert db.storage_engine.get_all_data() == {f"key{i}": i for i in range(30)}
+        db.shutdown()
+
+    def test_shard_count_is_fixed(self, data_dir):
+        """Каталог нельзя открыть с другим числом шардов"""
+        ShardedKVDB(data_dir, shards=2).shutdown()
+        with pytest.raises(ValueError):
+            ShardedKVDB(data_dir, shards=4)
+
+    def test_concurrent_writers(self, data_dir):
+        """Конкурентные записи в разные шарды не теряются"""
+        db = ShardedKVDB(data_dir, shards=4, auto_snapshot_threshold=50, wal_options={"record_format": "binary"})
+
+        def writer(thread_id):
+            for i in range(100):
+                db.set(f"t{thread_id}:{i}", i)
+                if i % 10 == 0:
+                    db.delete(f"t{thread_id}:{i}")
+
+        threads = [threading.Thread(target=writer, args=(t,)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        live = db.storage_engine.get_all_data()
+        assert len(live) == 4 * 90
+        for shard in db.shards:
+            shard.wal.close()
+
+        assert ShardedKVDB(
+            data_dir, shards=4, wal_options={"record_format": "binary"}, recovery_processes=1
+        ).storage_engine.get_all_data() == live
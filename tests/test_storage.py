@@ -1,4 +1,5 @@
 import pytest
+from app.core.interfaces import MISSING
 from app.core.storage import InMemoryStorage
 
 
@@ -158,4 +159,376 @@ class TestInMemoryStorage:
         """Тест работы с пустой строкой в качестве ключа"""
         storage = InMemoryStorage()
         storage.set("", "empty_key_value")
-        assert storage.get("") == "empty_key_value"
\ No newline at end of file
+        assert storage.get("") == "empty_key_value"
+
+
+class TestInMemoryStorageLoadItems:
+
+    def test_load_items_from_iterator(self):
+        """load_items должна заменять данные парами из итератора"""
+        storage = InMemoryStorage()
+        storage.set("old", "value")
+
+        count = storage.load_items((f"key{i}", i) for i in range(5))
+
+        assert count == 5
+        assert storage.get("old") is None
+        assert storage.get_all_data() == {f"key{i}": i for i in range(5)}
+
+    def test_load_items_error_keeps_data(self):
+        """Ошибка итератора не должна менять прежние данные"""
+        storage = InMemoryStorage()
+        storage.set("old", "value")
+
+        def items():
+            yield "key1", 1
+            raise ValueError("поврежденный снапшот")
+
+        with pytest.raises(ValueError):
+            storage.load_items(items())
+        assert storage.get_all_data() == {"old": "value"}
+
+
+class TestInMemoryStorageScan:
+
+    def test_scan_prefix(self):
+        """scan_prefix должна возвращать пары с префиксом по возрастанию ключей"""
+        storage = InMemoryStorage()
+        for key in ["users:bob", "orders:1", "users:alice", "usersx", "users:carol"]:
+            storage.set(key, key.upper())
+        storage.delete("users:carol")
+
+        assert list(storage.scan_prefix("users:")) == [("users:alice", "USERS:ALICE"), ("users:bob", "USERS:BOB")]
+        assert list(storage.scan_prefix("missing:")) == []
+
+    def test_range(self):
+        """range должна возвращать пары из полуинтервала [start, end)"""
+        storage = InMemoryStorage()
+        storage.load_data({f"key{i}": i for i in range(10)})
+
+        assert list(storage.range("key3", "key6")) == [("key3", 3), ("key4", 4), ("key5", 5)]
+        assert [key for key, _ in storage.range(end="key2")] == ["key0", "key1"]
+        assert len(list(storage.range())) == 10
+
+    def test_scan_during_snapshot(self):
+        """Индекс должен учитывать изменения, сделанные во время снапшота"""
+        storage = InMemoryStorage()
+        storage.load_data({"a:1": 1, "a:2": 2})
+        storage.begin_snapshot()
+        storage.set("a:3", 3)
+        storage.delete("a:1")
+        storage.set("a:1", 10)
+        storage.delete("a:2")
+
+        assert list(storage.scan_prefix("a:")) == [("a:1", 10), ("a:3", 3)]
+        storage.end_snapshot()
+        assert list(storage.scan_prefix("a:")) == [("a:1", 10), ("a:3", 3)]
+
+    def test_scan_skips_keys_deleted_during_iteration(self):
+        """Ключи, удаленные во время итерации, не должны возвращаться"""
+        storage = InMemoryStorage()
+        storage.load_data({"a:1": 1, "a:2": 2, "a:3": 3})
+
+        result = []
+        for key, value in storage.scan_prefix("a:"):
+            result.append(key)
+            storage.delete("a:3")
+        assert result == ["a:1", "a:2"]
+
+
+class TestInMemoryStoragePrefixCounts:
+
+    def test_count_prefix_maintained(self):
+        """Счетчик префикса должен обновляться при добавлении, перезаписи и удалении"""
+        storage = InMemoryStorage()
+        storage.set("users:alice", 1)
+        assert storage.count_prefix("users:") == 1
+
+        storage.set("users:bob", 2)
+        storage.set("users:bob", 3)
+        storage.set("orders:1", 4)
+        assert storage.count_prefix("users:") == 2
+        storage.delete("users:alice")
+        storage.delete("users:alice")
+        assert storage.count_prefix("users:") == 1
+        assert storage.count_prefix("orders:") == 1
+
+    def test_nested_prefixes(self):
+        """Тест вложенных префиксов с двоеточиями"""
+        storage = InMemoryStorage()
+        assert storage.count_prefix("a:") == 0
+        assert storage.count_prefix("a:b:") == 0
+        storage.set("a:b:c", 1)
+        storage.set("a:x", 2)
+
+        assert storage.count_prefix("a:") == 2
+        assert storage.count_prefix("a:b:") == 1
+
+    def test_count_prefix_during_snapshot(self):
+        """Счетчик должен учитывать изменения, сделанные во время снапшота"""
+        storage = InMemoryStorage()
+        storage.load_data({"a:1": 1, "a:2": 2})
+        assert storage.count_prefix("a:") == 2
+        storage.begin_snapshot()
+        storage.delete("a:1")
+        storage.set("a:1", 1)
+        storage.set("a:3", 3)
+        storage.delete("a:2")
+
+        assert storage.count_prefix("a:") == 2
+        storage.end_snapshot()
+        assert storage.count_prefix("a:") == 2
+
+    def test_count_prefix_after_load(self):
+        """load_data и load_items должны пересчитывать счетчики"""
+        storage = InMemoryStorage()
+        assert storage.count_prefix("a:") == 0
+        storage.load_data({"a:1": 1, "a:2": 2, "b:1": 3})
+        assert storage.count_prefix("a:") == 2
+        storage.load_items(iter([("a:1", 1)]))
+        assert storage.count_prefix("a:") == 1
+
+    def test_count_prefix_constant_time(self, monkeypatch):
+        """Повторный подсчет не должен просматривать индекс"""
+        storage = InMemoryStorage()
+        storage.set("a:1", 1)
+        storage.count_prefix("a:")
+
+        def fail(prefix):
+            raise AssertionError("индекс не должен просматриваться")
+        monkeypatch.setattr(storage._namespaces[None].index, "iter_prefix", fail)
+        storage.set("a:2", 2)
+        assert storage.count_prefix("a:") == 2
+
+
+class TestInMemoryStorageSnapshot:
+
+    def test_begin_snapshot_does_not_copy(self):
+        """Снапшот должен возвращать состояние без копирования словаря"""
+        storage = InMemoryStorage()
+        storage.set("key1", "value1")
+
+        snapshot = storage.begin_snapshot()
+
+        assert snapshot is storage._namespaces[None].data
+        assert snapshot == {"key1": "value1"}
+        storage.end_snapshot()
+
+    def test_snapshot_is_point_in_time(self):
+        """Изменения после начала снапшота не должны попадать в него"""
+        storage = InMemoryStorage()
+        storage.set("key1", "value1")
+        storage.set("key2", "value2")
+
+        snapshot = storage.begin_snapshot()
+        storage.set("key1", "updated")
+        storage.set("key3", "value3")
+        storage.delete("key2")
+
+        assert snapshot == {"key1": "value1", "key2": "value2"}
+        assert storage.get("key1") == "updated"
+        assert storage.get("key2") is None
+        assert storage.get("key3") == "value3"
+        assert storage.get_all_data() == {"key1": "updated", "key3": "value3"}
+        storage.end_snapshot()
+
+    def test_end_snapshot_merges_overlay(self):
+        """После закрытия снапшота изменения переносятся в основной словарь"""
+        storage = InMemoryStorage()
+        storage.set("key1", "value1")
+        storage.set("key2", "value2")
+
+        storage.begin_snapshot()
+        storage.set("key1", "updated")
+        storage.delete("key2")
+        storage.set("key3", None)
+        storage.end_snapshot()
+
+        assert storage._namespaces[None].overlay is None
+        assert storage._namespaces[None].data == {"key1": "updated", "key3": None}
+
+    def test_delete_during_snapshot(self):
+        """Тест удаления ключей, пока снапшот открыт"""
+        storage = InMemoryStorage()
+        storage.set("old", "value")
+
+        storage.begin_snapshot()
+        storage.set("new", "value")
+
+        assert storage.delete("new") is True
+        assert storage.delete("new") is False
+        assert storage.delete("old") is True
+        assert storage.delete("old") is False
+        assert storage.delete("missing") is False
+        storage.set("old", "again")
+        assert storage.get("old") == "again"
+        storage.end_snapshot()
+
+        assert storage.get_all_data() == {"old": "again"}
+
+    def test_overlay_grows_only_with_modified_keys(self):
+        """Дополнительная память снапшота пропорциональна числу измененных ключей"""
+        storage = InMemoryStorage()
+        for i in range(1000):
+            storage.set(f"key{i}", i)
+
+        storage.begin_snapshot()
+        for i in range(10):
+            storage.set(f"key{i}", -i)
+
+        assert len(storage._namespaces[None].overlay) == 10
+        storage.end_snapshot()
+
+    def test_nested_snapshot_not_allowed(self):
+        """Нельзя открыть второй снапшот, пока первый не закрыт"""
+        storage = InMemoryStorage()
+        storage.begin_snapshot()
+
+        with pytest.raises(RuntimeError):
+            storage.begin_snapshot()
+        storage.end_snapshot()
+        storage.begin_snapshot()
+        storage.end_snapshot()
+
+    def test_load_data_during_snapshot(self):
+        """load_data во время снапшота не должна менять замороженное состояние"""
+        storage = InMemoryStorage()
+        storage.set("key1", "value1")
+
+        snapshot = storage.begin_snapshot()
+        storage.load_data({"key2": "value2"})
+        storage.end_snapshot()
+
+        assert snapshot == {"key1": "value1"}
+        assert storage.get_all_data() == {"key2": "value2"}
+
+
+class TestInMemoryStorageNamespaces:
+
+    def test_namespaces_are_isolated(self):
+        """Одинаковые ключи разных пространств имен не пересекаются"""
+        storage = InMemoryStorage()
+        storage.set("key", "general")
+        storage.set("key", "users", namespace="users")
+        storage.set("key", "orders", namespace="orders")
+
+        assert storage.get("key") == "general"
+        assert storage.get("key", namespace="users") == "users"
+        assert storage.get("key", namespace="missing") is None
+        assert storage.delete("key", namespace="users")
+        assert not storage.delete("key", namespace="missing")
+        assert storage.get("key", namespace="orders") == "orders"
+        assert storage.get_all_data() == {"key": "general"}
+
+    def test_count_and_enumerate(self):
+        """count, get_all_data и scan_prefix работают в пределах пространства имен"""
+        storage = InMemoryStorage()
+        for i in range(5):
+            storage.set(f"user{i}", i, namespace="users")
+        storage.set("user9", "general")
+        storage.set("x", 1, namespace="empty")
+        storage.delete("x", namespace="empty")
+
+        assert storage.count(namespace="users") == 5
+        assert storage.count() == 1
+        assert storage.count_prefix("user", namespace="users") == 5
+        assert storage.get_all_data(namespace="users") == {f"user{i}": i for i in range(5)}
+        assert [key for key, _ in storage.scan_prefix("user", namespace="users")] == [f"user{i}" for i in range(5)]
+        assert storage.namespaces() == ["users"]
+
+    def test_snapshot_freezes_namespaces(self):
+        """Снапшот замораживает все пространства имен"""
+        storage = InMemoryStorage()
+        storage.set("alice", 1, namespace="users")
+
+        storage.begin_snapshot()
+        storage.set("bob", 2, namespace="users")
+        storage.set("1", "order", namespace="orders")
+        assert storage.snapshot_namespaces() == {"users": {"alice": 1}}
+        storage.end_snapshot()
+
+        assert storage.get_all_data(namespace="users") == {"alice": 1, "bob": 2}
+        assert storage.get_all_data(namespace="orders") == {"1": "order"}
+
+    def test_snapshot_namespaces_requires_snapshot(self):
+        """snapshot_namespaces нельзя вызвать без открытого снапшота"""
+        with pytest.raises(RuntimeError):
+            InMemoryStorage().snapshot_namespaces()
+
+    def test_load_namespaces(self):
+        """load_namespaces заменяет все пространства имен; части одного пространства объединяются"""
+        storage = InMemoryStorage()
+        storage.set("old", 1, namespace="stale")
+
+        loaded = storage.load_namespaces([
+            (None, [("key", "general")]),
+            ("users", [("alice", 1)]),
+            ("users", [("bob", 2)]),
+        ])
+
+        assert loaded == 3
+        assert storage.get("key") == "general"
+        assert storage.get_all_data(namespace="users") == {"alice": 1, "bob": 2}
+        assert storage.namespaces() == ["users"]
+
+    def test_drop_namespace(self):
+        """drop_namespace удаляет пространство имен целиком"""
+        storage = InMemoryStorage()
+        for i in range(5):
+            storage.set(f"key{i}", i, namespace="users")
+        storage.set("key0", "general")
+
+        assert storage.drop_namespace("users") == 5
+        assert storage.drop_namespace("users") == 0
+        assert storage.get("key0", namespace="users") is None
+        assert storage.namespaces() == []
+        assert storage.drop_namespace(None) == 1
+        assert storage.get_all_data() == {}
+
+    def test_drop_namespace_during_snapshot(self):
+        """Удаление пространства во время снапшота не меняет замороженное состояние"""
+        storage = InMemoryStorage()
+        storage.set("alice", 1, namespace="users")
+
+        storage.begin_snapshot()
+        storage.drop_namespace("users")
+        storage.set("bob", 2, namespace="users")
+        assert storage.snapshot_namespaces() == {"users": {"alice": 1}}
+        storage.end_snapshot()
+
+        assert storage.get_all_data(namespace="users") == {"bob": 2}
+
+    def test_apply_batch(self):
+        """apply_batch применяет операции разных пространств имен и считает удаленные ключи"""
+        storage = InMemoryStorage()
+        storage.set("old", 1)
+        storage.set("bob", 2, namespace="users")
+
+        deleted = storage.apply_batch([
+            {"type": "set", "key": "alice", "value": 1, "namespace": "users"},
+            {"type": "delete", "key": "bob", "namespace": "users"},
+            {"type": "delete", "key": "missing", "namespace": "orders"},
+            {"type": "set", "key": "new", "value": 3},
+            {"type": "delete", "key": "old"},
+        ])
+
+        assert deleted == 2
+        assert storage.get_all_data() == {"new": 3}
+        assert storage.get_all_data(namespace="users") == {"alice": 1}
+        assert storage.namespaces() == ["users"]
+
+    def test_get_many(self):
+        """get_many возвращает значения по порядку и MISSING для отсутствующих ключей, в том числе во время снапшота"""
+        storage = InMemoryStorage()
+        storage.set("a", 1, namespace="users")
+        storage.set("b", None, namespace="users")
+
+        assert storage.get_many(["b", "x", "a"], namespace="users") == [None, MISSING, 1]
+        assert storage.get_many(["a"], namespace="missing") == [MISSING]
+
+        storage.begin_snapshot()
+        storage.delete("a", namespace="users")
+        storage.set("c", 3, namespace="users")
+        assert storage.get_many(["a", "b", "c"], namespace="users") == [MISSING, None, 3]
+        storage.end_snapshot()
+
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.server.client import KVDBClient, KVDBClientPool
+from app.server.protocol import (
+    HEADER,
+    OP_GET,
+    OP_PING,
+    OP_SET,
+    STATUS_ERROR,
+    STATUS_OK,
+    decode_fields,
+    encode_fields,
+    encode_frame,
+)
+from app.server.tcp import KVDBServer
+
+
+class TestTcpServer:
+
+    def test_key_operations(self, data_dir, open_db):
+        """GET/SET/DELETE по TCP; записи переживают перезапуск сервера"""
+        async def scenario():
+            async with KVDBServer(open_db(data_dir, group_commit=True, thread_safe=True)) as server:
+                async with KVDBClient(port=server.port) as client:
+                    await client.ping()
+                    await client.set("a", {"x": [1, 2]})
+                    await client.set("a", 2, namespace="ns")
+                    await client.set("empty", None)
+                    assert await client.get("a") == {"x": [1, 2]}
+                    assert await client.get("a", namespace="ns") == 2
+                    assert await client.get("empty") is None
+                    assert await client.get("missing") is None
+                    assert await client.delete("a") is True
+                    assert await client.delete("a") is False
+
+        asyncio.run(scenario())
+        db = open_db(data_dir, group_commit=True, thread_safe=True)
+        assert db.get("a") is None and db.get("a", namespace="ns") == 2
+        db.shutdown()
+
+    def test_pipelined_operations_keep_per_key_order(self, data_dir, open_db):
+        """Конвейерные операции над одним ключом выполняются в порядке отправки"""
+        async def scenario():
+            async with KVDBServer(open_db(data_dir, group_commit=True, thread_safe=True)) as server:
+                async with KVDBClient(port=server.port) as client:
+                    results = await asyncio.gather(
+                        client.set("k", 1), client.set("k", 2), client.get("k"),
+                        client.delete("k"), client.get("k"), client.set("k", 3),
+                    )
+                    assert results == [None, None, 2, True, None, None]
+                    assert await client.get("k") == 3
+                    assert await client.set_many((f"key{i}", i) for i in range(200)) == 200
+                    assert await client.get("key199") == 199
+
+        asyncio.run(scenario())
+
+    def test_client_pool(self, data_dir, open_db):
+        """Пул распределяет ключи по соединениям по хэшу и сохраняет порядок операций над ключом"""
+        async def scenario():
+            async with KVDBServer(open_db(data_dir, group_commit=True, thread_safe=True)) as server:
+                async with KVDBClientPool(port=server.port, size=3) as pool:
+                    await pool.ping()
+                    assert await pool.set_many(((f"key{i}", i) for i in range(300)), namespace="bulk") == 300
+                    assert {id(pool.client_for(f"key{i}")) for i in range(300)} == {id(c) for c in pool.clients}
+                    values = await asyncio.gather(*(pool.get(f"key{i}", namespace="bulk") for i in range(300)))
+                    assert values == list(range(300))
+                    assert await asyncio.gather(pool.set("x", 1), pool.delete("x"), pool.get("x")) == [None, True, None]
+
+        asyncio.run(scenario())
+        with pytest.raises(ValueError):
+            KVDBClientPool(size=0)
+
+    def test_protocol_errors(self, data_dir, open_db):
+        """Некорректный кадр получает ответ с ошибкой, соединение продолжает работать"""
+        db = open_db(data_dir, group_commit=True, thread_safe=True)
+
+        async def scenario():
+            async with KVDBServer(db, shutdown_db=False) as server:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                writer.write(encode_frame(1, OP_SET, encode_fields(None, "a")))
+                writer.write(encode_frame(2, 99))
+                writer.write(encode_frame(3, OP_SET, encode_fields(None, "a", "{bad json")))
+                writer.write(encode_frame(4, OP_SET, encode_fields(None, "a", "[1]")))
+                writer.write(encode_frame(5, OP_GET, encode_fields(None, "a")))
+                responses = {}
+                for _ in range(5):
+                    length, request_id, status = HEADER.unpack(await reader.readexactly(HEADER.size))
+                    responses[request_id] = (status, await reader.readexactly(length))
+                writer.close()
+                assert [responses[i][0] for i in (1, 2, 3)] == [STATUS_ERROR] * 3
+                assert responses[4] == (STATUS_OK, b"")
+                assert responses[5][0] == STATUS_OK and decode_fields(responses[5][1], 1) == ["[1]"]
+
+                # Ошибка записи в WAL возвращается клиенту как IOError
+                db.wal.close()
+                async with KVDBClient(port=server.port) as client:
+                    with pytest.raises(IOError):
+                        await client.set("b", 1)
+
+        asyncio.run(scenario())
+        with pytest.raises(ValueError):
+            KVDBServer(open_db(data_dir, group_commit=True), write_workers=4)
+
+    def test_inline_replies_are_drained(self, data_dir, open_db, monkeypatch):
+        """Ответы на PING и некорректные кадры ждут drain, как ответы на GET: буфер записи ограничен"""
+        drains = []
+        original_drain = asyncio.StreamWriter.drain
+
+        async def drain(self):
+            drains.append(self)
+            await original_drain(self)
+        monkeypatch.setattr(asyncio.StreamWriter, "drain", drain)
+
+        async def scenario():
+            async with KVDBServer(open_db(data_dir, group_commit=True, thread_safe=True)) as server:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                for i in range(100):
+                    writer.write(encode_frame(i, OP_PING))
+                    writer.write(encode_frame(100 + i, 99))
+                statuses = []
+                for _ in range(200):
+                    length, _, status = HEADER.unpack(await reader.readexactly(HEADER.size))
+                    await reader.readexactly(length)
+                    statuses.append(status)
+                writer.close()
+                assert statuses.count(STATUS_OK) == 100 and statuses.count(STATUS_ERROR) == 100
+                assert sum(drained is not writer for drained in drains) >= 200
+
+        asyncio.run(scenario())
+
+    def test_server_disconnect(self, data_dir, open_db):
+        """После остановки сервера запросы сразу завершаются ConnectionError; клиент и пул переподключаются"""
+        async def scenario():
+            server = KVDBServer(open_db(data_dir, group_commit=True, thread_safe=True))
+            await server.start()
+            port = server.port
+            client = KVDBClient(port=port)
+            await client.connect()
+            pool = KVDBClientPool(port=port, size=2)
+            await pool.connect()
+            await client.set("a", 1)
+            await pool.set("b", 2)
+
+            await server.close()
+            for _ in range(2):
+                with pytest.raises(ConnectionError):
+                    await asyncio.wait_for(client.get("a"), timeout=5)
+            assert not client.connected
+            with pytest.raises(ConnectionError):
+                await asyncio.wait_for(pool.get("b"), timeout=5)
+
+            server = KVDBServer(open_db(data_dir, group_commit=True, thread_safe=True), port=port)
+            await server.start()
+            await client.reconnect()
+            assert await client.get("a") == 1
+            assert await asyncio.wait_for(pool.get("b"), timeout=5) == 2
+            await pool.ping()
+            await client.close()
+            await pool.close()
+            await server.close()
+
+        asyncio.run(scenario())
+
+    def test_unexpected_error_gets_response(self, data_dir, open_db, monkeypatch):
+        """Непредвиденное исключение базы возвращается клиенту ошибкой, а не оставляет запрос без ответа"""
+        db = open_db(data_dir, group_commit=True, thread_safe=True)
+
+        def fail(*args):
+            raise RuntimeError("сбой")
+        monkeypatch.setattr(db, "delete", fail)
+
+        async def scenario():
+            async with KVDBServer(db) as server:
+                async with KVDBClient(port=server.port) as client:
+                    with pytest.raises(IOError, match="сбой"):
+                        await asyncio.wait_for(client.delete("a"), timeout=5)
+                    await client.set("a", 1)
+                    assert await client.get("a") == 1
+
+        asyncio.run(scenario())
+
+    def test_bounded_storage_reads_in_pool(self, data_dir, open_db):
+        """С ограниченным хранилищем чтения выполняются в пуле потоков и учитываются политикой вытеснения"""
+        db = open_db(data_dir, group_commit=True, thread_safe=True, storage_options={"max_keys": 2})
+        threads = []
+        get = db.get
+
+        def recording_get(*args):
+            threads.append(threading.current_thread().name)
+            return get(*args)
+        db.get = recording_get
+
+        async def scenario():
+            async with KVDBServer(db) as server:
+                async with KVDBClient(port=server.port) as client:
+                    await client.set("a", 1)
+                    await client.set("b", 2)
+                    # Чтение освежает a, поэтому при переполнении вытесняется b
+                    assert await client.get("a") == 1
+                    await client.set("c", 3)
+                    assert await asyncio.gather(client.get("a"), client.get("b"), client.get("c")) == [1, None, 3]
+
+        asyncio.run(scenario())
+        assert len(threads) == 4 and all(name.startswith("kvdb-tcp") for name in threads)
@@ -0,0 +1,42 @@
+import logging
+from app.core.tracing import LoggingTracer, MultiTracer, RecordingTracer, TraceEvent
+
+
+class TestTracers:
+
+    def test_recording_tracer(self):
+        """RecordingTracer хранит последние события и считает статистику по операциям"""
+        tracer = RecordingTracer(maxlen=2)
+        tracer.record(TraceEvent("set", None, "key1", 1, 0.5))
+        tracer.record(TraceEvent("set", "users", "key2", 1, 0.25))
+        tracer.record(TraceEvent("get", None, "key1", 1, 0.125))
+
+        assert [event.key for event in tracer.events] == ["key2", "key1"]
+        assert tracer.stats() == {"set": (2, 0.75), "get": (1, 0.125)}
+
+        tracer.clear()
+        assert not tracer.events
+        assert tracer.stats() == {}
+
+    def test_logging_tracer(self, caplog):
+        """LoggingTracer пишет событие в лог только на включенном уровне"""
+        logger = logging.getLogger("test_tracing")
+        tracer = LoggingTracer(logger)
+        event = TraceEvent("delete", "users", "alice", 1, 0.001)
+
+        with caplog.at_level(logging.INFO, logger="test_tracing"):
+            tracer.record(event)
+        assert not caplog.records
+
+        with caplog.at_level(logging.DEBUG, logger="test_tracing"):
+            tracer.record(event)
+        assert caplog.records[0].getMessage() == "delete namespace='users' key='alice' count=1 1000.0 мкс"
+
+    def test_multi_tracer(self):
+        """MultiTracer передает событие всем трассировщикам"""
+        first, second = RecordingTracer(), RecordingTracer()
+        event = TraceEvent("get", None, "key", 1, 0.0)
+
+        MultiTracer([first, second]).record(event)
+
+        assert list(first.events) == list(second.events) == [event]
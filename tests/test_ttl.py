@@ -0,0 +1,360 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.core.async_database import AsyncKVDB
+from app.core.batch import WriteBatch
+from app.core.collection import Collection
+from app.core.database import KVDB
+from app.core.interfaces import MISSING
+from app.core.persistence import Snapshotter
+from app.core.recovery import compact_operations
+from app.core.sharding import ShardedKVDB
+from app.core.storage import InMemoryStorage, expires_namespace
+from app.core.wal import SegmentedWal, encode_binary_record, iter_binary_records
+
+
+def wait_until(condition, timeout=2.0):
+    """Ждет, пока condition() не станет истинным (фоновое истечение идет по таймеру)."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+class TestStorageExpiry:
+
+    def test_expired_keys_are_hidden_from_reads(self):
+        """Истекший ключ не виден чтениям и подсчету, но остается в памяти до удаления"""
+        storage = InMemoryStorage()
+        past, future = time.time() - 1, time.time() + 100
+        storage.set("a", 1, expires_at=past)
+        storage.set("b", 2, expires_at=future)
+        storage.set("c", 3, namespace="ns", expires_at=past)
+        storage.set("d", 4)
+
+        assert storage.get("a") is None and storage.get("b") == 2
+        assert storage.get_many(["a", "b", "d"]) == [MISSING, 2, 4]
+        assert storage.get_all_data() == {"b": 2, "d": 4}
+        assert list(storage.scan_prefix("")) == [("b", 2), ("d", 4)]
+        assert list(storage.range(namespace="ns")) == []
+        assert storage.count() == 2 and storage.count("ns") == 0
+        assert len(storage._namespaces[None].index) == 3
+        assert storage.expiry("b") == future and storage.expiry("d") is None
+        # Удаление истекшего ключа освобождает память, но ключ уже считался отсутствующим
+        assert storage.delete("c", namespace="ns") is False
+        assert storage.count("ns") == 0
+
+    def test_counts_exclude_expired_keys(self):
+        """count и count_prefix (и отслеживаемые счетчики префиксов) вычитают истекшие, но не удаленные ключи"""
+        storage = InMemoryStorage()
+        now = time.time()
+        assert storage.count_prefix("user:", namespace="ns") == 0
+        storage.set("user:1", 1, namespace="ns", expires_at=now + 0.05)
+        storage.set("user:2", 2, namespace="ns", expires_at=now + 100)
+        storage.set("item:1", 3, namespace="ns", expires_at=now + 0.05)
+        storage.set("user:3", 4, expires_at=now + 0.05)
+        # Перезапись с тем же временем истечения оставляет в куче две живые записи одного ключа
+        storage.set("user:1", 1, namespace="ns", expires_at=now + 0.05)
+        assert storage.count("ns") == 3 and storage.count_prefix("user:", namespace="ns") == 2
+
+        time.sleep(0.06)
+        assert storage.count("ns") == 1 and storage.count() == 0
+        assert storage.count_prefix("user:", namespace="ns") == 1
+        assert storage.count_prefix("item:", namespace="ns") == 0
+        assert storage.count_prefix("user:") == 0
+        # Подсчет не удаляет ключи: их удаляет владелец хранилища по pop_expired
+        assert storage.pop_expired(time.time()) == {"ns": ["user:1", "item:1"], None: ["user:3"]}
+
+    def test_pop_expired_skips_stale_entries(self):
+        """Куча истечений пропускает перезаписанные и удаленные ключи и не растет без предела"""
+        storage = InMemoryStorage()
+        now = time.time()
+        storage.set("a", 1, expires_at=now - 2)
+        storage.set("a", 1, expires_at=now + 100)
+        storage.set("b", 2, expires_at=now - 1)
+        storage.delete("b")
+        storage.set("c", 3, expires_at=now - 1)
+        storage.set("c", 3)
+        storage.set("d", 4, namespace="ns", expires_at=now - 1)
+        storage.set("e", 5, expires_at=now - 1)
+        assert storage.next_expiry() == now - 2
+
+        assert storage.pop_expired(now, limit=1) == {"ns": ["d"]}
+        assert storage.pop_expired(now) == {None: ["e"]}
+        assert storage.pop_expired(now) == {}
+        assert storage.next_expiry() == now + 100
+        # pop_expired только выбирает ключи; удаляет их вызывающий (KVDB - с записью в WAL)
+        storage.delete("d", namespace="ns")
+        storage.delete("e")
+
+        # Повторная запись ключа с TTL оставляет устаревшие записи кучи, но куча перестраивается
+        for i in range(5000):
+            storage.set("session", i, expires_at=now + 100 + i)
+        assert len(storage._expiry_heap) <= 2048
+        assert storage.pop_expired(now + 200) == {None: ["a"]}
+
+    def test_snapshot_keeps_expiry_of_frozen_state(self):
+        """Снапшот содержит времена истечения на момент begin_snapshot; изменения во время снапшота - в оверлее"""
+        storage = InMemoryStorage()
+        at = time.time() + 100
+        storage.set("a", 1, expires_at=at)
+        storage.set("b", 2, namespace="ns", expires_at=at + 1)
+        storage.begin_snapshot()
+        storage.set("a", 1)
+        storage.set("c", 3, expires_at=at + 2)
+        # Снапшот сериализуется до end_snapshot, после него словари изменяются
+        namespaces = {name: dict(data) for name, data in storage.snapshot_namespaces().items()}
+        assert namespaces[expires_namespace(None)] == {"a": at}
+        assert namespaces[expires_namespace("ns")] == {"b": at + 1}
+        assert storage.expiry("a") is None and storage.expiry("c") == at + 2
+        storage.end_snapshot()
+        assert storage.expiry("a") is None and storage.expiry("c") == at + 2
+
+        restored = InMemoryStorage()
+        restored.load_data({"a": 1}, {"ns": {"b": 2}, **namespaces})
+        assert restored.namespaces() == ["ns"]
+        assert restored.expiry("a") == at and restored.expiry("b", namespace="ns") == at + 1
+
+
+class TestKVDBTTL:
+
+    def test_set_with_ttl(self, data_dir, open_db):
+        """set с ttl: ключ истекает, ttl() показывает остаток, запись без ttl снимает TTL"""
+        db = open_db(data_dir)
+        db.set("a", 1, ttl=0.05)
+        db.set("b", 2, ttl=100)
+        db.set("b", 3)
+        users = Collection(db, "users")
+        users.set("u1", {"name": "x"}, ttl=0.05)
+        db.set_many({"c": 1, "d": 2}, ttl=100)
+        assert db.get("a") == 1 and 0 < db.ttl("a") <= 0.05
+        assert db.ttl("b") is None and 99 < db.ttl("c") <= 100
+        with pytest.raises(ValueError):
+            db.set("e", 1, ttl=0)
+
+        time.sleep(0.06)
+        assert db.get("a") is None and users.get("u1") is None and not users.exists("u1")
+        assert db.ttl("a") is None
+        assert db.delete("a") is False
+        db.shutdown()
+
+    def test_active_expiry_logs_compact_records(self, data_dir, open_db):
+        """Истекшие ключи удаляются попутно при записи и purge_expired одной записью WAL на пространство имен"""
+        db = open_db(data_dir, auto_snapshot_threshold=1000)
+        db.set_many(((f"key{i}", i) for i in range(10)), ttl=0.05)
+        db.set_many(((f"key{i}", i) for i in range(10)), namespace="ns", ttl=0.05)
+        db.set("kept", 1, ttl=100)
+        count = db.operation_count
+        time.sleep(0.06)
+
+        assert db.purge_expired(limit=5) == 5
+        assert db.purge_expired() == 15
+        assert db.purge_expired() == 0
+        assert db.storage_engine.count() == 1 and db.storage_engine.count("ns") == 0
+        expire_records = [op for op in db.wal.replay() if op['type'] == 'expire']
+        assert sum(len(op['keys']) for op in expire_records) == 20
+        assert len(expire_records) <= 3
+        # Каждая запись об истечении учитывается в пороге снапшота как одна операция
+        assert db.operation_count == count + len(expire_records)
+
+        # Запись удаляет ключ, срок которого наступил, без явного вызова
+        db.set("short", 1, ttl=0.01)
+        time.sleep(0.02)
+        db.set("other", 2)
+        assert db.storage_engine.count() == 2
+        assert db.wal.replay()[-1] == {'type': 'expire', 'keys': ['short']}
+        db.shutdown()
+
+    @pytest.mark.parametrize("snapshot, record_format", [("snapshot.bin", "binary"), ("snapshot.json", "json")])
+    def test_ttl_survives_restart(self, data_dir, open_db, snapshot, record_format):
+        """Время истечения восстанавливается из снапшота и из WAL; истекшие при простое ключи удаляются"""
+        db = open_db(data_dir, snapshot, record_format, auto_snapshot_threshold=4)
+        db.set("snap_short", 1, ttl=0.05)
+        db.set("snap_long", 2, ttl=100, namespace="ns")
+        db.set("plain", 3)
+        db.set("wal_pad", 0)  # порог: снапшот с временами истечения
+        db.set("wal_short", 4, ttl=0.05)
+        db.set("wal_long", 5, ttl=100)
+        db.wal.close()
+
+        time.sleep(0.06)
+        db = open_db(data_dir, snapshot, record_format)
+        assert db.get("snap_short") is None and db.get("wal_short") is None
+        assert 99 < db.ttl("snap_long", namespace="ns") <= 100 and 99 < db.ttl("wal_long") <= 100
+        assert db.get("plain") == 3 and db.ttl("plain") is None
+        assert db.purge_expired() == 2
+        db.shutdown()
+
+        db = open_db(data_dir, snapshot, record_format)
+        assert db.get_many(["snap_short", "wal_short", "wal_long", "plain"]) == {"wal_long": 5, "plain": 3}
+        db.shutdown()
+
+    def test_failed_expire_record_requeues_keys(self, data_dir, open_db, monkeypatch):
+        """Если запись истечения в WAL не удалась, ключи возвращаются в кучу и удаляются следующим истечением"""
+        db = open_db(data_dir)
+        db.set_many({"a": 1, "b": 2}, ttl=0.05)
+        db.set_many({"c": 3}, namespace="ns", ttl=0.05)
+        time.sleep(0.06)
+        original_log_deferred = db.wal.log_deferred
+
+        def fail(operation):
+            raise IOError("диск переполнен")
+        monkeypatch.setattr(db.wal, "log_deferred", fail)
+        with pytest.raises(IOError):
+            db.purge_expired()
+        assert len(db.storage_engine._expiry_heap) == 3
+
+        monkeypatch.setattr(db.wal, "log_deferred", original_log_deferred)
+        assert db.purge_expired() == 3
+        assert len(db.storage_engine._namespaces[None].index) == 0 and db.storage_engine.next_expiry() is None
+        db.shutdown()
+
+    def test_drop_namespace_skips_expired_keys(self, data_dir, open_db):
+        """drop_namespace освобождает истекшие ключи, но не считает их удаленными"""
+        db = open_db(data_dir)
+        db.set("short", 1, namespace="ns", ttl=0.05)
+        db.set("long", 2, namespace="ns", ttl=100)
+        db.set("plain", 3, namespace="ns")
+        db.set("other", 4, ttl=0.05)
+        time.sleep(0.06)
+        assert db.drop_namespace("ns") == 2
+        # Запись попутно удалила истекший ключ общего пространства
+        assert db.purge_expired() == 0 and db.storage_engine.count() == 0
+        db.shutdown()
+
+        storage = InMemoryStorage()
+        storage.set("a", 1, expires_at=time.time() - 1)
+        storage.set("b", 2)
+        assert storage.drop_namespace(None) == 1
+
+    def test_background_expiry(self, data_dir, open_db):
+        """С expire_interval фоновый поток удаляет истекшие ключи без записей и останавливается при shutdown"""
+        with pytest.raises(ValueError):
+            open_db(data_dir, expire_interval=0.01)
+        with pytest.raises(ValueError):
+            open_db(data_dir, thread_safe=True, expire_interval=0)
+
+        db = open_db(data_dir, thread_safe=True, expire_interval=0.01, auto_snapshot_threshold=1000)
+        db.set_many(((f"key{i}", i) for i in range(250)), ttl=0.05)
+        db.set("kept", 1, ttl=100)
+        storage = db.storage_engine
+        wait_until(lambda: len(storage._namespaces[None].index) == 1)
+        expire_records = [op for op in db.wal.replay() if op['type'] == 'expire']
+        # Поток удаляет ключи пакетами по EXPIRE_BATCH
+        assert sum(len(op['keys']) for op in expire_records) == 250 and len(expire_records) >= 3
+        thread = db._expire_thread
+        db.shutdown()
+        assert not thread.is_alive()
+
+    def test_async_background_expiry(self, data_dir, open_db):
+        """AsyncKVDB с expire_interval удаляет истекшие ключи в потоке писателя"""
+        db = open_db(data_dir, thread_safe=True)
+
+        async def scenario():
+            async with AsyncKVDB(db, shutdown_db=False, expire_interval=0.01) as adb:
+                await adb.set_many({"a": 1, "b": 2}, ttl=0.05)
+                await adb.set("c", 3)
+                deadline = time.monotonic() + 2
+                while len(db.storage_engine._namespaces[None].index) > 1:
+                    assert time.monotonic() < deadline
+                    await asyncio.sleep(0.01)
+
+        asyncio.run(scenario())
+        assert db.wal.replay()[-1] == {'type': 'expire', 'keys': ['a', 'b']}
+        db.shutdown()
+
+    def test_reserved_namespaces_rejected(self, data_dir, open_db):
+        """Пространства с префиксом "\\x00" зарезервированы: запись в них и такие коллекции отклоняются"""
+        db = open_db(data_dir)
+        reserved = expires_namespace("users")
+        with pytest.raises(ValueError):
+            db.set("a", 1, namespace=reserved)
+        with pytest.raises(ValueError):
+            db.set_many({"a": 1}, namespace=expires_namespace(None))
+        with pytest.raises(ValueError):
+            db.delete("a", namespace=reserved)
+        with pytest.raises(ValueError):
+            db.drop_namespace(reserved)
+        with pytest.raises(ValueError):
+            Collection(db, "\x00users")
+        # Отклоненные операции не попадают в журнал
+        assert db.wal.replay() == []
+        db.set("a", 1, namespace="users\x00")
+        db.shutdown()
+
+    def test_sharded_ttl(self, data_dir):
+        """ShardedKVDB передает ttl шардам и удаляет истекшие ключи во всех шардах"""
+        db = ShardedKVDB(data_dir, shards=3, recovery_processes=1)
+        db.set_many(((f"key{i}", i) for i in range(30)), ttl=0.05)
+        db.set("kept", 1, ttl=100)
+        assert 99 < db.ttl("kept") <= 100
+        time.sleep(0.06)
+        assert db.get_many([f"key{i}" for i in range(30)]) == {}
+        assert db.purge_expired(limit=10) == 10
+        assert db.purge_expired() == 20
+        assert db.storage_engine.count() == 1
+        db.shutdown()
+
+
+class TestExpiryRecords:
+
+    def test_binary_records_round_trip(self, data_dir):
+        """set с TTL и истечение ключей кодируются компактными бинарными записями"""
+        operations = [
+            {'type': 'set', 'key': 'a', 'value': [1], 'expires_at': 1234.5},
+            {'type': 'set', 'key': 'b', 'value': None, 'expires_at': 99.0, 'namespace': 'ns'},
+            {'type': 'expire', 'keys': ['a', 'ключ']},
+            {'type': 'expire', 'keys': ['b'], 'namespace': 'ns'},
+        ]
+        path = os.path.join(data_dir, "records.bin")
+        with open(path, "wb") as f:
+            for operation in operations:
+                f.write(encode_binary_record(operation))
+        with open(path, "rb") as f:
+            assert [operation for _, operation in iter_binary_records(f)] == operations
+        # Запись об истечении не содержит pickle: ключи хранятся длиной и байтами UTF-8
+        assert len(encode_binary_record({'type': 'expire', 'keys': ['k1', 'k2']})) == 13 + 2 * 6
+
+    def test_compact_operations_with_expiry(self):
+        """Истечение при сжатии журнала равносильно удалению, set с TTL сохраняет время истечения"""
+        batch = WriteBatch().set("b", 2, ttl=100).set("c", 3, namespace="ns")
+        operations = [
+            {'type': 'set', 'key': 'a', 'value': 1, 'expires_at': 10.0},
+            {'type': 'batch', 'operations': batch.operations},
+            {'type': 'expire', 'keys': ['a']},
+            {'type': 'expire', 'keys': ['c'], 'namespace': 'ns'},
+        ]
+        compacted = compact_operations(operations)
+        assert compacted == [
+            {'type': 'batch', 'operations': [{'type': 'delete', 'key': 'a'}, batch.operations[0]]},
+            {'type': 'batch', 'operations': [{'type': 'delete', 'key': 'c', 'namespace': 'ns'}]},
+        ]
+
+    def test_segmented_wal_parallel_replay_with_expiry(self, data_dir):
+        """Восстановление сегментов в пуле процессов учитывает записи об истечении"""
+        def open_segmented():
+            return KVDB(
+                storage_engine=InMemoryStorage(),
+                persistence=Snapshotter(os.path.join(data_dir, "snapshot.bin")),
+                wal=SegmentedWal(os.path.join(data_dir, "wal"), max_segment_records=5, record_format="binary"),
+                auto_snapshot_threshold=1000,
+                recovery_processes=2,
+            )
+
+        db = open_segmented()
+        db.set_many(((f"key{i}", i) for i in range(5)), ttl=0.05)
+        for i in range(5):
+            db.set(f"long{i}", i, ttl=100)
+        time.sleep(0.06)
+        assert db.purge_expired() == 5
+        for i in range(10):
+            db.set(f"plain{i}", i)
+        db.wal.close()
+
+        db = open_segmented()
+        assert db.storage_engine.count() == 15
+        assert db.get("key0") is None and 99 < db.ttl("long4") <= 100
+        db.shutdown()
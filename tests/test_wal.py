@@ -1,7 +1,10 @@
 import pytest
 import os
 import tempfile
-from app.core.wal import FileWal
+import threading
+from app.core import wal as wal_module
+from app.core.compression import detect_compression
+from app.core.wal import FileWal, SegmentedWal, Durability, BINARY_MAGIC, encode_binary_record
 
 
 class TestFileWal:
@@ -231,3 +234,460 @@ class TestFileWal:
         replayed = wal.replay()
         assert replayed == operations
 
+
+    def test_file_handle_stays_open(self, temp_wal_file):
+        """Тест что файл журнала открывается один раз и не переоткрывается на каждую операцию"""
+        wal = FileWal(temp_wal_file)
+        handle = wal._file
+
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+        wal.log({"type": "set", "key": "key2", "value": "value2"})
+
+        assert wal._file is handle
+        assert not handle.closed
+        wal.close()
+        assert handle.closed
+
+    def test_log_after_close(self, temp_wal_file):
+        """Тест записи в закрытый журнал"""
+        wal = FileWal(temp_wal_file)
+        wal.close()
+
+        with pytest.raises(IOError, match="Ошибка записи в WAL"):
+            wal.log({"type": "set", "key": "key1", "value": "value1"})
+
+    def test_invalid_group_commit_settings(self, temp_wal_file):
+        """Тест валидации параметров group commit"""
+        with pytest.raises(ValueError):
+            FileWal(temp_wal_file, group_commit=True, max_batch_size=0)
+        with pytest.raises(ValueError):
+            FileWal(temp_wal_file, group_commit=True, flush_interval=-1)
+
+    def test_group_commit_single_writer(self, temp_wal_file):
+        """Тест что в режиме group commit запись видна сразу после возврата из log"""
+        wal = FileWal(temp_wal_file, group_commit=True, flush_interval=0.001)
+
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+        assert FileWal(temp_wal_file).replay() == [{"type": "set", "key": "key1", "value": "value1"}]
+
+        wal.log({"type": "delete", "key": "key1"})
+        assert len(wal.replay()) == 2
+        wal.close()
+
+    def test_group_commit_concurrent_writers(self, temp_wal_file):
+        """Тест group commit с несколькими конкурентными писателями"""
+        wal = FileWal(temp_wal_file, group_commit=True, flush_interval=0.005, max_batch_size=64)
+        num_threads, per_thread = 8, 100
+
+        def writer(thread_id):
+            for i in range(per_thread):
+                wal.log({"type": "set", "key": f"t{thread_id}:{i}", "value": i})
+
+        threads = [threading.Thread(target=writer, args=(t,)) for t in range(num_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wal.close()
+
+        operations = FileWal(temp_wal_file).replay()
+        assert len(operations) == num_threads * per_thread
+        # Порядок внутри одного писателя сохраняется
+        for thread_id in range(num_threads):
+            values = [op["value"] for op in operations if op["key"].startswith(f"t{thread_id}:")]
+            assert values == list(range(per_thread))
+
+    def test_log_deferred(self, temp_wal_file):
+        """log_deferred ставит запись в очередь, а возвращенная функция ждет ее фиксации"""
+        wal = FileWal(temp_wal_file, group_commit=True, flush_interval=0.05)
+        wait1 = wal.log_deferred({"type": "set", "key": "key1", "value": 1})
+        wait2 = wal.log_deferred({"type": "delete", "key": "key1"})
+
+        wait2()
+        wait1()
+        assert FileWal(temp_wal_file).replay() == [
+            {"type": "set", "key": "key1", "value": 1},
+            {"type": "delete", "key": "key1"},
+        ]
+        wal.close()
+
+        # Без group commit запись выполняется сразу
+        plain = FileWal(temp_wal_file)
+        plain.log_deferred({"type": "set", "key": "key2", "value": 2})()
+        assert len(plain.replay()) == 3
+        plain.close()
+
+    def test_group_commit_compact(self, temp_wal_file):
+        """Тест очистки журнала в режиме group commit"""
+        wal = FileWal(temp_wal_file, group_commit=True, flush_interval=0)
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+        wal.compact()
+        wal.log({"type": "set", "key": "key2", "value": "value2"})
+
+        operations = wal.replay()
+        assert operations == [{"type": "set", "key": "key2", "value": "value2"}]
+        wal.close()
+
+    def test_default_durability(self, temp_wal_file):
+        """Тест уровней durability по умолчанию"""
+        wal = FileWal(temp_wal_file)
+        grouped = FileWal(temp_wal_file, group_commit=True)
+
+        assert wal.durability is Durability.FLUSH
+        assert grouped.durability is Durability.FSYNC
+        wal.close()
+        grouped.close()
+
+    def test_unknown_durability(self, temp_wal_file):
+        """Тест неизвестного уровня durability"""
+        with pytest.raises(ValueError, match="Неизвестный уровень durability"):
+            FileWal(temp_wal_file, durability="paranoid")
+
+    def test_durability_none_replays_buffered_records(self, temp_wal_file):
+        """Тест что при durability=none replay видит записи из буфера процесса"""
+        wal = FileWal(temp_wal_file, durability="none")
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+
+        assert wal.replay() == [{"type": "set", "key": "key1", "value": "value1"}]
+        wal.close()
+
+    def test_durability_fsync_per_operation(self, temp_wal_file, monkeypatch):
+        """Тест что durability=fsync вызывает fsync на каждую операцию"""
+        calls = []
+        monkeypatch.setattr(wal_module.os, "fsync", lambda fd: calls.append(fd))
+        wal = FileWal(temp_wal_file, durability=Durability.FSYNC)
+
+        for i in range(3):
+            wal.log({"type": "set", "key": f"key{i}", "value": i})
+
+        assert len(calls) == 3
+        wal.close()
+
+    def test_durability_flush_does_not_fsync(self, temp_wal_file, monkeypatch):
+        """Тест что durability=flush не вызывает fsync на запись"""
+        calls = []
+        monkeypatch.setattr(wal_module.os, "fsync", lambda fd: calls.append(fd))
+        wal = FileWal(temp_wal_file, durability="flush")
+
+        for i in range(3):
+            wal.log({"type": "set", "key": f"key{i}", "value": i})
+
+        assert calls == []
+        assert len(FileWal(temp_wal_file).replay()) == 3
+
+    def test_durability_interval_background_fsync(self, temp_wal_file, monkeypatch):
+        """Тест фонового fsync для durability=interval"""
+        synced = threading.Event()
+        monkeypatch.setattr(wal_module.os, "fsync", lambda fd: synced.set())
+        wal = FileWal(temp_wal_file, durability="interval", fsync_interval=0.01)
+
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+
+        assert synced.wait(timeout=2)
+        wal.set_durability("flush")
+        assert wal._syncer is None
+        wal.close()
+
+    def test_binary_format_roundtrip(self, temp_wal_file):
+        """Тест записи и чтения операций в бинарном формате"""
+        wal = FileWal(temp_wal_file, record_format="binary")
+        operations = [
+            {"type": "set", "key": "key1", "value": {"nested": [1, 2, None]}},
+            {"type": "set", "key": "greeting", "value": "Привет мир 你好"},
+            {"type": "delete", "key": "key1"},
+            {"type": "custom", "data": "something"},
+            {"type": "set", "key": "extra", "value": 1, "ttl": 10},
+        ]
+        for op in operations:
+            wal.log(op)
+
+        assert wal.replay() == operations
+        with open(temp_wal_file, 'rb') as f:
+            assert f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+    @pytest.mark.parametrize("record_format", ["json", "binary"])
+    def test_namespace_records(self, temp_wal_file, record_format):
+        """Тест записи и чтения операций с пространством имен"""
+        wal = FileWal(temp_wal_file, record_format=record_format)
+        operations = [
+            {"type": "set", "key": "alice", "value": {"age": 30}, "namespace": "users"},
+            {"type": "set", "key": "c", "value": 1, "namespace": "a:b"},
+            {"type": "delete", "key": "alice", "namespace": "users"},
+            {"type": "set", "key": "key", "value": "general"},
+        ]
+        for op in operations:
+            wal.log(op)
+
+        assert wal.replay() == operations
+
+    def test_binary_format_torn_tail(self, temp_wal_file):
+        """Тест что replay бинарного журнала останавливается на недописанной записи"""
+        wal = FileWal(temp_wal_file, record_format="binary")
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+        wal.log({"type": "set", "key": "key2", "value": "value2"})
+        valid_size = os.path.getsize(temp_wal_file)
+
+        # Имитируем сбой посреди записи третьей операции
+        record = encode_binary_record({"type": "set", "key": "key3", "value": "value3"})
+        with open(temp_wal_file, 'ab') as f:
+            f.write(record[:len(record) // 2])
+
+        operations = wal.replay()
+        assert [op["key"] for op in operations] == ["key1", "key2"]
+        # Хвост обрезан, новые записи не теряются за мусором
+        assert os.path.getsize(temp_wal_file) == valid_size
+        wal.log({"type": "set", "key": "key4", "value": "value4"})
+        assert [op["key"] for op in wal.replay()] == ["key1", "key2", "key4"]
+
+    def test_binary_format_checksum_mismatch(self, temp_wal_file):
+        """Тест что replay останавливается на записи с неверной контрольной суммой"""
+        wal = FileWal(temp_wal_file, record_format="binary")
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+        wal.log({"type": "set", "key": "key2", "value": "value2"})
+        wal.close()
+
+        # Портим последний байт последней записи
+        with open(temp_wal_file, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+
+        operations = FileWal(temp_wal_file, record_format="binary").replay()
+        assert operations == [{"type": "set", "key": "key1", "value": "value1"}]
+
+    def test_binary_format_compact(self, temp_wal_file):
+        """Тест очистки бинарного журнала"""
+        wal = FileWal(temp_wal_file, record_format="binary")
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+        wal.compact()
+        wal.log({"type": "set", "key": "key2", "value": "value2"})
+
+        assert wal.replay() == [{"type": "set", "key": "key2", "value": "value2"}]
+
+    def test_record_format_mismatch(self, temp_wal_file):
+        """Тест открытия журнала в формате, отличном от уже записанного"""
+        wal = FileWal(temp_wal_file)
+        wal.log({"type": "set", "key": "key1", "value": "value1"})
+
+        with pytest.raises(ValueError, match="записан в формате json"):
+            FileWal(temp_wal_file, record_format="binary")
+
+    def test_unknown_record_format(self, temp_wal_file):
+        """Тест неизвестного формата записей"""
+        with pytest.raises(ValueError, match="Неизвестный формат WAL"):
+            FileWal(temp_wal_file, record_format="xml")
+
+    def test_iter_replay_is_lazy(self, temp_wal_file):
+        """Тест что iter_replay возвращает операции по одной"""
+        wal = FileWal(temp_wal_file)
+        for i in range(3):
+            wal.log({"type": "set", "key": f"key{i}", "value": i})
+
+        iterator = wal.iter_replay()
+        assert not isinstance(iterator, list)
+        assert next(iterator) == {"type": "set", "key": "key0", "value": 0}
+        assert [op["key"] for op in iterator] == ["key1", "key2"]
+
+    @pytest.mark.parametrize("record_format", ["json", "binary"])
+    def test_iter_replay_matches_replay(self, temp_wal_file, record_format):
+        """Тест что iter_replay и replay возвращают одинаковые операции"""
+        wal = FileWal(temp_wal_file, record_format=record_format)
+        for i in range(10):
+            wal.log({"type": "set", "key": f"key{i}", "value": i})
+            wal.log({"type": "delete", "key": f"key{i - 1}"})
+
+        assert list(wal.iter_replay()) == wal.replay()
+
+    def test_iter_replay_corrupted_wal(self, temp_wal_file):
+        """Тест ошибки декодирования при потоковом чтении JSON журнала"""
+        with open(temp_wal_file, 'w', encoding='UTF-8') as f:
+            f.write('{"type": "set", "key": "key1"}\n')
+            f.write('{ ▄︻デ══━一💥 }\n')
+
+        iterator = FileWal(temp_wal_file).iter_replay()
+        assert next(iterator) == {"type": "set", "key": "key1"}
+        with pytest.raises(ValueError, match="Ошибка декодирования WAL"):
+            next(iterator)
+
+
+class TestSegmentedWal:
+
+    @staticmethod
+    def _set(i):
+        return {"type": "set", "key": f"key{i}", "value": i}
+
+    def test_log_and_replay(self, tmp_path):
+        """Тест записи и чтения сегментированного журнала"""
+        wal = SegmentedWal(str(tmp_path / "wal"))
+        for i in range(5):
+            wal.log(self._set(i))
+
+        assert wal.replay() == [self._set(i) for i in range(5)]
+        assert wal.last_lsn == 5
+
+    @pytest.mark.parametrize("record_format", ["json", "binary"])
+    def test_rotation_by_record_count(self, tmp_path, record_format):
+        """Тест ротации сегментов по числу записей"""
+        wal = SegmentedWal(str(tmp_path / "wal"), max_segment_records=3, record_format=record_format)
+        for i in range(10):
+            wal.log(self._set(i))
+
+        assert [base for base, _ in wal.segments()] == [1, 4, 7, 10]
+        assert [op["value"] for op in wal.replay()] == list(range(10))
+
+    def test_rotation_by_size(self, tmp_path):
+        """Тест ротации сегментов по размеру"""
+        wal = SegmentedWal(str(tmp_path / "wal"), max_segment_bytes=100)
+        for i in range(10):
+            wal.log({"type": "set", "key": f"key{i}", "value": "x" * 60})
+
+        segments = wal.segments()
+        assert len(segments) > 1
+        for _, path in segments[:-1]:
+            assert os.path.getsize(path) >= 100
+        assert len(wal.replay()) == 10
+
+    def test_replay_after_lsn(self, tmp_path):
+        """Тест чтения журнала начиная с заданного LSN"""
+        wal = SegmentedWal(str(tmp_path / "wal"), max_segment_records=4)
+        for i in range(10):
+            wal.log(self._set(i))
+
+        assert [op["value"] for op in wal.iter_replay(after_lsn=6)] == [6, 7, 8, 9]
+        assert list(wal.iter_replay(after_lsn=10)) == []
+
+    def test_compact_deletes_whole_segments(self, tmp_path):
+        """Тест что сжатие удаляет только сегменты, полностью вошедшие в снапшот"""
+        wal = SegmentedWal(str(tmp_path / "wal"), max_segment_records=3)
+        for i in range(10):
+            wal.log(self._set(i))
+
+        wal.compact(upto_lsn=7)
+
+        # Сегмент [7, 9] содержит записи после LSN 7 и должен остаться
+        assert [base for base, _ in wal.segments()] == [7, 10]
+        assert [op["value"] for op in wal.iter_replay(after_lsn=7)] == [7, 8, 9]
+
+    def test_compact_all(self, tmp_path):
+        """Тест полного сжатия журнала"""
+        wal = SegmentedWal(str(tmp_path / "wal"), max_segment_records=3)
+        for i in range(5):
+            wal.log(self._set(i))
+
+        wal.compact()
+        wal.log(self._set(5))
+
+        assert wal.replay() == [self._set(5)]
+        assert wal.last_lsn == 6
+        assert [base for base, _ in wal.segments()] == [6]
+
+    def test_lsn_continues_after_reopen(self, tmp_path):
+        """Тест что нумерация LSN продолжается после переоткрытия журнала"""
+        wal_dir = str(tmp_path / "wal")
+        wal = SegmentedWal(wal_dir, max_segment_records=3)
+        for i in range(4):
+            wal.log(self._set(i))
+        wal.compact(upto_lsn=3)
+        wal.close()
+
+        reopened = SegmentedWal(wal_dir, max_segment_records=3)
+        assert reopened.last_lsn == 4
+        reopened.log(self._set(4))
+        assert reopened.last_lsn == 5
+        assert [op["value"] for op in reopened.replay()] == [3, 4]
+
+    def test_group_commit_rotation(self, tmp_path):
+        """Тест ротации сегментов в режиме group commit"""
+        wal = SegmentedWal(str(tmp_path / "wal"), max_segment_records=10, group_commit=True)
+
+        def writer(offset):
+            for i in range(25):
+                wal.log(self._set(offset + i))
+
+        threads = [threading.Thread(target=writer, args=(t * 100,)) for t in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert wal.last_lsn == 100
+        assert len(wal.replay()) == 100
+        wal.close()
+
+    def test_torn_tail_in_active_segment(self, tmp_path):
+        """Тест недописанной записи в активном сегменте бинарного журнала"""
+        wal_dir = str(tmp_path / "wal")
+        wal = SegmentedWal(wal_dir, record_format="binary")
+        wal.log(self._set(0))
+        wal.log(self._set(1))
+        wal.close()
+        _, active = SegmentedWal(wal_dir, record_format="binary").segments()[-1]
+        with open(active, 'ab') as f:
+            f.write(encode_binary_record(self._set(2))[:5])
+
+        reopened = SegmentedWal(wal_dir, record_format="binary")
+        assert reopened.last_lsn == 2
+        reopened.log(self._set(3))
+        assert [op["value"] for op in reopened.replay()] == [0, 1, 3]
+
+    def test_invalid_segment_limits(self, tmp_path):
+        """Тест валидации лимитов сегмента"""
+        with pytest.raises(ValueError):
+            SegmentedWal(str(tmp_path / "wal"), max_segment_bytes=0)
+        with pytest.raises(ValueError):
+            SegmentedWal(str(tmp_path / "wal"), max_segment_records=0)
+
+
+class TestSegmentedWalCompression:
+
+    @staticmethod
+    def _set(i):
+        return {"type": "set", "key": f"key{i}", "value": {"index": i, "payload": "x" * 50}}
+
+    @pytest.mark.parametrize("compression", ["zlib", "lzma"])
+    @pytest.mark.parametrize("record_format", ["json", "binary"])
+    def test_sealed_segments_compressed(self, tmp_path, compression, record_format):
+        """Закрытые сегменты сжимаются в фоне, активный остается несжатым"""
+        wal = SegmentedWal(str(tmp_path / "wal"), max_segment_records=10,
+                           compression=compression, record_format=record_format)
+        for i in range(25):
+            wal.log(self._set(i))
+        wal.wait_for_compression()
+
+        codecs = [detect_compression(path) for _, path in wal.segments()]
+        assert codecs == [compression, compression, "none"]
+        assert wal.replay() == [self._set(i) for i in range(25)]
+        assert [op["key"] for op in wal.iter_replay(after_lsn=22)] == ["key22", "key23", "key24"]
+        wal.close()
+
+    def test_restart_with_compressed_segments(self, tmp_path):
+        """Тест перезапуска: LSN восстанавливается, несжатые закрытые сегменты дожимаются"""
+        wal_dir = str(tmp_path / "wal")
+        wal1 = SegmentedWal(wal_dir, max_segment_records=10)
+        for i in range(15):
+            wal1.log(self._set(i))
+        wal1.close()
+
+        wal2 = SegmentedWal(wal_dir, max_segment_records=10, compression="zlib")
+        wal2.wait_for_compression()
+        assert [detect_compression(path) for _, path in wal2.segments()] == ["zlib", "none"]
+        assert wal2.last_lsn == 15
+        wal2.log(self._set(15))
+        assert wal2.replay() == [self._set(i) for i in range(16)]
+        wal2.close()
+
+    def test_compact_with_compressed_segments(self, tmp_path):
+        """Тест сжатия журнала со сжатыми сегментами"""
+        wal = SegmentedWal(str(tmp_path / "wal"), max_segment_records=5, compression="zlib")
+        for i in range(12):
+            wal.log(self._set(i))
+        wal.wait_for_compression()
+
+        wal.compact(upto_lsn=10)
+        assert [op["key"] for op in wal.replay()] == ["key10", "key11"]
+        wal.compact()
+        wal.wait_for_compression()
+        assert wal.replay() == []
+        assert not [name for name in os.listdir(wal.dir_path) if name.endswith(".tmp")]
+        wal.close()